@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+"""
+Teleop log view benchmark.
+
+Runs a TeleopController headless (QT_QPA_PLATFORM=offscreen) and streams N MB
+of rostopic-style output into it through a real QProcess, like a telemetry
+flood during teleop. Reports how long the GUI thread needed, how many 30 Hz
+frames it missed while doing so, and peak RSS.
+
+Usage:
+    python3 benchmarks/bench_log_view.py [--mb 50] [--legacy]
+
+--legacy swaps in the old per-chunk QTextEdit append for comparison (use a
+smaller --mb; it slows down and grows without bound).
+"""
+import os
+import sys
+import time
+import argparse
+import resource
+
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from PySide6.QtCore import QProcess, QTimer  # noqa: E402
+from PySide6.QtGui import QTextCursor  # noqa: E402
+from PySide6.QtWidgets import QApplication, QTextEdit  # noqa: E402
+
+import teleop_controller  # noqa: E402
+
+FRAME_MS = 1000 / 30
+
+# Writes the requested number of bytes of odometry-like frames as fast as possible
+GENERATOR = r"""
+import sys
+frame = "".join(
+    f"header:\n  seq: {i}\n  frame_id: odom\npose:\n  position:\n    x: {i * 0.01:.4f}\n    y: 0.0\n"
+    "  orientation:\n    z: 0.0\n    w: 1.0\n---\n" for i in range(50)
+).encode()
+remaining = int(sys.argv[1])
+out = sys.stdout.buffer
+while remaining > 0:
+    chunk = frame[:remaining]
+    out.write(chunk)
+    remaining -= len(chunk)
+out.flush()
+"""
+
+
+def legacy_log(window):
+    """The previous log(): a QTextEdit edited and scrolled on every chunk."""
+    view = QTextEdit()
+    view.setReadOnly(True)
+    window.output_log.setParent(None)
+    window.centralWidget().layout().addWidget(view)
+    window.output_log = view
+
+    def log(text: str):
+        cursor = view.textCursor()
+        cursor.movePosition(QTextCursor.End)
+        cursor.insertText(text)
+        view.setTextCursor(cursor)
+        view.ensureCursorVisible()
+
+    window.log = log
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--mb", type=float, default=50)
+    parser.add_argument("--legacy", action="store_true", help="old unbounded QTextEdit log")
+    args = parser.parse_args()
+
+    app = QApplication(sys.argv)
+    window = teleop_controller.TeleopController()
+    if args.legacy:
+        legacy_log(window)
+    window.show()
+
+    # A 30 Hz probe: every late tick is a frame the GUI thread could not paint
+    ticks = {"last": None, "missed": 0, "worst": 0.0}
+
+    def on_tick():
+        now = time.perf_counter()
+        if ticks["last"] is not None:
+            gap = (now - ticks["last"]) * 1000
+            ticks["worst"] = max(ticks["worst"], gap)
+            ticks["missed"] += max(0, int(gap / FRAME_MS) - 1)
+        ticks["last"] = now
+
+    probe = QTimer()
+    probe.setInterval(int(FRAME_MS))
+    probe.timeout.connect(on_tick)
+
+    total = int(args.mb * 1_000_000)
+    window.process = QProcess(window)
+    window.process.setProcessChannelMode(QProcess.MergedChannels)
+    window.process.readyReadStandardOutput.connect(window.handle_stdout)
+    started = time.perf_counter()
+
+    def on_finished(*_):
+        # Let the last queued text reach the view
+        QTimer.singleShot(int(FRAME_MS * 2), app.quit)
+
+    window.process.finished.connect(on_finished)
+    window.process.start(sys.executable, ["-c", GENERATOR, str(total)])
+    probe.start()
+    app.exec()
+    elapsed = time.perf_counter() - started
+
+    log = window.output_log
+    expected = elapsed * 1000 / FRAME_MS
+    peak_rss_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    print(f"mode: {'legacy QTextEdit' if args.legacy else 'LogView'}, fed {args.mb:g} MB in {elapsed:.1f}s")
+    print(f"frames missed: {ticks['missed']} of ~{expected:.0f} ({ticks['missed'] / max(expected, 1):.0%}), "
+          f"worst gap {ticks['worst']:.0f} ms")
+    print(f"lines kept: {log.document().blockCount()}, peak RSS: {peak_rss_mb:.0f} MB")
+    if not args.legacy:
+        print(f"repaints: {log.flushes}, chars never shown: {log.dropped_chars / 1e6:.1f} M")
+    window.close()
+    del window, log
+    app.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -7,6 +7,10 @@ This script provides a simple UI with:
 - Stop button (terminates the running teleop process)
 - Output log box (shows live stdout/stderr from the script)
 
+The log is a bounded plain-text view: output is queued and appended at most
+LOG_FLUSH_HZ times per second, only the last LOG_MAX_LINES lines are kept, and
+autoscroll pauses while the user is scrolled up.
+
 Requirements:
     pip install PySide6
 
@@ -19,9 +23,9 @@ import os
 import signal
 from PySide6.QtWidgets import (
     QApplication, QMainWindow, QWidget, QVBoxLayout, QHBoxLayout,
-    QPushButton, QTextEdit, QInputDialog, QLabel, QFrame
+    QPushButton, QPlainTextEdit, QInputDialog, QLabel, QFrame
 )
-from PySide6.QtCore import QProcess, Qt
+from PySide6.QtCore import QProcess, Qt, QTimer
 from PySide6.QtGui import QFont, QTextCursor
 
 # ============================================================================
@@ -30,6 +34,95 @@ from PySide6.QtGui import QFont, QTextCursor
 SCRIPT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "scripts")
 SCRIPT_NAME = "xvalidation.sh"
 
+# Log view limits: lines kept, repaint rate, lines appended per repaint, and
+# queued characters kept before the oldest are discarded (a few seconds of flood)
+LOG_MAX_LINES = 20000
+LOG_FLUSH_HZ = 30
+LOG_FLUSH_LINES = 2000
+LOG_MAX_PENDING = 1024 * 1024
+
+
+class LogView(QPlainTextEdit):
+    """
+    Read-only log that stays responsive under output floods.
+
+    append_chunk() only queues text; a timer appends up to flush_lines queued
+    lines in one edit LOG_FLUSH_HZ times per second, so a flood can't starve
+    the GUI thread. The queue keeps only the newest max_pending characters, the
+    document only the last max_lines lines, and the view only follows new
+    output while the scrollbar is at the bottom.
+    """
+
+    def __init__(self, max_lines: int = LOG_MAX_LINES, flush_hz: int = LOG_FLUSH_HZ,
+                 flush_lines: int = LOG_FLUSH_LINES, max_pending: int = LOG_MAX_PENDING,
+                 parent=None):
+        super().__init__(parent)
+        self.setReadOnly(True)
+        self.setUndoRedoEnabled(False)
+        self.setMaximumBlockCount(max_lines)
+        self.flush_lines = flush_lines
+        self.max_pending = max_pending
+        self._pending = []
+        self._pending_size = 0
+        # Characters discarded from the queue before they were ever shown
+        self.dropped_chars = 0
+        self.flushes = 0
+
+        self._timer = QTimer(self)
+        self._timer.setInterval(max(1, 1000 // flush_hz))
+        self._timer.timeout.connect(self.flush)
+
+    def append_chunk(self, text: str):
+        """Queue text for the next repaint."""
+        if not text:
+            return
+        self._pending.append(text)
+        self._pending_size += len(text)
+        if self._pending_size > self.max_pending:
+            # Arriving faster than it can be drawn: keep the newest output
+            joined = "".join(self._pending)
+            keep = joined[-self.max_pending:]
+            self.dropped_chars += len(joined) - len(keep)
+            self._pending = [keep]
+            self._pending_size = len(keep)
+        if not self._timer.isActive():
+            self._timer.start()
+
+    def flush(self):
+        """Append up to flush_lines queued lines in a single edit."""
+        if not self._pending:
+            self._timer.stop()
+            return
+        text = "".join(self._pending)
+        # Layout cost is per line, so that is what each repaint is budgeted in
+        cut = 0
+        for _ in range(self.flush_lines):
+            cut = text.find("\n", cut) + 1
+            if not cut:
+                cut = len(text)
+                break
+        if cut < len(text):
+            self._pending = [text[cut:]]
+            self._pending_size = len(text) - cut
+            text = text[:cut]
+        else:
+            self._pending.clear()
+            self._pending_size = 0
+
+        scrollbar = self.verticalScrollBar()
+        follow = scrollbar.value() >= scrollbar.maximum()
+        cursor = QTextCursor(self.document())
+        cursor.movePosition(QTextCursor.End)
+        cursor.insertText(text)
+        if follow:
+            scrollbar.setValue(scrollbar.maximum())
+        self.flushes += 1
+
+    def clear(self):
+        self._pending.clear()
+        self._pending_size = 0
+        super().clear()
+
 
 class TeleopController(QMainWindow):
     """
@@ -101,7 +194,7 @@ class TeleopController(QMainWindow):
                 padding: 8px 16px;
                 font-size: 12px;
             }
-            QTextEdit {
+            QPlainTextEdit {
                 background-color: #0f0f1a;
                 border: 2px solid #0f3460;
                 border-radius: 10px;
@@ -187,18 +280,13 @@ class TeleopController(QMainWindow):
         layout.addLayout(terminal_header)
         
         # Output log box
-        self.output_log = QTextEdit()
-        self.output_log.setReadOnly(True)
+        self.output_log = LogView()
         self.output_log.setPlaceholderText("Output will appear here when you run Teleop...")
         layout.addWidget(self.output_log)
     
     def log(self, text: str):
-        """Append text to the output log and auto-scroll to bottom."""
-        cursor = self.output_log.textCursor()
-        cursor.movePosition(QTextCursor.End)
-        cursor.insertText(text)
-        self.output_log.setTextCursor(cursor)
-        self.output_log.ensureCursorVisible()
+        """Queue text for the output log (shown on its next repaint)."""
+        self.output_log.append_chunk(text)
     
     def clear_output(self):
         """Clear the output log."""
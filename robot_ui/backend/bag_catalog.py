@@ -0,0 +1,388 @@
+"""
+Fleet-wide catalog of the robots' rosbags for GET /api/bags.
+
+``xvalidation.sh -M``/``-L`` list ``~/logs/bags`` over SSH one robot at a
+time, every time someone wants to know which logs exist. ``BagCatalog``
+keeps every robot's bags in SQLite instead and refreshes it in the
+background every BAG_REFRESH_INTERVAL seconds:
+
+1. each robot runs bag_helper.py over its pooled SSH connection (at most
+   BAG_REFRESH_PARALLELISM at once), which lists the bag directory with
+   sizes and mtimes;
+2. only bags that are new, or whose size or mtime changed, are described:
+   start and end time, message counts and topics, from the bag header and the
+   index at the end of the file (a few KB; the bag itself is never pulled);
+3. rows of bags gone from the robot are dropped.
+
+A robot that is known to be down, or fails, keeps its rows as of its last
+refresh (see ``robots()`` for when that was). Queries ("robots 60-90, the
+last two hours, over 500 MB") are indexed SQL on the catalog and never touch
+the network.
+"""
+import os
+import json
+import time
+import sqlite3
+import asyncio
+import inspect
+import logging
+import threading
+from typing import AsyncIterator, Dict, Iterable, List, Optional
+
+import bag_helper
+from ssh_pool import SSHPool, SSHUnavailableError
+from reachability import Reachability
+from robots_config import FLEET_ROBOTS
+from remote_helper import HelperError, robot_target, read_framed, last_line
+from fleet import STATUS_OK, STATUS_FAILED, STATUS_UNREACHABLE, STATUS_TIMEOUT
+
+logger = logging.getLogger("robot_ui_backend")
+
+# Where the robots keep their bags
+BAG_DIR = os.environ.get("ROBOT_UI_BAG_DIR", "/home/zippy/logs/bags")
+
+# SQLite database of the catalog
+BAG_CATALOG_PATH = os.environ.get(
+    "ROBOT_UI_BAG_CATALOG", os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "bag_catalog.sqlite3")
+)
+
+# Seconds between background refreshes; 0 only refreshes on request
+BAG_REFRESH_INTERVAL = float(os.environ.get("ROBOT_UI_BAG_REFRESH", "300"))
+
+# Robots refreshed at the same time
+BAG_REFRESH_PARALLELISM = int(os.environ.get("ROBOT_UI_BAG_REFRESH_PARALLELISM", "16"))
+
+# Seconds one robot's refresh may take
+BAG_REFRESH_TIMEOUT = float(os.environ.get("ROBOT_UI_BAG_REFRESH_TIMEOUT", "120"))
+
+# Seconds after start-up before the first background refresh
+FIRST_REFRESH_DELAY = 5.0
+
+# Rows a query returns at most
+MAX_QUERY_LIMIT = 10000
+
+# Run on the robots with remote_helper.py
+HELPER_SOURCE = inspect.getsource(bag_helper)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS bags (
+    robot INTEGER NOT NULL,
+    name TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    active INTEGER NOT NULL,
+    indexed INTEGER,
+    start REAL,
+    end REAL,
+    messages INTEGER,
+    chunks INTEGER,
+    topics TEXT,
+    error TEXT,
+    described_at REAL NOT NULL,
+    PRIMARY KEY (robot, name)
+);
+CREATE INDEX IF NOT EXISTS bags_mtime ON bags (mtime_ns);
+CREATE INDEX IF NOT EXISTS bags_size ON bags (size);
+-- For the topic filter; each bag's row has its topics as JSON too
+CREATE TABLE IF NOT EXISTS bag_topics (
+    robot INTEGER NOT NULL,
+    name TEXT NOT NULL,
+    topic TEXT,
+    type TEXT,
+    messages INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS bag_topics_bag ON bag_topics (robot, name);
+CREATE INDEX IF NOT EXISTS bag_topics_topic ON bag_topics (topic, robot, name);
+CREATE TABLE IF NOT EXISTS robots (
+    robot INTEGER PRIMARY KEY,
+    refreshed_at REAL,
+    attempted_at REAL,
+    status TEXT,
+    error TEXT
+);
+"""
+
+BAG_COLUMNS = ("robot", "name", "size", "mtime_ns", "active", "indexed", "start", "end", "messages", "chunks",
+               "topics", "error", "described_at")
+
+
+def _bag_dict(row: sqlite3.Row) -> dict:
+    bag = {
+        "robot": row["robot"],
+        "name": row["name"],
+        "path": f"{BAG_DIR}/{row['name']}",
+        "size": row["size"],
+        "mtime": row["mtime_ns"] / 1e9,
+        "active": bool(row["active"]),
+        "indexed": None if row["indexed"] is None else bool(row["indexed"]),
+        "start": row["start"],
+        "end": row["end"],
+        "duration": None if row["start"] is None else round(row["end"] - row["start"], 3),
+        "messages": row["messages"],
+        "chunks": row["chunks"],
+        "topics": json.loads(row["topics"]) if row["topics"] else [],
+    }
+    if row["error"]:
+        bag["error"] = row["error"]
+    return bag
+
+
+class BagCatalog:
+    """The fleet's bags in SQLite, kept current by incremental refreshes."""
+
+    def __init__(self, pool: SSHPool, reachability: Optional[Reachability] = None,
+                 robots: Iterable[int] = FLEET_ROBOTS, path: str = BAG_CATALOG_PATH,
+                 interval: float = BAG_REFRESH_INTERVAL):
+        self.pool = pool
+        self.reachability = reachability
+        self.robot_numbers = list(robots)
+        self.interval = interval
+        self.path = path
+        # One connection shared by the threads the queries run on; opened by start()
+        self._db: Optional[sqlite3.Connection] = None
+        self._db_lock = threading.Lock()
+        self.bag_count = 0
+        self._robot_locks: Dict[int, asyncio.Lock] = {}
+        self._task: Optional[asyncio.Task] = None
+        self.rounds = 0
+        self.last_round_duration: Optional[float] = None
+
+    # Storage (blocking; called through asyncio.to_thread)
+
+    def _known(self, robot_number: int) -> Dict[str, tuple]:
+        with self._db_lock:
+            rows = self._db.execute("SELECT name, size, mtime_ns FROM bags WHERE robot = ?", (robot_number,))
+            return {name: (size, mtime_ns) for name, size, mtime_ns in rows}
+
+    def _store(self, robot_number: int, listing: Dict[str, list], described: Dict[str, dict],
+               removed: List[str]):
+        now = time.time()
+        with self._db_lock, self._db:
+            for name in removed:
+                self._db.execute("DELETE FROM bags WHERE robot = ? AND name = ?", (robot_number, name))
+                self._db.execute("DELETE FROM bag_topics WHERE robot = ? AND name = ?", (robot_number, name))
+            for name, result in described.items():
+                if name not in listing:
+                    continue
+                size, mtime_ns = listing[name]
+                self._db.execute(
+                    f"INSERT OR REPLACE INTO bags ({', '.join(BAG_COLUMNS)}) "
+                    f"VALUES ({', '.join('?' * len(BAG_COLUMNS))})",
+                    (robot_number, name, size, mtime_ns, name.endswith(".active"), result.get("indexed"),
+                     result.get("start"), result.get("end"), result.get("messages"), result.get("chunks"),
+                     json.dumps(result.get("topics", [])), result.get("error"), now))
+                self._db.execute("DELETE FROM bag_topics WHERE robot = ? AND name = ?", (robot_number, name))
+                self._db.executemany(
+                    "INSERT INTO bag_topics (robot, name, topic, type, messages) VALUES (?, ?, ?, ?, ?)",
+                    [(robot_number, name, t["topic"], t["type"], t["messages"]) for t in result.get("topics", [])])
+            self._db.execute(
+                "INSERT OR REPLACE INTO robots (robot, refreshed_at, attempted_at, status, error) "
+                "VALUES (?, ?, ?, ?, NULL)", (robot_number, now, now, STATUS_OK))
+            self.bag_count = self._db.execute("SELECT COUNT(*) FROM bags").fetchone()[0]
+
+    def _store_failure(self, robot_number: int, status: str, error: Optional[str]):
+        with self._db_lock, self._db:
+            self._db.execute(
+                "INSERT INTO robots (robot, attempted_at, status, error) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT (robot) DO UPDATE SET attempted_at = excluded.attempted_at, "
+                "status = excluded.status, error = excluded.error",
+                (robot_number, time.time(), status, error))
+
+    def _query(self, where: List[str], params: list, order: str, limit: int) -> List[dict]:
+        sql = f"SELECT * FROM bags{' WHERE ' + ' AND '.join(where) if where else ''} ORDER BY {order} LIMIT ?"
+        with self._db_lock:
+            rows = self._db.execute(sql, (*params, limit)).fetchall()
+        return [_bag_dict(row) for row in rows]
+
+    def _robots(self) -> List[dict]:
+        with self._db_lock:
+            counts = dict(self._db.execute("SELECT robot, COUNT(*) FROM bags GROUP BY robot"))
+            rows = self._db.execute("SELECT * FROM robots ORDER BY robot").fetchall()
+        return [{"robot": r["robot"], "bags": counts.get(r["robot"], 0), "refreshed_at": r["refreshed_at"],
+                 "attempted_at": r["attempted_at"], "status": r["status"], "error": r["error"]} for r in rows]
+
+    # Refresh
+
+    async def _refresh_robot(self, robot_number: int) -> dict:
+        target = robot_target(self.pool, robot_number)
+        known = await asyncio.to_thread(self._known, robot_number)
+        async with target.process(HELPER_SOURCE, ["bags", target.path(BAG_DIR)]) as proc:
+            listing = await read_framed(proc, bag_helper.MARK)
+            wanted = sorted(name for name, (size, mtime_ns) in listing.items()
+                            if known.get(name) != (size, mtime_ns))
+            proc.stdin.write(json.dumps(wanted).encode() + b"\n")
+            await proc.stdin.drain()
+            proc.stdin.close()
+            output = await proc.stdout.read()
+            await proc.wait()
+        described = {}
+        for line in output.decode(errors="replace").splitlines():
+            try:
+                result = json.loads(line)
+            except ValueError:
+                continue
+            if isinstance(result, dict) and "name" in result:
+                described[result["name"]] = result
+        if proc.returncode != 0 and len(described) < len(wanted):
+            # Bags the helper didn't get to are tried again next time
+            raise HelperError(last_line(output) or f"helper exited with {proc.returncode}")
+        removed = [name for name in known if name not in listing]
+        await asyncio.to_thread(self._store, robot_number, listing, described, removed)
+        return {
+            "bags": len(listing),
+            "new": sum(1 for name in described if name not in known),
+            "changed": sum(1 for name in described if name in known),
+            "removed": len(removed),
+            "failed": sum(1 for r in described.values() if "error" in r),
+            "read_bytes": sum(r.get("read_bytes", 0) for r in described.values()),
+        }
+
+    async def refresh_robot(self, robot_number: int) -> dict:
+        """Bring one robot's rows up to date; returns what changed."""
+        lock = self._robot_locks.setdefault(robot_number, asyncio.Lock())
+        started = time.monotonic()
+        # A robot already being refreshed is refreshed again after, cheaply
+        async with lock:
+            try:
+                result = {"status": STATUS_OK,
+                          **await asyncio.wait_for(self._refresh_robot(robot_number), BAG_REFRESH_TIMEOUT)}
+            except SSHUnavailableError as e:
+                result = {"status": STATUS_UNREACHABLE, "error": str(e)}
+            except asyncio.TimeoutError:
+                result = {"status": STATUS_TIMEOUT, "error": f"Refresh timed out after {BAG_REFRESH_TIMEOUT:g}s"}
+            except (HelperError, OSError) as e:
+                result = {"status": STATUS_FAILED, "error": str(e)}
+            if result["status"] != STATUS_OK:
+                logger.warning(f"Bag catalog refresh of robot {robot_number}: {result['status']}: {result['error']}")
+                await asyncio.to_thread(self._store_failure, robot_number, result["status"], result["error"])
+        return {"robot": robot_number, **result, "duration": round(time.monotonic() - started, 3)}
+
+    async def refresh(self, robot_numbers: Optional[List[int]] = None,
+                      parallelism: Optional[int] = None) -> AsyncIterator[dict]:
+        """
+        Refresh ``robot_numbers`` (default: every watched robot), at most
+        ``parallelism`` at a time, yielding each robot's result as it
+        finishes. Robots known to be down are skipped and reported first.
+        """
+        numbers = self.robot_numbers if robot_numbers is None else robot_numbers
+        semaphore = asyncio.Semaphore(parallelism or BAG_REFRESH_PARALLELISM)
+        down = [n for n in numbers if self.reachability and self.reachability.known_down(n)]
+        for n in down:
+            yield {"robot": n, "status": STATUS_UNREACHABLE, "error": self.reachability.describe(n), "duration": 0.0}
+
+        async def refresh_one(n: int) -> dict:
+            async with semaphore:
+                return await self.refresh_robot(n)
+
+        tasks = [asyncio.create_task(refresh_one(n)) for n in numbers if n not in down]
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                yield await next_done
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    async def refresh_all(self) -> List[dict]:
+        started = time.perf_counter()
+        results = [result async for result in self.refresh()]
+        self.rounds += 1
+        self.last_round_duration = time.perf_counter() - started
+        return results
+
+    async def _loop(self):
+        # Lets the first reachability round mark down robots before the first refresh
+        await asyncio.sleep(min(self.interval, FIRST_REFRESH_DELAY))
+        while True:
+            try:
+                await self.refresh_all()
+            except Exception as e:
+                logger.error(f"Bag catalog refresh round failed: {e}")
+            await asyncio.sleep(self.interval)
+
+    def _open(self):
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        self._db = sqlite3.connect(self.path, check_same_thread=False)
+        self._db.row_factory = sqlite3.Row
+        with self._db_lock, self._db:
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("PRAGMA synchronous=NORMAL")
+            self._db.executescript(SCHEMA)
+            self.bag_count = self._db.execute("SELECT COUNT(*) FROM bags").fetchone()[0]
+
+    def start(self):
+        """Open the database, and refresh in the background unless the interval is 0."""
+        if self._db is None:
+            self._open()
+        if self._task is None and self.interval > 0:
+            self._task = asyncio.create_task(self._loop())
+
+    async def close(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        with self._db_lock:
+            if self._db is not None:
+                self._db.close()
+                self._db = None
+
+    # Queries
+
+    async def query(
+        self,
+        robot_numbers: Optional[List[int]] = None,
+        since: Optional[float] = None,
+        until: Optional[float] = None,
+        min_size: Optional[int] = None,
+        max_size: Optional[int] = None,
+        topic: Optional[str] = None,
+        name: Optional[str] = None,
+        active: Optional[bool] = None,
+        limit: int = 1000,
+        order: str = "newest",
+    ) -> List[dict]:
+        """
+        Bags matching every filter given: robots, last modified between
+        ``since`` and ``until`` (Unix time), size in bytes, a topic they
+        recorded, a name glob (``*_2024-06-0[1-3]*``) and whether they are
+        still being recorded.
+        """
+        where: List[str] = []
+        params: list = []
+        if robot_numbers is not None:
+            where.append(f"robot IN ({', '.join('?' * len(robot_numbers))})")
+            params.extend(robot_numbers)
+        if since is not None:
+            where.append("mtime_ns >= ?")
+            params.append(int(since * 1e9))
+        if until is not None:
+            where.append("mtime_ns <= ?")
+            params.append(int(until * 1e9))
+        if min_size is not None:
+            where.append("size >= ?")
+            params.append(min_size)
+        if max_size is not None:
+            where.append("size <= ?")
+            params.append(max_size)
+        if topic is not None:
+            where.append("EXISTS (SELECT 1 FROM bag_topics WHERE bag_topics.topic = ? "
+                         "AND bag_topics.robot = bags.robot AND bag_topics.name = bags.name)")
+            params.append(topic)
+        if name is not None:
+            where.append("name GLOB ?")
+            params.append(name)
+        if active is not None:
+            where.append("active = ?")
+            params.append(int(active))
+        orders = {"newest": "mtime_ns DESC", "oldest": "mtime_ns ASC", "largest": "size DESC",
+                  "robot": "robot, mtime_ns DESC"}
+        if order not in orders:
+            raise ValueError(f"order must be one of {', '.join(orders)}")
+        return await asyncio.to_thread(self._query, where, params, orders[order], min(limit, MAX_QUERY_LIMIT))
+
+    async def robots(self) -> List[dict]:
+        """Per robot: bags in the catalog and how its last refreshes went."""
+        return await asyncio.to_thread(self._robots)
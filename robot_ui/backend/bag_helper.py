@@ -0,0 +1,199 @@
+"""
+Robot-side half of bag_catalog.py, run as ``python3 -S -c <this file> bags <dir>``.
+
+Only the standard library, and Python 3.6 syntax, like sync_helper.py.
+
+First prints a ``rui-bags <length>`` line and then that many bytes of JSON,
+{name: [size, mtime_ns]} for every ``*.bag`` and ``*.bag.active`` file in the
+directory. Then reads one JSON line from stdin, the names to describe (the new
+and changed ones), and prints a JSON line for each:
+
+    {"name", "indexed", "start", "end", "messages", "chunks", "topics": [{"topic",
+     "type", "messages"}], "read_bytes"}  or  {"name", "error"}
+
+Only the bag header and the index section at its end (connection and chunk
+info records) are read, a few KB however big the bag is. A bag still being
+recorded (``.bag.active``) has no index yet; its chunk headers and per-chunk
+index records are walked instead, seeking past the message data, which gives
+times and counts but not topic names (those are inside the chunks).
+"""
+import os
+import sys
+import json
+import struct
+
+MARK = b"rui-bags"
+
+MAGIC = b"#ROSBAG V2.0\n"
+
+# Record ops
+OP_BAG_HEADER = 0x03
+OP_INDEX_DATA = 0x04
+OP_CHUNK = 0x05
+OP_CHUNK_INFO = 0x06
+OP_CONNECTION = 0x07
+
+SUFFIXES = (".bag", ".bag.active")
+
+
+class Reader:
+    def __init__(self, f):
+        self.f = f
+        self.read_bytes = 0
+
+    def read(self, n):
+        data = self.f.read(n)
+        self.read_bytes += len(data)
+        if len(data) != n:
+            raise EOFError("truncated record")
+        return data
+
+    def record_header(self):
+        (header_len,) = struct.unpack("<I", self.read(4))
+        fields = parse_fields(self.read(header_len))
+        (data_len,) = struct.unpack("<I", self.read(4))
+        return fields, data_len
+
+    def skip(self, n):
+        self.f.seek(n, 1)
+
+
+def parse_fields(buf):
+    fields = {}
+    pos = 0
+    while pos + 4 <= len(buf):
+        (n,) = struct.unpack_from("<I", buf, pos)
+        name, _, value = buf[pos + 4:pos + 4 + n].partition(b"=")
+        fields[name.decode("ascii", "replace")] = value
+        pos += 4 + n
+    return fields
+
+
+def _u32(value):
+    return struct.unpack("<I", value)[0]
+
+
+def _time(value):
+    sec, nsec = struct.unpack("<II", value[:8])
+    return sec + nsec / 1e9
+
+
+def _op(fields):
+    return fields.get("op", b"\0")[0]
+
+
+def _read_index(reader, index_pos, conn_count, chunk_count):
+    reader.f.seek(index_pos)
+    topics = {}
+    for _ in range(conn_count):
+        fields, data_len = reader.record_header()
+        if _op(fields) != OP_CONNECTION:
+            raise ValueError("bad index: expected a connection record")
+        data = parse_fields(reader.read(data_len))
+        topics[_u32(fields["conn"])] = {"topic": fields["topic"].decode("utf-8", "replace"),
+                                        "type": data.get("type", b"").decode("utf-8", "replace"),
+                                        "messages": 0}
+    start = end = None
+    for _ in range(chunk_count):
+        fields, data_len = reader.record_header()
+        if _op(fields) != OP_CHUNK_INFO:
+            raise ValueError("bad index: expected a chunk info record")
+        data = reader.read(data_len)
+        for i in range(_u32(fields["count"])):
+            conn, count = struct.unpack_from("<II", data, i * 8)
+            topics.setdefault(conn, {"topic": None, "type": None, "messages": 0})["messages"] += count
+        chunk_start, chunk_end = _time(fields["start_time"]), _time(fields["end_time"])
+        start = chunk_start if start is None else min(start, chunk_start)
+        end = chunk_end if end is None else max(end, chunk_end)
+    return start, end, chunk_count, list(topics.values())
+
+
+def _scan_chunks(reader):
+    # Unindexed: chunk records, each followed by an index data record per
+    # connection in it (ver 1: count x (time, offset))
+    counts = {}
+    start = end = None
+    chunks = 0
+    while True:
+        try:
+            fields, data_len = reader.record_header()
+            op = _op(fields)
+            if op == OP_INDEX_DATA:
+                data = reader.read(data_len)
+                count = _u32(fields["count"])
+                if count:
+                    conn = _u32(fields["conn"])
+                    counts[conn] = counts.get(conn, 0) + count
+                    first, last = _time(data[:8]), _time(data[(count - 1) * 12:(count - 1) * 12 + 8])
+                    start = first if start is None else min(start, first)
+                    end = last if end is None else max(end, last)
+            else:
+                if op == OP_CHUNK:
+                    chunks += 1
+                reader.skip(data_len)
+        except (EOFError, KeyError, struct.error):
+            # The record still being written
+            break
+    topics = [{"topic": None, "type": None, "messages": n} for _, n in sorted(counts.items())]
+    return start, end, chunks, topics
+
+
+def describe(path):
+    with open(path, "rb") as f:
+        reader = Reader(f)
+        if f.read(len(MAGIC)) != MAGIC:
+            raise ValueError("not a rosbag v2.0 file")
+        reader.read_bytes = len(MAGIC)
+        fields, data_len = reader.record_header()
+        if _op(fields) != OP_BAG_HEADER:
+            raise ValueError("no bag header record")
+        (index_pos,) = struct.unpack("<Q", fields["index_pos"])
+        reader.skip(data_len)
+        if index_pos:
+            start, end, chunks, topics = _read_index(reader, index_pos, _u32(fields["conn_count"]),
+                                                     _u32(fields["chunk_count"]))
+        else:
+            start, end, chunks, topics = _scan_chunks(reader)
+        return {"indexed": bool(index_pos), "start": start, "end": end,
+                "messages": sum(t["messages"] for t in topics), "chunks": chunks, "topics": topics,
+                "read_bytes": reader.read_bytes}
+
+
+def listing(directory):
+    bags = {}
+    try:
+        names = os.listdir(directory)
+    except OSError:
+        return bags
+    for name in names:
+        if not name.endswith(SUFFIXES):
+            continue
+        try:
+            st = os.stat(os.path.join(directory, name))
+        except OSError:
+            continue
+        bags[name] = [st.st_size, st.st_mtime_ns]
+    return bags
+
+
+def main(argv):
+    if len(argv) != 2 or argv[0] != "bags":
+        sys.exit("usage: bags <dir>")
+    directory = argv[1]
+    answer = json.dumps(listing(directory), separators=(",", ":")).encode()
+    out = sys.stdout.buffer
+    out.write(MARK + b" " + str(len(answer)).encode() + b"\n" + answer)
+    out.flush()
+    line = sys.stdin.buffer.readline()
+    for name in json.loads(line.decode()) if line else []:
+        try:
+            result = describe(os.path.join(directory, os.path.basename(name)))
+        except (OSError, ValueError, EOFError, KeyError, struct.error) as e:
+            result = {"error": str(e) or type(e).__name__}
+        result["name"] = name
+        out.write((json.dumps(result) + "\n").encode())
+        out.flush()
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,153 @@
+"""
+Bag catalog benchmark for bag_catalog.py.
+
+Writes --bags rosbags per robot for --robots local directories standing in
+for robots (fleet_sim.write_bag: sparse files, so a fleet's worth of
+multi-GB bags costs little disk), recorded over the last day, plus one
+``.bag.active`` still being written on each. Then:
+
+    first refresh    every bag is new and gets described
+    no change        listings only
+    incremental      a new bag on --new robots and every active bag grown
+    ls -l            a directory listing per robot, one after the other, for
+                     robots 60-90 (xvalidation.sh -M, without any metadata)
+    queries          GET /api/bags-style queries on the catalog, p50/p99
+
+Refreshes report the bytes read from the bags against their total size.
+The stand-ins' helpers all run on this machine, so with few CPUs a refresh
+mostly measures their start-up one after the other.
+
+Usage:
+    python3 benchmarks/bench_bags.py [--robots 100] [--bags 20] [--new 5]
+"""
+import os
+import sys
+import time
+import random
+import shutil
+import asyncio
+import argparse
+import tempfile
+import subprocess
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+WORKDIR = tempfile.mkdtemp(prefix="bench-bags-")
+os.environ["ROBOT_UI_LOCAL_ROBOTS"] = os.path.join(WORKDIR, "robots")
+
+from bag_catalog import BagCatalog, BAG_DIR  # noqa: E402
+from fleet_sim import write_bag  # noqa: E402
+
+DAY = 86400.0
+
+
+def bag_dir(n: int) -> str:
+    return os.path.join(WORKDIR, "robots", str(n), BAG_DIR.lstrip("/"))
+
+
+def build_fleet(robots: int, bags: int, now: float) -> int:
+    rng = random.Random(1)
+    total = 0
+    for n in range(1, robots + 1):
+        directory = bag_dir(n)
+        os.makedirs(directory)
+        for b in range(bags):
+            start = now - DAY + b * DAY / bags + rng.uniform(0, 600)
+            path = os.path.join(directory, f"roslogger_{n}_{b:03d}.bag")
+            write_bag(path, start, 600, size=rng.randrange(50, 2000) * 1_000_000, hz=0.2)
+            total += os.path.getsize(path)
+        write_bag(os.path.join(directory, f"roslogger_{n}_{bags:03d}.bag.active"), now - 300, 240, active=True)
+    return total
+
+
+def grow(robots: int, new: int, bags: int, now: float):
+    for n in range(1, robots + 1):
+        write_bag(os.path.join(bag_dir(n), f"roslogger_{n}_{bags:03d}.bag.active"), now - 300, 300, active=True)
+    for n in random.Random(2).sample(range(1, robots + 1), new):
+        write_bag(os.path.join(bag_dir(n), f"roslogger_{n}_new.bag"), now - 600, 600, size=800_000_000)
+
+
+async def refresh(catalog: BagCatalog):
+    started = time.perf_counter()
+    results = [r async for r in catalog.refresh(parallelism=16)]
+    failed = [r for r in results if r["status"] != "ok"]
+    if failed:
+        raise SystemExit(f"robot {failed[0]['robot']}: {failed[0]['status']}: {failed[0].get('error')}")
+    return (time.perf_counter() - started, sum(r["new"] + r["changed"] for r in results),
+            sum(r["read_bytes"] for r in results))
+
+
+def list_each(robots) -> float:
+    started = time.perf_counter()
+    for n in robots:
+        subprocess.run(["ls", "-l", bag_dir(n)], stdout=subprocess.DEVNULL, check=True)
+    return time.perf_counter() - started
+
+
+async def time_query(catalog: BagCatalog, runs: int, **filters):
+    times = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        rows = await catalog.query(**filters)
+        times.append(time.perf_counter() - started)
+    times.sort()
+    return len(rows), times[len(times) // 2] * 1000, times[min(len(times) - 1, int(0.99 * len(times)))] * 1000
+
+
+async def run(args):
+    now = time.time()
+    started = time.perf_counter()
+    total = build_fleet(args.robots, args.bags, now)
+    print(f"{'write bags':>24}: {time.perf_counter() - started:7.2f} s, {args.robots * (args.bags + 1)} bags, "
+          f"{total / 1e9:.1f} GB apparent")
+
+    catalog = BagCatalog(None, robots=range(1, args.robots + 1), path=os.path.join(WORKDIR, "catalog.sqlite3"),
+                         interval=0)
+    catalog.start()
+    try:
+        for label, before in (("first refresh", None), ("no change", None),
+                              ("incremental", lambda: grow(args.robots, args.new, args.bags, now))):
+            if before:
+                before()
+            elapsed, described, read = await refresh(catalog)
+            print(f"{label:>24}: {elapsed:7.2f} s, {described:5d} bags described, {read / 1e3:9.1f} kB read "
+                  f"of {total / 1e9:.1f} GB")
+
+        window = [n for n in range(60, 91) if n <= args.robots]
+        if window:
+            print(f"{'ls -l robots 60-90':>24}: {list_each(window) * 1000:7.1f} ms (locally; one SSH round trip "
+                  f"and login per robot on the fleet)")
+        queries = (
+            ("60-90, 2 h, >500 MB", dict(robot_numbers=window, since=now - 7200, min_size=500_000_000)),
+            ("60-90, 2 h", dict(robot_numbers=window, since=now - 7200)),
+            ("topic, 24 h", dict(topic="/camera/image_raw/compressed", since=now - DAY)),
+            ("all, largest 100", dict(limit=100, order="largest")),
+            ("active", dict(active=True)),
+        )
+        for label, filters in queries:
+            rows, p50, p99 = await time_query(catalog, args.runs, **filters)
+            print(f"{label:>24}: p50 {p50:6.2f} ms, p99 {p99:6.2f} ms, {rows} bags")
+        size = sum(os.path.getsize(os.path.join(WORKDIR, f)) for f in os.listdir(WORKDIR)
+                   if f.startswith("catalog.sqlite3"))
+        print(f"{'catalog':>24}: {catalog.bag_count} bags, {size / 1e6:.1f} MB on disk")
+    finally:
+        await catalog.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--robots", type=int, default=100)
+    parser.add_argument("--bags", type=int, default=20, help="bags per robot")
+    parser.add_argument("--new", type=int, default=5, help="robots with a new bag before the incremental refresh")
+    parser.add_argument("--runs", type=int, default=200, help="runs per query")
+    args = parser.parse_args()
+    try:
+        asyncio.run(run(args))
+    finally:
+        shutil.rmtree(WORKDIR, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,201 @@
+"""
+Bag download benchmark with injected disconnects.
+
+Serves a random N MB "bag" from a local HTTP stand-in (its own process) that
+caps every connection's bandwidth, like a robot's Wi-Fi link, and drops
+connections at random. Compares a single scp-style stream that restarts from
+zero after a drop with the chunked Transfer engine at 1 and several streams,
+then interrupts a transfer half-way and checks that a fresh one resumes it.
+Every result is verified against the source's SHA-256.
+
+Usage:
+    python3 benchmarks/bench_downloads.py [--mb 128] [--conn-mbps 16] [--drops-per-gb 20]
+"""
+import os
+import sys
+import time
+import random
+import shutil
+import asyncio
+import logging
+import argparse
+import hashlib
+import tempfile
+import multiprocessing
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import httpx
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+from downloads import HTTPSource, Transfer  # noqa: E402
+
+
+def serve(path: str, conn_bps: float, drop_per_byte: float, ports):
+    size = os.path.getsize(path)
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, *args):
+            pass
+
+        def do_HEAD(self):
+            self.send_response(200)
+            self.send_header("Accept-Ranges", "bytes")
+            self.send_header("Content-Length", str(size))
+            self.end_headers()
+
+        def do_GET(self):
+            start, end = 0, size - 1
+            header = self.headers.get("Range")
+            if header:
+                first, _, last = header.split("=", 1)[1].partition("-")
+                start, end = int(first), int(last or size - 1)
+                self.send_response(206)
+                self.send_header("Content-Range", f"bytes {start}-{end}/{size}")
+            else:
+                self.send_response(200)
+            self.send_header("Content-Length", str(end - start + 1))
+            self.end_headers()
+
+            # Each connection dies after an exponentially distributed byte count
+            budget = random.expovariate(drop_per_byte) if drop_per_byte else float("inf")
+            sent = 0
+            began = time.monotonic()
+            with open(path, "rb") as f:
+                f.seek(start)
+                remaining = end - start + 1
+                while remaining:
+                    data = f.read(min(65536, remaining))
+                    if sent + len(data) > budget:
+                        self.wfile.write(data[:int(budget - sent)])
+                        self.close_connection = True
+                        self.connection.shutdown(2)
+                        return
+                    self.wfile.write(data)
+                    sent += len(data)
+                    remaining -= len(data)
+                    # Pace to the per-connection bandwidth
+                    ahead = sent / conn_bps - (time.monotonic() - began)
+                    if ahead > 0:
+                        time.sleep(ahead)
+
+    class Server(ThreadingHTTPServer):
+        daemon_threads = True
+
+        def handle_error(self, request, client_address):
+            # Clients abandoning a dropped range are expected here
+            pass
+
+    server = Server(("127.0.0.1", 0), Handler)
+    ports.put(server.server_address[1])
+    server.serve_forever()
+
+
+async def scp_style(url: str, dest: str) -> tuple:
+    """One stream for the whole file; any drop starts it over, like scp."""
+    attempts = 0
+    fetched = 0
+    async with httpx.AsyncClient(timeout=30) as client:
+        while True:
+            attempts += 1
+            try:
+                with open(dest, "wb") as f:
+                    async with client.stream("GET", url) as response:
+                        async for data in response.aiter_raw(262144):
+                            f.write(data)
+                            fetched += len(data)
+                        expected = int(response.headers["content-length"])
+                if os.path.getsize(dest) == expected:
+                    return attempts, fetched
+            except httpx.HTTPError:
+                pass
+
+
+def sha256_of(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+async def engine(url: str, dest: str, streams: int, chunk_size: int, stop_after: float = None) -> Transfer:
+    transfer = Transfer(HTTPSource(url), dest, "bench", chunk_size=chunk_size,
+                        robot_streams=asyncio.Semaphore(streams), all_streams=asyncio.Semaphore(streams))
+    transfer.start()
+    if stop_after:
+        await asyncio.sleep(stop_after)
+        transfer.cancel()
+    await transfer.wait()
+    return transfer
+
+
+async def run(args, url: str, expected: str, workdir: str):
+    size = args.mb * 1_000_000
+    mb = size / 1e6
+
+    started = time.perf_counter()
+    attempts, fetched = await scp_style(url, os.path.join(workdir, "scp.bag"))
+    wall = time.perf_counter() - started
+    ok = sha256_of(os.path.join(workdir, "scp.bag")) == expected
+    print(f"{'scp-style, restart on drop':>28}: {wall:6.1f}s  {mb / wall:5.1f} MB/s  "
+          f"{attempts} attempts, {fetched / size:.2f}x bytes fetched, sha256 {'ok' if ok else 'MISMATCH'}")
+
+    chunk_size = args.chunk_mb * 1024 * 1024
+    for streams in (1, args.streams):
+        dest = os.path.join(workdir, f"engine{streams}.bag")
+        started = time.perf_counter()
+        transfer = await engine(url, dest, streams, chunk_size)
+        wall = time.perf_counter() - started
+        ok = transfer.status == "done" and sha256_of(dest) == expected
+        print(f"{f'chunked, {streams} stream(s)':>28}: {wall:6.1f}s  {mb / wall:5.1f} MB/s  "
+              f"{transfer.retries} retries, {transfer.fetched / size:.2f}x bytes fetched, "
+              f"sha256 {'ok' if ok else 'MISMATCH ' + transfer.status}")
+
+    # Interrupt half-way (backend restart, operator cancel), then start over
+    dest = os.path.join(workdir, "resumed.bag")
+    first = await engine(url, dest, args.streams, chunk_size, stop_after=(size / 2) / (args.conn_mbps * 1e6 * args.streams))
+    started = time.perf_counter()
+    second = await engine(url, dest, args.streams, chunk_size)
+    wall = time.perf_counter() - started
+    ok = second.status == "done" and sha256_of(dest) == expected
+    print(f"{'resume after interruption':>28}: {wall:6.1f}s  first pass {first.status} at "
+          f"{first.to_dict()['chunks_done']} chunks, resumed {second.resumed_bytes / size:.0%} of the file, "
+          f"sha256 {'ok' if ok else 'MISMATCH'}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--mb", type=int, default=128)
+    parser.add_argument("--conn-mbps", type=float, default=16.0, help="MB/s per connection")
+    parser.add_argument("--drops-per-gb", type=float, default=20.0, help="mean connection drops per GB sent")
+    parser.add_argument("--streams", type=int, default=4)
+    parser.add_argument("--chunk-mb", type=int, default=8)
+    args = parser.parse_args()
+    # Retries are the point of the exercise; keep their warnings out of the report
+    logging.getLogger("robot_ui_backend").setLevel(logging.ERROR)
+
+    workdir = tempfile.mkdtemp(prefix="bench-dl-")
+    source = os.path.join(workdir, "source.bag")
+    with open(source, "wb") as f:
+        f.write(os.urandom(args.mb * 1_000_000))
+    expected = sha256_of(source)
+
+    ports = multiprocessing.Queue()
+    server = multiprocessing.Process(
+        target=serve, args=(source, args.conn_mbps * 1e6, args.drops_per_gb / 1e9, ports), daemon=True)
+    server.start()
+    url = f"http://127.0.0.1:{ports.get(timeout=10)}/source.bag"
+    print(f"{args.mb} MB bag, {args.conn_mbps:g} MB/s per connection, ~{args.drops_per_gb:g} drops per GB")
+    try:
+        asyncio.run(run(args, url, expected, workdir))
+    finally:
+        server.terminate()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+"""
+Fan-out benchmark.
+
+Streams N MB through one PTY to 1, 10 and 100 subscribers and reports the
+reader-side cost: PTY reads, bytes read and time spent publishing. These stay
+flat as viewers are added because every chunk is read once. Each run also adds
+one subscriber that never reads, to show a stuck browser is dropped instead of
+stalling the others.
+
+Usage:
+    python3 benchmarks/bench_fanout.py [--mb 20] [--subscribers 1,10,100]
+"""
+import os
+import sys
+import pty
+import time
+import asyncio
+import argparse
+import subprocess
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from pty_reader import PtyReader  # noqa: E402
+from ring_buffer import OutputRing  # noqa: E402
+from broadcaster import Broadcaster  # noqa: E402
+
+PRODUCER = r"""
+import sys
+total = int(sys.argv[1])
+line = b"Processing step 123456/1000000... telemetry x=0.000 y=0.000 theta=0.000\n"
+block = line * 256
+out = sys.stdout.buffer
+written = 0
+while written < total:
+    out.write(block)
+    written += len(block)
+out.flush()
+"""
+
+
+async def consume(subscriber) -> int:
+    received = 0
+    while True:
+        data = await subscriber.get()
+        if data is None:
+            return received
+        received += len(data)
+
+
+async def run(n_subscribers: int, total_bytes: int):
+    master_fd, slave_fd = pty.openpty()
+    proc = subprocess.Popen(
+        [sys.executable, "-c", PRODUCER, str(total_bytes)],
+        stdin=slave_fd, stdout=slave_fd, stderr=slave_fd,
+        start_new_session=True,
+    )
+    os.close(slave_fd)
+
+    reader = PtyReader(master_fd)
+    broadcaster = Broadcaster(reader, OutputRing(1048576))
+    subscribers = [broadcaster.subscribe()[2] for _ in range(n_subscribers)]
+    _, _, stuck = broadcaster.subscribe()
+
+    start = time.perf_counter()
+    cpu_start = time.process_time()
+    consumers = [asyncio.create_task(consume(s)) for s in subscribers]
+    await broadcaster.run()
+    received = await asyncio.gather(*consumers)
+    wall = time.perf_counter() - start
+    cpu = time.process_time() - cpu_start
+
+    reader.close()
+    os.close(master_fd)
+    proc.wait()
+
+    complete = sum(1 for r in received if r == broadcaster.bytes_read)
+    print(
+        f"{n_subscribers:>4} subs: read {broadcaster.bytes_read / 1e6:6.1f} MB in "
+        f"{broadcaster.reads:>6} reads, publish {broadcaster.publish_seconds * 1e3:7.1f} ms, "
+        f"wall {wall:5.2f}s, process cpu {cpu:5.2f}s, "
+        f"complete viewers {complete}/{n_subscribers}, stuck viewer dropped: {stuck.overflowed}"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--mb", type=int, default=20)
+    parser.add_argument("--subscribers", default="1,10,100")
+    args = parser.parse_args()
+    for n in (int(x) for x in args.subscribers.split(",")):
+        asyncio.run(run(n, args.mb * 1_000_000))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+"""
+Fleet fan-out benchmark.
+
+Runs one diagnostic on N stand-in robots (sshd_standin.py, 127.0.0.1-N) the
+way xvalidation.sh does it, one fresh ssh after another, and through a
+FleetRun over the SSH pool at a few parallelism limits. Reports wall time and
+checks that every robot's output and result arrived as tagged frames.
+
+Requires ``pip install asyncssh`` (only for the stand-in).
+
+Usage:
+    python3 benchmarks/bench_fleet.py [--robots 60] [--work-ms 500] [--rtt-ms 20]
+"""
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+# Robot N is 127.0.0.N, all served by the stand-in
+os.environ["ROBOT_UI_IP_PREFIX"] = "127.0.0."
+os.environ["ROBOT_UI_IP_OFFSET"] = "0"
+
+from robots_config import FleetCommand, robot_ip  # noqa: E402
+from ssh_pool import SSHPool  # noqa: E402
+from fleet import FleetRun  # noqa: E402
+from sshd_standin import start_standin  # noqa: E402
+
+
+async def sequential(robots, port: int, key_file: str, command: str) -> float:
+    started = time.perf_counter()
+    for n in robots:
+        proc = await asyncio.create_subprocess_exec(
+            "ssh", "-p", str(port), "-i", key_file,
+            "-o", "StrictHostKeyChecking=no", "-o", "UserKnownHostsFile=/dev/null",
+            "-o", "LogLevel=ERROR", "-o", "BatchMode=yes",
+            f"zippy@{robot_ip(n)}", command.format(robot_number=n),
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.STDOUT,
+        )
+        await proc.communicate()
+    return time.perf_counter() - started
+
+
+async def fan_out(robots, pool: SSHPool, command: FleetCommand, parallelism: int):
+    run = FleetRun("-bench", command, robots, pool, parallelism)
+    _, _, subscriber = run.broadcaster.subscribe()
+    started = time.perf_counter()
+    run.start()
+    frames = []
+    while True:
+        data = await subscriber.get()
+        if data is None:
+            break
+        frames.extend(json.loads(line) for line in data.splitlines())
+    wall = time.perf_counter() - started
+
+    summary = frames[-1]
+    tagged_output = {f["robot"] for f in frames if f["type"] == "output" and f"robot {f['robot']}" in f["data"]}
+    assert summary["type"] == "summary" and summary["ok"] == len(robots), summary
+    assert tagged_output == set(robots), "output frames missing or mis-tagged"
+    return wall, len(frames)
+
+
+async def run(args, port: int, key_file: str):
+    robots = list(range(1, args.robots + 1))
+    remote = f"sleep {args.work_ms / 1000:g}; echo robot {{robot_number}} ok"
+    command = FleetCommand(label="bench", remote_command=remote, timeout=60)
+    print(f"{len(robots)} stand-in robots, {args.work_ms:g} ms of work each, {args.rtt_ms:g} ms simulated RTT")
+
+    wall = await sequential(robots, port, key_file, remote)
+    print(f"{'sequential ssh (xvalidation)':>30}: {wall:6.2f}s")
+
+    for parallelism in (1, 8, 16, 32):
+        # Fresh pool each time so every pass pays its own connects
+        pool = SSHPool(password=None, port=port, options=["-i", key_file, "-o", "IdentitiesOnly=yes"])
+        try:
+            wall, frames = await fan_out(robots, pool, command, parallelism)
+        finally:
+            await pool.close()
+        print(f"{f'fleet run, parallelism {parallelism}':>30}: {wall:6.2f}s  ({frames} frames)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--robots", type=int, default=60)
+    parser.add_argument("--work-ms", type=float, default=500)
+    parser.add_argument("--rtt-ms", type=float, default=20,
+                        help="simulated network round trip, charged 3x per authentication")
+    args = parser.parse_args()
+
+    server, port, key_file = start_standin(args.rtt_ms / 1000.0)
+    try:
+        asyncio.run(run(args, port, key_file))
+    finally:
+        server.terminate()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,133 @@
+"""
+Job queue scheduling overhead benchmark.
+
+Queues N jobs of the dummy run_command.sh (zero steps, so each job is one
+PTY session of a short bash script) spread over R robots with random
+priorities, and runs them with W workers. Reports the cost of submitting and
+cancelling with N jobs waiting (no workers, so nothing starts), the time to
+drain the queue compared with starting the same sessions directly from W
+plain loops, and checks that every robot ran its jobs one at a time in
+priority order and that every job exited 0.
+
+Usage:
+    python3 benchmarks/bench_jobs.py [--jobs 10000] [--robots 200] [--workers 16]
+"""
+import os
+import sys
+import time
+import random
+import asyncio
+import logging
+import argparse
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+from robots_config import RobotCommand, SCRIPTS_DIR  # noqa: E402
+from sessions import SessionManager  # noqa: E402
+from jobs import JobQueue, STATUS_DONE  # noqa: E402
+
+COMMAND = RobotCommand(label="bench", command_args=[os.path.join(SCRIPTS_DIR, "run_command.sh"), "Bench", "0"])
+
+
+def submit_all(queue: JobQueue, jobs: int, robots: int, rng: random.Random) -> list:
+    return [queue.submit("bench", 0, COMMAND, robot_number=i % robots, priority=rng.randrange(10))
+            for i in range(jobs)]
+
+
+async def queue_ops(args):
+    """Submit and cancel with N jobs waiting; workers=0 keeps them all queued."""
+    queue = JobQueue(SessionManager(max_sessions=args.workers), workers=0)
+    rng = random.Random(1)
+    started = time.perf_counter()
+    queued = submit_all(queue, args.jobs, args.robots, rng)
+    submit_us = (time.perf_counter() - started) / args.jobs * 1e6
+
+    started = time.perf_counter()
+    for job in queued[::2]:
+        queue.cancel(job.id)
+    cancel_us = (time.perf_counter() - started) / len(queued[::2]) * 1e6
+
+    started = time.perf_counter()
+    listed = queue.list(status="queued")
+    list_ms = (time.perf_counter() - started) * 1000
+    assert len(listed) == args.jobs - len(queued[::2])
+
+    # Let the remaining half through: dispatch skips the cancelled heads
+    queue.workers = args.workers
+    started = time.perf_counter()
+    queue._dispatch()
+    first_dispatch_us = (time.perf_counter() - started) * 1e6
+    queue.stop_all()
+    await asyncio.sleep(0.5)
+
+    print(f"{'submit':>28}: {submit_us:7.1f} us per job ({args.jobs} queued)")
+    print(f"{'cancel queued':>28}: {cancel_us:7.1f} us per job")
+    print(f"{'list queued':>28}: {list_ms:7.1f} ms for {len(listed)} jobs")
+    print(f"{'first dispatch':>28}: {first_dispatch_us:7.1f} us to start {args.workers} jobs past "
+          f"{len(queued[::2])} cancelled ones")
+
+
+async def direct(args) -> float:
+    """Baseline: W loops starting the same sessions back to back, no queue."""
+    sessions = SessionManager(max_sessions=args.workers)
+    counter = iter(range(args.jobs))
+
+    async def loop(worker: int):
+        for i in counter:
+            session = sessions.start("bench", COMMAND, robot_number=worker)
+            await session.wait()
+            assert session.exit_code == 0
+
+    started = time.perf_counter()
+    await asyncio.gather(*(loop(w) for w in range(args.workers)))
+    return time.perf_counter() - started
+
+
+async def queued(args) -> float:
+    queue = JobQueue(SessionManager(max_sessions=args.workers), workers=args.workers)
+    rng = random.Random(2)
+    started = time.perf_counter()
+    all_jobs = submit_all(queue, args.jobs, args.robots, rng)
+    while queue.running_count:
+        await asyncio.sleep(0.01)
+    elapsed = time.perf_counter() - started
+
+    failed = [job for job in all_jobs if job.status != STATUS_DONE or job.exit_code != 0]
+    by_robot = {}
+    for job in all_jobs:
+        by_robot.setdefault(job.robot_number, []).append(job)
+    ordered = overlapping = 0
+    for robot_jobs in by_robot.values():
+        runs = sorted(robot_jobs, key=lambda j: j.started_at)
+        overlapping += sum(1 for a, b in zip(runs, runs[1:]) if b.started_at < a.finished_at)
+        # The first job of each robot starts as soon as it is submitted
+        rest = runs[1:]
+        ordered += rest == sorted(rest, key=lambda j: (-j.priority, j.seq))
+    print(f"{'checks':>28}: {len(failed)} failed, {overlapping} overlapping runs on one robot, "
+          f"{ordered}/{len(by_robot)} robots in priority order")
+    return elapsed
+
+
+async def run(args):
+    print(f"{args.jobs} jobs of run_command.sh over {args.robots} robots, {args.workers} workers")
+    await queue_ops(args)
+    baseline = await direct(args)
+    elapsed = await queued(args)
+    print(f"{'direct sessions':>28}: {baseline:7.2f} s  {args.jobs / baseline:7.0f} jobs/s")
+    print(f"{'job queue':>28}: {elapsed:7.2f} s  {args.jobs / elapsed:7.0f} jobs/s  "
+          f"overhead {(elapsed - baseline) / args.jobs * 1e6:+.0f} us per job")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--jobs", type=int, default=10000)
+    parser.add_argument("--robots", type=int, default=200)
+    parser.add_argument("--workers", type=int, default=16)
+    args = parser.parse_args()
+    logging.getLogger("robot_ui_backend").setLevel(logging.WARNING)
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,129 @@
+"""
+Metrics and profiler overhead benchmark.
+
+Measures what the instrumentation costs where it runs: a histogram
+observation and a counter increment, the timing middleware per HTTP request
+(the same app in-process over ASGI with and without it), a /metrics scrape
+with N sessions registered, and event-loop throughput on a busy coroutine
+with the sampling profiler off and on.
+
+Usage:
+    python3 benchmarks/bench_metrics.py [--requests 5000] [--sessions 200]
+"""
+import os
+import sys
+import time
+import asyncio
+import logging
+import argparse
+import statistics
+
+import httpx
+from fastapi import FastAPI
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+from metrics import MetricsRegistry, MetricsMiddleware  # noqa: E402
+from profiler import SamplingProfiler  # noqa: E402
+from robots_config import RobotCommand  # noqa: E402
+import main as backend  # noqa: E402
+
+
+def per_call_ns(fn, n: int = 1_000_000) -> float:
+    started = time.perf_counter()
+    for _ in range(n):
+        fn()
+    return (time.perf_counter() - started) / n * 1e9
+
+
+def make_app(instrumented: bool) -> FastAPI:
+    app = FastAPI()
+    if instrumented:
+        app.add_middleware(MetricsMiddleware)
+
+    @app.get("/api/robots/{robot_id}/commands")
+    async def commands(robot_id: str):
+        return [{"label": "Home System"}]
+
+    return app
+
+
+async def request_us(app, requests: int) -> float:
+    transport = httpx.ASGITransport(app=app)
+    latencies = []
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        for i in range(requests):
+            started = time.perf_counter()
+            await client.get(f"/api/robots/model{i % 50}/commands")
+            latencies.append(time.perf_counter() - started)
+    return statistics.median(latencies) * 1e6
+
+
+async def busy_loop(seconds: float) -> int:
+    """Iterations of a CPU-bound coroutine yielding to the loop every step."""
+    iterations = 0
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        sum(range(200))
+        iterations += 1
+        await asyncio.sleep(0)
+    return iterations
+
+
+async def run(args):
+    registry = MetricsRegistry()
+    histogram = registry.histogram("bench_seconds", "bench")
+    counter = registry.counter("bench_total", "bench")
+    baseline = per_call_ns(lambda: None)
+    print(f"{'histogram observe':>24}: {per_call_ns(lambda: histogram.observe(0.003)) - baseline:7.0f} ns")
+    print(f"{'counter inc':>24}: {per_call_ns(lambda: counter.inc()) - baseline:7.0f} ns")
+
+    # Warm up, then alternate so drift hits both equally
+    await request_us(make_app(False), 200)
+    await request_us(make_app(True), 200)
+    plain = statistics.median([await request_us(make_app(False), args.requests // 4) for _ in range(4)])
+    timed = statistics.median([await request_us(make_app(True), args.requests // 4) for _ in range(4)])
+    print(f"{'request, no middleware':>24}: {plain:7.1f} us p50")
+    print(f"{'request, timed':>24}: {timed:7.1f} us p50  ({timed - plain:+.1f} us)")
+
+    # A scrape with many sessions (and their per-session series) registered
+    command = RobotCommand(label="bench", command_args=["sleep", "30"])
+    backend.sessions.max_sessions = max(backend.sessions.max_sessions, args.sessions)
+    started_sessions = [backend.sessions.start(f"bench-{i}", command) for i in range(args.sessions)]
+    await backend.metrics()
+    started = time.perf_counter()
+    body = await backend.metrics()
+    scrape_ms = (time.perf_counter() - started) * 1000
+    print(f"{'/metrics scrape':>24}: {scrape_ms:7.1f} ms with {len(started_sessions)} running sessions, "
+          f"{len(body.body) // 1024} KiB")
+    await asyncio.gather(*(s.stop() for s in started_sessions))
+
+    # Alternate off/on rounds so drift hits both equally
+    await busy_loop(0.5)
+    profiler = SamplingProfiler()
+    off_rounds, on_rounds = [], []
+    for _ in range(3):
+        off_rounds.append(await busy_loop(args.seconds / 3))
+        await profiler.start(reset=False)
+        on_rounds.append(await busy_loop(args.seconds / 3))
+        await profiler.stop()
+    off, on = sum(off_rounds), sum(on_rounds)
+    print(f"{'loop, profiler off':>24}: {off / args.seconds:9.0f} iterations/s")
+    print(f"{'loop, profiler on (5 ms)':>24}: {on / args.seconds:9.0f} iterations/s  "
+          f"({(on - off) / off * 100:+.1f}%, {profiler.samples} samples)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--requests", type=int, default=5000)
+    parser.add_argument("--sessions", type=int, default=200)
+    parser.add_argument("--seconds", type=float, default=3.0)
+    args = parser.parse_args()
+    logging.getLogger("robot_ui_backend").setLevel(logging.WARNING)
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
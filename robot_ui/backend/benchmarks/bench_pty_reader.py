@@ -0,0 +1,152 @@
+"""
+PTY streaming benchmark.
+
+Pushes N MB of ``run_command.sh``-style progress lines through a real PTY and
+measures how fast they reach a (fake) websocket, comparing the event-loop
+reader against the legacy ``run_in_executor`` + 1 KB read loop.
+
+Every line starts with the producer's CLOCK_MONOTONIC timestamp, so the
+byte-to-socket latency is the time between ``write()`` in the child and
+``send_text()`` in the server for the first complete line of each chunk.
+
+Usage:
+    python3 benchmarks/bench_pty_reader.py [--mb 100] [--mode both|loop|executor]
+"""
+import os
+import sys
+import pty
+import time
+import asyncio
+import argparse
+import subprocess
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from pty_reader import PtyReader  # noqa: E402
+
+# Child process: writes timestamped "Processing step" lines until TOTAL bytes are out
+PRODUCER = r"""
+import os, sys, time
+total = int(sys.argv[1])
+out = sys.stdout.buffer
+written = 0
+step = 0
+while written < total:
+    lines = []
+    for _ in range(64):
+        step += 1
+        lines.append(b"%020d Processing step %d/1000000...\n" % (time.monotonic_ns(), step))
+    block = b"".join(lines)
+    out.write(block)
+    out.flush()
+    written += len(block)
+"""
+
+TS_LEN = 20
+
+
+class FakeWebSocket:
+    """Stands in for starlette's WebSocket and records per-send latency."""
+
+    def __init__(self):
+        self.bytes_sent = 0
+        self.latencies_ns = []
+
+    async def send_text(self, text: str):
+        now = time.monotonic_ns()
+        self.bytes_sent += len(text)
+        nl = text.find("\n")
+        if nl != -1 and len(text) > nl + TS_LEN:
+            stamp = text[nl + 1:nl + 1 + TS_LEN]
+            if stamp.isdigit():
+                self.latencies_ns.append(now - int(stamp))
+
+
+def spawn_producer(total_bytes: int):
+    master_fd, slave_fd = pty.openpty()
+    proc = subprocess.Popen(
+        [sys.executable, "-c", PRODUCER, str(total_bytes)],
+        stdin=slave_fd,
+        stdout=slave_fd,
+        stderr=slave_fd,
+        start_new_session=True,
+    )
+    os.close(slave_fd)
+    return proc, master_fd
+
+
+async def stream_event_loop(master_fd: int, ws: FakeWebSocket):
+    reader = PtyReader(master_fd)
+    try:
+        while True:
+            data = await reader.read()
+            if not data:
+                break
+            await ws.send_text(data.decode("utf-8", errors="ignore"))
+    finally:
+        reader.close()
+
+
+async def stream_executor(master_fd: int, ws: FakeWebSocket):
+    # Mirrors the original /ws/terminal loop: one thread-pool hop per 1 KB
+    loop = asyncio.get_running_loop()
+
+    def read_pty():
+        try:
+            return os.read(master_fd, 1024)
+        except OSError:
+            return b""
+
+    while True:
+        data = await loop.run_in_executor(None, read_pty)
+        if not data:
+            break
+        await ws.send_text(data.decode("utf-8", errors="ignore"))
+
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    idx = min(len(ordered) - 1, int(len(ordered) * pct / 100))
+    return ordered[idx]
+
+
+async def run(mode: str, total_bytes: int):
+    proc, master_fd = spawn_producer(total_bytes)
+    ws = FakeWebSocket()
+    start = time.perf_counter()
+    try:
+        if mode == "loop":
+            await stream_event_loop(master_fd, ws)
+        else:
+            await stream_executor(master_fd, ws)
+    finally:
+        elapsed = time.perf_counter() - start
+        os.close(master_fd)
+        proc.wait()
+
+    mb = ws.bytes_sent / 1e6
+    print(
+        f"{mode:>8}: {mb:8.1f} MB in {elapsed:6.2f}s  "
+        f"{mb / elapsed:8.1f} MB/s  "
+        f"p50 {percentile(ws.latencies_ns, 50) / 1e6:7.2f} ms  "
+        f"p99 {percentile(ws.latencies_ns, 99) / 1e6:7.2f} ms  "
+        f"sends {len(ws.latencies_ns)}"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--mb", type=int, default=100, help="payload size in MB")
+    parser.add_argument("--mode", choices=["both", "loop", "executor"], default="both")
+    args = parser.parse_args()
+
+    total = args.mb * 1_000_000
+    modes = ["loop", "executor"] if args.mode == "both" else [args.mode]
+    for mode in modes:
+        asyncio.run(run(mode, total))
+
+
+if __name__ == "__main__":
+    main()
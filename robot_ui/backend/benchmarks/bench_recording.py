@@ -0,0 +1,156 @@
+"""
+Session recording benchmark.
+
+Measures what recording costs on the streaming path (one Broadcaster.publish
+with and without the recorder's tap, and PTY throughput plus the worst event
+loop lag for a flooding command with recording off and on), then builds a
+synthetic recording of --hours of output and times seeking in it (index
+binary search, and search plus decoding the block) against decoding from the
+start, and asciicast export.
+
+Usage:
+    python3 benchmarks/bench_recording.py [--megabytes 50] [--hours 8]
+"""
+import os
+import sys
+import time
+import random
+import shutil
+import asyncio
+import logging
+import argparse
+import tempfile
+import statistics
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+from broadcaster import Broadcaster  # noqa: E402
+from ring_buffer import OutputRing  # noqa: E402
+from recording import RecordingStore, RecordingReader, asciicast, KIND_OUTPUT, BLOCK_BYTES  # noqa: E402
+from robots_config import RobotCommand  # noqa: E402
+from sessions import SessionManager  # noqa: E402
+
+
+def publish_ns(tap: bool, store: RecordingStore, n: int = 2000) -> float:
+    broadcaster = Broadcaster(None, OutputRing(1 << 20))
+    recorder = store.open("bench-publish") if tap else None
+    if recorder:
+        broadcaster.tap = recorder.output
+    chunk = b"x" * 4096
+    started = time.perf_counter()
+    for _ in range(n):
+        broadcaster.publish(chunk)
+    elapsed = (time.perf_counter() - started) / n * 1e9
+    if recorder:
+        recorder.close()
+    return elapsed
+
+
+async def flood(store, megabytes: int):
+    """MB/s through a session and the worst loop lag meanwhile."""
+    manager = SessionManager(recordings=store)
+    command = RobotCommand(label="flood", command_args=[
+        "bash", "-c", f"head -c {megabytes * 1024 * 1024} /dev/zero | tr '\\0' 'x' | fold -w 120"])
+    loop = asyncio.get_running_loop()
+    worst = 0.0
+
+    async def watch():
+        nonlocal worst
+        while True:
+            expected = loop.time() + 0.01
+            await asyncio.sleep(0.01)
+            worst = max(worst, loop.time() - expected)
+
+    watcher = asyncio.create_task(watch())
+    started = time.perf_counter()
+    session = manager.start("bench", command)
+    await session.wait()
+    elapsed = time.perf_counter() - started
+    watcher.cancel()
+    return session.broadcaster.bytes_read / elapsed / 1e6, worst * 1000
+
+
+def synthesize(store: RecordingStore, hours: float):
+    """A recording of `hours` of output, ten 200-byte lines a second, written block by block."""
+    recorder = store.open("bench-synthetic")
+    line = b"[INFO] [1700000000.123]: planner tick, 42 waypoints, 0.015 s\r\n" * 3
+    events, offset, pending = [], 0, 0
+    t = 0.0
+    while t < hours * 3600:
+        events.append((t, KIND_OUTPUT, line))
+        pending += len(line)
+        t += 0.1
+        if pending >= BLOCK_BYTES or t - events[0][0] >= 1.0:
+            store.submit(recorder._write_block, events, offset)
+            offset += pending
+            events, pending = [], 0
+    if events:
+        store.submit(recorder._write_block, events, offset)
+    recorder.close()
+    return offset + pending
+
+
+def run(args):
+    directory = tempfile.mkdtemp(prefix="recording-bench-")
+    try:
+        store = RecordingStore(directory)
+        plain, tapped = publish_ns(False, store), publish_ns(True, store)
+        print(f"{'publish 4 KiB':>24}: {plain:7.0f} ns")
+        print(f"{'publish 4 KiB, recorded':>24}: {tapped:7.0f} ns  ({tapped - plain:+.0f} ns)")
+
+        for label, flood_store in (("flood, not recorded", None), ("flood, recorded", store)):
+            rate, lag = asyncio.run(flood(flood_store, args.megabytes))
+            print(f"{label:>24}: {rate:7.1f} MB/s, worst loop lag {lag:.1f} ms")
+        asyncio.run(store.close())
+
+        store = RecordingStore(directory)
+        started = time.perf_counter()
+        output = synthesize(store, args.hours)
+        asyncio.run(store.close())
+        reader = RecordingReader(store.path("bench-synthetic", ".rec"), store.path("bench-synthetic", ".idx"))
+        size = os.path.getsize(reader.rec_path) + os.path.getsize(reader.idx_path)
+        print(f"{'synthetic recording':>24}: {args.hours:g} h, {output / 1e6:.0f} MB of output in "
+              f"{size / 1e6:.1f} MB ({output / size:.0f}x), {reader.blocks} blocks, "
+              f"{time.perf_counter() - started:.1f} s to write")
+
+        duration = args.hours * 3600
+        targets = [random.uniform(0, duration) for _ in range(10_000)]
+        started = time.perf_counter()
+        for t in targets:
+            reader.find(t)
+        print(f"{'seek (index search)':>24}: {(time.perf_counter() - started) / len(targets) * 1e6:7.2f} us")
+
+        timings = []
+        for t in targets[:1000]:
+            started = time.perf_counter()
+            next(e for _, e in reader.events(t) if e[0] >= t)
+            timings.append(time.perf_counter() - started)
+        print(f"{'seek to first event':>24}: {statistics.median(timings) * 1e6:7.1f} us p50, "
+              f"{max(timings) * 1e6:.1f} us max")
+
+        started = time.perf_counter()
+        target = duration / 2
+        next(e for _, e in reader.events(0) if e[0] >= target)
+        print(f"{'decode from start':>24}: {(time.perf_counter() - started) * 1000:7.1f} ms to reach the middle")
+
+        started = time.perf_counter()
+        exported = sum(len(line) for line in asciicast(reader, {"started_at": 0}))
+        elapsed = time.perf_counter() - started
+        print(f"{'asciicast export':>24}: {exported / elapsed / 1e6:7.1f} MB/s")
+        reader.close()
+    finally:
+        shutil.rmtree(directory)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--megabytes", type=int, default=50)
+    parser.add_argument("--hours", type=float, default=8.0)
+    args = parser.parse_args()
+    logging.getLogger("robot_ui_backend").setLevel(logging.WARNING)
+    run(args)
+
+
+if __name__ == "__main__":
+    main()
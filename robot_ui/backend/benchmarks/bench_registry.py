@@ -0,0 +1,143 @@
+"""
+Robot registry request latency benchmark.
+
+Builds a registry of N robot types (several commands each, some with telemetry
+blocks) and times GET /api/robots/{id}/commands in-process over ASGI: the
+previous handler returning the pydantic models for FastAPI to serialize, the
+pre-serialized bytes of the compiled registry, and the 304 answer to a
+matching If-None-Match. Also reports how long compiling the registry takes,
+which is what a hot reload costs.
+
+Usage:
+    python3 benchmarks/bench_registry.py [--types 300] [--commands 12] [--requests 5000]
+"""
+import os
+import sys
+import json
+import time
+import random
+import asyncio
+import logging
+import argparse
+import statistics
+
+import httpx
+from fastapi import FastAPI, HTTPException
+from fastapi.encoders import jsonable_encoder
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+from robots_config import RobotConfig, RobotCommand, TelemetryConfig, ODOM_SERIES  # noqa: E402
+from robot_registry import CompiledRegistry  # noqa: E402
+import main as backend  # noqa: E402
+
+
+def make_robots(types: int, commands: int):
+    robots = {}
+    for t in range(types):
+        robot_id = f"model{t}"
+        cmds = []
+        for c in range(commands):
+            if c % 4 == 3:
+                cmds.append(RobotCommand(
+                    label=f"Topic {c}",
+                    command_args=["/opt/robot_ui/scripts/fake_rostopic.py", f"/topic_{c}", "50", "90000"],
+                    telemetry=TelemetryConfig(fields=["pose"], topic=f"/topic_{c}", series=ODOM_SERIES),
+                ))
+            elif c % 4 == 2:
+                cmds.append(RobotCommand(label=f"Remote {c}", remote_command=f"cat ~/cfg/file_{c}.yaml"))
+            else:
+                cmds.append(RobotCommand(
+                    label=f"Command {c}",
+                    command_args=["/opt/robot_ui/scripts/run_command.sh", f"Cmd{c}_{robot_id}", str(c)],
+                ))
+        robots[robot_id] = RobotConfig(
+            id=robot_id, name=f"Model {t}", image_key=robot_id,
+            validation_script=["/opt/robot_ui/scripts/validate_robot.sh", robot_id], commands=cmds,
+        )
+    return robots
+
+
+def legacy_app(robots) -> FastAPI:
+    """The handler as it was: FastAPI serializes the pydantic models per request."""
+    app = FastAPI()
+
+    @app.get("/api/robots/{robot_id}/commands")
+    async def get_robot_commands(robot_id: str):
+        if robot_id not in robots:
+            raise HTTPException(404, "Robot not found")
+        return robots[robot_id].commands
+
+    return app
+
+
+async def measure(app, ids, requests: int, headers_for=None) -> list:
+    transport = httpx.ASGITransport(app=app)
+    latencies = []
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        for i in range(requests):
+            robot_id = ids[i % len(ids)]
+            headers = headers_for(robot_id) if headers_for else None
+            started = time.perf_counter()
+            response = await client.get(f"/api/robots/{robot_id}/commands", headers=headers)
+            latencies.append(time.perf_counter() - started)
+            assert response.status_code in (200, 304), response.status_code
+    return latencies
+
+
+def report(name: str, latencies: list, baseline: float = None):
+    latencies = sorted(latencies)
+    p50 = statistics.median(latencies) * 1e6
+    p99 = latencies[int(len(latencies) * 0.99)] * 1e6
+    ratio = f"  {baseline / p50:4.1f}x faster" if baseline else ""
+    print(f"{name:>26}: p50 {p50:7.1f} us  p99 {p99:7.1f} us{ratio}")
+    return p50
+
+
+async def run(args):
+    robots = make_robots(args.types, args.commands)
+    started = time.perf_counter()
+    compiled = CompiledRegistry(robots)
+    compile_ms = (time.perf_counter() - started) * 1000
+    backend.registry.current = compiled
+
+    ids = list(robots)
+    random.Random(1).shuffle(ids)
+    size = len(compiled.commands_body[ids[0]])
+    print(f"{args.types} robot types x {args.commands} commands, {size} byte response, "
+          f"{args.requests} requests each")
+
+    # Same payload either way
+    assert json.loads(compiled.commands_body[ids[0]]) == jsonable_encoder(robots[ids[0]].commands)
+
+    # Warm up both apps
+    await measure(legacy_app(robots), ids, 200)
+    await measure(backend.app, ids, 200)
+
+    baseline = report("pydantic per request", await measure(legacy_app(robots), ids, args.requests))
+    report("pre-serialized bytes", await measure(backend.app, ids, args.requests), baseline)
+    report("If-None-Match -> 304", await measure(
+        backend.app, ids, args.requests, lambda rid: {"If-None-Match": compiled.commands_etag[rid]}), baseline)
+
+    # Serialization alone, without the ASGI round trip
+    started = time.perf_counter()
+    for i in range(args.requests):
+        json.dumps(jsonable_encoder(robots[ids[i % len(ids)]].commands)).encode()
+    encode_us = (time.perf_counter() - started) / args.requests * 1e6
+    print(f"{'jsonable_encoder + dumps':>26}: {encode_us:7.1f} us per response (the part that is now skipped)")
+    print(f"{'compile registry (reload)':>26}: {compile_ms:7.1f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--types", type=int, default=300)
+    parser.add_argument("--commands", type=int, default=12)
+    parser.add_argument("--requests", type=int, default=5000)
+    args = parser.parse_args()
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+"""
+Numeric telemetry benchmark.
+
+Ingests a 30-minute, 50 Hz odometry history (90k frames from
+scripts/fake_rostopic.py) into a SeriesStore the same way a session does, then
+times the decimated window served to a plot of a given pixel width and reports
+its size next to the raw text and raw float size.
+
+Usage:
+    python3 benchmarks/bench_series.py [--minutes 30] [--hz 50] [--width 1000]
+"""
+import os
+import sys
+import time
+import argparse
+import subprocess
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+from robots_config import ODOM_SERIES  # noqa: E402
+from telemetry import FrameParser, extract_numeric  # noqa: E402
+from telemetry_series import SeriesStore, encode_window  # noqa: E402
+
+FAKE_ROSTOPIC = os.path.join(os.path.dirname(BACKEND_DIR), "scripts", "fake_rostopic.py")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--minutes", type=float, default=30)
+    parser.add_argument("--hz", type=float, default=50)
+    parser.add_argument("--width", type=int, default=1000)
+    args = parser.parse_args()
+
+    n_frames = int(args.minutes * 60 * args.hz)
+    raw = subprocess.run(
+        [sys.executable, FAKE_ROSTOPIC, "/raw_odom", "1000000", str(n_frames)],
+        capture_output=True, check=True,
+    ).stdout
+
+    store = SeriesStore(capacity=max(n_frames, 1))
+    t_start = 1_700_000_000.0
+    period = 1.0 / args.hz
+    frame_no = [0]
+
+    def record(frame: bytes):
+        store.append(t_start + frame_no[0] * period, extract_numeric(frame, ODOM_SERIES))
+        frame_no[0] += 1
+
+    frame_parser = FrameParser(on_frame=record)
+    start = time.perf_counter()
+    for i in range(0, len(raw), 4096):
+        frame_parser.feed(raw[i:i + 4096])
+    ingest = time.perf_counter() - start
+    print(
+        f"ingest: {store.count} frames ({len(raw) / 1e6:.1f} MB text) in {ingest:.2f}s, "
+        f"{ingest / max(store.count, 1) * 1e6:.1f} us/frame "
+        f"(budget at {args.hz:g} Hz: {1e6 / args.hz:.0f} us)"
+    )
+
+    t_end = t_start + n_frames * period
+    for names in (ODOM_SERIES[:1], ODOM_SERIES):
+        runs = 20
+        start = time.perf_counter()
+        for _ in range(runs):
+            blob = encode_window(store, names, t_start, t_end, args.width)
+        elapsed = (time.perf_counter() - start) / runs
+        raw_floats = store.count * (8 + 4 * len(names))
+        print(
+            f"window {len(names)} field(s) @ {args.width}px: {len(blob) / 1e3:.1f} KB in "
+            f"{elapsed * 1e3:.2f} ms (raw samples {raw_floats / 1e6:.2f} MB)"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+"""
+SSH connection pool benchmark.
+
+Starts a local sshd stand-in (asyncssh, key authentication) answering on
+127.0.0.1-127.0.0.N as N fake robots and runs the same short diagnostic command
+against them with a fresh ``ssh`` per command, like xvalidation.sh, and over
+the SSHPool's warm ControlMaster channels. Reports per-command latency and wall
+time for a sequential and a fleet-wide concurrent pass.
+
+Requires ``pip install asyncssh`` (only for the stand-in, sshd_standin.py).
+
+Usage:
+    python3 benchmarks/bench_ssh_pool.py [--robots 8] [--commands 20] [--rtt-ms 0]
+"""
+import os
+import sys
+import time
+import asyncio
+import argparse
+import statistics
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+from ssh_pool import SSHPool  # noqa: E402
+from sshd_standin import start_standin  # noqa: E402
+
+COMMAND = "cd /tmp && ls -la | head -5"
+
+
+def summary(label: str, latencies, wall: float):
+    latencies = sorted(latencies)
+    p99 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))]
+    print(
+        f"{label:>30}: p50 {statistics.median(latencies) * 1000:6.1f} ms  "
+        f"p99 {p99 * 1000:6.1f} ms  wall {wall:6.2f}s"
+    )
+
+
+async def cold_run(host: str, port: int, key_file: str) -> float:
+    started = time.perf_counter()
+    proc = await asyncio.create_subprocess_exec(
+        "ssh", "-p", str(port), "-i", key_file,
+        "-o", "StrictHostKeyChecking=no", "-o", "UserKnownHostsFile=/dev/null",
+        "-o", "LogLevel=ERROR", "-o", "BatchMode=yes",
+        f"zippy@{host}", COMMAND,
+        stdout=asyncio.subprocess.PIPE,
+        stderr=asyncio.subprocess.STDOUT,
+    )
+    output, _ = await proc.communicate()
+    if proc.returncode != 0:
+        raise RuntimeError(output.decode(errors="replace"))
+    return time.perf_counter() - started
+
+
+async def pooled_run(pool: SSHPool, host: str) -> float:
+    started = time.perf_counter()
+    code, output = await pool.run(host, COMMAND)
+    if code != 0:
+        raise RuntimeError(output.decode(errors="replace"))
+    return time.perf_counter() - started
+
+
+async def run(args, port: int, key_file: str):
+    hosts = [f"127.0.0.{i + 1}" for i in range(args.robots)]
+    pool = SSHPool(password=None, port=port, options=["-i", key_file, "-o", "IdentitiesOnly=yes"])
+
+    print(f"{args.robots} stand-in robots on port {port}, {args.commands} commands each: {COMMAND!r}")
+    try:
+        # Sequential: one robot, back to back
+        started = time.perf_counter()
+        cold = [await cold_run(hosts[0], port, key_file) for _ in range(args.commands)]
+        summary("cold ssh, sequential", cold, time.perf_counter() - started)
+
+        started = time.perf_counter()
+        pooled = [await pooled_run(pool, hosts[0]) for _ in range(args.commands)]
+        summary("pooled (incl. 1 connect)", pooled, time.perf_counter() - started)
+
+        started = time.perf_counter()
+        pooled = [await pooled_run(pool, hosts[0]) for _ in range(args.commands)]
+        summary("pooled, warm", pooled, time.perf_counter() - started)
+
+        # Fleet-wide: every robot at once, like a diagnostic across the fleet
+        started = time.perf_counter()
+        cold = await asyncio.gather(*(
+            cold_run(host, port, key_file) for host in hosts for _ in range(args.commands)
+        ))
+        summary(f"cold ssh, {args.robots} robots parallel", cold, time.perf_counter() - started)
+
+        started = time.perf_counter()
+        pooled = await asyncio.gather(*(pooled_run(pool, host) for host in hosts for _ in range(args.commands)))
+        summary(f"pooled, {args.robots} robots parallel", pooled, time.perf_counter() - started)
+        print(f"master connections opened: {pool.connects}")
+    finally:
+        await pool.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--robots", type=int, default=8)
+    parser.add_argument("--commands", type=int, default=20)
+    parser.add_argument("--rtt-ms", type=float, default=0.0,
+                        help="simulated network round trip, charged 3x per authentication")
+    args = parser.parse_args()
+
+    server, port, key_file = start_standin(args.rtt_ms / 1000.0)
+    try:
+        asyncio.run(run(args, port, key_file))
+    finally:
+        server.terminate()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,125 @@
+"""
+Cold-start benchmark for serve.py.
+
+Starts the backend --runs times in each mode and times, from spawning the
+process, the first 200 from /health and from /api/robots:
+
+    uvicorn --reload    python3 -m uvicorn main:app --reload (development)
+    uvicorn             python3 -m uvicorn main:app
+    serve.py            python3 serve.py (socket bound before the imports)
+    serve.py, eager     serve.py with numpy and httpx imported up front, as
+                        before they were imported on first use
+    serve.py, no .pyc   serve.py with an empty bytecode cache, as after an
+                        upgrade without ``compileall``
+
+Requests are retried every --poll-ms while the port refuses connections.
+Then prints the slowest imports of ``main`` (serve.py --import-profile).
+
+Usage:
+    python3 benchmarks/bench_startup.py [--runs 5] [--poll-ms 5]
+"""
+import os
+import sys
+import time
+import shutil
+import signal
+import socket
+import argparse
+import tempfile
+import subprocess
+import http.client
+import statistics
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from serve import import_profile  # noqa: E402
+from fleet_sim import free_port  # noqa: E402
+
+SERVE = os.path.join(BACKEND_DIR, "serve.py")
+EAGER = f"import numpy, httpx, runpy; runpy.run_path({SERVE!r}, run_name='__main__')"
+
+
+def modes(port: int):
+    uvicorn = [sys.executable, "-m", "uvicorn", "main:app", "--app-dir", BACKEND_DIR, "--port", str(port),
+               "--log-level", "warning"]
+    return (
+        ("uvicorn --reload", uvicorn + ["--reload", "--reload-dir", BACKEND_DIR], {}),
+        ("uvicorn", uvicorn, {}),
+        ("serve.py", [sys.executable, SERVE, "--port", str(port)], {}),
+        ("serve.py, eager", [sys.executable, "-c", EAGER, "--port", str(port)], {}),
+        ("serve.py, no .pyc", [sys.executable, SERVE, "--port", str(port)], {"PYTHONPYCACHEPREFIX": None}),
+    )
+
+
+def get(port: int, path: str, poll: float, deadline: float) -> bool:
+    while time.perf_counter() < deadline:
+        try:
+            conn = http.client.HTTPConnection("127.0.0.1", port, timeout=max(0.1, deadline - time.perf_counter()))
+            conn.request("GET", path)
+            status = conn.getresponse().status
+            conn.close()
+            if status == 200:
+                return True
+        except (ConnectionError, socket.timeout, http.client.HTTPException):
+            pass
+        time.sleep(poll)
+    return False
+
+
+def start_once(argv, extra_env, workdir: str, port: int, poll: float):
+    env = dict(os.environ, ROBOT_UI_BAG_REFRESH="0", ROBOT_UI_RECORD="0")
+    cache = None
+    if "PYTHONPYCACHEPREFIX" in extra_env:
+        cache = env["PYTHONPYCACHEPREFIX"] = tempfile.mkdtemp(prefix="pycache-", dir=workdir)
+    started = time.perf_counter()
+    proc = subprocess.Popen(argv, cwd=workdir, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+                            start_new_session=True)
+    try:
+        deadline = started + 30
+        if not get(port, "/health", poll, deadline):
+            raise SystemExit(f"{' '.join(argv)}: no /health within 30 s")
+        health = time.perf_counter() - started
+        if not get(port, "/api/robots", poll, deadline):
+            raise SystemExit(f"{' '.join(argv)}: no /api/robots within 30 s")
+        return health, time.perf_counter() - started
+    finally:
+        os.killpg(proc.pid, signal.SIGINT)
+        try:
+            proc.wait(10)
+        except subprocess.TimeoutExpired:
+            os.killpg(proc.pid, signal.SIGKILL)
+            proc.wait()
+        if cache:
+            shutil.rmtree(cache, ignore_errors=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--poll-ms", type=float, default=5.0)
+    parser.add_argument("--top", type=int, default=10, help="slowest imports to print")
+    args = parser.parse_args()
+
+    # Recordings and the bag catalog would otherwise land in the working directory
+    workdir = tempfile.mkdtemp(prefix="bench-startup-")
+    try:
+        for label, argv, extra_env in modes(free_port()):
+            port = int(argv[argv.index("--port") + 1])
+            health, robots = zip(*(start_once(argv, extra_env, workdir, port, args.poll_ms / 1000)
+                                   for _ in range(args.runs)))
+            print(f"{label:>24}: /health {statistics.median(health) * 1000:6.0f} ms, "
+                  f"/api/robots {statistics.median(robots) * 1000:6.0f} ms "
+                  f"(median of {args.runs}, best {min(robots) * 1000:.0f} ms)")
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    total, modules = import_profile(args.top)
+    print(f"{'import main':>24}: {total:6.1f} ms; slowest by self time:")
+    for self_ms, cumulative_ms, name in modules:
+        print(f"{'':>24}  {self_ms:6.1f} ms self, {cumulative_ms:6.1f} ms cumulative  {name}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,393 @@
+"""
+End-to-end benchmark suite against a simulated fleet.
+
+Starts a FakeFleet (benchmarks/fleet_sim.py) and the backend under uvicorn,
+then drives it over HTTP and websockets like the UI does:
+
+    execute    a log stream started on every robot at once: /api/execute
+               latency, time to the first output byte on /ws/terminal, time
+               to stop, and how long a hung process takes to stop
+    stream     --streams log streams with --viewers binary /ws/terminal
+               viewers each for --seconds: MB/s delivered and how old frames
+               are on arrival; meanwhile --teleop teleop sessions send a key
+               every 100 ms and time its answer
+    validate   bulk /api/robots/validate over the fleet (one robot hangs,
+               some fail after a connect timeout on a lost link) and
+               per-robot validation of the others at once
+    downloads  a bag from --downloads robots at once through /api/downloads
+
+For every scenario it also records the worst event loop lag (from /metrics)
+and the backend's peak RSS. Results go to a JSON file (by default
+benchmarks/results/<commit>.json); --compare prints each number next to an
+earlier run's and exits 1 if any got worse by more than --threshold.
+
+Usage:
+    python3 benchmarks/bench_suite.py [--robots 20] [--seconds 10] [--compare benchmarks/results/abc1234.json]
+"""
+import os
+import re
+import sys
+import json
+import time
+import asyncio
+import argparse
+import platform
+import subprocess
+
+import httpx
+import websockets
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from terminal_protocol import decode_frames, FRAME_DATA  # noqa: E402
+from fleet_sim import FakeFleet, start_backend, wait_ready, free_port, LOG_STREAM, TELEOP, HUNG  # noqa: E402
+
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "results")
+
+ACK = re.compile(rb"key (\d+)\r")
+LAG = re.compile(r"^robot_ui_event_loop_lag_max_seconds ([0-9.e+-]+)$", re.M)
+
+
+def pct(values, q: float, scale: float = 1000.0):
+    """The q-th quantile of `values` (seconds) in ms, or None without samples."""
+    if not values:
+        return None
+    ordered = sorted(values)
+    return round(ordered[min(len(ordered) - 1, int(q * len(ordered)))] * scale, 2)
+
+
+def rss_mb(pid: int) -> float:
+    with open(f"/proc/{pid}/status") as f:
+        for line in f:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1]) / 1024
+    return 0.0
+
+
+class Monitor:
+    """Scrapes the backend's loop lag and RSS twice a second; peaks per scenario."""
+
+    def __init__(self, client: httpx.AsyncClient, pid: int):
+        self.client = client
+        self.pid = pid
+        self.lag = 0.0
+        self.rss = 0.0
+        self._task = None
+
+    async def _run(self):
+        while True:
+            try:
+                text = (await self.client.get("/metrics")).text
+                match = LAG.search(text)
+                if match:
+                    self.lag = max(self.lag, float(match.group(1)))
+                self.rss = max(self.rss, rss_mb(self.pid))
+            except (httpx.HTTPError, OSError):
+                pass
+            await asyncio.sleep(0.5)
+
+    def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        self._task.cancel()
+        await asyncio.gather(self._task, return_exceptions=True)
+
+    def take(self) -> dict:
+        """Peaks since the last call."""
+        peaks = {"loop_lag_max_ms": round(self.lag * 1000, 1), "rss_peak_mb": round(self.rss, 1)}
+        self.lag, self.rss = 0.0, rss_mb(self.pid)
+        return peaks
+
+
+class Suite:
+    def __init__(self, args, fleet: FakeFleet, base: str, client: httpx.AsyncClient):
+        self.args = args
+        self.fleet = fleet
+        self.base = base
+        self.client = client
+
+    def ws_url(self, session_id: str) -> str:
+        return self.base.replace("http", "ws") + f"/ws/terminal/{session_id}?proto=bin"
+
+    async def execute(self, robot_id: str, index: int) -> str:
+        response = await self.client.post("/api/execute", json={"robot_id": robot_id, "command_index": index})
+        response.raise_for_status()
+        return response.json()["session_id"]
+
+    async def stop(self, session_id: str) -> float:
+        """DELETE the session and wait until it is gone; seconds taken."""
+        started = time.perf_counter()
+        await self.client.delete(f"/api/sessions/{session_id}")
+        while (await self.client.get(f"/api/sessions/{session_id}")).json()["running"]:
+            await asyncio.sleep(0.02)
+        return time.perf_counter() - started
+
+    async def first_output(self, session_id: str):
+        async with websockets.connect(self.ws_url(session_id), max_size=None) as ws:
+            async for message in ws:
+                if isinstance(message, bytes) and any(
+                        frame[0] == FRAME_DATA and frame[5] for frame in decode_frames(message)):
+                    return
+
+    async def scenario_execute(self) -> dict:
+        async def one(robot_id: str):
+            started = time.perf_counter()
+            session_id = await self.execute(robot_id, LOG_STREAM)
+            requested = time.perf_counter() - started
+            await self.first_output(session_id)
+            first = time.perf_counter() - started
+            return requested, first, await self.stop(session_id)
+
+        started = time.perf_counter()
+        timings = await asyncio.gather(*(one(robot_id) for robot_id in self.fleet.ids))
+        wall = time.perf_counter() - started
+        requested, first, stopped = zip(*timings)
+
+        hung = await self.execute(self.fleet.ids[0], HUNG)
+        await self.first_output(hung)
+        hung_stop = await self.stop(hung)
+        return {
+            "sessions": len(timings),
+            "sessions_per_s": round(len(timings) / wall, 1),
+            "request_p50_ms": pct(requested, 0.5), "request_p99_ms": pct(requested, 0.99),
+            "first_output_p50_ms": pct(first, 0.5), "first_output_p99_ms": pct(first, 0.99),
+            "stop_p50_ms": pct(stopped, 0.5), "stop_p99_ms": pct(stopped, 0.99),
+            "hung_stop_s": round(hung_stop, 2),
+        }
+
+    async def view(self, session_id: str, until: float, ages: list) -> int:
+        """One binary viewer until `until`; returns payload bytes received."""
+        received = 0
+        async with websockets.connect(self.ws_url(session_id), max_size=None) as ws:
+            while time.time() < until:
+                try:
+                    message = await asyncio.wait_for(ws.recv(), until - time.time())
+                except asyncio.TimeoutError:
+                    break
+                if isinstance(message, str):
+                    continue
+                now = time.time()
+                for frame_type, _, _, _, stamp, payload in decode_frames(message):
+                    if frame_type == FRAME_DATA:
+                        received += len(payload)
+                        ages.append(now - stamp)
+        return received
+
+    async def teleop(self, session_id: str, until: float, latencies: list):
+        sent, answered = {}, {}
+        async with websockets.connect(self.ws_url(session_id), max_size=None) as ws:
+
+            async def read():
+                async for message in ws:
+                    if isinstance(message, str):
+                        # Echo probes go straight back, as the web terminal does
+                        await ws.send(message)
+                        continue
+                    now = time.perf_counter()
+                    for frame_type, _, _, _, _, payload in decode_frames(message):
+                        if frame_type == FRAME_DATA:
+                            for match in ACK.finditer(payload):
+                                answered.setdefault(int(match.group(1)), now)
+
+            reader = asyncio.create_task(read())
+            n = 0
+            while time.time() < until - 0.5:
+                n += 1
+                sent[n] = time.perf_counter()
+                await ws.send(b"w" if n % 2 else b"x")
+                await asyncio.sleep(0.1)
+            await asyncio.sleep(0.5)
+            reader.cancel()
+            await asyncio.gather(reader, return_exceptions=True)
+        latencies.extend(answered[n] - sent[n] for n in sent if n in answered)
+        return len(sent) - sum(1 for n in sent if n in answered)
+
+    async def scenario_stream(self) -> dict:
+        args = self.args
+        streams = self.fleet.ids[:args.streams]
+        teleops = self.fleet.ids[args.streams:args.streams + args.teleop]
+        stream_ids = [await self.execute(robot_id, LOG_STREAM) for robot_id in streams]
+        teleop_ids = [await self.execute(robot_id, TELEOP) for robot_id in teleops]
+        await asyncio.sleep(0.5)
+
+        ages, latencies = [], []
+        until = time.time() + args.seconds
+        started = time.perf_counter()
+        viewers = [self.view(session_id, until, ages) for session_id in stream_ids for _ in range(args.viewers)]
+        results = await asyncio.gather(*viewers, *(self.teleop(s, until, latencies) for s in teleop_ids))
+        wall = time.perf_counter() - started
+        received = sum(results[:len(viewers)])
+        lost = sum(results[len(viewers):])
+        await asyncio.gather(*(self.stop(s) for s in stream_ids + teleop_ids))
+        return {
+            "streams": len(stream_ids), "viewers": len(viewers),
+            "delivered_mbps": round(received / wall / 1e6, 2),
+            "frame_age_p50_ms": pct(ages, 0.5), "frame_age_p99_ms": pct(ages, 0.99),
+            "teleop_sessions": len(teleop_ids),
+            "teleop_key_p50_ms": pct(latencies, 0.5), "teleop_key_p99_ms": pct(latencies, 0.99),
+            "teleop_unanswered": lost,
+        }
+
+    async def scenario_validate(self) -> dict:
+        started = time.perf_counter()
+        arrivals, durations, outcomes = [], [], {"ok": 0, "failed": 0, "timed_out": 0}
+        async with self.client.stream("POST", "/api/robots/validate",
+                                      json={"robot_ids": self.fleet.ids}, timeout=60) as response:
+            async for line in response.aiter_lines():
+                if not line:
+                    continue
+                result = json.loads(line)
+                arrivals.append(time.perf_counter() - started)
+                durations.append(result["duration"])
+                if result["success"]:
+                    outcomes["ok"] += 1
+                elif "timed out after" in result["message"]:
+                    outcomes["timed_out"] += 1
+                else:
+                    outcomes["failed"] += 1
+
+        answering = self.fleet.ids[self.fleet.hung:]
+
+        async def one(robot_id: str) -> float:
+            began = time.perf_counter()
+            await self.client.post(f"/api/robots/{robot_id}/validate", timeout=60)
+            return time.perf_counter() - began
+
+        single = await asyncio.gather(*(one(robot_id) for robot_id in answering))
+        return {
+            "robots": len(arrivals), **outcomes,
+            "bulk_first_ms": pct(arrivals[:1], 0), "bulk_all_s": round(arrivals[-1], 2) if arrivals else None,
+            "bulk_duration_p50_ms": pct(durations, 0.5),
+            "single_p50_ms": pct(single, 0.5), "single_p99_ms": pct(single, 0.99),
+        }
+
+    async def scenario_downloads(self) -> dict:
+        robots = self.fleet.ids[:self.args.downloads]
+        started = time.perf_counter()
+        transfers = []
+        for robot_id in robots:
+            response = await self.client.post("/api/downloads", json={"url": self.fleet.bag_url_for(robot_id)})
+            transfers.append(response.json()["transfer_id"])
+        states = {}
+        while len(states) < len(set(transfers)):
+            await asyncio.sleep(0.1)
+            for transfer_id in transfers:
+                state = (await self.client.get(f"/api/downloads/{transfer_id}")).json()
+                if state["status"] in ("done", "failed", "cancelled"):
+                    states.setdefault(transfer_id, state)
+        wall = time.perf_counter() - started
+        done = [s for s in states.values() if s["status"] == "done"]
+        return {
+            "transfers": len(transfers), "done": len(done),
+            "aggregate_mbps": round(sum(s["size"] for s in done) / wall / 1e6, 2),
+            "retries": sum(s["retries"] for s in states.values()),
+            "wall_s": round(wall, 2),
+        }
+
+
+def git_commit() -> str:
+    try:
+        commit = subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=BACKEND_DIR, text=True).strip()
+        dirty = subprocess.call(["git", "diff", "--quiet", "HEAD", "--", "."], cwd=BACKEND_DIR)
+        return commit + ("-dirty" if dirty else "")
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def direction(metric: str) -> int:
+    """-1 if lower is better, 1 if higher is better, 0 for counts."""
+    if metric.endswith(("_ms", "_s", "_mb")):
+        return -1
+    if metric.endswith(("_mbps", "_per_s")):
+        return 1
+    return 0
+
+
+def compare(previous: dict, current: dict, threshold: float) -> int:
+    print(f"\ncompared with {previous['commit']} ({previous['date']}):")
+    regressions = 0
+    for scenario, metrics in current["results"].items():
+        for metric, value in metrics.items():
+            old = previous["results"].get(scenario, {}).get(metric)
+            if not isinstance(value, (int, float)) or not isinstance(old, (int, float)) or not old:
+                continue
+            change = (value - old) / abs(old)
+            worse = -change * direction(metric) > threshold
+            regressions += worse
+            flag = "  WORSE" if worse else ""
+            print(f"{scenario + '.' + metric:>36}: {old:>10g} -> {value:<10g} {change:+7.1%}{flag}")
+    return regressions
+
+
+async def run(args, fleet: FakeFleet, base: str, pid: int) -> dict:
+    results = {}
+    async with httpx.AsyncClient(base_url=base, timeout=30) as client:
+        suite = Suite(args, fleet, base, client)
+        monitor = Monitor(client, pid)
+        monitor.start()
+        monitor.take()
+        for name in args.scenarios:
+            results[name] = await getattr(suite, f"scenario_{name}")()
+            results[name].update(monitor.take())
+            print(f"{name:>24}: " + ", ".join(f"{k} {v}" for k, v in results[name].items()))
+        await monitor.stop()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--robots", type=int, default=20)
+    parser.add_argument("--rate", type=int, default=100_000, help="log stream bytes per second per robot")
+    parser.add_argument("--latency", type=float, default=0.05, help="mean link latency in seconds")
+    parser.add_argument("--loss", type=float, default=0.01)
+    parser.add_argument("--streams", type=int, default=10)
+    parser.add_argument("--viewers", type=int, default=2, help="viewers per stream")
+    parser.add_argument("--teleop", type=int, default=4)
+    parser.add_argument("--seconds", type=float, default=10.0)
+    parser.add_argument("--downloads", type=int, default=4)
+    parser.add_argument("--bag-mb", type=int, default=16)
+    parser.add_argument("--scenarios", nargs="+", default=["execute", "stream", "validate", "downloads"],
+                        choices=["execute", "stream", "validate", "downloads"])
+    parser.add_argument("--out", help="results file (default benchmarks/results/<commit>.json)")
+    parser.add_argument("--compare", help="earlier results file to compare with")
+    parser.add_argument("--threshold", type=float, default=0.1, help="relative change counted as a regression")
+    args = parser.parse_args()
+    if args.streams + args.teleop > args.robots:
+        parser.error("--streams plus --teleop can't exceed --robots")
+
+    commit = git_commit()
+    report = {
+        "commit": commit,
+        "date": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "host": {"cpus": os.cpu_count(), "python": platform.python_version(), "platform": platform.platform()},
+        "args": {k: v for k, v in vars(args).items() if k not in ("out", "compare", "threshold")},
+    }
+    with FakeFleet(args.robots, args.rate, args.latency, args.loss, bag_mb=args.bag_mb) as fleet:
+        port = free_port()
+        backend = start_backend(fleet, port)
+        base = f"http://127.0.0.1:{port}"
+        try:
+            wait_ready(base)
+            print(f"{'fleet':>24}: {args.robots} robots, {args.rate / 1e3:g} kB/s streams, "
+                  f"{args.latency * 1000:g} ms latency, {args.loss:.0%} loss, commit {commit}")
+            report["results"] = asyncio.run(run(args, fleet, base, backend.pid))
+        finally:
+            backend.terminate()
+            backend.wait()
+
+    out = args.out or os.path.join(RESULTS_DIR, f"{commit}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(out)), exist_ok=True)
+    with open(out, "w") as f:
+        json.dump(report, f, indent=1)
+    print(f"{'results':>24}: {out}")
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare(json.load(f), report, args.threshold)
+        sys.exit(1 if regressions else 0)
+
+
+if __name__ == "__main__":
+    main()
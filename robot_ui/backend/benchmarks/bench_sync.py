@@ -0,0 +1,171 @@
+"""
+Delta push benchmark for sync.py.
+
+Builds a robot_files tree like xvalidation.sh's (robot_parameters with
+--param-files YAML files, DHL_HOST_CLI with a --firmware-mb firmware image)
+and --robots local directories standing in for robots, then pushes the -U
+and -v bundles to all of them with LocalTarget, each robot capped to
+--link-rate bytes/s like its Wi-Fi link:
+
+    full copy        shutil.copytree per robot, one after the other (xvalidation.sh's scp -r, uncapped)
+    first push       every file is new on every robot
+    no change        manifests only
+    small edit       one parameter changed, one firmware block patched
+
+and checks that every robot ends up with the local files, and its own
+robot.yaml. Hashing is timed cold and from the manifest cache. The stand-ins'
+helpers all run on this machine, so with few CPUs a no-change push to many
+robots mostly measures their start-up one after the other.
+
+Usage:
+    python3 benchmarks/bench_sync.py [--robots 20] [--link-rate 5000000] [--firmware-mb 8]
+"""
+import os
+import sys
+import time
+import shutil
+import asyncio
+import argparse
+import tempfile
+import filecmp
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+WORKDIR = tempfile.mkdtemp(prefix="bench-sync-")
+# Manifest caches (local and the stand-ins') and the bundles live in the work dir
+os.environ["HOME"] = WORKDIR
+os.environ["ROBOT_UI_ROBOT_FILES_DIR"] = os.path.join(WORKDIR, "robot_files")
+
+from robots_config import SYNC_BUNDLES, ROBOT_FILES_DIR  # noqa: E402
+from sync import local_manifest, push_many, SYNC_BLOCK_SIZE  # noqa: E402
+from remote_helper import LocalTarget  # noqa: E402
+import sync_helper  # noqa: E402
+
+PARAMS, FIRMWARE = SYNC_BUNDLES["-U"], SYNC_BUNDLES["-v"]
+
+
+def build_files(param_files: int, firmware_mb: int):
+    params = os.path.join(ROBOT_FILES_DIR, PARAMS.source)
+    os.makedirs(params)
+    for n in range(param_files):
+        with open(os.path.join(params, f"params_{n:03d}.yaml"), "w") as f:
+            f.write("".join(f"param_{n}_{i}: {i * 0.01:.3f}\n" for i in range(150)))
+    with open(os.path.join(params, "robot.yaml"), "w") as f:
+        f.write("pgv_offset: 0.0\n")
+    firmware = os.path.join(ROBOT_FILES_DIR, FIRMWARE.source)
+    os.makedirs(firmware)
+    with open(os.path.join(firmware, "dual-motor-driver20.bin"), "wb") as f:
+        f.write(os.urandom(firmware_mb * 1_000_000))
+    with open(os.path.join(firmware, "host_cli"), "wb") as f:
+        f.write(os.urandom(600_000))
+    os.chmod(os.path.join(firmware, "host_cli"), 0o755)
+
+
+def robot_dirs(robots: int):
+    roots = {}
+    for n in range(1, robots + 1):
+        root = roots[n] = os.path.join(WORKDIR, "robots", str(n))
+        own = os.path.join(root, PARAMS.dest.lstrip("/"), PARAMS.source)
+        os.makedirs(own)
+        with open(os.path.join(own, "robot.yaml"), "w") as f:
+            f.write(f"pgv_offset: {n * 0.001:.3f}\n")
+    return roots
+
+
+def full_copy(roots) -> float:
+    started = time.perf_counter()
+    for n, root in roots.items():
+        for bundle in (PARAMS, FIRMWARE):
+            dest = os.path.join(root, "copy", bundle.dest.lstrip("/"), bundle.source)
+            shutil.copytree(os.path.join(ROBOT_FILES_DIR, bundle.source), dest)
+    elapsed = time.perf_counter() - started
+    for root in roots.values():
+        shutil.rmtree(os.path.join(root, "copy"), ignore_errors=True)
+    return elapsed
+
+
+async def push_all(roots, link_rate: int):
+    started = time.perf_counter()
+    sent = total = 0
+    durations = []
+    for bundle in (PARAMS, FIRMWARE):
+        targets = {n: LocalTarget(root) for n, root in roots.items()}
+        async for result in push_many(bundle, targets, parallelism=len(roots), robot_rate=link_rate, total_rate=0):
+            if result["status"] != "ok":
+                raise SystemExit(f"robot {result['robot']}: {result['status']}: {result.get('error')}")
+            sent += result["bytes_sent"]
+            total += result["bytes_total"]
+            durations.append(result["duration"])
+    return time.perf_counter() - started, sent, total, max(durations)
+
+
+def edit_files():
+    path = os.path.join(ROBOT_FILES_DIR, PARAMS.source, "params_000.yaml")
+    with open(path, "a") as f:
+        f.write("param_0_new: 1.000\n")
+    with open(os.path.join(ROBOT_FILES_DIR, FIRMWARE.source, "dual-motor-driver20.bin"), "r+b") as f:
+        f.seek(3 * SYNC_BLOCK_SIZE + 100)
+        f.write(os.urandom(16))
+
+
+def check(roots):
+    for n, root in roots.items():
+        for bundle in (PARAMS, FIRMWARE):
+            local = os.path.join(ROBOT_FILES_DIR, bundle.source)
+            remote = os.path.join(root, bundle.dest.lstrip("/"), bundle.source)
+            diff = filecmp.dircmp(local, remote)
+            for name in diff.common_files + diff.left_only:
+                rel = f"{bundle.source}/{name}"
+                if rel in bundle.exclude:
+                    continue
+                if name in diff.left_only or not filecmp.cmp(os.path.join(local, name),
+                                                              os.path.join(remote, name), shallow=False):
+                    raise SystemExit(f"robot {n}: {rel} differs")
+        with open(os.path.join(root, PARAMS.dest.lstrip("/"), PARAMS.source, "robot.yaml")) as f:
+            if f.read() != f"pgv_offset: {n * 0.001:.3f}\n":
+                raise SystemExit(f"robot {n}: its robot.yaml was overwritten")
+        if not os.access(os.path.join(root, FIRMWARE.dest.lstrip("/"), FIRMWARE.source, "host_cli"), os.X_OK):
+            raise SystemExit(f"robot {n}: host_cli lost its execute bit")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--robots", type=int, default=20)
+    parser.add_argument("--link-rate", type=int, default=5_000_000, help="bytes per second per robot")
+    parser.add_argument("--param-files", type=int, default=40)
+    parser.add_argument("--firmware-mb", type=int, default=8)
+    args = parser.parse_args()
+
+    try:
+        build_files(args.param_files, args.firmware_mb)
+        roots = robot_dirs(args.robots)
+
+        for label in ("hash bundles (cold)", "hash bundles (cached)"):
+            started = time.perf_counter()
+            for bundle in (PARAMS, FIRMWARE):
+                local_manifest(bundle)
+            print(f"{label:>24}: {(time.perf_counter() - started) * 1000:7.1f} ms")
+
+        elapsed = full_copy(roots)
+        size = sum(os.path.getsize(os.path.join(d, f)) for bundle in (PARAMS, FIRMWARE)
+                   for d, _, files in os.walk(os.path.join(ROBOT_FILES_DIR, bundle.source)) for f in files)
+        print(f"{'full copy (scp -r)':>24}: {elapsed:7.2f} s, {size * args.robots / 1e6:8.2f} MB sent, "
+              f"{size * args.robots / args.link_rate:6.1f} s at the link rate one robot at a time")
+
+        for label, before in (("first push", None), ("no change", None), ("small edit", edit_files)):
+            if before:
+                before()
+            elapsed, sent, total, slowest = asyncio.run(push_all(roots, args.link_rate))
+            check(roots)
+            print(f"{label:>24}: {elapsed:7.2f} s, {sent / 1e6:8.2f} MB sent of {total / 1e6:.2f} MB, "
+                  f"slowest robot {slowest:.2f} s")
+        cache = sync_helper.CACHE_DIR
+        print(f"{'manifest caches':>24}: {len(os.listdir(cache))} files, "
+              f"{sum(os.path.getsize(os.path.join(cache, f)) for f in os.listdir(cache)) / 1e3:.0f} kB")
+    finally:
+        shutil.rmtree(WORKDIR, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+"""
+Telemetry coalescing benchmark.
+
+Feeds N MB of ``rostopic echo``-style odometry frames, as PTY-sized chunks,
+through a TelemetryStream and reports parser throughput and how many bytes
+actually reach the websocket, with and without a field projection.
+
+Usage:
+    python3 benchmarks/bench_telemetry.py [--mb 50] [--interval-ms 150] [--rate 500]
+"""
+import os
+import sys
+import time
+import asyncio
+import argparse
+import subprocess
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+from robots_config import TelemetryConfig  # noqa: E402
+from telemetry import FrameParser, TelemetryStream  # noqa: E402
+
+FAKE_ROSTOPIC = os.path.join(os.path.dirname(BACKEND_DIR), "scripts", "fake_rostopic.py")
+
+
+class ReplayReader:
+    """Serves a byte string in 4 KB chunks at a fixed message rate."""
+
+    def __init__(self, payload: bytes, frame_size: int, rate_hz: float):
+        self.payload = payload
+        self.pos = 0
+        # Pace the chunks so the stream lasts as long as it would on a robot
+        self.chunk = 4096
+        self.delay = self.chunk / frame_size / rate_hz
+
+    async def read(self) -> bytes:
+        if self.pos >= len(self.payload):
+            return b""
+        data = self.payload[self.pos:self.pos + self.chunk]
+        self.pos += len(data)
+        await asyncio.sleep(self.delay)
+        return data
+
+
+def sample_frames() -> bytes:
+    raw = subprocess.run(
+        [sys.executable, FAKE_ROSTOPIC, "/raw_odom", "1000000", "2000"],
+        capture_output=True, check=True,
+    ).stdout
+    return raw.replace(b"\n", b"\r\n")
+
+
+async def run(label: str, payload: bytes, frame_size: int, config: TelemetryConfig, rate: float):
+    stream = TelemetryStream(ReplayReader(payload, frame_size, rate), config)
+    start = time.perf_counter()
+    frames_out = 0
+    while await stream.read():
+        frames_out += 1
+    wall = time.perf_counter() - start
+
+    print(
+        f"{label:>14}: in {stream.bytes_in / 1e6:7.1f} MB ({stream.parser.frames} frames) over {wall:5.1f}s, "
+        f"out {stream.bytes_out / 1e3:8.1f} KB ({frames_out} frames), "
+        f"reduction {stream.bytes_in / max(stream.bytes_out, 1):6.0f}x"
+    )
+
+
+def parse_throughput(payload: bytes):
+    parser = FrameParser()
+    start = time.perf_counter()
+    for i in range(0, len(payload), 4096):
+        parser.feed(payload[i:i + 4096])
+    elapsed = time.perf_counter() - start
+    print(f"{'parser only':>14}: {len(payload) / 1e6 / elapsed:7.1f} MB/s ({parser.frames} frames)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--mb", type=int, default=50)
+    parser.add_argument("--interval-ms", type=int, default=150)
+    parser.add_argument("--rate", type=float, default=500.0, help="simulated messages per second")
+    args = parser.parse_args()
+
+    sample = sample_frames()
+    frame_size = len(sample) // 2000
+    payload = sample * max(1, args.mb * 1_000_000 // len(sample))
+
+    parse_throughput(payload)
+    asyncio.run(run("all fields", payload, frame_size, TelemetryConfig(interval_ms=args.interval_ms), args.rate))
+    asyncio.run(run("fields=[pose]", payload, frame_size,
+                    TelemetryConfig(interval_ms=args.interval_ms, fields=["pose"]), args.rate))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,186 @@
+"""
+Teleop keystroke latency benchmark.
+
+Runs the backend under uvicorn in a subprocess with a temporary robots file
+holding fake_teleop.py twice: as a plain command and as a teleop command.
+For each, a websocket client (binary protocol) sends a movement key every
+--interval ms while the script floods its terminal with --rate bytes/s, and
+times each key until the answer carrying its number ("key N") arrives back
+over the same websocket: once with a viewer that keeps up, once with one
+that only takes --viewer-rate bytes/s (a slow link or a busy browser). Under
+a flood a slow teleop viewer only gets the newest output, so most answers are
+never seen there; those that are show how stale its output is. Also reports
+the server's own key-to-output and echo-probe round trip percentiles, and how
+a burst of autorepeat is coalesced.
+
+Usage:
+    python3 benchmarks/bench_teleop.py [--rate 10000000] [--keys 200] [--interval 100] [--viewer-rate 2000000]
+"""
+import os
+import re
+import sys
+import json
+import time
+import socket
+import asyncio
+import argparse
+import tempfile
+import subprocess
+
+import httpx
+import websockets
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+from terminal_protocol import decode_frames, FRAME_DATA  # noqa: E402
+from robots_config import SCRIPTS_DIR  # noqa: E402
+
+ACK = re.compile(rb"key (\d+)\r")
+
+
+def robots_file(rate: int) -> str:
+    command = [os.path.join(SCRIPTS_DIR, "fake_teleop.py"), str(rate)]
+    robots = {"robots": [{
+        "id": "bench", "name": "Bench", "image_key": "bench", "validation_script": ["true"],
+        "commands": [
+            {"label": "plain", "command_args": command},
+            {"label": "teleop", "command_args": command, "teleop": {"ack": "currently:"}},
+        ],
+    }]}
+    fd, path = tempfile.mkstemp(suffix=".json")
+    with os.fdopen(fd, "w") as f:
+        json.dump(robots, f)
+    return path
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def percentile(values, q: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+async def measure(base: str, client: httpx.AsyncClient, index: int, keys: int, interval: float,
+                  viewer_rate: float = 0):
+    started = await client.post("/api/execute", json={"robot_id": "bench", "command_index": index})
+    session_id = started.json()["session_id"]
+    sent, answered = {}, {}
+    received = 0
+    url = base.replace("http", "ws") + f"/ws/terminal/{session_id}?proto=bin"
+    sock = socket.socket()
+    if viewer_rate:
+        # A small receive buffer (set before connecting, so the TCP window is
+        # small too), like a browser that stops reading while it renders
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 65536)
+    sock.connect(("127.0.0.1", int(base.rsplit(":", 1)[1])))
+    async with websockets.connect(url, sock=sock, max_size=None, max_queue=1) as ws:
+
+        async def read():
+            nonlocal received
+            async for message in ws:
+                if isinstance(message, str):
+                    # Echo probes go straight back
+                    await ws.send(message)
+                    continue
+                now = time.perf_counter()
+                for frame_type, _, _, _, _, payload in decode_frames(message):
+                    if frame_type != FRAME_DATA:
+                        continue
+                    received += len(payload)
+                    for match in ACK.finditer(payload):
+                        answered.setdefault(int(match.group(1)), now)
+                if viewer_rate:
+                    await asyncio.sleep(len(message) / viewer_rate)
+
+        reader = asyncio.create_task(read())
+        await asyncio.sleep(1.0)
+        flood_from, flood_bytes = time.perf_counter(), received
+        try:
+            for n in range(1, keys + 1):
+                sent[n] = time.perf_counter()
+                # Alternate so the velocity stays put
+                await ws.send(b"w" if n % 2 else b"x")
+                await asyncio.sleep(interval)
+            await asyncio.sleep(1.0)
+
+            # Autorepeat: 20 presses 5 ms apart, well inside repeat_ms
+            for _ in range(20):
+                await ws.send(b"w")
+                await asyncio.sleep(0.005)
+            await ws.send(b" ")
+            await asyncio.sleep(0.5)
+        except websockets.ConnectionClosed:
+            # A plain session drops a viewer that falls too far behind
+            pass
+        rate = (received - flood_bytes) / (time.perf_counter() - flood_from) / 1e6
+        stats = (await client.get(f"/api/sessions/{session_id}")).json()
+        await client.delete(f"/api/sessions/{session_id}")
+        reader.cancel()
+        await asyncio.gather(reader, return_exceptions=True)
+    # Stopping runs in the background; the robot is free once it is done
+    while (await client.get(f"/api/sessions/{session_id}")).json()["running"]:
+        await asyncio.sleep(0.1)
+    latencies = [(answered[n] - sent[n]) * 1000 for n in sent if n in answered]
+    return latencies, keys - len(latencies), rate, stats["teleop"]
+
+
+async def run(args, base: str):
+    async with httpx.AsyncClient(base_url=base) as client:
+        for _ in range(100):
+            try:
+                await client.get("/api/robots")
+                break
+            except httpx.TransportError:
+                await asyncio.sleep(0.1)
+        for viewer_rate, index, label in ((0, 0, "plain session"), (0, 1, "teleop session"),
+                                          (args.viewer_rate, 0, "plain, slow viewer"),
+                                          (args.viewer_rate, 1, "teleop, slow viewer")):
+            latencies, lost, rate, teleop = await measure(base, client, index, args.keys, args.interval / 1000,
+                                                          viewer_rate)
+            if latencies:
+                print(f"{label:>24}: p50 {percentile(latencies, 0.5):6.1f} ms, "
+                      f"p99 {percentile(latencies, 0.99):6.1f} ms, "
+                      f"{lost} answers not seen, viewer got {rate:.1f} MB/s")
+            else:
+                print(f"{label:>24}: no answers seen, viewer got {rate:.1f} MB/s")
+            if teleop:
+                key, rtt = teleop["key_to_output"], teleop["rtt"]
+                print(f"{'server key->output':>24}: p50 {key['p50_ms']:6.1f} ms, p99 {key['p99_ms']:6.1f} ms")
+                if rtt:
+                    print(f"{'echo probe rtt':>24}: p50 {rtt['p50_ms']:6.1f} ms, p99 {rtt['p99_ms']:6.1f} ms "
+                          f"({rtt['samples']} probes)")
+                print(f"{'autorepeat burst':>24}: 20 presses, {teleop['coalesced']} coalesced, "
+                      f"{teleop['cancelled']} cancelled by the stop key")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--rate", type=int, default=10_000_000, help="flood bytes per second")
+    parser.add_argument("--keys", type=int, default=200)
+    parser.add_argument("--interval", type=float, default=100.0, help="ms between keys")
+    parser.add_argument("--viewer-rate", type=float, default=2_000_000, help="slow viewer's bytes per second")
+    args = parser.parse_args()
+
+    port = free_port()
+    path = robots_file(args.rate)
+    env = dict(os.environ, ROBOT_UI_ROBOTS_FILE=path, ROBOT_UI_RECORD="0")
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--port", str(port), "--log-level", "warning"],
+        cwd=BACKEND_DIR, env=env,
+    )
+    try:
+        print(f"{'flood':>24}: {args.rate / 1e6:.1f} MB/s, a key every {args.interval:g} ms")
+        asyncio.run(run(args, f"http://127.0.0.1:{port}"))
+    finally:
+        server.terminate()
+        server.wait()
+        os.remove(path)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,54 @@
+"""
+Fleet validation benchmark.
+
+Validates N fake robots whose scripts take a random 0.1-0.9 s each and compares
+the wall time of ``validate_many`` with the sum of the individual durations
+(which is what the old sequential path would have cost).
+
+Usage:
+    python3 benchmarks/bench_validate.py [--robots 80] [--concurrency 80]
+"""
+import os
+import sys
+import time
+import random
+import asyncio
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from validation import validate_many  # noqa: E402
+
+
+async def run(n_robots: int, concurrency: int):
+    rng = random.Random(42)
+    targets = {
+        str(n): ["sh", "-c", f"sleep {rng.uniform(0.1, 0.9):.3f}; echo Validation passed for {n}"]
+        for n in range(1, n_robots + 1)
+    }
+
+    start = time.perf_counter()
+    durations = []
+    failures = 0
+    async for result in validate_many(targets, concurrency):
+        durations.append(result["duration"])
+        failures += 0 if result["success"] else 1
+    wall = time.perf_counter() - start
+
+    print(
+        f"{n_robots} robots, concurrency {concurrency}: wall {wall:.2f}s, "
+        f"slowest {max(durations):.2f}s, sequential sum {sum(durations):.2f}s, "
+        f"failures {failures}"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--robots", type=int, default=80)
+    parser.add_argument("--concurrency", type=int, default=80)
+    args = parser.parse_args()
+    asyncio.run(run(args.robots, args.concurrency))
+
+
+if __name__ == "__main__":
+    main()
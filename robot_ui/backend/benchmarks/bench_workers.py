@@ -0,0 +1,212 @@
+"""
+Multi-worker benchmark for serve.py --workers.
+
+Starts a FakeFleet (benchmarks/fleet_sim.py) and the backend once per
+--workers count (1 is the single process; above 1, a primary owning the
+sessions plus that many workers). Each time it runs --streams log streams at
+--rate bytes/s and attaches --viewers binary /ws/terminal viewers spread over
+them, from --clients load processes. After --warmup seconds, for --seconds:
+
+    delivered    MB/s of terminal output the viewers got, of what the streams
+                 wrote times their viewers, and how many viewers were dropped
+                 for falling behind (close code 1013)
+    frame age    how old output frames are on arrival, p50/p99
+    requests     GET /api/sessions (answered by the primary) and GET
+                 /api/robots (by a worker), one after the other, p50/p99
+    cpu          CPU use of the primary and of every worker
+
+The viewers' load processes share the machine with the backend, so on few
+cores the numbers say more about the split between processes than about
+throughput.
+
+Usage:
+    python3 benchmarks/bench_workers.py [--workers 1,2,4] [--viewers 300] [--streams 4] [--rate 50000]
+"""
+import os
+import sys
+import time
+import asyncio
+import argparse
+import multiprocessing
+
+import httpx
+import websockets
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from terminal_protocol import decode_frames, FRAME_DATA  # noqa: E402
+from fleet_sim import FakeFleet, start_backend, wait_ready, free_port, LOG_STREAM  # noqa: E402
+
+
+def pct(values, q: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))] * 1000 if ordered else float("nan")
+
+
+async def view(url: str, start: float, until: float, ages: list) -> tuple:
+    """One viewer; (payload bytes received in the window, close code)."""
+    received = 0
+    try:
+        async with websockets.connect(url, max_size=None, open_timeout=60) as ws:
+            while time.time() < until:
+                try:
+                    message = await asyncio.wait_for(ws.recv(), until - time.time())
+                except asyncio.TimeoutError:
+                    break
+                now = time.time()
+                if isinstance(message, str) or now < start:
+                    continue
+                for frame_type, _, _, _, stamp, payload in decode_frames(message):
+                    if frame_type == FRAME_DATA:
+                        received += len(payload)
+                        ages.append(now - stamp)
+            return received, None
+    except websockets.ConnectionClosed as e:
+        return received, e.rcvd.code if e.rcvd else None
+    except (OSError, websockets.InvalidHandshake, asyncio.TimeoutError):
+        return received, "refused"
+
+
+def load(urls, start: float, until: float, results: multiprocessing.Queue):
+    """A load process: its share of the viewers."""
+    async def run():
+        ages = []
+        outcomes = await asyncio.gather(*(view(url, start, until, ages) for url in urls))
+        # A sample of the ages is enough for percentiles
+        results.put((sum(r for r, _ in outcomes), [code for _, code in outcomes], ages[::max(1, len(ages) // 20000)]))
+    asyncio.run(run())
+
+
+def cpu_seconds(pid: int) -> float:
+    with open(f"/proc/{pid}/stat") as f:
+        fields = f.read().rsplit(")", 1)[1].split()
+    return (int(fields[11]) + int(fields[12])) / os.sysconf("SC_CLK_TCK")
+
+
+def worker_pids(primary: int):
+    pids = []
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat") as f:
+                ppid = int(f.read().rsplit(")", 1)[1].split()[1])
+            with open(f"/proc/{entry}/cmdline", "rb") as f:
+                cmdline = f.read()
+        except (OSError, ValueError):
+            continue
+        if ppid == primary and b"--worker-fd" in cmdline:
+            pids.append(int(entry))
+    return sorted(pids)
+
+
+async def requests(base: str, until: float) -> dict:
+    times = {"/api/sessions": [], "/api/robots": []}
+    async with httpx.AsyncClient(base_url=base, timeout=30) as client:
+        while time.time() < until:
+            for path, samples in times.items():
+                started = time.perf_counter()
+                (await client.get(path)).raise_for_status()
+                samples.append(time.perf_counter() - started)
+            await asyncio.sleep(0.05)
+    return times
+
+
+async def written(client: httpx.AsyncClient, session_ids) -> int:
+    """Output the sessions have written so far, in all."""
+    total = 0
+    for session_id in session_ids:
+        total += (await client.get(f"/api/sessions/{session_id}")).json()["output_end"]
+    return total
+
+
+async def measure(args, client: httpx.AsyncClient, backend_pid: int, session_ids) -> dict:
+    base = str(client.base_url).rstrip("/")
+    ws_base = base.replace("http", "ws")
+    urls = [f"{ws_base}/ws/terminal/{session_ids[i % len(session_ids)]}?proto=bin" for i in range(args.viewers)]
+    start = time.time() + args.warmup
+    until = start + args.seconds
+    results = multiprocessing.Queue()
+    loaders = [multiprocessing.Process(target=load, args=(urls[i::args.clients], start, until, results))
+               for i in range(args.clients)]
+    for loader in loaders:
+        loader.start()
+
+    await asyncio.sleep(max(0.0, start - time.time()))
+    pids = [backend_pid] + worker_pids(backend_pid)
+    cpu_before = [cpu_seconds(pid) for pid in pids]
+    written_before = await written(client, session_ids)
+    began = time.perf_counter()
+    times = await requests(base, until)
+    wall = time.perf_counter() - began
+    cpu = [(cpu_seconds(pid) - before) / wall for pid, before in zip(pids, cpu_before)]
+    # Every viewer watches one of the streams
+    offered = (await written(client, session_ids) - written_before) * args.viewers / len(session_ids)
+
+    received, codes, ages = 0, [], []
+    for _ in loaders:
+        r, c, a = results.get()
+        received += r
+        codes += c
+        ages += a
+    for loader in loaders:
+        loader.join()
+    return {"received": received, "offered": offered, "wall": wall, "codes": codes, "ages": ages, "times": times,
+            "cpu": cpu}
+
+
+async def run_mode(args, fleet: FakeFleet, workers: int):
+    port = free_port()
+    backend = start_backend(fleet, port, workers=workers)
+    base = f"http://127.0.0.1:{port}"
+    try:
+        wait_ready(base)
+        async with httpx.AsyncClient(base_url=base) as client:
+            session_ids = []
+            for robot_id in fleet.ids[:args.streams]:
+                response = await client.post("/api/execute", json={"robot_id": robot_id, "command_index": LOG_STREAM})
+                response.raise_for_status()
+                session_ids.append(response.json()["session_id"])
+            result = await measure(args, client, backend.pid, session_ids)
+            for session_id in session_ids:
+                await client.delete(f"/api/sessions/{session_id}")
+    finally:
+        backend.terminate()
+        backend.wait()
+
+    label = "1 process" if workers == 1 else f"{workers} workers"
+    dropped = sum(1 for code in result["codes"] if code == 1013)
+    failed = sum(1 for code in result["codes"] if code not in (None, 1000, 1013))
+    cpu = result["cpu"]
+    print(f"{label:>24}: {result['received'] / result['wall'] / 1e6:6.2f} of {result['offered'] / result['wall'] / 1e6:.2f} "
+          f"MB/s to {args.viewers} viewers "
+          f"({dropped} dropped, {failed} failed), frame age p50 {pct(result['ages'], 0.5):6.1f} ms "
+          f"p99 {pct(result['ages'], 0.99):7.1f} ms")
+    for path, samples in result["times"].items():
+        print(f"{'':>24}  {path:<14} p50 {pct(samples, 0.5):6.1f} ms, p99 {pct(samples, 0.99):7.1f} ms")
+    workers_cpu = ", ".join(f"{c * 100:.0f}%" for c in cpu[1:])
+    print(f"{'':>24}  cpu: primary {cpu[0] * 100:.0f}%" + (f", workers {workers_cpu}" if workers_cpu else ""))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--workers", default="1,2,4", help="worker counts to compare; 1 is a single process")
+    parser.add_argument("--viewers", type=int, default=300)
+    parser.add_argument("--streams", type=int, default=4, help="log stream sessions the viewers watch")
+    parser.add_argument("--rate", type=int, default=50_000, help="bytes per second per stream")
+    parser.add_argument("--clients", type=int, default=2, help="processes the viewers run in")
+    parser.add_argument("--warmup", type=float, default=5.0, help="seconds for the viewers to connect")
+    parser.add_argument("--seconds", type=float, default=10.0)
+    args = parser.parse_args()
+
+    print(f"{'cpus':>24}: {os.cpu_count()}, {args.streams} streams at {args.rate / 1e3:.0f} kB/s, "
+          f"{args.viewers} viewers")
+    with FakeFleet(robots=args.streams, rate=args.rate, latency=0.0, loss=0.0, hung=0, bag_mb=1) as fleet:
+        for workers in (int(n) for n in args.workers.split(",")):
+            asyncio.run(run_mode(args, fleet, workers))
+
+
+if __name__ == "__main__":
+    main()
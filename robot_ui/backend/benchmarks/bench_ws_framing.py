@@ -0,0 +1,183 @@
+"""
+Terminal websocket framing benchmark.
+
+Runs the backend under uvicorn in a child process, starts a session whose
+command floods N MB of timestamped UTF-8 lines into its PTY, and reads it over
+a real websocket with each /ws/terminal protocol: the text protocol (one text
+message per chunk), the binary protocol without coalescing, with the default
+16 ms / 64 KB coalescing, and with deflate on top. Reports throughput,
+messages and bytes on the wire, the server's CPU time, line latency from the
+producer's write() to the client, and whether every multibyte character
+arrived intact (and every line arrived).
+
+Usage:
+    python3 benchmarks/bench_ws_framing.py [--mb 50]
+"""
+import os
+import sys
+import time
+import socket
+import asyncio
+import logging
+import argparse
+import multiprocessing
+
+import httpx
+import websockets
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+from terminal_protocol import decode_frames, FRAME_DATA  # noqa: E402
+
+# Child process: waits for one line on stdin (the client is attached), then
+# writes timestamped lines with multibyte characters until TOTAL bytes are out
+PRODUCER = r"""
+import sys, time
+total = int(sys.argv[1])
+sys.stdin.readline()
+out = sys.stdout.buffer
+written = 0
+step = 0
+while written < total:
+    lines = []
+    for _ in range(64):
+        step += 1
+        lines.append(("%020d Processing step %d ✓ héllo wörld ✓\n" % (time.monotonic_ns(), step)).encode())
+    block = b"".join(lines)
+    out.write(block)
+    out.flush()
+    written += len(block)
+"""
+
+TS_LEN = 20
+MODES = [
+    ("text, per chunk", "proto=text"),
+    ("binary, no batching", "proto=bin&batch_ms=0"),
+    ("binary, 16 ms batches", "proto=bin"),
+    ("binary, 16 ms + deflate", "proto=bin&deflate=true"),
+]
+
+
+def serve(port: int):
+    import uvicorn
+    from fastapi import HTTPException
+    from robots_config import RobotCommand
+    import main
+
+    logging.getLogger("robot_ui_backend").setLevel(logging.WARNING)
+
+    @main.app.post("/bench/start")
+    async def start(total: int):
+        command = RobotCommand(label="flood", command_args=[sys.executable, "-c", PRODUCER, str(total)])
+        try:
+            session = main.sessions.start("bench", command)
+        except Exception as e:
+            raise HTTPException(500, str(e))
+        # Echo off, so the "go" line isn't mixed into the output
+        os.system(f"stty -echo -F /proc/{session.process.pid}/fd/0 2>/dev/null")
+        return {"session_id": session.id}
+
+    uvicorn.run(main.app, host="127.0.0.1", port=port, log_level="warning", ws_per_message_deflate=False)
+
+
+def cpu_seconds(pid: int) -> float:
+    with open(f"/proc/{pid}/stat") as f:
+        fields = f.read().rsplit(")", 1)[1].split()
+    return (int(fields[11]) + int(fields[12])) / os.sysconf("SC_CLK_TCK")
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def first_stamp(text: str):
+    nl = text.find("\n")
+    if nl != -1 and len(text) > nl + TS_LEN and text[nl + 1:nl + 1 + TS_LEN].isdigit():
+        return int(text[nl + 1:nl + 1 + TS_LEN])
+    return None
+
+
+async def run_mode(base: str, query: str, total: int, server_pid: int) -> dict:
+    async with httpx.AsyncClient(base_url=f"http://{base}") as client:
+        session_id = (await client.post("/bench/start", params={"total": total})).json()["session_id"]
+
+    binary = "proto=bin" in query
+    wire_bytes = messages = 0
+    latencies = []
+    received = bytearray()
+    text_parts = []
+    cpu_before = cpu_seconds(server_pid)
+    async with websockets.connect(f"ws://{base}/ws/terminal/{session_id}?{query}",
+                                  compression=None, max_size=None) as ws:
+        await ws.send(b"go\n" if binary else "go\n")
+        started = time.perf_counter()
+        async for message in ws:
+            now = time.monotonic_ns()
+            messages += 1
+            wire_bytes += len(message) if binary else len(message.encode())
+            if binary:
+                for frame_type, _, _, _, _, payload in decode_frames(message):
+                    if frame_type == FRAME_DATA:
+                        received += payload
+                        stamp = first_stamp(payload[:200].decode("utf-8", errors="replace"))
+                        if stamp:
+                            latencies.append(now - stamp)
+            else:
+                text_parts.append(message)
+                stamp = first_stamp(message[:200])
+                if stamp:
+                    latencies.append(now - stamp)
+        elapsed = time.perf_counter() - started
+    cpu = cpu_seconds(server_pid) - cpu_before
+
+    text = received.decode("utf-8", errors="replace") if binary else "".join(text_parts)
+    latencies.sort()
+    return {
+        "elapsed": elapsed,
+        "payload_mb": len(text.encode()) / 1e6,
+        "wire_mb": wire_bytes / 1e6,
+        "messages": messages,
+        "cpu": cpu,
+        "p50": latencies[len(latencies) // 2] / 1e6 if latencies else 0.0,
+        "p99": latencies[int(len(latencies) * 0.99)] / 1e6 if latencies else 0.0,
+        "lines": text.count("Processing step"),
+        "intact": "�" not in text and text.count("✓") == 2 * text.count("Processing step"),
+    }
+
+
+async def run(args, port: int, server_pid: int):
+    base = f"127.0.0.1:{port}"
+    total = args.mb * 1_000_000
+    print(f"{args.mb} MB of UTF-8 lines through a PTY and a real websocket")
+    for name, query in MODES:
+        r = await run_mode(base, query, total, server_pid)
+        print(f"{name:>24}: {r['payload_mb'] / r['elapsed']:6.1f} MB/s  {r['messages']:7d} msgs  "
+              f"wire {r['wire_mb']:6.1f} MB  server cpu {r['cpu']:5.2f}s  "
+              f"p50 {r['p50']:6.2f} ms  p99 {r['p99']:6.2f} ms  {r['lines']} lines, utf-8 {'ok' if r['intact'] else 'CORRUPTED'}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--mb", type=int, default=50)
+    args = parser.parse_args()
+
+    port = free_port()
+    server = multiprocessing.Process(target=serve, args=(port,), daemon=True)
+    server.start()
+    for _ in range(100):
+        try:
+            httpx.get(f"http://127.0.0.1:{port}/health")
+            break
+        except httpx.HTTPError:
+            time.sleep(0.1)
+    try:
+        asyncio.run(run(args, port, server.pid))
+    finally:
+        server.terminate()
+
+
+if __name__ == "__main__":
+    main()
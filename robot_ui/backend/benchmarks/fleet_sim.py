@@ -0,0 +1,363 @@
+"""
+Simulated robot fleet shared by the end-to-end benchmarks.
+
+A ``FakeFleet`` writes a robots file with --robots fake robot types (sim01,
+sim02, ...), each with these commands:
+
+    0 "Log stream"    scripts/fake_robot.py stream at the robot's output rate
+    1 "Raw odom"      scripts/fake_rostopic.py /raw_odom as a telemetry command
+    2 "Teleop"        scripts/fake_teleop.py as a teleop command
+    3 "Hung process"  scripts/fake_robot.py hang, which ignores SIGINT and SIGTERM
+
+and validation through ``fake_robot.py validate``. Every robot gets its own
+link latency and loss, drawn around the fleet's, and the first ``hung`` robots
+hang instead of validating. A child process serves a bag file for every robot
+over HTTP with range support (``/<robot>/<robot>.bag``), answering after the
+robot's latency and dropping connections at random like a flaky Wi-Fi link.
+
+Run on its own to point the UI at a fake fleet:
+    python3 benchmarks/fleet_sim.py --robots 20 --port 8000
+"""
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import socket
+import struct
+import argparse
+import tempfile
+import subprocess
+import multiprocessing
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Optional
+
+import httpx
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+from robots_config import SCRIPTS_DIR  # noqa: E402
+
+# Command indexes of every fake robot
+LOG_STREAM, RAW_ODOM, TELEOP, HUNG = range(4)
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def serve_bags(path: str, latency: Dict[str, float], drop_per_byte: float, ports):
+    """HTTP range server for the fleet's bags; runs in its own process."""
+    size = os.path.getsize(path)
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, *args):
+            pass
+
+        def _robot(self) -> Optional[str]:
+            parts = self.path.strip("/").split("/")
+            if len(parts) != 2 or parts[0] not in latency:
+                self.send_error(404)
+                return None
+            time.sleep(latency[parts[0]])
+            return parts[0]
+
+        def do_HEAD(self):
+            if self._robot() is None:
+                return
+            self.send_response(200)
+            self.send_header("Accept-Ranges", "bytes")
+            self.send_header("Content-Length", str(size))
+            self.end_headers()
+
+        def do_GET(self):
+            if self._robot() is None:
+                return
+            start, end = 0, size - 1
+            header = self.headers.get("Range")
+            if header:
+                first, _, last = header.split("=", 1)[1].partition("-")
+                start, end = int(first), int(last or size - 1)
+                self.send_response(206)
+                self.send_header("Content-Range", f"bytes {start}-{end}/{size}")
+            else:
+                self.send_response(200)
+            self.send_header("Content-Length", str(end - start + 1))
+            self.end_headers()
+            # Each connection dies after an exponentially distributed byte count
+            budget = random.expovariate(drop_per_byte) if drop_per_byte else float("inf")
+            sent = 0
+            with open(path, "rb") as f:
+                f.seek(start)
+                remaining = end - start + 1
+                while remaining:
+                    data = f.read(min(65536, remaining))
+                    if sent + len(data) > budget:
+                        self.wfile.write(data[:int(budget - sent)])
+                        self.close_connection = True
+                        self.connection.shutdown(2)
+                        return
+                    self.wfile.write(data)
+                    sent += len(data)
+                    remaining -= len(data)
+
+    class Server(ThreadingHTTPServer):
+        daemon_threads = True
+
+        def handle_error(self, request, client_address):
+            # Clients abandoning a dropped range are expected here
+            pass
+
+    server = Server(("127.0.0.1", 0), Handler)
+    ports.put(server.server_address[1])
+    server.serve_forever()
+
+
+def _bag_record(fields: Dict[str, bytes], data_len: int) -> bytes:
+    header = b"".join(struct.pack("<I", len(k) + 1 + len(v)) + k.encode() + b"=" + v for k, v in fields.items())
+    return struct.pack("<I", len(header)) + header + struct.pack("<I", data_len)
+
+
+def _bag_time(t: float) -> bytes:
+    return struct.pack("<II", int(t), int(round((t - int(t)) * 1e9)) % 1_000_000_000)
+
+
+BAG_TOPICS = [("/raw_odom", "nav_msgs/Odometry"), ("/error_code", "std_msgs/String"),
+              ("/camera/image_raw/compressed", "sensor_msgs/CompressedImage")]
+CAMERA = 2
+
+
+def write_bag(path: str, start: float, duration: float, size: int = 0, hz: float = 1.0, chunk_s: float = 60.0,
+              active: bool = False):
+    """
+    A rosbag v2.0 file like the robots' roslogger bags: uncompressed chunks of
+    ``chunk_s`` seconds with ``hz`` messages per second on each of BAG_TOPICS,
+    and the index at the end. Camera frames make up ``size`` bytes in all, as
+    holes in a sparse file, so big bags cost no disk. ``active`` leaves it
+    unindexed, as ``rosbag record`` does while it is still writing.
+    """
+    conns = [_bag_record({"op": b"\x07", "conn": struct.pack("<I", n), "topic": topic.encode()}, 0)
+             for n, (topic, _) in enumerate(BAG_TOPICS)]
+    conn_data = []
+    for topic, msg_type in BAG_TOPICS:
+        data = b"".join(struct.pack("<I", len(f)) + f for f in (
+            b"topic=" + topic.encode(), b"type=" + msg_type.encode(), b"md5sum=" + b"0" * 32,
+            b"message_definition=# " + msg_type.encode()))
+        conn_data.append(data)
+    chunk_count = max(1, int(duration // chunk_s))
+    frames = chunk_count * max(1, int(chunk_s * hz))
+    frame_size = max(0, size // frames - 64) if size else 16
+    chunk_infos = []
+    with open(path, "wb") as f:
+        f.write(b"#ROSBAG V2.0\n")
+        header_at = f.tell()
+        f.seek(header_at + 4096)
+        for c in range(chunk_count):
+            chunk_start = start + c * duration / chunk_count
+            times = [chunk_start + i / hz for i in range(max(1, int(chunk_s * hz)))]
+            # The chunk's contents, less the holes: (offset in body, length) each
+            body = bytearray()
+            holes = []
+            hole_bytes = 0
+            index = {n: [] for n in range(len(BAG_TOPICS))}
+            if c == 0:
+                for n, record in enumerate(conns):
+                    body += record[:-4] + struct.pack("<I", len(conn_data[n])) + conn_data[n]
+            for t in times:
+                for n in range(len(BAG_TOPICS)):
+                    index[n].append((t, len(body) + hole_bytes))
+                    length = frame_size if n == CAMERA else 16
+                    body += _bag_record({"op": b"\x02", "conn": struct.pack("<I", n), "time": _bag_time(t)}, length)
+                    if n == CAMERA and size:
+                        holes.append((len(body), length))
+                        hole_bytes += length
+                    else:
+                        body += bytes(length)
+            chunk_pos = f.tell()
+            total = len(body) + hole_bytes
+            f.write(_bag_record({"op": b"\x05", "compression": b"none", "size": struct.pack("<I", total)}, total))
+            written = 0
+            for at, length in holes:
+                f.write(body[written:at])
+                f.seek(length, 1)
+                written = at
+            f.write(body[written:])
+            for n, entries in index.items():
+                data = b"".join(_bag_time(t) + struct.pack("<I", offset) for t, offset in entries)
+                f.write(_bag_record({"op": b"\x04", "ver": struct.pack("<I", 1), "conn": struct.pack("<I", n),
+                                     "count": struct.pack("<I", len(entries))}, len(data)) + data)
+            chunk_infos.append((chunk_pos, times[0], times[-1], len(times)))
+        index_pos = 0
+        if not active:
+            index_pos = f.tell()
+            for n, record in enumerate(conns):
+                f.write(record[:-4] + struct.pack("<I", len(conn_data[n])) + conn_data[n])
+            for chunk_pos, first, last, count in chunk_infos:
+                data = b"".join(struct.pack("<II", n, count) for n in range(len(BAG_TOPICS)))
+                f.write(_bag_record({"op": b"\x06", "ver": struct.pack("<I", 1), "chunk_pos": struct.pack("<Q", chunk_pos),
+                                     "start_time": _bag_time(first), "end_time": _bag_time(last),
+                                     "count": struct.pack("<I", len(BAG_TOPICS))}, len(data)) + data)
+        f.truncate()
+        header = _bag_record({"op": b"\x03", "index_pos": struct.pack("<Q", index_pos),
+                              "conn_count": struct.pack("<I", 0 if active else len(BAG_TOPICS)),
+                              "chunk_count": struct.pack("<I", 0 if active else chunk_count)}, 0)
+        padding = 4096 - len(header)
+        f.seek(header_at)
+        f.write(header[:-4] + struct.pack("<I", padding) + b" " * padding)
+    end = start + duration
+    os.utime(path, (end, end))
+
+
+class FakeFleet:
+    """A robots file and bag server for ``robots`` fake robots; use as a context manager."""
+
+    def __init__(self, robots: int = 20, rate: int = 100_000, latency: float = 0.05, loss: float = 0.01,
+                 hung: int = 1, bag_mb: int = 16, drops_per_gb: float = 20.0, odom_hz: float = 50.0,
+                 seed: int = 1):
+        self.robots = robots
+        self.rate = rate
+        self.latency = latency
+        self.loss = loss
+        self.hung = min(hung, robots)
+        self.bag_mb = bag_mb
+        self.drops_per_gb = drops_per_gb
+        self.odom_hz = odom_hz
+        rng = random.Random(seed)
+        self.ids = [f"sim{n:02d}" for n in range(1, robots + 1)]
+        # Per robot: latency and loss spread around the fleet's, like robots
+        # near and far from the access points
+        self.links = {
+            robot_id: (round(latency * rng.uniform(0.5, 2.0), 4), round(loss * rng.uniform(0.0, 2.0), 4))
+            for robot_id in self.ids
+        }
+        self.workdir: Optional[str] = None
+        self.robots_file: Optional[str] = None
+        self.bag_path: Optional[str] = None
+        self.bag_url: Optional[str] = None
+        self._server: Optional[multiprocessing.Process] = None
+
+    def config(self) -> dict:
+        fake_robot = os.path.join(SCRIPTS_DIR, "fake_robot.py")
+        robots = []
+        for n, robot_id in enumerate(self.ids):
+            latency, loss = self.links[robot_id]
+            link = [fake_robot, "--latency", str(latency), "--loss", str(loss), "--seed", str(n)]
+            validation = link + (["hang"] if n < self.hung else ["validate", robot_id])
+            robots.append({
+                "id": robot_id, "name": robot_id.capitalize(), "image_key": robot_id,
+                "validation_script": validation,
+                "commands": [
+                    {"label": "Log stream", "command_args": link + ["stream", str(self.rate)]},
+                    {"label": "Raw odom",
+                     "command_args": [os.path.join(SCRIPTS_DIR, "fake_rostopic.py"), "/raw_odom", str(self.odom_hz)],
+                     "telemetry": {"interval_ms": 100, "fields": ["pose", "twist"], "topic": "raw_odom",
+                                   "series": ["pose.pose.position.x", "twist.twist.linear.x"]}},
+                    {"label": "Teleop", "command_args": [os.path.join(SCRIPTS_DIR, "fake_teleop.py")],
+                     "teleop": {"ack": "currently:"}},
+                    {"label": "Hung process", "command_args": link + ["hang"]},
+                ],
+            })
+        return {"robots": robots}
+
+    def bag_url_for(self, robot_id: str) -> str:
+        # Named after the robot so downloads land in distinct files
+        return f"{self.bag_url}/{robot_id}/{robot_id}.bag"
+
+    def start(self):
+        self.workdir = tempfile.mkdtemp(prefix="fleet-sim-")
+        self.robots_file = os.path.join(self.workdir, "robots.json")
+        with open(self.robots_file, "w") as f:
+            json.dump(self.config(), f, indent=1)
+        self.bag_path = os.path.join(self.workdir, "sim.bag")
+        with open(self.bag_path, "wb") as f:
+            for _ in range(self.bag_mb):
+                f.write(os.urandom(1_000_000))
+        ports = multiprocessing.Queue()
+        latencies = {robot_id: link[0] for robot_id, link in self.links.items()}
+        self._server = multiprocessing.Process(
+            target=serve_bags, args=(self.bag_path, latencies, self.drops_per_gb / 1e9, ports), daemon=True)
+        self._server.start()
+        self.bag_url = f"http://127.0.0.1:{ports.get(timeout=10)}"
+        return self
+
+    def stop(self):
+        if self._server:
+            self._server.terminate()
+            self._server.join()
+            self._server = None
+        if self.workdir:
+            shutil.rmtree(self.workdir, ignore_errors=True)
+            self.workdir = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+def start_backend(fleet: FakeFleet, port: int, env: Optional[dict] = None,
+                  workers: Optional[int] = None) -> subprocess.Popen:
+    """
+    The backend under uvicorn, serving the fleet's robots file; with
+    ``workers``, under ``serve.py --workers`` instead.
+    """
+    # No real robots to probe for reachability
+    env = dict(os.environ, ROBOT_UI_ROBOTS_FILE=fleet.robots_file, ROBOT_UI_RECORD="0", ROBOT_UI_ROBOTS="",
+               ROBOT_UI_DOWNLOAD_DIR=os.path.join(fleet.workdir, "downloads"),
+               ROBOT_UI_BAG_CATALOG=os.path.join(fleet.workdir, "bag_catalog.sqlite3"), **(env or {}))
+    if workers:
+        argv = [sys.executable, "serve.py", "--host", "127.0.0.1", "--port", str(port), "--workers", str(workers),
+                "--no-access-log"]
+    else:
+        argv = [sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1", "--port", str(port),
+                "--log-level", "warning"]
+    return subprocess.Popen(argv, cwd=BACKEND_DIR, env=env)
+
+
+def wait_ready(base: str, timeout: float = 30.0):
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            httpx.get(f"{base}/health").raise_for_status()
+            return
+        except httpx.HTTPError:
+            if time.monotonic() > deadline:
+                raise
+            time.sleep(0.1)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--robots", type=int, default=20)
+    parser.add_argument("--rate", type=int, default=100_000, help="log stream bytes per second per robot")
+    parser.add_argument("--latency", type=float, default=0.05, help="mean link latency in seconds")
+    parser.add_argument("--loss", type=float, default=0.01, help="mean chance of a stall per 100 ms")
+    parser.add_argument("--hung", type=int, default=1, help="robots whose validation hangs")
+    parser.add_argument("--bag-mb", type=int, default=16)
+    parser.add_argument("--port", type=int, default=8000)
+    args = parser.parse_args()
+
+    with FakeFleet(args.robots, args.rate, args.latency, args.loss, args.hung, args.bag_mb) as fleet:
+        backend = start_backend(fleet, args.port)
+        try:
+            base = f"http://127.0.0.1:{args.port}"
+            wait_ready(base)
+            print(f"{args.robots} fake robots on {base}, robots file {fleet.robots_file}")
+            print(f"bags: {fleet.bag_url_for(fleet.ids[0])} (POST /api/downloads with that url)")
+            backend.wait()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            backend.terminate()
+            backend.wait()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+"""
+Concurrent session load test.
+
+Starts N sessions through the SessionManager, one per robot, each printing
+lines tagged with its own token. Every session gets a subscriber, and the test
+fails if any subscriber sees a line that belongs to another session.
+
+Usage:
+    python3 benchmarks/load_sessions.py [--sessions 50] [--lines 2000]
+"""
+import os
+import sys
+import time
+import asyncio
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from robots_config import RobotCommand  # noqa: E402
+from sessions import SessionManager  # noqa: E402
+
+PRODUCER = r"""
+import sys
+token, lines = sys.argv[1], int(sys.argv[2])
+for i in range(lines):
+    print(f"{token} Processing step {i + 1}/{lines}...", flush=(i % 50 == 0))
+"""
+
+
+async def collect(session) -> bytes:
+    _, backlog, subscriber = session.subscribe()
+    parts = [backlog]
+    while True:
+        data = await subscriber.get()
+        if data is None:
+            break
+        parts.append(data)
+    session.unsubscribe(subscriber)
+    return b"".join(parts)
+
+
+async def run(n_sessions: int, n_lines: int):
+    manager = SessionManager(max_sessions=n_sessions)
+    tokens = [f"SESSION-{i:03d}" for i in range(n_sessions)]
+
+    start = time.perf_counter()
+    running = []
+    for i, token in enumerate(tokens):
+        cmd = RobotCommand(
+            label=token,
+            command_args=[sys.executable, "-c", PRODUCER, token, str(n_lines)],
+        )
+        running.append(manager.start(f"robot-{i}", cmd))
+
+    outputs = await asyncio.gather(*(collect(s) for s in running))
+    elapsed = time.perf_counter() - start
+
+    total_bytes = 0
+    failures = 0
+    for token, output in zip(tokens, outputs):
+        total_bytes += len(output)
+        lines = [l for l in output.decode().splitlines() if l.strip()]
+        foreign = [l for l in lines if not l.startswith(token)]
+        if foreign or len(lines) != n_lines:
+            failures += 1
+            print(f"{token}: {len(lines)} lines, {len(foreign)} foreign, e.g. {foreign[:1]}")
+
+    print(
+        f"{n_sessions} sessions x {n_lines} lines: {total_bytes / 1e6:.1f} MB in {elapsed:.2f}s "
+        f"({total_bytes / 1e6 / elapsed:.1f} MB/s aggregate), cross-talk failures: {failures}"
+    )
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--sessions", type=int, default=50)
+    parser.add_argument("--lines", type=int, default=2000)
+    args = parser.parse_args()
+    failures = asyncio.run(run(args.sessions, args.lines))
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
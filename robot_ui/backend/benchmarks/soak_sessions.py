@@ -0,0 +1,115 @@
+"""
+Session start/stop soak test.
+
+Runs N start/stop cycles through the SessionManager, C at a time. Commands
+rotate through ones that stop on SIGINT, ignore SIGINT, ignore SIGINT and
+SIGTERM, exit by themselves, and leave a background child holding the PTY.
+Each running command is stopped with the supervisor's escalation ladder
+(shortened graces). Reports cycles per second, which rung stopped how many,
+peak open fds while running, and fails if fds, PTY masters, zombies or
+surviving processes are left at the end.
+
+Usage:
+    python3 benchmarks/soak_sessions.py [--cycles 10000] [--concurrency 32]
+"""
+import os
+import sys
+import time
+import signal
+import asyncio
+import logging
+import argparse
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+from robots_config import RobotCommand  # noqa: E402
+from sessions import SessionManager  # noqa: E402
+from supervisor import group_alive, process_counts  # noqa: E402
+
+# Each prints "ready" once its traps are set, so the stop can't race them
+COMMANDS = [
+    ("stops on SIGINT", "echo ready; exec sleep 30"),
+    ("ignores SIGINT", "trap '' INT; echo ready; sleep 30"),
+    ("ignores INT+TERM", "trap '' INT TERM; echo ready; while :; do sleep 0.05; done"),
+    ("exits by itself", "echo ready; exit 3"),
+    ("leaves a child on the PTY", "sleep 30 & echo ready; exit 0"),
+]
+
+LADDER = ((signal.SIGINT, 0.2), (signal.SIGTERM, 0.2), (signal.SIGKILL, 2.0))
+
+
+async def cycle(manager: SessionManager, robot: str, kind: int) -> int:
+    label, script = COMMANDS[kind]
+    session = manager.start(robot, RobotCommand(label=label, command_args=["bash", "-c", script]))
+    _, backlog, subscriber = session.subscribe()
+    output = backlog
+    while b"ready" not in output:
+        data = await subscriber.get()
+        if data is None:
+            break
+        output += data
+    session.unsubscribe(subscriber)
+    await session.stop(LADDER)
+    assert not session.running and session.master_fd is None, label
+    return session.process.pid
+
+
+async def sample(peaks: dict, stop: asyncio.Event):
+    while not stop.is_set():
+        for key, value in process_counts().items():
+            peaks[key] = max(peaks.get(key, 0), value)
+        try:
+            await asyncio.wait_for(stop.wait(), 1.0)
+        except asyncio.TimeoutError:
+            pass
+
+
+async def run(args):
+    manager = SessionManager(max_sessions=args.concurrency)
+    before = process_counts()
+    counter = iter(range(args.cycles))
+    pgids = []
+
+    async def worker(n: int):
+        for i in counter:
+            pgids.append(await cycle(manager, f"soak-{n}", i % len(COMMANDS)))
+
+    peaks = {}
+    stop = asyncio.Event()
+    sampler = asyncio.create_task(sample(peaks, stop))
+    started = time.perf_counter()
+    await asyncio.gather(*(worker(n) for n in range(args.concurrency)))
+    elapsed = time.perf_counter() - started
+    stop.set()
+    await sampler
+
+    after = process_counts()
+    survivors = sum(1 for pgid in pgids if group_alive(pgid))
+    stats = manager.supervisor.stats()
+    print(f"{args.cycles} start/stop cycles, {args.concurrency} at a time, over {len(COMMANDS)} kinds of command")
+    print(f"{'throughput':>16}: {args.cycles / elapsed:7.0f} cycles/s ({elapsed:.1f} s)")
+    print(f"{'stopped by':>16}: " + ", ".join(f"{k} {v}" for k, v in sorted(stats['stopped_by'].items()))
+          + f", already exited {args.cycles - sum(stats['stopped_by'].values())}")
+    print(f"{'reaped':>16}: {stats['reaped']}/{stats['started']} via {stats['reaper']}")
+    print(f"{'peak while busy':>16}: {peaks.get('open_fds')} fds, {peaks.get('pty_masters')} PTY masters, "
+          f"{peaks.get('zombies')} zombies")
+    leaks = {key: after[key] - before[key] for key in before}
+    print(f"{'left at the end':>16}: " + ", ".join(f"{k} {v:+d}" for k, v in leaks.items())
+          + f", {survivors} surviving process groups")
+    ok = not any(leaks.values()) and not survivors and stats["children"] == 0
+    print("OK" if ok else "LEAK")
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--cycles", type=int, default=10000)
+    parser.add_argument("--concurrency", type=int, default=32)
+    args = parser.parse_args()
+    logging.getLogger("robot_ui_backend").setLevel(logging.WARNING)
+    sys.exit(0 if asyncio.run(run(args)) else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+"""
+Local sshd stand-in shared by the SSH benchmarks.
+
+An asyncssh server in a child process that accepts any user with a generated
+key and runs exec requests with /bin/sh. It listens on 0.0.0.0, so
+127.0.0.1-127.0.0.254 all reach it and can play distinct robots.
+
+Requires ``pip install asyncssh``.
+"""
+import os
+import sys
+import asyncio
+import tempfile
+import multiprocessing
+from typing import Tuple
+
+try:
+    import asyncssh
+except ImportError:
+    sys.exit("The SSH benchmarks need asyncssh for their local sshd stand-in: pip install asyncssh")
+
+
+class StandInServer(asyncssh.SSHServer):
+    """Accepts any user with the benchmark key; optional delay per auth."""
+
+    def __init__(self, rtt: float):
+        self.rtt = rtt
+
+    def begin_auth(self, username):
+        return True
+
+    async def validate_public_key(self, username, key):
+        # Stand-in for the extra round trips of a handshake over the network
+        await asyncio.sleep(self.rtt * 3)
+        return True
+
+    def public_key_auth_supported(self):
+        return True
+
+
+async def handle_process(process):
+    proc = await asyncio.create_subprocess_shell(
+        process.command or "true",
+        stdout=asyncio.subprocess.PIPE,
+        stderr=asyncio.subprocess.STDOUT,
+    )
+    while True:
+        data = await proc.stdout.read(65536)
+        if not data:
+            break
+        process.stdout.write(data)
+    process.exit(await proc.wait())
+
+
+def _serve(rtt: float, ports):
+    async def main():
+        server = await asyncssh.create_server(
+            lambda: StandInServer(rtt), "0.0.0.0", 0,
+            server_host_keys=[asyncssh.generate_private_key("ssh-ed25519")],
+            process_factory=handle_process,
+            encoding=None,
+        )
+        ports.put(server.sockets[0].getsockname()[1])
+        await server.wait_closed()
+    asyncio.run(main())
+
+
+def start_standin(rtt: float = 0.0) -> Tuple[multiprocessing.Process, int, str]:
+    """
+    Start the server in its own process, so it doesn't share the client's
+    event loop. Returns (process, port, client key file).
+    """
+    key_file = os.path.join(tempfile.mkdtemp(prefix="bench-ssh-"), "id_ed25519")
+    asyncssh.generate_private_key("ssh-ed25519").write_private_key(key_file)
+    os.chmod(key_file, 0o600)
+
+    ports = multiprocessing.Queue()
+    server = multiprocessing.Process(target=_serve, args=(rtt, ports), daemon=True)
+    server.start()
+    return server, ports.get(timeout=10), key_file
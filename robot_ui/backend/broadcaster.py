@@ -0,0 +1,203 @@
+"""
+Fan-out of one PTY's output to many viewers.
+
+A single task reads the PTY, appends each chunk to the session's ring buffer and
+hands it to every subscriber's bounded queue, so N viewers still cost one read.
+Publishing never blocks: a subscriber that falls more than ``max_pending`` bytes
+behind is handled by its slow-consumer policy instead of stalling the reader,
+the robot process or the other viewers.
+"""
+import time
+import asyncio
+import logging
+from collections import deque
+from typing import Callable, Deque, Optional, Set, Tuple
+
+from ring_buffer import OutputRing
+
+logger = logging.getLogger("robot_ui_backend")
+
+# Default bytes a subscriber may have queued before its policy kicks in
+SUBSCRIBER_MAX_PENDING = 262144
+
+# Slow-consumer policies
+POLICY_DROP = "drop"          # close the subscriber; it can resume from the ring with ?since=
+POLICY_COALESCE = "coalesce"  # keep only the newest max_pending bytes
+
+
+class Subscriber:
+    """Bounded queue of output chunks for one viewer."""
+
+    def __init__(self, offset: int, max_pending: int = SUBSCRIBER_MAX_PENDING, policy: str = POLICY_DROP):
+        if policy not in (POLICY_DROP, POLICY_COALESCE):
+            raise ValueError(f"Unknown slow-consumer policy: {policy}")
+        self.max_pending = max_pending
+        self.policy = policy
+        # Absolute stream offset of the next byte get() will return
+        self.offset = offset
+        self.skipped = 0
+        # Bytes handed out by get(), i.e. sent on to the viewer
+        self.delivered = 0
+        self.closed = False
+        self.overflowed = False
+
+        self._chunks: Deque[bytes] = deque()
+        self._pending = 0
+        self._waiter: Optional[asyncio.Future] = None
+
+    @property
+    def pending(self) -> int:
+        return self._pending
+
+    def publish(self, data: bytes):
+        if self.closed:
+            return
+        self._chunks.append(data)
+        self._pending += len(data)
+        if self._pending > self.max_pending:
+            if self.policy == POLICY_DROP:
+                self.overflowed = True
+                self._chunks.clear()
+                self._pending = 0
+                self.close()
+                return
+            self._coalesce()
+        self._wake()
+
+    def _coalesce(self):
+        joined = b"".join(self._chunks)
+        keep = joined[-self.max_pending:]
+        dropped = len(joined) - len(keep)
+        self.skipped += dropped
+        self.offset += dropped
+        self._chunks.clear()
+        self._chunks.append(keep)
+        self._pending = len(keep)
+
+    def close(self):
+        self.closed = True
+        self._wake()
+
+    def _wake(self):
+        waiter = self._waiter
+        if waiter is not None and not waiter.done():
+            waiter.set_result(None)
+
+    async def get(self) -> Optional[bytes]:
+        """
+        Return everything queued so far as one chunk, waiting if nothing is
+        pending. Returns None once the stream ended or the subscriber was dropped.
+        """
+        while not self._chunks:
+            if self.closed:
+                return None
+            self._waiter = asyncio.get_running_loop().create_future()
+            try:
+                await self._waiter
+            finally:
+                self._waiter = None
+
+        data = self._chunks.popleft() if len(self._chunks) == 1 else b"".join(self._chunks)
+        self._chunks.clear()
+        self._pending = 0
+        self.offset += len(data)
+        self.delivered += len(data)
+        return data
+
+
+class Broadcaster:
+    """Single reader task per PTY publishing into a ring buffer and subscriber queues."""
+
+    def __init__(self, reader, ring: OutputRing):
+        # `reader` is anything with `async read() -> bytes` returning b"" at EOF:
+        # a PtyReader, or a TelemetryStream wrapped around one. It may be None
+        # when the owner calls publish() and finish() itself.
+        self.reader = reader
+        self.ring = ring
+        self.finished = False
+        self._subscribers: Set[Subscriber] = set()
+
+        # Reader-side cost, independent of the number of viewers
+        self.reads = 0
+        self.bytes_read = 0
+        self.publish_seconds = 0.0
+        # Backlogs plus everything unsubscribed viewers were handed
+        self.bytes_delivered = 0
+        # Called with every published chunk, e.g. a session's recorder
+        self.tap: Optional[Callable[[bytes], None]] = None
+
+    @property
+    def subscriber_count(self) -> int:
+        return len(self._subscribers)
+
+    def subscribe(
+        self,
+        since: Optional[int] = None,
+        max_pending: int = SUBSCRIBER_MAX_PENDING,
+        policy: str = POLICY_DROP,
+    ) -> Tuple[int, bytes, Subscriber]:
+        """
+        Return ``(offset, backlog, subscriber)``: the buffered output from
+        ``since`` (or the oldest retained byte) and a subscriber that receives
+        everything after it.
+        """
+        offset, backlog = self.ring.read_from(self.ring.start if since is None else since)
+        subscriber = Subscriber(offset + len(backlog), max_pending, policy)
+        self.bytes_delivered += len(backlog)
+        if self.finished:
+            subscriber.close()
+        else:
+            self._subscribers.add(subscriber)
+        return offset, backlog, subscriber
+
+    def unsubscribe(self, subscriber: Subscriber):
+        self._subscribers.discard(subscriber)
+        subscriber.close()
+        self.bytes_delivered += subscriber.delivered
+        subscriber.delivered = 0
+
+    def delivered(self) -> int:
+        """Bytes handed to viewers so far, including ones still attached."""
+        return self.bytes_delivered + sum(s.delivered for s in self._subscribers)
+
+    def queued(self) -> int:
+        """Bytes waiting in viewers' queues."""
+        return sum(s.pending for s in self._subscribers)
+
+    def publish(self, data: bytes):
+        started = time.perf_counter()
+        self.ring.append(data)
+        if self.tap:
+            self.tap(data)
+        for subscriber in tuple(self._subscribers):
+            subscriber.publish(data)
+            if subscriber.closed:
+                self._subscribers.discard(subscriber)
+        self.publish_seconds += time.perf_counter() - started
+
+    def drop_all(self):
+        """Close every subscriber as fallen behind, e.g. when the stream skipped ahead of them."""
+        for subscriber in self._subscribers:
+            subscriber.overflowed = True
+            subscriber.close()
+        self._subscribers.clear()
+
+    def finish(self):
+        """Mark the stream ended and close every subscriber."""
+        self.finished = True
+        for subscriber in self._subscribers:
+            subscriber.close()
+        self._subscribers.clear()
+
+    async def run(self):
+        """Read until EOF, then close every subscriber."""
+        try:
+            while True:
+                data = await self.reader.read()
+                if not data:
+                    break
+                self.reads += 1
+                self.bytes_read += len(data)
+                self.publish(data)
+        finally:
+            self.finish()
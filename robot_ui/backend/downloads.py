@@ -0,0 +1,505 @@
+"""
+Resumable, parallel-chunked bag downloads.
+
+``xvalidation.sh -D`` copies a bag with one ``scp`` per robot: a dropped Wi-Fi
+link restarts a multi-GB transfer from zero and robots are done one after the
+other. A ``Transfer`` instead splits the file into ``chunk_size`` ranges and
+fetches several at once, writing each straight into its place in a
+preallocated ``<dest>.part`` file with ``pwrite`` (in a worker thread, as is
+all other file I/O of a transfer). Every finished chunk's
+SHA-256 is recorded in a ``<dest>.part.json`` sidecar, so after a disconnect or
+a backend restart only missing (or corrupted) chunks are fetched again; a range
+interrupted mid-way retries from the last byte written. When the source can
+hash a range itself (SSH), each chunk is also checked against it.
+
+Sources are pluggable: ``SSHSource`` reads over the SSH pool with ``dd``,
+``HTTPSource`` uses HTTP range requests. Streams are capped per robot and
+overall.
+"""
+import os
+import json
+import time
+import uuid
+import shlex
+import asyncio
+import hashlib
+import logging
+from typing import TYPE_CHECKING, Awaitable, Callable, Dict, List, Optional
+
+from ssh_pool import SSHPool, SSHUnavailableError
+
+if TYPE_CHECKING:
+    # Imported by HTTPSource when first used; it is most of the backend's import time
+    import httpx
+
+logger = logging.getLogger("robot_ui_backend")
+
+# Where finished downloads go: <DOWNLOAD_DIR>/<robot number>/<file name>
+DOWNLOAD_DIR = os.environ.get(
+    "ROBOT_UI_DOWNLOAD_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "bags")
+)
+
+# Bytes per range request
+DOWNLOAD_CHUNK_SIZE = int(os.environ.get("ROBOT_UI_DOWNLOAD_CHUNK", str(8 * 1024 * 1024)))
+
+# Concurrent range streams per robot and across all transfers
+STREAMS_PER_ROBOT = int(os.environ.get("ROBOT_UI_DOWNLOAD_STREAMS_PER_ROBOT", "4"))
+MAX_STREAMS = int(os.environ.get("ROBOT_UI_DOWNLOAD_STREAMS", "16"))
+
+# Attempts per chunk before the transfer gives up (it can be resumed later)
+CHUNK_RETRIES = 6
+
+# Bytes per read from a source stream
+READ_SIZE = 262144
+
+# How long a finished transfer stays listed
+FINISHED_TRANSFER_TTL = 3600.0
+
+STATE_SUFFIX = ".part.json"
+PART_SUFFIX = ".part"
+
+# Transfer statuses
+STATUS_QUEUED = "queued"
+STATUS_RUNNING = "running"
+STATUS_DONE = "done"
+STATUS_FAILED = "failed"
+STATUS_CANCELLED = "cancelled"
+
+# Receives each block read from a source, in order
+Sink = Callable[[bytes], Awaitable[None]]
+
+
+class SourceError(Exception):
+    """A range could not be read completely; the chunk is retried."""
+
+
+class DestinationBusyError(Exception):
+    """Raised when another source is already being downloaded to the same file."""
+
+    def __init__(self, transfer_id: str):
+        super().__init__(f"Another download is writing to this file: {transfer_id}")
+        self.transfer_id = transfer_id
+
+
+class SSHSource:
+    """A file on a robot, read over its pooled SSH connection."""
+
+    def __init__(self, pool: SSHPool, host: str, path: str):
+        self.pool = pool
+        self.host = host
+        self.path = path
+        self.key = f"ssh://{host}{path}"
+
+    async def size(self) -> int:
+        try:
+            code, output = await self.pool.run(self.host, f"stat -c %s {shlex.quote(self.path)}", timeout=30)
+        except (SSHUnavailableError, asyncio.TimeoutError) as e:
+            raise SourceError(str(e) or "stat timed out") from e
+        if code != 0:
+            raise SourceError(output.decode(errors="replace").strip() or f"Cannot stat {self.path}")
+        return int(output.split()[0])
+
+    def _dd(self, offset: int, length: int) -> str:
+        return (
+            f"dd if={shlex.quote(self.path)} bs={READ_SIZE} skip={offset} count={length} "
+            "iflag=skip_bytes,count_bytes status=none"
+        )
+
+    async def read_range(self, offset: int, length: int, sink: Sink):
+        try:
+            async with self.pool.channel(self.host, self._dd(offset, length)) as proc:
+                while True:
+                    data = await proc.stdout.read(READ_SIZE)
+                    if not data:
+                        break
+                    await sink(data)
+                if await proc.wait() != 0:
+                    raise SourceError(f"dd exited with {proc.returncode}")
+        except SSHUnavailableError as e:
+            # The master dropped or can't be reached yet; the chunk is retried
+            raise SourceError(str(e)) from e
+
+    async def checksum(self, offset: int, length: int) -> Optional[str]:
+        try:
+            code, output = await self.pool.run(self.host, f"{self._dd(offset, length)} | sha256sum", timeout=120)
+        except (SSHUnavailableError, asyncio.TimeoutError) as e:
+            raise SourceError(str(e) or "Remote checksum timed out") from e
+        if code != 0:
+            raise SourceError("Remote checksum failed")
+        return output.split()[0].decode()
+
+    async def close(self):
+        pass
+
+
+class HTTPSource:
+    """A file served over HTTP with range support."""
+
+    # Bytes are written as they come off the wire, so they must be the file's
+    HEADERS = {"Accept-Encoding": "identity"}
+
+    def __init__(self, url: str, client: Optional["httpx.AsyncClient"] = None):
+        self.url = url
+        self.key = url
+        # Created on first use and closed with the transfer; a shared one isn't
+        self._client = client
+        self._owns_client = client is None
+
+    @property
+    def client(self) -> "httpx.AsyncClient":
+        if self._client is None:
+            import httpx
+
+            self._client = httpx.AsyncClient(timeout=httpx.Timeout(30.0, connect=10.0))
+        return self._client
+
+    async def size(self) -> int:
+        response = await self.client.head(self.url, headers=self.HEADERS)
+        response.raise_for_status()
+        if response.headers.get("accept-ranges") != "bytes":
+            raise SourceError("Server does not support range requests")
+        return int(response.headers["content-length"])
+
+    async def read_range(self, offset: int, length: int, sink: Sink):
+        import httpx
+
+        headers = dict(self.HEADERS, Range=f"bytes={offset}-{offset + length - 1}")
+        try:
+            async with self.client.stream("GET", self.url, headers=headers) as response:
+                if response.status_code != 206:
+                    raise SourceError(f"Expected 206, got {response.status_code}")
+                if response.headers.get("content-encoding", "identity") != "identity":
+                    raise SourceError(f"Server sent {response.headers['content-encoding']}-encoded data")
+                async for data in response.aiter_raw(READ_SIZE):
+                    await sink(data)
+        except httpx.HTTPError as e:
+            raise SourceError(str(e)) from e
+
+    async def checksum(self, offset: int, length: int) -> Optional[str]:
+        return None
+
+    async def close(self):
+        if self._owns_client and self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+
+class Transfer:
+    """One file fetched as parallel ranges into a preallocated partial file."""
+
+    def __init__(self, source, dest: str, robot: str, chunk_size: int = DOWNLOAD_CHUNK_SIZE,
+                 robot_streams: Optional[asyncio.Semaphore] = None,
+                 all_streams: Optional[asyncio.Semaphore] = None,
+                 verify: bool = True):
+        self.id = uuid.uuid4().hex
+        self.source = source
+        self.dest = dest
+        self.robot = robot
+        self.chunk_size = chunk_size
+        self.verify = verify
+        self.robot_streams = robot_streams or asyncio.Semaphore(STREAMS_PER_ROBOT)
+        self.all_streams = all_streams or asyncio.Semaphore(MAX_STREAMS)
+
+        self.status = STATUS_QUEUED
+        self.error: Optional[str] = None
+        self.size: Optional[int] = None
+        self.started_at = time.time()
+        self.finished_at: Optional[float] = None
+        # Bytes present at start (resumed) and fetched since
+        self.resumed_bytes = 0
+        self.fetched = 0
+        self.retries = 0
+        self.active_streams = 0
+        # sha256 of every finished chunk, and bytes so far of chunks in flight
+        self.chunks: Dict[int, str] = {}
+        self._inflight: Dict[int, int] = {}
+
+        self._fd: Optional[int] = None
+        # Sidecar writes run in threads; one at a time so the newest state lands last
+        self._state_lock = asyncio.Lock()
+        self._task: Optional[asyncio.Task] = None
+        self._rate_at = time.monotonic()
+        self._rate_bytes = 0
+        self.rate = 0.0
+
+    @property
+    def part_path(self) -> str:
+        return self.dest + PART_SUFFIX
+
+    @property
+    def state_path(self) -> str:
+        return self.dest + STATE_SUFFIX
+
+    @property
+    def chunk_count(self) -> int:
+        return -(-self.size // self.chunk_size) if self.size else 0
+
+    @property
+    def done_bytes(self) -> int:
+        if self.status == STATUS_DONE:
+            return self.size or 0
+        return sum(self._chunk_length(i) for i in self.chunks) + sum(self._inflight.values())
+
+    def _chunk_length(self, index: int) -> int:
+        return min(self.chunk_size, self.size - index * self.chunk_size)
+
+    def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    def cancel(self):
+        if self._task and not self._task.done():
+            self._task.cancel()
+
+    async def wait(self):
+        if self._task:
+            await asyncio.gather(self._task, return_exceptions=True)
+
+    def _load_state(self):
+        """
+        Reuse finished chunks from an earlier attempt if they still check out.
+        Hashes up to the whole partial file; runs in a thread.
+        """
+        try:
+            with open(self.state_path) as f:
+                state = json.load(f)
+        except (OSError, ValueError):
+            return
+        if (state.get("source") != self.source.key or state.get("size") != self.size
+                or state.get("chunk_size") != self.chunk_size):
+            logger.info(f"Ignoring stale download state for {self.dest}")
+            return
+        for index, digest in state.get("chunks", {}).items():
+            index = int(index)
+            data = os.pread(self._fd, self._chunk_length(index), index * self.chunk_size)
+            if hashlib.sha256(data).hexdigest() == digest:
+                self.chunks[index] = digest
+        self.resumed_bytes = self.done_bytes
+        logger.info(f"Resuming {self.dest}: {len(self.chunks)}/{self.chunk_count} chunks present")
+
+    def _open_part(self):
+        """Open the partial file, preallocating it unless it can be resumed; runs in a thread."""
+        os.makedirs(os.path.dirname(self.dest) or ".", exist_ok=True)
+        self._fd = os.open(self.part_path, os.O_RDWR | os.O_CREAT, 0o644)
+        if os.fstat(self._fd).st_size == self.size:
+            self._load_state()
+            return
+        os.ftruncate(self._fd, 0)
+        if self.size:
+            # Reserve the blocks up front; falls back to a sparse file
+            try:
+                os.posix_fallocate(self._fd, 0, self.size)
+            except OSError:
+                os.ftruncate(self._fd, self.size)
+
+    def _write_state(self, state: dict):
+        tmp = self.state_path + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump(state, f)
+        os.replace(tmp, self.state_path)
+
+    async def _save_state(self):
+        async with self._state_lock:
+            state = {
+                "source": self.source.key,
+                "size": self.size,
+                "chunk_size": self.chunk_size,
+                "chunks": {str(i): digest for i, digest in self.chunks.items()},
+            }
+            await asyncio.to_thread(self._write_state, state)
+
+    def _finish_part(self):
+        """Flush the partial file and move it into place; runs in a thread."""
+        os.fsync(self._fd)
+        os.close(self._fd)
+        self._fd = None
+        os.replace(self.part_path, self.dest)
+        if os.path.exists(self.state_path):
+            os.unlink(self.state_path)
+
+    def _count(self, n: int):
+        self.fetched += n
+        self._rate_bytes += n
+        now = time.monotonic()
+        if now - self._rate_at >= 1.0:
+            # Smoothed bytes per second over roughly the last few seconds
+            instant = self._rate_bytes / (now - self._rate_at)
+            self.rate = instant if not self.rate else 0.5 * self.rate + 0.5 * instant
+            self._rate_at, self._rate_bytes = now, 0
+
+    async def _fetch_chunk(self, index: int):
+        offset = index * self.chunk_size
+        length = self._chunk_length(index)
+        hasher = hashlib.sha256()
+        received = 0
+
+        def write(data: bytes, position: int):
+            os.pwrite(self._fd, data, position)
+            hasher.update(data)
+
+        async def sink(data: bytes):
+            nonlocal received
+            data = data[:length - received]
+            await asyncio.to_thread(write, data, offset + received)
+            received += len(data)
+            self._inflight[index] = received
+            self._count(len(data))
+
+        attempt = 0
+        while True:
+            try:
+                async with self.robot_streams, self.all_streams:
+                    self.active_streams += 1
+                    try:
+                        # After a drop, carry on from the last byte written
+                        await self.source.read_range(offset + received, length - received, sink)
+                    finally:
+                        self.active_streams -= 1
+                if received < length:
+                    raise SourceError(f"Range ended after {received} of {length} bytes")
+                digest = hasher.hexdigest()
+                if self.verify:
+                    expected = await self.source.checksum(offset, length)
+                    if expected is not None and expected != digest:
+                        hasher, received = hashlib.sha256(), 0
+                        self._inflight.pop(index, None)
+                        raise SourceError(f"Checksum mismatch in chunk {index}")
+                self._inflight.pop(index, None)
+                self.chunks[index] = digest
+                await self._save_state()
+                return
+            except SourceError as e:
+                attempt += 1
+                self.retries += 1
+                if attempt >= CHUNK_RETRIES:
+                    self._inflight.pop(index, None)
+                    raise
+                delay = min(10.0, 0.25 * 2 ** attempt)
+                logger.warning(f"{self.dest} chunk {index}: {e}; retrying in {delay:.1f}s")
+                await asyncio.sleep(delay)
+
+    async def _run(self):
+        self.status = STATUS_RUNNING
+        try:
+            self.size = await self.source.size()
+            await asyncio.to_thread(self._open_part)
+
+            missing = [i for i in range(self.chunk_count) if i not in self.chunks]
+            tasks = [asyncio.create_task(self._fetch_chunk(i)) for i in missing]
+            try:
+                await asyncio.gather(*tasks)
+            except BaseException:
+                for task in tasks:
+                    task.cancel()
+                await asyncio.gather(*tasks, return_exceptions=True)
+                raise
+
+            await asyncio.to_thread(self._finish_part)
+            self.status = STATUS_DONE
+            logger.info(f"Downloaded {self.dest} ({self.size} bytes, {self.retries} retries)")
+        except asyncio.CancelledError:
+            # The partial file and its state stay behind for a later resume
+            self.status = STATUS_CANCELLED
+        except Exception as e:
+            self.status = STATUS_FAILED
+            self.error = str(e)
+            logger.error(f"Download of {self.dest} failed: {e}")
+        finally:
+            if self._fd is not None:
+                os.close(self._fd)
+                self._fd = None
+            self._inflight.clear()
+            self.finished_at = time.time()
+            self.rate = 0.0
+            await self.source.close()
+
+    def current_rate(self) -> float:
+        """Smoothed rate, decaying towards zero while nothing arrives."""
+        idle = time.monotonic() - self._rate_at
+        if self.status == STATUS_RUNNING and idle >= 2.0:
+            return self._rate_bytes / idle
+        return self.rate
+
+    def to_dict(self) -> dict:
+        done = self.done_bytes
+        rate = self.current_rate()
+        elapsed = (self.finished_at or time.time()) - self.started_at
+        remaining = (self.size - done) if self.size is not None else None
+        return {
+            "transfer_id": self.id,
+            "robot": self.robot,
+            "source": self.source.key,
+            "dest": self.dest,
+            "status": self.status,
+            "error": self.error,
+            "size": self.size,
+            "done": done,
+            "resumed": self.resumed_bytes,
+            "chunks_done": len(self.chunks),
+            "chunks_total": self.chunk_count,
+            "streams": self.active_streams,
+            "retries": self.retries,
+            "rate_bps": round(rate),
+            "avg_bps": round(self.fetched / elapsed) if elapsed > 0 else 0,
+            "eta": round(remaining / rate, 1) if remaining and rate else None,
+        }
+
+
+class DownloadManager:
+    """Running and recent transfers, with the per-robot and global stream caps."""
+
+    def __init__(self, pool: SSHPool, download_dir: str = DOWNLOAD_DIR):
+        self.pool = pool
+        self.download_dir = download_dir
+        self.all_streams = asyncio.Semaphore(MAX_STREAMS)
+        self._robot_streams: Dict[str, asyncio.Semaphore] = {}
+        self._transfers: Dict[str, Transfer] = {}
+
+    def start(self, source, dest: str, robot: str, **kwargs) -> Transfer:
+        """
+        Start a transfer, or return the one already fetching ``source`` to
+        ``dest``. Raises DestinationBusyError if a different source is.
+        """
+        for transfer in self._transfers.values():
+            if transfer.dest == dest and transfer.status in (STATUS_QUEUED, STATUS_RUNNING):
+                if transfer.source.key != source.key:
+                    raise DestinationBusyError(transfer.id)
+                return transfer
+        robot_streams = self._robot_streams.setdefault(robot, asyncio.Semaphore(STREAMS_PER_ROBOT))
+        transfer = Transfer(source, dest, robot, robot_streams=robot_streams, all_streams=self.all_streams, **kwargs)
+        transfer.start()
+        self._transfers[transfer.id] = transfer
+        return transfer
+
+    def dest_for(self, robot: str, name: str) -> str:
+        """Local path for a remote file name; raises ValueError if it names no file."""
+        base = os.path.basename(name.rstrip("/"))
+        if base in ("", ".", ".."):
+            raise ValueError(f"No file name in {name!r}")
+        return os.path.join(self.download_dir, robot, base)
+
+    def start_from_robot(self, robot_number: int, host: str, remote_path: str) -> Transfer:
+        dest = self.dest_for(str(robot_number), remote_path)
+        return self.start(SSHSource(self.pool, host, remote_path), dest, str(robot_number))
+
+    def start_from_url(self, url: str, robot: str) -> Transfer:
+        import httpx
+
+        dest = self.dest_for(robot, httpx.URL(url).path)
+        return self.start(HTTPSource(url), dest, robot)
+
+    def get(self, transfer_id: str) -> Optional[Transfer]:
+        return self._transfers.get(transfer_id)
+
+    def list(self) -> List[Transfer]:
+        self._prune()
+        return list(self._transfers.values())
+
+    def _prune(self):
+        cutoff = time.time() - FINISHED_TRANSFER_TTL
+        for transfer_id, transfer in list(self._transfers.items()):
+            if transfer.finished_at is not None and transfer.finished_at < cutoff:
+                del self._transfers[transfer_id]
+
+    def stop_all(self):
+        for transfer in self._transfers.values():
+            transfer.cancel()
@@ -0,0 +1,223 @@
+"""
+Fleet-wide command fan-out for /api/fleet/execute.
+
+``xvalidation.sh`` walks its robot list one at a time (ping, then ssh), so a
+range of 60 robots spends minutes waiting on each in turn. A ``FleetRun`` runs
+one flag on many robots at once over the SSH pool, at most ``parallelism`` at
+a time. Every event is an NDJSON frame tagged with the robot number:
+
+    {"type": "start",   "robot": 12, "ip": "10.30.72.72"}
+    {"type": "output",  "robot": 12, "data": "..."}
+    {"type": "result",  "robot": 12, "status": "ok", "exit_code": 0, "duration": 0.41}
+    {"type": "summary", "run_id": "...", "ok": 59, "failed": 0, "unreachable": 1, ...}
+
+Frames go through the same ring buffer / broadcaster as terminal sessions, so
+any number of viewers can follow a run and late ones get it replayed.
+"""
+import os
+import json
+import time
+import uuid
+import codecs
+import asyncio
+import logging
+from typing import Dict, List, Optional
+
+from robots_config import FleetCommand, robot_ip
+from ring_buffer import OutputRing
+from broadcaster import Broadcaster
+from ssh_pool import SSHPool, SSHUnavailableError, SSH_PASSWORD
+from reachability import Reachability
+
+logger = logging.getLogger("robot_ui_backend")
+
+# Robots worked on at the same time by one run
+FLEET_PARALLELISM = int(os.environ.get("ROBOT_UI_FLEET_PARALLELISM", "16"))
+
+# Largest robot list accepted by one run
+MAX_FLEET_ROBOTS = 500
+
+# Bytes of frames kept per run for late viewers
+FLEET_BUFFER_SIZE = 4 * 1024 * 1024
+
+# How long a finished run stays queryable
+FINISHED_RUN_TTL = 900.0
+
+READ_CHUNK_SIZE = 65536
+
+# Per-robot result statuses
+STATUS_OK = "ok"
+STATUS_FAILED = "failed"
+STATUS_UNREACHABLE = "unreachable"
+STATUS_TIMEOUT = "timeout"
+STATUS_CANCELLED = "cancelled"
+
+
+class FleetRun:
+    """One flag executed on a list of robots."""
+
+    def __init__(self, flag: str, command: FleetCommand, robots: List[int], pool: SSHPool,
+                 parallelism: int = FLEET_PARALLELISM, reachability: Optional[Reachability] = None):
+        self.id = uuid.uuid4().hex
+        self.flag = flag
+        self.command = command
+        self.robots = robots
+        self.pool = pool
+        # Clamped to 1..FLEET_PARALLELISM: each robot in flight holds an SSH master
+        self.parallelism = max(1, min(parallelism, FLEET_PARALLELISM))
+        self.reachability = reachability
+        self.started_at = time.time()
+        self.finished_at: Optional[float] = None
+        self.results: Dict[int, dict] = {}
+
+        self.output = OutputRing(FLEET_BUFFER_SIZE)
+        self.broadcaster = Broadcaster(None, self.output)
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def running(self) -> bool:
+        return self.finished_at is None
+
+    def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    def cancel(self):
+        if self._task and not self._task.done():
+            self._task.cancel()
+
+    def _emit(self, frame: dict):
+        self.broadcaster.publish(json.dumps(frame).encode("utf-8") + b"\n")
+
+    async def _run(self):
+        semaphore = asyncio.Semaphore(self.parallelism)
+
+        async def limited(robot_number: int):
+            async with semaphore:
+                await self._run_robot(robot_number)
+
+        tasks = [asyncio.create_task(limited(n)) for n in self.robots]
+        try:
+            await asyncio.gather(*tasks)
+        except asyncio.CancelledError:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+        finally:
+            for robot_number in self.robots:
+                self.results.setdefault(robot_number, self._result(robot_number, STATUS_CANCELLED, None, 0.0))
+            self.finished_at = time.time()
+            self._emit(self.summary())
+            self.broadcaster.finish()
+            logger.info(f"Fleet run {self.id} ({self.flag}) finished: {self.counts()}")
+
+    def _result(self, robot_number: int, status: str, exit_code: Optional[int], duration: float,
+                error: Optional[str] = None) -> dict:
+        result = {
+            "type": "result",
+            "robot": robot_number,
+            "ip": robot_ip(robot_number),
+            "status": status,
+            "exit_code": exit_code,
+            "duration": round(duration, 3),
+        }
+        if error:
+            result["error"] = error
+        return result
+
+    async def _run_robot(self, robot_number: int):
+        host = robot_ip(robot_number)
+        command = self.command.remote_command.format(robot_number=robot_number, password=SSH_PASSWORD)
+        started = time.monotonic()
+        exit_code = None
+        error = None
+        self._emit({"type": "start", "robot": robot_number, "ip": host})
+        try:
+            if self.reachability and self.reachability.known_down(robot_number):
+                # Skip the connect timeout; the prober already saw it fail
+                raise SSHUnavailableError(self.reachability.describe(robot_number))
+            async with self.pool.channel(host, command) as proc:
+                decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+
+                async def forward():
+                    while True:
+                        data = await proc.stdout.read(READ_CHUNK_SIZE)
+                        if not data:
+                            break
+                        text = decoder.decode(data)
+                        if text:
+                            self._emit({"type": "output", "robot": robot_number, "data": text})
+                    return await proc.wait()
+
+                exit_code = await asyncio.wait_for(forward(), self.command.timeout)
+            status = STATUS_OK if exit_code == 0 else STATUS_FAILED
+        except SSHUnavailableError as e:
+            status, error = STATUS_UNREACHABLE, str(e)
+        except asyncio.TimeoutError:
+            status, error = STATUS_TIMEOUT, f"No result within {self.command.timeout:g}s"
+        except asyncio.CancelledError:
+            status = STATUS_CANCELLED
+            raise
+        except Exception as e:
+            status, error = STATUS_FAILED, str(e)
+        finally:
+            result = self._result(robot_number, status, exit_code, time.monotonic() - started, error)
+            self.results[robot_number] = result
+            self._emit(result)
+
+    def counts(self) -> Dict[str, int]:
+        counts = {STATUS_OK: 0, STATUS_FAILED: 0, STATUS_UNREACHABLE: 0, STATUS_TIMEOUT: 0, STATUS_CANCELLED: 0}
+        for result in self.results.values():
+            counts[result["status"]] += 1
+        return counts
+
+    def summary(self) -> dict:
+        end = self.finished_at or time.time()
+        return {
+            "type": "summary",
+            "run_id": self.id,
+            "flag": self.flag,
+            "command": self.command.label,
+            "running": self.running,
+            "total": len(self.robots),
+            "done": len(self.results),
+            **self.counts(),
+            "parallelism": self.parallelism,
+            "duration": round(end - self.started_at, 3),
+            "results": [self.results[n] for n in self.robots if n in self.results],
+        }
+
+
+class FleetManager:
+    """Registry of fleet runs."""
+
+    def __init__(self, pool: SSHPool, reachability: Optional[Reachability] = None):
+        self.pool = pool
+        self.reachability = reachability
+        self._runs: Dict[str, FleetRun] = {}
+
+    def start(self, flag: str, command: FleetCommand, robots: List[int],
+              parallelism: Optional[int] = None) -> FleetRun:
+        self._prune()
+        run = FleetRun(flag, command, robots, self.pool, parallelism or FLEET_PARALLELISM,
+                       self.reachability)
+        run.start()
+        self._runs[run.id] = run
+        logger.info(f"Started fleet run {run.id}: {flag} on {len(robots)} robots")
+        return run
+
+    def get(self, run_id: str) -> Optional[FleetRun]:
+        return self._runs.get(run_id)
+
+    def list(self) -> List[FleetRun]:
+        self._prune()
+        return list(self._runs.values())
+
+    def stop_all(self):
+        for run in self._runs.values():
+            run.cancel()
+
+    def _prune(self):
+        cutoff = time.time() - FINISHED_RUN_TTL
+        for run_id, run in list(self._runs.items()):
+            if run.finished_at is not None and run.finished_at < cutoff:
+                del self._runs[run_id]
@@ -0,0 +1,322 @@
+"""
+Priority job queue for robot commands.
+
+/api/execute starts a command right away or refuses (409 while the robot is
+busy, 429 at the session limit). A job is queued instead: it runs once its
+robot is free (one job per robot at a time, like sessions) and one of
+``JOB_WORKERS`` slots is available, higher ``priority`` first and in
+submission order within a priority. A job may carry a ``timeout`` (seconds of
+run time) and a ``deadline`` (absolute time it must be finished by; a job still
+queued then expires without running).
+
+Each job runs as an ordinary session, so its output is attachable through
+/ws/terminal/{session_id} and its output offsets are part of the job status.
+Cancelling or timing out a running job stops the session's whole process group
+(the command is started with ``start_new_session``, i.e. ``setsid``) with the
+supervisor's SIGINT, SIGTERM, SIGKILL ladder.
+
+Scheduling never scans the queue: each robot has a heap of its queued jobs
+and one more heap holds the head job of every idle robot, so submitting,
+cancelling and dispatching are O(log n) however many jobs are waiting.
+Cancelled jobs are left in the heaps and skipped when they come up.
+"""
+import os
+import time
+import uuid
+import heapq
+import asyncio
+import logging
+import itertools
+from collections import deque
+from typing import Awaitable, Callable, Deque, Dict, List, Optional, Sequence, Set, Tuple
+
+from robots_config import RobotCommand
+from sessions import Session, SessionManager, SessionLimitError, RobotBusyError
+from supervisor import STOP_LADDER
+from ssh_pool import ChannelLease
+
+logger = logging.getLogger("robot_ui_backend")
+
+# Jobs running at the same time, across all robots
+JOB_WORKERS = int(os.environ.get("ROBOT_UI_JOB_WORKERS", "16"))
+
+# Seconds before retrying a robot that has an interactive session running
+# (or when the session limit was hit)
+BUSY_RETRY = 1.0
+
+# Finished jobs stay listed this long, up to this many
+FINISHED_JOB_TTL = 3600.0
+MAX_FINISHED_JOBS = 20000
+
+# Job statuses
+STATUS_QUEUED = "queued"
+STATUS_RUNNING = "running"
+STATUS_DONE = "done"
+STATUS_FAILED = "failed"
+STATUS_CANCELLED = "cancelled"
+STATUS_TIMEOUT = "timeout"
+STATUS_EXPIRED = "expired"
+
+
+class JobError(Exception):
+    """The job could not be started (e.g. its robot is unreachable)."""
+
+
+class JobBusyError(Exception):
+    """The job can't start yet (e.g. its robot's SSH channels are taken); it is retried."""
+
+
+class Job:
+    """One queued command and, once it runs, its session."""
+
+    def __init__(self, robot_id: str, command_index: int, command: RobotCommand, seq: int,
+                 robot_number: Optional[int] = None, priority: int = 0,
+                 timeout: Optional[float] = None, deadline: Optional[float] = None):
+        self.id = uuid.uuid4().hex
+        self.robot_id = robot_id
+        self.robot_number = robot_number
+        self.command_index = command_index
+        self.command = command
+        self.priority = priority
+        self.timeout = timeout
+        self.deadline = deadline
+        # Submission order, the tie-breaker within a priority
+        self.seq = seq
+
+        self.status = STATUS_QUEUED
+        self.error: Optional[str] = None
+        self.exit_code: Optional[int] = None
+        self.session: Optional[Session] = None
+        self.submitted_at = time.time()
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def robot_key(self) -> str:
+        # Same key the session manager serializes on
+        return self.robot_id if self.robot_number is None else f"{self.robot_id}:{self.robot_number}"
+
+    @property
+    def finished(self) -> bool:
+        return self.finished_at is not None
+
+    def run_limit(self) -> Optional[float]:
+        """Seconds the job may still run, from its timeout and deadline."""
+        limits = []
+        if self.timeout is not None:
+            limits.append(self.timeout)
+        if self.deadline is not None:
+            limits.append(max(0.0, self.deadline - time.time()))
+        return min(limits) if limits else None
+
+    def to_dict(self) -> dict:
+        session = self.session
+        return {
+            "job_id": self.id,
+            "robot_id": self.robot_id,
+            "robot_number": self.robot_number,
+            "command_index": self.command_index,
+            "command": self.command.label,
+            "priority": self.priority,
+            "status": self.status,
+            "error": self.error,
+            "exit_code": self.exit_code,
+            "timeout": self.timeout,
+            "deadline": self.deadline,
+            "submitted_at": self.submitted_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "session_id": session.id if session else None,
+            "output_start": session.output.start if session else None,
+            "output_end": session.output.end if session else None,
+        }
+
+
+# Called before a job's session starts; returns the SSH channel a remote
+# command runs on, or None. Raises JobError to fail the job, JobBusyError to
+# retry it later.
+PrepareHook = Callable[[Job], Awaitable[Optional[ChannelLease]]]
+
+
+class JobQueue:
+    """Queued, running and recently finished jobs, dispatched onto sessions."""
+
+    def __init__(self, sessions: SessionManager, workers: int = JOB_WORKERS,
+                 prepare: Optional[PrepareHook] = None, ladder: Sequence[Tuple[int, float]] = STOP_LADDER):
+        self.sessions = sessions
+        self.workers = workers
+        self.prepare = prepare
+        # Signals and grace periods for stopping a cancelled or timed out job
+        self.ladder = ladder
+        self._jobs: Dict[str, Job] = {}
+        # Per robot key: heap of (-priority, seq, job)
+        self._queues: Dict[str, List[Tuple[int, int, Job]]] = {}
+        # Head job of every robot that may start one: (-priority, seq, robot key)
+        self._ready: List[Tuple[int, int, str]] = []
+        # Robots with a job running, or waiting out BUSY_RETRY
+        self._busy: Set[str] = set()
+        self._running = 0
+        self._seq = itertools.count()
+        self._finished: Deque[Job] = deque()
+
+    @property
+    def running_count(self) -> int:
+        return self._running
+
+    def submit(self, robot_id: str, command_index: int, command: RobotCommand,
+               robot_number: Optional[int] = None, priority: int = 0,
+               timeout: Optional[float] = None, deadline: Optional[float] = None) -> Job:
+        self._prune()
+        job = Job(robot_id, command_index, command, next(self._seq), robot_number, priority, timeout, deadline)
+        self._jobs[job.id] = job
+        self._enqueue(job)
+        self._dispatch()
+        return job
+
+    def get(self, job_id: str) -> Optional[Job]:
+        return self._jobs.get(job_id)
+
+    def list(self, status: Optional[str] = None, robot_id: Optional[str] = None,
+             robot_number: Optional[int] = None) -> List[Job]:
+        self._prune()
+        return [
+            job for job in self._jobs.values()
+            if (status is None or job.status == status)
+            and (robot_id is None or job.robot_id == robot_id)
+            and (robot_number is None or job.robot_number == robot_number)
+        ]
+
+    def cancel(self, job_id: str) -> bool:
+        job = self._jobs.get(job_id)
+        if not job or job.finished:
+            return False
+        if job.status == STATUS_QUEUED:
+            # Stays in its robot's heap until it comes up and is skipped
+            self._finish(job, STATUS_CANCELLED)
+            self._dispatch()
+        elif job._task:
+            # The runner stops the process group and finishes the job
+            job._task.cancel()
+        return True
+
+    def stop_all(self):
+        for job in list(self._jobs.values()):
+            self.cancel(job.id)
+
+    def _enqueue(self, job: Job):
+        key = job.robot_key
+        queue = self._queues.setdefault(key, [])
+        heapq.heappush(queue, (-job.priority, job.seq, job))
+        if queue[0][2] is job and key not in self._busy:
+            heapq.heappush(self._ready, (-job.priority, job.seq, key))
+
+    def _head(self, key: str) -> Optional[Job]:
+        """The robot's next queued job, dropping cancelled ones on the way."""
+        queue = self._queues.get(key)
+        while queue and queue[0][2].status != STATUS_QUEUED:
+            heapq.heappop(queue)
+        if not queue:
+            self._queues.pop(key, None)
+            return None
+        return queue[0][2]
+
+    def _dispatch(self):
+        """Start queued jobs while there are free workers and idle robots."""
+        while self._running < self.workers and self._ready:
+            _, seq, key = heapq.heappop(self._ready)
+            if key in self._busy:
+                continue
+            job = self._head(key)
+            if job is None:
+                continue
+            if job.seq != seq:
+                # The entry was for a job since cancelled or overtaken
+                heapq.heappush(self._ready, (-job.priority, job.seq, key))
+                continue
+            heapq.heappop(self._queues[key])
+            if job.deadline is not None and job.deadline <= time.time():
+                self._finish(job, STATUS_EXPIRED, "Deadline passed before the job could start")
+                self._release(key)
+                continue
+            self._busy.add(key)
+            self._running += 1
+            job.status = STATUS_RUNNING
+            job._task = asyncio.create_task(self._run(job))
+
+    def _release(self, key: str):
+        """The robot may start its next job."""
+        self._busy.discard(key)
+        job = self._head(key)
+        if job:
+            heapq.heappush(self._ready, (-job.priority, job.seq, key))
+
+    def _requeue_later(self, job: Job):
+        """Put a job back in its place and retry its robot after BUSY_RETRY."""
+        job.status = STATUS_QUEUED
+        key = job.robot_key
+        heapq.heappush(self._queues.setdefault(key, []), (-job.priority, job.seq, job))
+        asyncio.get_running_loop().call_later(BUSY_RETRY, self._retry, key)
+
+    def _retry(self, key: str):
+        self._release(key)
+        self._dispatch()
+
+    async def _run(self, job: Job):
+        key = job.robot_key
+        retry = False
+        try:
+            try:
+                channel = await self.prepare(job) if self.prepare else None
+                job.session = self.sessions.start(job.robot_id, job.command, job.robot_number, channel=channel)
+            except (RobotBusyError, SessionLimitError, JobBusyError) as e:
+                logger.info(f"Job {job.id} waiting: {e}")
+                retry = True
+                return
+            job.started_at = time.time()
+            try:
+                job.exit_code = await asyncio.wait_for(job.session.wait(), job.run_limit())
+            except asyncio.TimeoutError:
+                try:
+                    job.exit_code = await job.session.stop(self.ladder)
+                finally:
+                    self._finish(job, STATUS_TIMEOUT, "Timed out")
+                return
+            if job.exit_code == 0:
+                self._finish(job, STATUS_DONE)
+            else:
+                self._finish(job, STATUS_FAILED, f"Exited with code {job.exit_code}")
+        except asyncio.CancelledError:
+            try:
+                if job.session:
+                    job.exit_code = await job.session.stop(self.ladder)
+            finally:
+                self._finish(job, STATUS_CANCELLED)
+        except JobError as e:
+            self._finish(job, STATUS_FAILED, str(e))
+        except Exception as e:
+            logger.error(f"Job {job.id} failed: {e}")
+            self._finish(job, STATUS_FAILED, f"Failed to start command: {e}")
+        finally:
+            self._running -= 1
+            if retry:
+                self._requeue_later(job)
+            else:
+                self._release(key)
+            self._dispatch()
+
+    def _finish(self, job: Job, status: str, error: Optional[str] = None):
+        if job.finished_at is not None:
+            # Cancelled while a timed-out job was being stopped: it stays timed out
+            return
+        job.status = status
+        job.error = error
+        job.finished_at = time.time()
+        self._finished.append(job)
+
+    def _prune(self):
+        cutoff = time.time() - FINISHED_JOB_TTL
+        while self._finished and (self._finished[0].finished_at < cutoff
+                                  or len(self._finished) > MAX_FINISHED_JOBS):
+            job = self._finished.popleft()
+            self._jobs.pop(job.id, None)
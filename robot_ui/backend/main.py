@@ -1,20 +1,33 @@
 import os
-import pty
-import subprocess
-import select
-import termios
-import struct
-import fcntl
+import time
 import asyncio
+import json
 import logging
-import shlex
 from typing import List, Optional, Dict
 
-from fastapi import FastAPI, HTTPException, WebSocket, WebSocketDisconnect
+from fastapi import FastAPI, HTTPException, Request, WebSocket, WebSocketDisconnect
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse, PlainTextResponse
+import anyio.to_thread
 from pydantic import BaseModel
 
-from robots_config import ROBOTS, RobotCommand
+from robots_config import FLEET_COMMANDS, SYNC_BUNDLES, MAX_ROBOT_NUMBER, robot_ip, parse_robot_numbers
+from robot_registry import RobotRegistry, cached_json
+from sessions import SessionManager, SessionLimitError, RobotBusyError
+from ssh_pool import SSHPool, SSHUnavailableError, ChannelLease, ChannelLimitError
+from fleet import FleetManager, MAX_FLEET_ROBOTS
+from downloads import DownloadManager, DestinationBusyError, STATUS_QUEUED, STATUS_RUNNING
+from reachability import Reachability
+from jobs import Job, JobQueue, JobError, JobBusyError
+from metrics import REGISTRY, LOOP_LAG_MAX, MetricsMiddleware, LoopLagMonitor, InstrumentedExecutor
+from profiler import SamplingProfiler
+from recording import RecordingStore, RecordingReader, asciicast, KIND_OUTPUT, KIND_RESIZE
+from validation import run_validation, validate_many
+from sync import push_many, bundle_source
+from remote_helper import robot_target
+from bag_catalog import BagCatalog
+from terminal_protocol import FrameEncoder, BATCH_MS, BATCH_BYTES, parse_playback, SeekMessage, SpeedMessage
+from terminal_ws import attach
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -30,12 +43,123 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+# Outermost, so the latency includes every other middleware
+app.add_middleware(MetricsMiddleware)
 
-# Global variables to manage the "Terminal" process
-# In a real app with multiple users, this needs to be more robust (session based).
-# For this single-user desktop app, a global is acceptable.
-active_process: Optional[subprocess.Popen] = None
-master_fd: Optional[int] = None
+# Robot types and commands from robots.json, reloaded when the file changes
+registry = RobotRegistry()
+
+# Every session's output on disk, replayable after the session is gone
+recordings = RecordingStore()
+
+# Every command started through /api/execute gets its own session (PTY, process
+# group and output history), so several operators can work side by side.
+sessions = SessionManager(recordings=recordings)
+# serve.py --workers serves them to the worker processes from here
+app.state.sessions = sessions
+
+# Warm SSH connections to robots, reused by every remote command
+ssh_pool = SSHPool()
+
+# Background probes of every robot, so known-down ones fail fast instead of
+# each request waiting out a ping or SSH timeout
+reachability = Reachability()
+
+# Fleet-wide runs of xvalidation.sh flags over the SSH pool
+fleet = FleetManager(ssh_pool, reachability)
+
+# Resumable, chunked bag downloads from robots
+downloads = DownloadManager(ssh_pool)
+
+# Every robot's bags in SQLite, refreshed in the background
+bags = BagCatalog(ssh_pool, reachability)
+
+async def _prepare_job(job: Job) -> Optional[ChannelLease]:
+    """SSH channel for a remote command, as /api/execute does it."""
+    if not job.command.remote_command:
+        return None
+    if reachability.known_down(job.robot_number):
+        raise JobError(reachability.describe(job.robot_number))
+    try:
+        return await ssh_pool.prepare(robot_ip(job.robot_number), job.command.remote_command, tty=True)
+    except ChannelLimitError as e:
+        raise JobBusyError(str(e))
+    except SSHUnavailableError as e:
+        raise JobError(f"Robot unreachable: {e}")
+
+# Queued commands with priorities, run one per robot on the session manager
+jobs = JobQueue(sessions, prepare=_prepare_job)
+
+# Event loop health for /metrics: timer lag and the default executor's load
+loop_lag = LoopLagMonitor()
+executor = InstrumentedExecutor(thread_name_prefix="robot-ui")
+
+# Off until POST /api/profiler/start
+profiler = SamplingProfiler()
+
+def _session_metrics():
+    listed = sessions.list()
+    running = sum(1 for s in listed if s.running)
+    yield "", {"state": "running"}, running
+    yield "", {"state": "finished"}, len(listed) - running
+
+def _pty_bytes(attribute: str, pruned: str):
+    def collect():
+        total = getattr(sessions, pruned)
+        for session in sessions.list():
+            if not session.broadcaster:
+                continue
+            value = session.broadcaster.bytes_read if attribute == "read" else session.broadcaster.delivered()
+            total += value
+            if session.running:
+                yield "", {"session": session.id, "robot": session.robot_id, "command": session.label}, value
+        yield "", {"session": "all", "robot": "", "command": ""}, total
+    return collect
+
+def _viewer_metrics():
+    for session in sessions.list():
+        if session.running and session.broadcaster:
+            yield "", {"session": session.id, "robot": session.robot_id}, session.broadcaster.queued()
+
+def _executor_metrics():
+    yield "", {"pool": "asyncio", "state": "active"}, executor.active
+    yield "", {"pool": "asyncio", "state": "queued"}, executor.queued
+    yield "", {"pool": "asyncio", "state": "max"}, executor.max_workers
+    # Starlette runs sync endpoints and file responses in anyio's pool
+    limiter = anyio.to_thread.current_default_thread_limiter()
+    yield "", {"pool": "anyio", "state": "active"}, limiter.borrowed_tokens
+    yield "", {"pool": "anyio", "state": "queued"}, limiter.statistics().tasks_waiting
+    yield "", {"pool": "anyio", "state": "max"}, limiter.total_tokens
+
+def _process_metrics():
+    stats = sessions.supervisor.stats()
+    for key in ("open_fds", "pty_masters", "zombies", "children"):
+        yield "", {"kind": key}, stats[key]
+
+def _job_metrics():
+    counts: Dict[str, int] = {}
+    for job in jobs.list():
+        counts[job.status] = counts.get(job.status, 0) + 1
+    for status, count in counts.items():
+        yield "", {"status": status}, count
+
+REGISTRY.collector("robot_ui_sessions", "Sessions by state", "gauge", _session_metrics)
+REGISTRY.collector("robot_ui_pty_bytes_read_total", "PTY bytes read, per running session and in all",
+                   "counter", _pty_bytes("read", "pruned_bytes_read"))
+REGISTRY.collector("robot_ui_pty_bytes_sent_total", "PTY bytes handed to viewers, per running session and in all",
+                   "counter", _pty_bytes("sent", "pruned_bytes_sent"))
+REGISTRY.collector("robot_ui_viewer_queue_bytes", "Output queued for a session's websocket viewers",
+                   "gauge", _viewer_metrics)
+REGISTRY.collector("robot_ui_executor_threads", "Thread pool work items by state", "gauge", _executor_metrics)
+REGISTRY.collector("robot_ui_processes", "Open fds, PTY masters, zombie and supervised children",
+                   "gauge", _process_metrics)
+REGISTRY.collector("robot_ui_spawned_total", "Session commands spawned", "counter",
+                   lambda: [("", {}, sessions.supervisor.started)])
+REGISTRY.collector("robot_ui_jobs", "Jobs by status", "gauge", _job_metrics)
+REGISTRY.collector("robot_ui_recording_pending_writes", "Recording blocks waiting for the writer thread",
+                   "gauge", lambda: [("", {}, recordings.pending_writes)])
+REGISTRY.collector("robot_ui_bag_catalog_bags", "Bags in the fleet-wide catalog", "gauge",
+                   lambda: [("", {}, bags.bag_count)])
 
 class ValidationResponse(BaseModel):
     success: bool
@@ -44,157 +168,852 @@ class ValidationResponse(BaseModel):
 class CommandRequest(BaseModel):
     robot_id: str
     command_index: int
+    # Which robot of this type to run a remote command on
+    robot_number: Optional[int] = None
+
+class JobRequest(BaseModel):
+    robot_id: str
+    command_index: int
+    robot_number: Optional[int] = None
+    # Higher runs first; equal priorities run in submission order
+    priority: int = 0
+    # Seconds the command may run once started
+    timeout: Optional[float] = None
+    # Unix time the job must be finished by; it expires if still queued then
+    deadline: Optional[float] = None
+
+class FleetRequest(BaseModel):
+    # xvalidation.sh flag, e.g. "-M"; see GET /api/fleet/commands
+    flag: str
+    # Robot numbers, or an inclusive range start..end (or both)
+    robots: Optional[List[int]] = None
+    start: Optional[int] = None
+    end: Optional[int] = None
+    parallelism: Optional[int] = None
+
+class SyncRequest(BaseModel):
+    # xvalidation.sh file flag, e.g. "-U"; see GET /api/sync/bundles
+    flag: str
+    robots: Optional[List[int]] = None
+    start: Optional[int] = None
+    end: Optional[int] = None
+    parallelism: Optional[int] = None
+    # Bytes per second to each robot and overall; 0 is uncapped
+    robot_rate: Optional[int] = None
+    total_rate: Optional[int] = None
+    # Also remove files under the bundle the robot has but we don't
+    delete: bool = False
+    # Only report what would be sent
+    dry_run: bool = False
+
+class DownloadRequest(BaseModel):
+    # File on the robot, e.g. /home/zippy/logs/bags.tar; or a bag name under
+    # /home/zippy/logs
+    robot_number: Optional[int] = None
+    remote_path: Optional[str] = None
+    bag: Optional[str] = None
+    # Alternatively an HTTP(S) URL with range support
+    url: Optional[str] = None
+
+class BulkValidationRequest(BaseModel):
+    # Robot types to validate; defaults to every robot type in the registry
+    robot_ids: Optional[List[str]] = None
+    # Individual robot numbers, validated with the script of `robot_id`
+    robot_numbers: Optional[List[int]] = None
+    robot_id: Optional[str] = None
+    concurrency: Optional[int] = None
 
 @app.get("/health")
 async def health_check():
     return {"status": "ok"}
 
 @app.get("/api/robots")
-async def get_robots():
+async def get_robots(request: Request):
     """List available robots."""
-    return [
-        {
-            "id": r.id, 
-            "name": r.name, 
-            "image_key": r.image_key
-        } 
-        for r in ROBOTS.values()
-    ]
+    current = registry.current
+    return cached_json(request, current.robots_body, current.robots_etag)
+
+def _check_robot_number(robot_number: Optional[int]):
+    if robot_number is not None and not 0 <= robot_number <= MAX_ROBOT_NUMBER:
+        raise HTTPException(400, f"Robot numbers go from 0 to {MAX_ROBOT_NUMBER}")
+
+def _robot_spec(robots: Optional[str]) -> Optional[List[int]]:
+    """Robot numbers from a "1-10,72" query parameter; None if it is absent."""
+    try:
+        return parse_robot_numbers(robots, MAX_ROBOT_NUMBER, MAX_FLEET_ROBOTS) if robots else None
+    except ValueError as e:
+        raise HTTPException(400, str(e))
+
+@app.get("/api/robots/status")
+async def robots_status(robots: Optional[str] = None, refresh: bool = False):
+    """
+    Cached reachability of the watched robots (`ROBOT_UI_ROBOTS`), or of
+    `robots` ("1-10,72"). `refresh=true` probes them now instead.
+    """
+    numbers = _robot_spec(robots)
+    if refresh:
+        if numbers is None:
+            await reachability.probe_all()
+        else:
+            # Robots outside ROBOT_UI_ROBOTS are probed once, not added to the watch list
+            probed = await asyncio.gather(*(reachability.probe(n) for n in numbers))
+            return [robot.to_dict(reachability.ttl) for robot in probed]
+    return reachability.snapshot(numbers)
 
 @app.get("/api/robots/{robot_id}/commands")
-async def get_robot_commands(robot_id: str):
-    if robot_id not in ROBOTS:
+async def get_robot_commands(robot_id: str, request: Request):
+    current = registry.current
+    if robot_id not in current.robots:
         raise HTTPException(404, "Robot not found")
     
-    return ROBOTS[robot_id].commands
+    return cached_json(request, current.commands_body[robot_id], current.commands_etag[robot_id])
+
+@app.post("/api/robots/validate")
+async def validate_robots(req: BulkValidationRequest, format: str = "ndjson"):
+    """
+    Validate many robots concurrently and stream each result as it finishes,
+    as NDJSON (default) or server-sent events (`?format=sse`).
+    """
+    if format not in ("ndjson", "sse"):
+        raise HTTPException(400, "format must be 'ndjson' or 'sse'")
+
+    robots = registry.current.robots
+    targets: Dict[str, List[str]] = {}
+    # Known-down robots are reported straight away instead of timing out
+    down: List[dict] = []
+    if req.robot_numbers:
+        if req.robot_id not in robots:
+            raise HTTPException(400, "robot_id must name a robot type when robot_numbers is given")
+        script = robots[req.robot_id].validation_script
+        for number in _selected_robots(req.robot_numbers, None, None):
+            if reachability.known_down(number):
+                down.append({"success": False, "message": reachability.describe(number),
+                             "target": str(number), "duration": 0.0, "unreachable": True})
+            else:
+                targets[str(number)] = script + [str(number)]
+    else:
+        robot_ids = req.robot_ids or list(robots)
+        unknown = [r for r in robot_ids if r not in robots]
+        if unknown:
+            raise HTTPException(404, f"Robot not found: {', '.join(unknown)}")
+        for robot_id in robot_ids:
+            targets[robot_id] = robots[robot_id].validation_script
+
+    async def results():
+        for result in down:
+            yield result
+        async for result in validate_many(targets, req.concurrency):
+            yield result
+
+    async def stream():
+        async for result in results():
+            line = json.dumps(result)
+            if format == "sse":
+                yield f"event: result\ndata: {line}\n\n"
+            else:
+                yield line + "\n"
+        if format == "sse":
+            yield "event: done\ndata: {}\n\n"
+
+    media_type = "text/event-stream" if format == "sse" else "application/x-ndjson"
+    return StreamingResponse(stream(), media_type=media_type)
 
 @app.post("/api/robots/{robot_id}/validate")
-async def validate_robot(robot_id: str):
-    if robot_id not in ROBOTS:
+async def validate_robot(robot_id: str, robot_number: Optional[int] = None):
+    robots = registry.current.robots
+    if robot_id not in robots:
         raise HTTPException(404, "Robot not found")
     
-    config = ROBOTS[robot_id]
+    config = robots[robot_id]
+    args = config.validation_script
+    _check_robot_number(robot_number)
+    if robot_number is not None:
+        if reachability.known_down(robot_number):
+            return {"success": False, "message": reachability.describe(robot_number)}
+        args = args + [str(robot_number)]
     
-    # Run validation synchronously for simplicity, but in a real app should be async/background
-    # Note: subprocess.run blocks.
-    try:
-        result = subprocess.run(
-            config.validation_script, 
-            capture_output=True, 
-            text=True,
-            timeout=10
-        )
-        
-        if result.returncode == 0:
-            return {"success": True, "message": result.stdout}
-        else:
-             return {"success": False, "message": f"Validation failed:\n{result.stderr}\n{result.stdout}"}
-    except Exception as e:
-        return {"success": False, "message": str(e)}
+    # Runs as an asyncio subprocess so open terminals keep streaming meanwhile
+    return await run_validation(args)
 
 @app.post("/api/execute")
 async def execute_command(req: CommandRequest):
-    global active_process, master_fd
-    
-    if req.robot_id not in ROBOTS:
+    robots = registry.current.robots
+    if req.robot_id not in robots:
         raise HTTPException(404, "Robot not found")
     
-    robot = ROBOTS[req.robot_id]
+    robot = robots[req.robot_id]
     
     if req.command_index < 0 or req.command_index >= len(robot.commands):
         raise HTTPException(400, "Invalid command index")
         
     cmd_config = robot.commands[req.command_index]
-    
-    # Kill existing if any
-    if active_process and active_process.poll() is None:
+    _check_robot_number(req.robot_number)
+
+    channel = None
+    if cmd_config.remote_command:
+        if req.robot_number is None:
+            raise HTTPException(400, "robot_number is required for remote commands")
+        if reachability.known_down(req.robot_number):
+            raise HTTPException(502, reachability.describe(req.robot_number))
         try:
-            active_process.terminate()
-            if master_fd:
-                os.close(master_fd)
-                master_fd = None
-        except:
-            pass
-            
-    # Start new process wrapped in PTY
-    master_fd, slave_fd = pty.openpty()
-    
-    env = os.environ.copy()
-    env["TERM"] = "xterm-256color"
-    
+            channel = await ssh_pool.prepare(robot_ip(req.robot_number), cmd_config.remote_command, tty=True)
+        except ChannelLimitError as e:
+            raise HTTPException(429, str(e))
+        except SSHUnavailableError as e:
+            raise HTTPException(502, f"Robot unreachable: {e}")
+
     try:
-        active_process = subprocess.Popen(
-            cmd_config.command_args,
-            preexec_fn=os.setsid,
-            stdin=slave_fd,
-            stdout=slave_fd,
-            stderr=slave_fd,
-            env=env,
-            start_new_session=True
-        )
-        os.close(slave_fd)
-        return {"status": "started", "command": cmd_config.label}
+        session = sessions.start(req.robot_id, cmd_config, req.robot_number, channel=channel)
+    except RobotBusyError as e:
+        raise HTTPException(409, {"message": str(e), "session_id": e.session_id})
+    except SessionLimitError as e:
+        raise HTTPException(429, str(e))
     except Exception as e:
-        if master_fd:
-             os.close(master_fd)
         raise HTTPException(500, f"Failed to start command: {e}")
 
+    return {"status": "started", "command": cmd_config.label, "session_id": session.id}
+
+@app.get("/api/sessions")
+async def list_sessions():
+    return [s.to_dict() for s in sessions.list()]
+
+@app.get("/api/sessions/{session_id}")
+async def get_session(session_id: str):
+    session = sessions.get(session_id)
+    if not session:
+        raise HTTPException(404, "Session not found")
+    return session.to_dict()
+
+@app.delete("/api/sessions/{session_id}")
+async def stop_session(session_id: str):
+    if not sessions.stop(session_id):
+        raise HTTPException(404, "Session not found")
+    return {"status": "stopping", "session_id": session_id}
+
+@app.post("/api/jobs")
+async def submit_job(req: JobRequest):
+    robots = registry.current.robots
+    if req.robot_id not in robots:
+        raise HTTPException(404, "Robot not found")
+    robot = robots[req.robot_id]
+    if req.command_index < 0 or req.command_index >= len(robot.commands):
+        raise HTTPException(400, "Invalid command index")
+    cmd_config = robot.commands[req.command_index]
+    if cmd_config.remote_command and req.robot_number is None:
+        raise HTTPException(400, "robot_number is required for remote commands")
+    _check_robot_number(req.robot_number)
+    if req.timeout is not None and req.timeout <= 0:
+        raise HTTPException(400, "timeout must be positive")
+
+    job = jobs.submit(req.robot_id, req.command_index, cmd_config, req.robot_number,
+                      req.priority, req.timeout, req.deadline)
+    return job.to_dict()
+
+@app.get("/api/jobs")
+async def list_jobs(status: Optional[str] = None, robot_id: Optional[str] = None,
+                    robot_number: Optional[int] = None, limit: int = 1000):
+    """Newest first."""
+    found = jobs.list(status, robot_id, robot_number)
+    return [job.to_dict() for job in reversed(found[-limit:])] if limit > 0 else []
+
+@app.get("/api/jobs/{job_id}")
+async def get_job(job_id: str):
+    job = jobs.get(job_id)
+    if not job:
+        raise HTTPException(404, "Job not found")
+    return job.to_dict()
+
+@app.delete("/api/jobs/{job_id}")
+async def cancel_job(job_id: str):
+    """Drops a queued job; a running one has its process group stopped."""
+    job = jobs.get(job_id)
+    if not job:
+        raise HTTPException(404, "Job not found")
+    if not jobs.cancel(job_id):
+        raise HTTPException(409, f"Job already {job.status}")
+    return {"status": "cancelling" if job.status == "running" else job.status, "job_id": job_id}
+
+@app.websocket("/ws/terminal/{session_id}")
+async def session_terminal_websocket(websocket: WebSocket, session_id: str, since: Optional[int] = None,
+                                     proto: str = "text", deflate: bool = False, batch_ms: int = BATCH_MS):
+    """
+    `proto=bin` switches to the binary protocol in terminal_protocol.py (raw
+    bytes, coalesced frames, separate control messages); `deflate=true`
+    compresses its output frames and `batch_ms` sets the coalescing window.
+    """
+    session = sessions.get(session_id)
+    if not session:
+        await websocket.close(code=4404)
+        return
+    await websocket.accept()
+    await attach(websocket, session, since, proto, deflate, batch_ms)
+
 @app.websocket("/ws/terminal")
 async def terminal_websocket(websocket: WebSocket):
+    """Legacy endpoint: attaches to the most recently started session."""
     await websocket.accept()
-    global master_fd, active_process
-    
+    session = sessions.latest()
+    if session is None:
+        # No command started yet: wait for /api/execute to start one, unless
+        # the client goes away first
+        received = asyncio.create_task(websocket.receive())
+        try:
+            while session is None:
+                done, _ = await asyncio.wait((received,), timeout=0.1)
+                if done:
+                    if received.result()["type"] == "websocket.disconnect":
+                        return
+                    # Input with nothing to run it yet
+                    received = asyncio.create_task(websocket.receive())
+                session = sessions.latest()
+        finally:
+            received.cancel()
+    await attach(websocket, session)
+
+@app.get("/api/recordings")
+async def list_recordings(robot_id: Optional[str] = None, limit: int = 200):
+    """Recorded sessions, newest first."""
+    listed = await asyncio.to_thread(recordings.list)
+    if robot_id is not None:
+        listed = [r for r in listed if r.get("robot_id") == robot_id]
+    return listed[:max(0, limit)]
+
+@app.get("/api/recordings/{session_id}")
+async def get_recording(session_id: str):
+    meta = recordings.meta(session_id)
+    reader = recordings.reader(session_id)
+    if not meta or not reader:
+        raise HTTPException(404, "Recording not found")
+    try:
+        meta["blocks"] = reader.blocks
+        meta.setdefault("duration", reader.duration)
+    finally:
+        reader.close()
+    return meta
+
+@app.get("/api/recordings/{session_id}/asciicast")
+async def export_recording(session_id: str):
+    """The recording as an asciicast v2 file, for asciinema and other players."""
+    meta = recordings.meta(session_id)
+    reader = recordings.reader(session_id)
+    if not meta or not reader:
+        raise HTTPException(404, "Recording not found")
+
+    def lines():
+        try:
+            yield from asciicast(reader, meta)
+        finally:
+            reader.close()
+
+    # A plain generator: Starlette iterates it in a worker thread, so
+    # decompression stays off the event loop
+    return StreamingResponse(lines(), media_type="application/x-asciicast", headers={
+        "Content-Disposition": f'attachment; filename="{session_id}.cast"',
+    })
+
+async def _playback_input(websocket: WebSocket, controls: asyncio.Queue):
+    """Text messages from the player are JSON control messages."""
+    while True:
+        message = await websocket.receive()
+        if message["type"] == "websocket.disconnect":
+            raise WebSocketDisconnect(message.get("code", 1000))
+        if message.get("text") is not None:
+            try:
+                controls.put_nowait(parse_playback(message["text"]))
+            except ValueError as e:
+                logger.warning(f"Bad playback control message: {e}")
+
+async def _playback_output(websocket: WebSocket, reader: RecordingReader, meta: dict,
+                           start: float, speed: float, controls: asyncio.Queue):
+    """
+    Play a recording as binary-protocol frames from `start` seconds in, at
+    `speed` (0 plays without delays). Seeking lands on the block holding the
+    target time; its events up to the target are sent at once, so the
+    terminal catches up, and the rest is timed. Resizes go out as JSON text
+    messages. After END the player can still seek, e.g. to watch again.
+    """
+    encoder = FrameEncoder()
     loop = asyncio.get_running_loop()
-    
+    base = meta.get("started_at") or 0.0
+    paused = False
+    while True:
+        # A recording still being written has grown since the last pass
+        reader.refresh()
+        # Recording time `origin` plays at loop time `anchor`
+        anchor, origin = loop.time(), start
+        position = start
+        batch: List[bytes] = []
+        batch_offset = batch_time = 0
+        # Stream offset just past the last output sent
+        end = 0
+        sought = None
+        hello = True
+
+        async def flush():
+            nonlocal batch
+            if batch:
+                await websocket.send_bytes(encoder.data(batch_offset, b"".join(batch), base + batch_time))
+                batch = []
+
+        for offset, (t, kind, data) in reader.events(start):
+            if hello:
+                await websocket.send_bytes(encoder.hello(offset, meta.get("output_bytes") or 0))
+                hello = False
+            # Wait until the event is due, handling controls in the meantime
+            while t > start and (paused or speed > 0):
+                if not paused:
+                    delay = anchor + (t - origin) / speed - loop.time()
+                    if delay <= 0:
+                        break
+                await flush()
+                try:
+                    control = await asyncio.wait_for(controls.get(), None if paused else delay)
+                except asyncio.TimeoutError:
+                    break
+                now = position if paused else (min(t, origin + (loop.time() - anchor) * speed) if speed else t)
+                if isinstance(control, SeekMessage):
+                    sought = control.time
+                    break
+                if isinstance(control, SpeedMessage):
+                    speed = control.speed
+                elif control.type == "pause":
+                    paused, position = True, now
+                else:
+                    paused = False
+                anchor, origin = loop.time(), now
+            if sought is not None:
+                break
+            if kind == KIND_OUTPUT:
+                end = offset + len(data)
+                if not batch:
+                    batch_offset, batch_time = offset, t
+                batch.append(data)
+                if sum(map(len, batch)) >= BATCH_BYTES:
+                    await flush()
+            elif kind == KIND_RESIZE:
+                await flush()
+                cols, rows = data.decode().split("x")
+                await websocket.send_text(json.dumps({"type": "resize", "rows": int(rows), "cols": int(cols)}))
+        if sought is None:
+            await flush()
+            if hello:
+                await websocket.send_bytes(encoder.hello(0, meta.get("output_bytes") or 0))
+            await websocket.send_bytes(encoder.end(end, "finished", meta.get("exit_code")))
+            # Finished: only a seek starts playing again
+            while sought is None:
+                control = await controls.get()
+                if isinstance(control, SeekMessage):
+                    sought = control.time
+                elif isinstance(control, SpeedMessage):
+                    speed = control.speed
+                else:
+                    paused = control.type == "pause"
+        start = sought
+
+@app.websocket("/ws/recordings/{session_id}")
+async def recording_websocket(websocket: WebSocket, session_id: str, start: float = 0.0, speed: float = 1.0):
+    """Plays a recording back at `speed` from `start` seconds in (see terminal_protocol.py)."""
+    meta = recordings.meta(session_id)
+    reader = recordings.reader(session_id)
+    if not meta or not reader:
+        await websocket.close(code=4404)
+        return
+    await websocket.accept()
+    controls: asyncio.Queue = asyncio.Queue()
+    input_task = asyncio.create_task(_playback_input(websocket, controls))
+    output_task = asyncio.create_task(
+        _playback_output(websocket, reader, meta, max(0.0, start), max(0.0, speed), controls))
     try:
+        done, _ = await asyncio.wait([input_task, output_task], return_when=asyncio.FIRST_COMPLETED)
+        for task in done:
+            task.result()
+    except WebSocketDisconnect:
+        logger.info("Playback websocket disconnected")
+    except Exception as e:
+        logger.error(f"Playback error: {e}")
+    finally:
+        input_task.cancel()
+        output_task.cancel()
+        await asyncio.gather(input_task, output_task, return_exceptions=True)
+        reader.close()
+
+@app.get("/api/telemetry/{robot_id}")
+async def get_telemetry_streams(robot_id: str):
+    """Numeric telemetry streams recorded for a robot and their fields."""
+    if robot_id not in registry.current.robots:
+        raise HTTPException(404, "Robot not found")
+    result = {}
+    for stream in sessions.series.streams(robot_id):
+        store = sessions.series.get(robot_id, stream)
+        result[stream] = {
+            "fields": list(store.columns),
+            "samples": len(store),
+            "first": store.first_time,
+            "last": store.last_time,
+        }
+    return result
+
+@app.websocket("/ws/telemetry/{robot_id}")
+async def telemetry_websocket(
+    websocket: WebSocket,
+    robot_id: str,
+    stream: str,
+    fields: Optional[str] = None,
+    width: int = 800,
+    window: float = 1800.0,
+    refresh_ms: int = 500,
+):
+    """
+    Binary plot feed. Every `refresh_ms` the last `window` seconds of the
+    requested fields (comma separated, default all) are sent as `width`
+    min/max/mean buckets in the telemetry_series window format. The client can
+    send JSON like {"width": 1200, "window": 600, "fields": [...]} to change
+    the view, e.g. after a resize.
+    """
+    # Imports numpy; only once someone plots
+    from telemetry_series import encode_window
+
+    await websocket.accept()
+    view = {
+        "width": width,
+        "window": window,
+        "fields": fields.split(",") if fields else None,
+    }
+
+    async def receive_view_updates():
         while True:
-            if master_fd is None:
-                # No active command, just wait a bit or echo
-                # In a real shell app we would spawn a bash shell here if nothing is running,
-                # but for this specific requirement, we only show command output.
-                # Use a small sleep to avoid busy loop
-                await asyncio.sleep(0.1)
+            try:
+                update = json.loads(await websocket.receive_text())
+            except ValueError:
                 continue
-                
-            # Helper to read PTY
-            def read_pty():
-                if master_fd is None: return b""
-                try:
-                    return os.read(master_fd, 1024)
-                except OSError:
-                    return b""
-
-            # Create tasks
-            pty_task = loop.run_in_executor(None, read_pty)
-            ws_task = websocket.receive_text()
-            
-            done, pending = await asyncio.wait(
-                [pty_task, ws_task],
-                return_when=asyncio.FIRST_COMPLETED
-            )
-            
-            for task in done:
-                if task == pty_task:
-                    data = task.result()
-                    if data:
-                        await websocket.send_text(data.decode("utf-8", errors="ignore"))
-                    else:
-                        # Process might be done or closed, perform check
-                        if active_process and active_process.poll() is not None:
-                             # Process finished
-                             await websocket.send_text("\n[Command Finished]\n")
-                             master_fd = None # invalid descriptor
-                
-                elif task == ws_task:
-                    msg = task.result()
-                    if master_fd:
-                         os.write(master_fd, msg.encode("utf-8"))
+            for key in ("width", "window", "fields"):
+                if key in update:
+                    view[key] = update[key]
 
+    async def send_windows():
+        while True:
+            store = sessions.series.get(robot_id, stream)
+            if store is not None:
+                now = time.time()
+                bins = max(1, min(int(view["width"]), 8192))
+                names = view["fields"] or list(store.columns)
+                await websocket.send_bytes(encode_window(store, names, now - float(view["window"]), now, bins))
+            if refresh_ms <= 0:
+                return
+            await asyncio.sleep(refresh_ms / 1000.0)
+
+    input_task = asyncio.create_task(receive_view_updates())
+    output_task = asyncio.create_task(send_windows())
+    try:
+        done, pending = await asyncio.wait(
+            [input_task, output_task],
+            return_when=asyncio.FIRST_COMPLETED
+        )
+        for task in done:
+            task.result()
+        if output_task in done:
+            await websocket.close()
     except WebSocketDisconnect:
-        logger.info("Websocket disconnected")
+        logger.info("Telemetry websocket disconnected")
     except Exception as e:
-        logger.error(f"Terminal error: {e}")
+        logger.error(f"Telemetry error: {e}")
+    finally:
+        input_task.cancel()
+        output_task.cancel()
+
+@app.get("/api/fleet/commands")
+async def get_fleet_commands():
+    return [{"flag": flag, "label": c.label, "timeout": c.timeout} for flag, c in FLEET_COMMANDS.items()]
+
+def _selected_robots(robots: Optional[List[int]], start: Optional[int], end: Optional[int]) -> List[int]:
+    """Robot numbers, plus an inclusive range start..end (or both)."""
+    robots = list(robots or [])
+    if start is not None or end is not None:
+        if start is None or end is None or end < start:
+            raise HTTPException(400, "A range needs start <= end")
+        robots.extend(range(start, end + 1))
+    # Keep the caller's order, drop duplicates
+    robots = list(dict.fromkeys(robots))
+    if not robots:
+        raise HTTPException(400, "No robots selected")
+    if len(robots) > MAX_FLEET_ROBOTS:
+        raise HTTPException(400, f"At most {MAX_FLEET_ROBOTS} robots per run")
+    for n in robots:
+        _check_robot_number(n)
+    return robots
+
+@app.post("/api/fleet/execute")
+async def fleet_execute(req: FleetRequest):
+    command = FLEET_COMMANDS.get(req.flag)
+    if not command:
+        raise HTTPException(400, f"Unknown or non-fleet flag: {req.flag}")
+
+    robots = _selected_robots(req.robots, req.start, req.end)
+    run = fleet.start(req.flag, command, robots, req.parallelism)
+    return {"status": "started", "run_id": run.id, "command": command.label, "robots": robots,
+            "parallelism": run.parallelism}
+
+@app.get("/api/fleet")
+async def list_fleet_runs():
+    return [{k: v for k, v in run.summary().items() if k != "results"} for run in fleet.list()]
+
+@app.get("/api/fleet/{run_id}")
+async def get_fleet_run(run_id: str):
+    run = fleet.get(run_id)
+    if not run:
+        raise HTTPException(404, "Fleet run not found")
+    return run.summary()
+
+@app.delete("/api/fleet/{run_id}")
+async def cancel_fleet_run(run_id: str):
+    run = fleet.get(run_id)
+    if not run:
+        raise HTTPException(404, "Fleet run not found")
+    run.cancel()
+    return {"status": "cancelling", "run_id": run_id}
+
+@app.websocket("/ws/fleet/{run_id}")
+async def fleet_websocket(websocket: WebSocket, run_id: str, since: Optional[int] = None):
+    """
+    One text message per NDJSON frame (start / output / result, then a final
+    summary). With `since`, the first message is {"type": "resume", "offset": n}
+    like the terminal header; the client adds len(frame) + 1 bytes per frame.
+    """
+    run = fleet.get(run_id)
+    if not run:
+        await websocket.close(code=4404)
+        return
+    await websocket.accept()
+    offset, backlog, subscriber = run.broadcaster.subscribe(since)
+    if offset and offset != since:
+        # The buffer no longer starts on a frame boundary: skip to the next one
+        cut = backlog.find(b"\n") + 1
+        backlog, offset = backlog[cut:], offset + cut
+    try:
+        if since is not None:
+            await websocket.send_text(json.dumps({"type": "resume", "offset": offset}))
+        data = backlog
+        while data is not None:
+            for line in data.splitlines():
+                await websocket.send_text(line.decode("utf-8"))
+            data = await subscriber.get()
+        if subscriber.overflowed:
+            await websocket.close(code=1013, reason="viewer fell behind")
+        else:
+            await websocket.close()
+    except WebSocketDisconnect:
+        logger.info("Fleet websocket disconnected")
+    except Exception as e:
+        logger.error(f"Fleet websocket error: {e}")
+    finally:
+        run.broadcaster.unsubscribe(subscriber)
+
+@app.post("/api/downloads")
+async def start_download(req: DownloadRequest):
+    _check_robot_number(req.robot_number)
+    try:
+        if req.url:
+            robot = str(req.robot_number) if req.robot_number is not None else "http"
+            transfer = downloads.start_from_url(req.url, robot)
+        else:
+            if req.robot_number is None or not (req.remote_path or req.bag):
+                raise HTTPException(400, "robot_number and remote_path (or bag) are required")
+            remote_path = req.remote_path or f"/home/zippy/logs/{req.bag}"
+            if reachability.known_down(req.robot_number):
+                raise HTTPException(502, reachability.describe(req.robot_number))
+            transfer = downloads.start_from_robot(req.robot_number, robot_ip(req.robot_number), remote_path)
+    except DestinationBusyError as e:
+        raise HTTPException(409, {"message": str(e), "transfer_id": e.transfer_id})
+    except ValueError as e:
+        raise HTTPException(400, str(e))
+    return transfer.to_dict()
+
+@app.get("/api/downloads")
+async def list_downloads():
+    return [t.to_dict() for t in downloads.list()]
+
+@app.get("/api/downloads/{transfer_id}")
+async def get_download(transfer_id: str):
+    transfer = downloads.get(transfer_id)
+    if not transfer:
+        raise HTTPException(404, "Download not found")
+    return transfer.to_dict()
+
+@app.delete("/api/downloads/{transfer_id}")
+async def cancel_download(transfer_id: str):
+    """Stops the transfer; starting the same download again resumes it."""
+    transfer = downloads.get(transfer_id)
+    if not transfer:
+        raise HTTPException(404, "Download not found")
+    transfer.cancel()
+    return {"status": "cancelling", "transfer_id": transfer_id}
+
+@app.websocket("/ws/downloads")
+async def downloads_websocket(websocket: WebSocket, transfer_id: Optional[str] = None, interval_ms: int = 500):
+    """
+    Progress of every transfer (or just `transfer_id`) as a JSON list every
+    `interval_ms`: bytes done, current and average rate, ETA, streams, retries.
+    With `transfer_id` the socket closes once that transfer ends.
+    """
+    await websocket.accept()
+    try:
+        while True:
+            if transfer_id:
+                transfer = downloads.get(transfer_id)
+                if not transfer:
+                    await websocket.close(code=4404)
+                    return
+                await websocket.send_text(json.dumps([transfer.to_dict()]))
+                if transfer.status not in (STATUS_QUEUED, STATUS_RUNNING):
+                    await websocket.close()
+                    return
+            else:
+                await websocket.send_text(json.dumps([t.to_dict() for t in downloads.list()]))
+            await asyncio.sleep(max(interval_ms, 100) / 1000.0)
+    except WebSocketDisconnect:
+        logger.info("Downloads websocket disconnected")
+    except Exception as e:
+        logger.error(f"Downloads websocket error: {e}")
+
+@app.get("/api/sync/bundles")
+async def get_sync_bundles():
+    return [{"flag": flag, "label": b.label, "source": bundle_source(b), "dest": b.dest, "exclude": b.exclude,
+             "available": os.path.exists(bundle_source(b))} for flag, b in SYNC_BUNDLES.items()]
+
+@app.post("/api/sync")
+async def sync_files(req: SyncRequest):
+    """
+    Push a file bundle to many robots, sending only changed blocks, and
+    stream each robot's diff summary as NDJSON as it finishes. With
+    `dry_run`, bytes_sent is what the push would send.
+    """
+    bundle = SYNC_BUNDLES.get(req.flag)
+    if not bundle:
+        raise HTTPException(400, f"Unknown file flag: {req.flag}")
+    if not os.path.exists(bundle_source(bundle)):
+        raise HTTPException(404, f"{bundle_source(bundle)} does not exist")
+    robots = _selected_robots(req.robots, req.start, req.end)
+
+    # Known-down robots are reported straight away instead of timing out
+    down = [n for n in robots if reachability.known_down(n)]
+    targets = {n: robot_target(ssh_pool, n) for n in robots if n not in down}
+
+    async def stream():
+        for n in down:
+            yield json.dumps({"robot": n, "status": "unreachable", "error": reachability.describe(n),
+                              "duration": 0.0}) + "\n"
+        async for result in push_many(bundle, targets, req.parallelism, req.robot_rate, req.total_rate,
+                                      req.delete, req.dry_run):
+            yield json.dumps(result) + "\n"
+
+    return StreamingResponse(stream(), media_type="application/x-ndjson")
+
+@app.get("/api/bags")
+async def list_bags(robots: Optional[str] = None, max_age: Optional[float] = None, since: Optional[float] = None,
+                    until: Optional[float] = None, min_size: Optional[int] = None, max_size: Optional[int] = None,
+                    topic: Optional[str] = None, name: Optional[str] = None, active: Optional[bool] = None,
+                    limit: int = 1000, order: str = "newest"):
+    """
+    Bags in the fleet-wide catalog, e.g. `robots=60-90&max_age=7200&min_size=500000000`
+    for bags of robots 60-90 written in the last two hours and over 500 MB.
+    `max_age` and `since`/`until` are seconds; `name` is a glob; `order` is
+    newest, oldest, largest or robot. Answered from the catalog, not the robots.
+    """
+    numbers = _robot_spec(robots)
+    if max_age is not None:
+        since = max(since or 0, time.time() - max_age)
+    try:
+        return await bags.query(numbers, since, until, min_size, max_size, topic, name, active, max(0, limit), order)
+    except ValueError as e:
+        raise HTTPException(400, str(e))
+
+@app.get("/api/bags/robots")
+async def bag_catalog_robots():
+    """Per robot: bags in the catalog and when it was last refreshed."""
+    return await bags.robots()
+
+@app.post("/api/bags/refresh")
+async def refresh_bags(robots: Optional[str] = None):
+    """
+    Refresh the catalog now for `robots` ("60-90"; default every watched
+    robot) and stream each robot's result as NDJSON as it finishes.
+    """
+    numbers = _robot_spec(robots)
+
+    async def stream():
+        async for result in bags.refresh(numbers):
+            yield json.dumps(result) + "\n"
+
+    return StreamingResponse(stream(), media_type="application/x-ndjson")
+
+@app.get("/api/ssh")
+async def ssh_connections():
+    return ssh_pool.stats()
+
+@app.get("/metrics")
+async def metrics():
+    """Prometheus text exposition format."""
+    LOOP_LAG_MAX.set(loop_lag.take_max())
+    await sessions.supervisor.refresh_counts()
+    return PlainTextResponse(REGISTRY.render(), media_type="text/plain; version=0.0.4")
+
+@app.get("/api/profiler")
+async def profiler_status(top: int = 20):
+    return {**profiler.status(), "top": profiler.top(top)}
+
+@app.post("/api/profiler/start")
+async def profiler_start(interval_ms: float = 5.0, seconds: Optional[float] = None):
+    """Samples the event loop thread until stopped (or for `seconds`)."""
+    if not 0.5 <= interval_ms <= 1000:
+        raise HTTPException(400, "interval_ms must be between 0.5 and 1000")
+    await profiler.start(interval_ms / 1000.0, seconds)
+    return profiler.status()
+
+@app.post("/api/profiler/stop")
+async def profiler_stop():
+    await profiler.stop()
+    return profiler.status()
+
+@app.get("/api/profiler/stacks")
+async def profiler_stacks(limit: Optional[int] = None):
+    """Folded stacks for flamegraph.pl or speedscope."""
+    return PlainTextResponse(profiler.folded(limit))
+
+@app.get("/api/processes")
+async def process_metrics():
+    """Session commands started and reaped, how stops ended, and open fds/PTYs/zombies."""
+    await sessions.supervisor.refresh_counts()
+    stats = sessions.supervisor.stats()
+    stats["sessions_running"] = sessions.running_count()
+    return stats
+
+@app.on_event("startup")
+async def startup():
+    asyncio.get_running_loop().set_default_executor(executor)
+    loop_lag.start()
+    recordings.start()
+    ssh_pool.start()
+    reachability.start()
+    registry.start()
+    bags.start()
+
+@app.on_event("shutdown")
+async def shutdown():
+    jobs.stop_all()
+    await sessions.stop_all()
+    fleet.stop_all()
+    downloads.stop_all()
+    await bags.close()
+    await registry.close()
+    await reachability.close()
+    await ssh_pool.close()
+    await sessions.supervisor.close()
+    await recordings.close()
+    await loop_lag.close()
+    await profiler.stop()
 
 if __name__ == "__main__":
-    import uvicorn
-    uvicorn.run("main:app", host="0.0.0.0", port=8000, reload=True)
+    # Production server without the reloader; for development run
+    # `uvicorn main:app --reload`
+    import serve
+    serve.main(app)
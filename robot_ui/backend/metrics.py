@@ -0,0 +1,330 @@
+"""
+Prometheus-style metrics for GET /metrics, without a client library.
+
+Hot paths only touch plain numbers: a counter increment is one addition and a
+histogram observation is a bisect into fixed buckets. Anything that already
+lives on an object (bytes a session's reader has read, a viewer's queued
+bytes, the supervisor's counts) is not mirrored into metrics at all; a
+collector reads it when /metrics is scraped, so the PTY streaming loop does no
+extra work for it.
+
+Also here: ``MetricsMiddleware`` (latency per route template), the event-loop
+lag monitor and a default executor that counts its busy and queued work.
+"""
+import time
+import asyncio
+import logging
+import threading
+from bisect import bisect_left
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+logger = logging.getLogger("robot_ui_backend")
+
+# Seconds; suits request latencies as well as spawn times and loop lag
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+# How often the event-loop lag monitor wakes up
+LAG_INTERVAL = 0.25
+
+# A collected sample: (suffix, labels, value), e.g. ("", {"session": "..."}, 42)
+Sample = Tuple[str, Dict[str, str], float]
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _number(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) and not value.is_integer() else str(int(value))
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.label_names = tuple(labels)
+        self._children: Dict[Tuple[str, ...], object] = {}
+        # The only child of a metric without labels, once used
+        self._default = None
+
+    def labels(self, *values: str):
+        child = self._children.get(values)
+        if child is None:
+            if len(values) != len(self.label_names):
+                raise ValueError(f"{self.name} takes labels {self.label_names}")
+            child = self._children[values] = self._new_child()
+        return child
+
+    def _new_child(self):
+        raise NotImplementedError
+
+    def _unlabelled(self):
+        if self._default is None:
+            self._default = self.labels()
+        return self._default
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        for values, child in list(self._children.items()):
+            lines.extend(self._render_child(values, child))
+        return lines
+
+    def _render_child(self, values, child) -> List[str]:
+        return [f"{self.name}{_labels(self.label_names, values)} {_number(child.value)}"]
+
+
+class _Value:
+    __slots__ = ("value",)
+
+    def __init__(self):
+        self.value = 0
+
+    def inc(self, amount: float = 1):
+        self.value += amount
+
+    def set(self, value: float):
+        self.value = value
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def _new_child(self):
+        return _Value()
+
+    def inc(self, amount: float = 1):
+        self._unlabelled().value += amount
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def set(self, value: float):
+        self._unlabelled().value = value
+
+
+class _HistogramValue:
+    __slots__ = ("bounds", "counts", "sum", "count")
+
+    def __init__(self, bounds: Sequence[float]):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, help, labels)
+        self.buckets = tuple(sorted(buckets))
+
+    def _new_child(self):
+        return _HistogramValue(self.buckets)
+
+    def observe(self, value: float):
+        self._unlabelled().observe(value)
+
+    def _render_child(self, values, child) -> List[str]:
+        lines = []
+        cumulative = 0
+        for bound, count in zip(self.buckets + (float("inf"),), child.counts):
+            cumulative += count
+            le = f'le="{_number(bound)}"'
+            lines.append(f"{self.name}_bucket{_labels(self.label_names, values, le)} {cumulative}")
+        label_text = _labels(self.label_names, values)
+        lines.append(f"{self.name}_sum{label_text} {_number(child.sum)}")
+        lines.append(f"{self.name}_count{label_text} {child.count}")
+        return lines
+
+
+class Collected:
+    """A metric family whose samples are produced at scrape time."""
+
+    def __init__(self, name: str, help: str, kind: str, collect: Callable[[], Iterable[Sample]]):
+        self.name = name
+        self.help = help
+        self.kind = kind
+        self.collect = collect
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        try:
+            for suffix, labels, value in self.collect():
+                if value is None:
+                    continue
+                lines.append(f"{self.name}{suffix}{_labels(list(labels), list(labels.values()))} {_number(value)}")
+        except Exception as e:
+            logger.warning(f"Metrics collector {self.name} failed: {e}")
+        return lines
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics: Dict[str, object] = {}
+
+    def _add(self, metric):
+        if metric.name in self._metrics:
+            raise ValueError(f"Metric {metric.name} already registered")
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, help: str, labels: Sequence[str] = ()) -> Counter:
+        return self._add(Counter(name, help, labels))
+
+    def gauge(self, name: str, help: str, labels: Sequence[str] = ()) -> Gauge:
+        return self._add(Gauge(name, help, labels))
+
+    def histogram(self, name: str, help: str, labels: Sequence[str] = (),
+                  buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+        return self._add(Histogram(name, help, labels, buckets))
+
+    def collector(self, name: str, help: str, kind: str, collect: Callable[[], Iterable[Sample]]) -> Collected:
+        return self._add(Collected(name, help, kind, collect))
+
+    def render(self) -> str:
+        lines: List[str] = []
+        for metric in list(self._metrics.values()):
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+# Process-wide registry served by GET /metrics
+REGISTRY = MetricsRegistry()
+
+HTTP_SECONDS = REGISTRY.histogram(
+    "robot_ui_http_request_duration_seconds", "HTTP request latency by route template",
+    labels=("method", "route", "status"),
+)
+LOOP_LAG = REGISTRY.histogram(
+    "robot_ui_event_loop_lag_seconds", "How late the event loop ran a timer",
+    buckets=(0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 5.0),
+)
+LOOP_LAG_MAX = REGISTRY.gauge(
+    "robot_ui_event_loop_lag_max_seconds", "Largest event loop lag since the previous scrape",
+)
+
+
+class MetricsMiddleware:
+    """Times every HTTP request, labelled by the route it matched (not the raw path)."""
+
+    def __init__(self, app):
+        self.app = app
+        self._routes: Dict[object, str] = {}
+
+    def _route(self, scope) -> str:
+        endpoint = scope.get("endpoint")
+        if endpoint is None:
+            return "unmatched"
+        route = self._routes.get(endpoint)
+        if route is None:
+            for r in scope["app"].routes:
+                if getattr(r, "endpoint", None) is endpoint:
+                    route = r.path
+                    break
+            route = self._routes[endpoint] = route or "unmatched"
+        return route
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        status = 500
+        started = time.perf_counter()
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            HTTP_SECONDS.labels(scope["method"], self._route(scope), str(status)).observe(
+                time.perf_counter() - started)
+
+
+class LoopLagMonitor:
+    """Sleeps LAG_INTERVAL at a time and records how late each wake-up was."""
+
+    def __init__(self, interval: float = LAG_INTERVAL):
+        self.interval = interval
+        self._max = 0.0
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    async def close(self):
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+
+    def take_max(self) -> float:
+        """Largest lag since the last call (read on every scrape)."""
+        value, self._max = self._max, 0.0
+        return value
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            expected = loop.time() + self.interval
+            await asyncio.sleep(self.interval)
+            lag = max(0.0, loop.time() - expected)
+            LOOP_LAG.observe(lag)
+            if lag > self._max:
+                self._max = lag
+
+
+class InstrumentedExecutor(ThreadPoolExecutor):
+    """The loop's default executor, counting running and waiting work items."""
+
+    def __init__(self, max_workers: Optional[int] = None, **kwargs):
+        super().__init__(max_workers, **kwargs)
+        self._lock = threading.Lock()
+        self.submitted = 0
+        self.active = 0
+        self.completed = 0
+
+    def submit(self, fn, /, *args, **kwargs):
+        with self._lock:
+            self.submitted += 1
+
+        def run():
+            with self._lock:
+                self.active += 1
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                with self._lock:
+                    self.active -= 1
+                    self.completed += 1
+
+        return super().submit(run)
+
+    @property
+    def max_workers(self) -> int:
+        return self._max_workers
+
+    @property
+    def queued(self) -> int:
+        return self.submitted - self.completed - self.active
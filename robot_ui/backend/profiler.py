@@ -0,0 +1,125 @@
+"""
+Sampling profiler for the event loop thread, switched on and off at runtime.
+
+A background thread wakes every ``interval`` seconds, takes the event loop
+thread's current stack from ``sys._current_frames()`` and counts it. Nothing
+is hooked into the interpreter, so while it is off it costs nothing and while
+it is on the cost is one stack walk per sample. Results come out as folded
+stacks (``outer;inner;leaf count`` per line), which flamegraph.pl, speedscope
+and inferno read directly.
+"""
+import sys
+import time
+import asyncio
+import logging
+import threading
+from collections import Counter
+from typing import Dict, List, Optional, Tuple
+
+logger = logging.getLogger("robot_ui_backend")
+
+# Seconds between samples
+PROFILE_INTERVAL = 0.005
+
+# Stacks deeper than this are cut at the leaf end
+MAX_DEPTH = 64
+
+
+class SamplingProfiler:
+    """Samples one thread's stack on a timer."""
+
+    def __init__(self, thread_id: Optional[int] = None):
+        self.thread_id = thread_id
+        self.interval = PROFILE_INTERVAL
+        self.samples = 0
+        self.started_at: Optional[float] = None
+        self.stopped_at: Optional[float] = None
+        # Held by the sampler thread while it counts a stack, and by readers
+        # while they copy the counts
+        self._lock = threading.Lock()
+        self._stacks: Counter = Counter()
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        self._until: Optional[float] = None
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    async def start(self, interval: float = PROFILE_INTERVAL, duration: Optional[float] = None,
+                    reset: bool = True):
+        """Start sampling the event loop's thread (or ``thread_id``), optionally for ``duration`` seconds."""
+        if self.running:
+            await self.stop()
+        if self.thread_id is None:
+            self.thread_id = threading.get_ident()
+        if reset:
+            with self._lock:
+                self._stacks.clear()
+                self.samples = 0
+        self.interval = interval
+        self._until = time.monotonic() + duration if duration else None
+        self.started_at = time.time()
+        self.stopped_at = None
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+        self._thread.start()
+        logger.info(f"Profiler started, sampling every {interval * 1000:.1f} ms")
+
+    async def stop(self):
+        self._stop.set()
+        if self._thread:
+            # A sample in progress finishes first; don't hold up the loop for it
+            thread, self._thread = self._thread, None
+            await asyncio.get_running_loop().run_in_executor(None, thread.join)
+        if self.started_at and not self.stopped_at:
+            self.stopped_at = time.time()
+            logger.info(f"Profiler stopped after {self.samples} samples")
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            if self._until is not None and time.monotonic() >= self._until:
+                self.stopped_at = time.time()
+                break
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                continue
+            names: List[str] = []
+            while frame is not None and len(names) < MAX_DEPTH:
+                code = frame.f_code
+                names.append(f"{code.co_name} ({code.co_filename.rsplit('/', 1)[-1]}:{frame.f_lineno})")
+                frame = frame.f_back
+            stack = ";".join(reversed(names))
+            with self._lock:
+                self._stacks[stack] += 1
+                self.samples += 1
+
+    def _snapshot(self) -> Tuple[Counter, int]:
+        """A copy of the counts, safe to read while the sampler thread adds to them."""
+        with self._lock:
+            return Counter(self._stacks), self.samples
+
+    def folded(self, limit: Optional[int] = None) -> str:
+        """The most frequent stacks in folded format, one per line."""
+        stacks, _ = self._snapshot()
+        return "".join(f"{stack} {count}\n" for stack, count in stacks.most_common(limit))
+
+    def top(self, limit: int = 20) -> List[Dict[str, object]]:
+        """Leaf functions by share of samples, i.e. where the loop spends its time."""
+        stacks, samples = self._snapshot()
+        leaves: Counter = Counter()
+        for stack, count in stacks.items():
+            leaves[stack.rsplit(";", 1)[-1]] += count
+        total = samples or 1
+        return [{"frame": frame, "samples": count, "percent": round(100.0 * count / total, 1)}
+                for frame, count in leaves.most_common(limit)]
+
+    def status(self) -> dict:
+        return {
+            "running": self.running,
+            "interval_ms": self.interval * 1000,
+            "samples": self.samples,
+            "stacks": len(self._stacks),
+            "started_at": self.started_at,
+            "stopped_at": self.stopped_at,
+        }
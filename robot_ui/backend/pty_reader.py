@@ -0,0 +1,141 @@
+"""
+Event-loop-native reader for the master side of a PTY.
+
+The fd is switched to non-blocking mode and registered with the running
+asyncio loop via ``add_reader``. Every readable event drains up to
+``READ_CHUNK_SIZE`` bytes straight from the kernel, so streaming output never
+round-trips through the default thread pool.
+"""
+import os
+import asyncio
+import logging
+from collections import deque
+from typing import Deque, Optional
+
+logger = logging.getLogger("robot_ui_backend")
+
+# Bytes read per readable event. A PTY rarely buffers more than a few pages,
+# so this comfortably drains it in one syscall.
+READ_CHUNK_SIZE = 65536
+
+# Largest payload handed to a consumer in one ``read()`` call.
+MAX_BATCH_SIZE = 262144
+
+# When this many bytes are buffered and nobody consumes them, stop watching the
+# fd. The child then blocks on its own write, which is the backpressure we want.
+HIGH_WATER = 1048576
+LOW_WATER = 262144
+
+
+class PtyReader:
+    """Reads a PTY master fd from the event loop and queues the chunks."""
+
+    def __init__(self, fd: int, loop: Optional[asyncio.AbstractEventLoop] = None):
+        self.fd = fd
+        self._loop = loop or asyncio.get_running_loop()
+        self._chunks: Deque[bytes] = deque()
+        self._buffered = 0
+        self._eof = False
+        self._closed = False
+        self._paused = False
+        # Held by a viewer's flow control (see hold()), independent of HIGH_WATER
+        self._held = False
+        self._waiter: Optional[asyncio.Future] = None
+
+        os.set_blocking(fd, False)
+        self._loop.add_reader(fd, self._on_readable)
+
+    @property
+    def at_eof(self) -> bool:
+        return self._eof and not self._chunks
+
+    def _on_readable(self):
+        try:
+            data = os.read(self.fd, READ_CHUNK_SIZE)
+        except BlockingIOError:
+            return
+        except OSError:
+            # EIO: every slave handle is closed, i.e. the command has exited.
+            data = b""
+
+        if not data:
+            self._eof = True
+            self._stop_watching()
+        else:
+            self._chunks.append(data)
+            self._buffered += len(data)
+            if self._buffered >= HIGH_WATER:
+                self._stop_watching()
+                self._paused = True
+        self._wake()
+
+    def _wake(self):
+        waiter = self._waiter
+        if waiter is not None and not waiter.done():
+            waiter.set_result(None)
+
+    def _stop_watching(self):
+        try:
+            self._loop.remove_reader(self.fd)
+        except (ValueError, OSError):
+            pass
+
+    async def read(self) -> bytes:
+        """
+        Return everything buffered so far (up to ``MAX_BATCH_SIZE`` bytes),
+        waiting for data if nothing is pending. Returns b"" once the PTY hits EOF.
+        """
+        while not self._chunks:
+            if self._eof or self._closed:
+                return b""
+            self._waiter = self._loop.create_future()
+            try:
+                await self._waiter
+            finally:
+                self._waiter = None
+
+        if len(self._chunks) == 1:
+            data = self._chunks.popleft()
+        else:
+            parts = []
+            size = 0
+            while self._chunks and size < MAX_BATCH_SIZE:
+                part = self._chunks.popleft()
+                parts.append(part)
+                size += len(part)
+            data = b"".join(parts)
+        self._buffered -= len(data)
+
+        if self._paused and self._buffered <= LOW_WATER and not self._closed:
+            self._paused = False
+            if not self._held:
+                self._loop.add_reader(self.fd, self._on_readable)
+        return data
+
+    @property
+    def held(self) -> bool:
+        return self._held
+
+    def hold(self):
+        """Stop reading until release(); the child blocks once the PTY buffer fills."""
+        if self._held or self._closed:
+            return
+        self._held = True
+        if not self._paused and not self._eof:
+            self._stop_watching()
+
+    def release(self):
+        if not self._held:
+            return
+        self._held = False
+        # Still over the high-water mark: read() resumes watching once drained
+        if not self._paused and not self._eof and not self._closed:
+            self._loop.add_reader(self.fd, self._on_readable)
+
+    def close(self):
+        """Unregister from the loop. The fd itself is owned by the caller."""
+        if self._closed:
+            return
+        self._closed = True
+        self._stop_watching()
+        self._wake()
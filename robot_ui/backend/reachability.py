@@ -0,0 +1,224 @@
+"""
+Background reachability prober for robots.
+
+``xvalidation.sh`` runs a blocking ``ping -c 1 -W 2`` before every robot, so
+each unreachable robot costs two seconds per command. ``Reachability`` probes
+every watched robot concurrently on an interval instead (a TCP connect to the
+SSH port, or an unprivileged ICMP echo where the kernel allows it) and keeps
+the results, with last-seen time and RTT history, in a TTL cache. Request
+handlers ask ``known_down()`` and get an answer without touching the network;
+a result older than the TTL counts as unknown, never as down.
+"""
+import os
+import time
+import socket
+import struct
+import asyncio
+import logging
+from collections import deque
+from typing import Dict, Iterable, List, Optional
+
+from robots_config import FLEET_ROBOTS, robot_ip
+from ssh_pool import SSH_PORT
+
+logger = logging.getLogger("robot_ui_backend")
+
+# Seconds between probe rounds; 0 probes only on request (refresh=true)
+PROBE_INTERVAL = float(os.environ.get("ROBOT_UI_PROBE_INTERVAL", "10"))
+
+# Per-probe timeout, as ping -W 2 in xvalidation.sh
+PROBE_TIMEOUT = 2.0
+
+# "tcp" connects to the SSH port; "icmp" pings (falls back to tcp if not permitted)
+PROBE_METHOD = os.environ.get("ROBOT_UI_PROBE_METHOD", "tcp")
+
+# A result older than this is treated as unknown (30 s when probing on request)
+STATUS_TTL = 3 * (PROBE_INTERVAL or 10)
+
+# RTT samples kept per robot
+RTT_HISTORY = 20
+
+# Probes in flight at once
+MAX_PARALLEL_PROBES = 128
+
+STATUS_UP = "up"
+STATUS_DOWN = "down"
+STATUS_UNKNOWN = "unknown"
+
+ICMP_ECHO_REQUEST = 8
+ICMP_ECHO_REPLY = 0
+
+
+class RobotStatus:
+    """Probe results for one robot."""
+
+    def __init__(self, robot_number: int):
+        self.robot_number = robot_number
+        self.ip = robot_ip(robot_number)
+        self.up: Optional[bool] = None
+        self.last_checked = 0.0
+        self.last_seen: Optional[float] = None
+        self.failures = 0
+        self.error: Optional[str] = None
+        self.rtts: deque = deque(maxlen=RTT_HISTORY)
+
+    def status(self, ttl: float, now: Optional[float] = None) -> str:
+        if self.up is None or (now or time.time()) - self.last_checked > ttl:
+            return STATUS_UNKNOWN
+        return STATUS_UP if self.up else STATUS_DOWN
+
+    def record(self, rtt: Optional[float], error: Optional[str] = None):
+        self.last_checked = time.time()
+        self.up = rtt is not None
+        if self.up:
+            self.last_seen = self.last_checked
+            self.failures = 0
+            self.error = None
+            self.rtts.append(rtt)
+        else:
+            self.failures += 1
+            self.error = error
+
+    def to_dict(self, ttl: float) -> dict:
+        rtts = [round(r * 1000, 2) for r in self.rtts]
+        return {
+            "robot": self.robot_number,
+            "ip": self.ip,
+            "status": self.status(ttl),
+            "rtt_ms": rtts[-1] if rtts else None,
+            "rtt_avg_ms": round(sum(rtts) / len(rtts), 2) if rtts else None,
+            "rtt_history_ms": rtts,
+            "last_seen": self.last_seen,
+            "last_checked": self.last_checked or None,
+            "consecutive_failures": self.failures,
+            "error": self.error,
+        }
+
+
+def _icmp_checksum(data: bytes) -> int:
+    if len(data) % 2:
+        data += b"\0"
+    total = sum(struct.unpack(f"!{len(data) // 2}H", data))
+    total = (total >> 16) + (total & 0xFFFF)
+    total += total >> 16
+    return ~total & 0xFFFF
+
+
+class Reachability:
+    """TTL cache of robot reachability, refreshed by a background task."""
+
+    def __init__(self, robots: Iterable[int] = FLEET_ROBOTS, port: int = SSH_PORT,
+                 interval: float = PROBE_INTERVAL, timeout: float = PROBE_TIMEOUT,
+                 ttl: float = STATUS_TTL, method: str = PROBE_METHOD):
+        self.port = port
+        self.interval = interval
+        self.timeout = timeout
+        self.ttl = ttl
+        self.method = method
+        self._robots: Dict[int, RobotStatus] = {n: RobotStatus(n) for n in robots}
+        self._semaphore = asyncio.Semaphore(MAX_PARALLEL_PROBES)
+        self._icmp_seq = 0
+        self._task: Optional[asyncio.Task] = None
+        self.rounds = 0
+        self.last_round_duration = 0.0
+
+    def status(self, robot_number: int) -> str:
+        robot = self._robots.get(robot_number)
+        return robot.status(self.ttl) if robot else STATUS_UNKNOWN
+
+    def known_down(self, robot_number: int) -> bool:
+        """True only if a fresh probe said so; never for an unwatched robot."""
+        return self.status(robot_number) == STATUS_DOWN
+
+    def describe(self, robot_number: int) -> str:
+        robot = self._robots.get(robot_number) or RobotStatus(robot_number)
+        seen = (f"last seen {time.time() - robot.last_seen:.0f}s ago"
+                if robot.last_seen else "not seen since the backend started")
+        return f"Robot {robot_number} ({robot.ip}) is unreachable: {robot.error or 'no reply'}; {seen}"
+
+    async def _probe_tcp(self, ip: str) -> float:
+        started = time.perf_counter()
+        _, writer = await asyncio.wait_for(asyncio.open_connection(ip, self.port), self.timeout)
+        rtt = time.perf_counter() - started
+        writer.close()
+        try:
+            await writer.wait_closed()
+        except OSError:
+            pass
+        return rtt
+
+    async def _probe_icmp(self, ip: str) -> float:
+        # Unprivileged ICMP (net.ipv4.ping_group_range); the kernel sets the id
+        self._icmp_seq = (self._icmp_seq + 1) & 0xFFFF
+        seq = self._icmp_seq
+        header = struct.pack("!BBHHH", ICMP_ECHO_REQUEST, 0, 0, 0, seq)
+        packet = struct.pack("!BBHHH", ICMP_ECHO_REQUEST, 0, _icmp_checksum(header), 0, seq)
+        loop = asyncio.get_running_loop()
+        with socket.socket(socket.AF_INET, socket.SOCK_DGRAM, socket.IPPROTO_ICMP) as sock:
+            sock.setblocking(False)
+            started = time.perf_counter()
+            await loop.sock_sendto(sock, packet, (ip, 0))
+
+            async def reply():
+                while True:
+                    data = await loop.sock_recv(sock, 1024)
+                    if len(data) >= 8 and data[0] == ICMP_ECHO_REPLY and struct.unpack("!H", data[6:8])[0] == seq:
+                        return
+
+            await asyncio.wait_for(reply(), self.timeout)
+            return time.perf_counter() - started
+
+    async def probe(self, robot_number: int) -> RobotStatus:
+        """
+        Probe one robot now. A watched robot's status is updated; any other is
+        probed into a throwaway status and stays unwatched.
+        """
+        robot = self._robots.get(robot_number) or RobotStatus(robot_number)
+        async with self._semaphore:
+            try:
+                if self.method == "icmp":
+                    try:
+                        rtt = await self._probe_icmp(robot.ip)
+                    except PermissionError:
+                        logger.warning("ICMP probes not permitted (net.ipv4.ping_group_range); using TCP")
+                        self.method = "tcp"
+                        rtt = await self._probe_tcp(robot.ip)
+                else:
+                    rtt = await self._probe_tcp(robot.ip)
+                robot.record(rtt)
+            except asyncio.TimeoutError:
+                robot.record(None, f"no reply within {self.timeout:g}s")
+            except OSError as e:
+                robot.record(None, e.strerror or str(e))
+        return robot
+
+    async def probe_all(self):
+        started = time.perf_counter()
+        await asyncio.gather(*(self.probe(n) for n in list(self._robots)))
+        self.rounds += 1
+        self.last_round_duration = time.perf_counter() - started
+
+    async def _loop(self):
+        while True:
+            try:
+                await self.probe_all()
+            except Exception as e:
+                logger.error(f"Reachability probe round failed: {e}")
+            await asyncio.sleep(self.interval)
+
+    def start(self):
+        if self._task is None and self.interval > 0:
+            self._task = asyncio.create_task(self._loop())
+
+    async def close(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def snapshot(self, robot_numbers: Optional[List[int]] = None) -> List[dict]:
+        numbers = robot_numbers if robot_numbers is not None else sorted(self._robots)
+        return [(self._robots.get(n) or RobotStatus(n)).to_dict(self.ttl) for n in numbers]
@@ -0,0 +1,408 @@
+"""
+Session recordings: what a session's viewers saw, replayable later.
+
+Every session writes three files to ``RECORD_DIR``:
+
+    <id>.rec   magic, then append-only blocks: a BLOCK header followed by the
+               zlib-compressed events of the block
+    <id>.idx   one INDEX entry per block: (first event time, file position,
+               stream offset), a sparse time index
+    <id>.json  metadata (robot, command, start, size, exit code, totals)
+
+An event is an EVENT header (seconds since the start, kind, length) plus its
+bytes. Kinds follow asciicast v2: ``o`` output as published to viewers, ``i``
+input written to the PTY (only with ROBOT_UI_RECORD_INPUT=1, keystrokes
+include passwords typed at prompts), ``r`` a resize ("COLSxROWS").
+
+Recording is kept off the streaming hot path: ``Recorder.output()`` appends
+the chunk to a list and returns. Pending events are cut into a block every
+``FLUSH_INTERVAL`` seconds or ``BLOCK_BYTES`` bytes, and a single writer
+thread compresses and appends it, so zlib and the disk never run on the event
+loop.
+
+Playback memory-maps both files: finding the block for time ``t`` is a binary
+search over the fixed-size index entries, so seeking is O(log n) however long
+the recording is, and only the blocks actually played are decompressed.
+"""
+import os
+import json
+import mmap
+import time
+import zlib
+import struct
+import asyncio
+import codecs
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+logger = logging.getLogger("robot_ui_backend")
+
+# Where recordings go; ROBOT_UI_RECORD=0 turns recording off
+RECORD_DIR = os.environ.get(
+    "ROBOT_UI_RECORD_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "recordings")
+)
+RECORD_ENABLED = os.environ.get("ROBOT_UI_RECORD", "1") != "0"
+RECORD_INPUT = os.environ.get("ROBOT_UI_RECORD_INPUT", "0") == "1"
+
+# Recordings older than this many days are deleted, at startup and then
+# every PRUNE_INTERVAL seconds
+RECORD_RETENTION_DAYS = float(os.environ.get("ROBOT_UI_RECORD_DAYS", "30"))
+PRUNE_INTERVAL = 3600.0
+
+# A block is written after this long, or once this many bytes are pending
+FLUSH_INTERVAL = 1.0
+BLOCK_BYTES = 65536
+
+COMPRESS_LEVEL = 6
+
+# Blocks queued for the writer thread beyond this are dropped (and counted)
+# rather than letting a slow disk hold the output in memory
+MAX_PENDING_WRITES = 256
+
+MAGIC = b"RUIREC1\n"
+# compressed length, raw length, first event time, stream offset of the block
+BLOCK = struct.Struct("<IIdQ")
+# first event time, file position of the block, stream offset
+INDEX = struct.Struct("<dQQ")
+# seconds since the start, kind, length
+EVENT = struct.Struct("<dcI")
+
+KIND_OUTPUT = b"o"
+KIND_INPUT = b"i"
+KIND_RESIZE = b"r"
+
+# Events are (time, kind, data)
+Event = Tuple[float, bytes, bytes]
+
+
+def _encode_block(events: List[Event]) -> bytes:
+    return b"".join(EVENT.pack(t, kind, len(data)) + data for t, kind, data in events)
+
+
+def _decode_block(raw: bytes) -> Iterator[Event]:
+    pos = 0
+    while pos < len(raw):
+        t, kind, length = EVENT.unpack_from(raw, pos)
+        pos += EVENT.size
+        yield t, kind, raw[pos:pos + length]
+        pos += length
+
+
+class Recorder:
+    """Collects one session's events and hands full blocks to the writer thread."""
+
+    def __init__(self, store: "RecordingStore", session_id: str, meta: dict, record_input: bool = RECORD_INPUT):
+        self.store = store
+        self.record_input = record_input
+        self.id = session_id
+        self.meta = meta
+        self.closed = False
+        self._t0 = time.monotonic()
+        self._pending: List[Event] = []
+        self._pending_bytes = 0
+        # Stream offset of the first output byte not yet handed to the writer
+        self._offset = 0
+        # Size of the encoded events before compression
+        self.raw_bytes = 0
+        self.events = 0
+        self.dropped_bytes = 0
+
+        self.rec_path = store.path(session_id, ".rec")
+        self.idx_path = store.path(session_id, ".idx")
+        self._rec_fd: Optional[int] = None
+        self._idx_fd: Optional[int] = None
+        self._position = 0
+        store.submit(self._open)
+        store.submit(self._write_meta, dict(meta))
+
+    def _open(self):
+        # Created with the first recording, not when the backend is imported
+        os.makedirs(self.store.directory, exist_ok=True)
+        self._rec_fd = os.open(self.rec_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+        self._idx_fd = os.open(self.idx_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+        os.write(self._rec_fd, MAGIC)
+        self._position = len(MAGIC)
+
+    def _record(self, kind: bytes, data: bytes):
+        if self.closed:
+            return
+        self._pending.append((time.monotonic() - self._t0, kind, data))
+        self._pending_bytes += len(data)
+        if self._pending_bytes >= BLOCK_BYTES:
+            self.flush()
+
+    def output(self, data: bytes):
+        self._record(KIND_OUTPUT, data)
+
+    def input(self, data: bytes):
+        if self.record_input:
+            self._record(KIND_INPUT, data)
+
+    def resize(self, rows: int, cols: int):
+        self.meta.setdefault("size", [rows, cols])
+        self._record(KIND_RESIZE, f"{cols}x{rows}".encode())
+
+    def flush(self):
+        """Hand pending events to the writer thread as one block."""
+        if not self._pending:
+            return
+        events, pending, self._pending, self._pending_bytes = self._pending, self._pending_bytes, [], 0
+        offset = self._offset
+        # Output keeps its stream offsets across a dropped block, so playback
+        # offsets still match the live session's
+        self._offset += sum(len(data) for _, kind, data in events if kind == KIND_OUTPUT)
+        if self.store.pending_writes >= MAX_PENDING_WRITES:
+            if not self.dropped_bytes:
+                logger.warning(f"Recording {self.id}: writer is behind, dropping output")
+            self.dropped_bytes += pending
+            return
+        self.store.submit(self._write_block, events, offset)
+
+    def _write_block(self, events: List[Event], offset: int):
+        raw = _encode_block(events)
+        packed = zlib.compress(raw, COMPRESS_LEVEL)
+        os.write(self._rec_fd, BLOCK.pack(len(packed), len(raw), events[0][0], offset) + packed)
+        os.write(self._idx_fd, INDEX.pack(events[0][0], self._position, offset))
+        self._position += BLOCK.size + len(packed)
+        self.events += len(events)
+        self.raw_bytes += len(raw)
+
+    def close(self, **meta):
+        """Write what is pending and the final metadata."""
+        if self.closed:
+            return
+        self.flush()
+        self.closed = True
+        self.meta.update(meta, duration=time.monotonic() - self._t0, output_bytes=self._offset,
+                         dropped_bytes=self.dropped_bytes)
+        self.store.submit(self._close, dict(self.meta))
+        self.store.forget(self)
+
+    def _close(self, meta: dict):
+        self._write_meta(meta)
+        for fd in (self._rec_fd, self._idx_fd):
+            if fd is not None:
+                os.close(fd)
+        self._rec_fd = self._idx_fd = None
+
+    def update(self, **meta):
+        """Change metadata after close (e.g. the exit code, known only once reaped)."""
+        self.meta.update(meta)
+        self.store.submit(self._write_meta, dict(self.meta))
+
+    def _write_meta(self, meta: dict):
+        # Runs on the writer thread, with a copy of the metadata taken on the loop
+        meta.update(events=self.events, raw_bytes=self.raw_bytes, file_bytes=self._position)
+        path = self.store.path(self.id, ".json")
+        with open(path + ".tmp", "w") as f:
+            json.dump(meta, f)
+        os.replace(path + ".tmp", path)
+
+
+class RecordingStore:
+    """Owns the recording directory, the writer thread and the periodic flush."""
+
+    def __init__(self, directory: str = RECORD_DIR, enabled: bool = RECORD_ENABLED):
+        self.directory = directory
+        self.enabled = enabled
+        # One thread, so the blocks of a file are written in order
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="recorder")
+        self._recorders: Dict[str, Recorder] = {}
+        self._task: Optional[asyncio.Task] = None
+        # Writes handed to the writer thread, and finished by it (each counter
+        # only changes on one thread)
+        self.submitted = 0
+        self.completed = 0
+
+    def path(self, session_id: str, suffix: str) -> str:
+        return os.path.join(self.directory, session_id + suffix)
+
+    def open(self, session_id: str, **meta) -> Optional[Recorder]:
+        if not self.enabled:
+            return None
+        recorder = Recorder(self, session_id, dict(meta, session_id=session_id))
+        self._recorders[session_id] = recorder
+        return recorder
+
+    def forget(self, recorder: Recorder):
+        self._recorders.pop(recorder.id, None)
+
+    def submit(self, fn, *args):
+        self.submitted += 1
+        future = self._executor.submit(fn, *args)
+        future.add_done_callback(self._done)
+
+    def _done(self, future):
+        self.completed += 1
+        if future.exception():
+            logger.error(f"Recording write failed: {future.exception()}")
+
+    @property
+    def pending_writes(self) -> int:
+        return self.submitted - self.completed
+
+    def start(self):
+        if self.enabled:
+            self._task = asyncio.create_task(self._run())
+
+    async def _run(self):
+        next_prune = 0.0
+        while True:
+            if time.monotonic() >= next_prune:
+                # On the writer thread, sparing the files still being written
+                self.submit(self.prune, RECORD_RETENTION_DAYS, set(self._recorders))
+                next_prune = time.monotonic() + PRUNE_INTERVAL
+            await asyncio.sleep(FLUSH_INTERVAL)
+            for recorder in list(self._recorders.values()):
+                recorder.flush()
+
+    async def close(self):
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+        for recorder in list(self._recorders.values()):
+            recorder.close()
+        await asyncio.get_running_loop().run_in_executor(None, self._executor.shutdown)
+
+    def prune(self, days: float = RECORD_RETENTION_DAYS, keep: Iterable[str] = ()):
+        """Delete recordings older than ``days``, except the sessions in ``keep``."""
+        cutoff = time.time() - days * 86400
+        keep = set(keep)
+        for name in os.listdir(self.directory) if os.path.isdir(self.directory) else ():
+            if name.split(".", 1)[0] in keep:
+                continue
+            path = os.path.join(self.directory, name)
+            try:
+                if os.path.getmtime(path) < cutoff:
+                    os.remove(path)
+            except OSError:
+                pass
+
+    def list(self) -> List[dict]:
+        recordings = []
+        for name in os.listdir(self.directory) if os.path.isdir(self.directory) else ():
+            if name.endswith(".json"):
+                meta = self.meta(name[:-len(".json")])
+                if meta:
+                    recordings.append(meta)
+        return sorted(recordings, key=lambda m: m.get("started_at") or 0, reverse=True)
+
+    def meta(self, session_id: str) -> Optional[dict]:
+        try:
+            with open(self.path(session_id, ".json")) as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            return None
+        meta["recording"] = session_id in self._recorders
+        return meta
+
+    def reader(self, session_id: str) -> Optional["RecordingReader"]:
+        if not os.path.exists(self.path(session_id, ".rec")):
+            return None
+        return RecordingReader(self.path(session_id, ".rec"), self.path(session_id, ".idx"))
+
+
+class RecordingReader:
+    """Memory-mapped view of a recording's blocks and index."""
+
+    def __init__(self, rec_path: str, idx_path: str):
+        self.rec_path = rec_path
+        self.idx_path = idx_path
+        self._rec: Optional[mmap.mmap] = None
+        self._idx: Optional[mmap.mmap] = None
+        self.blocks = 0
+        self.refresh()
+
+    def refresh(self):
+        """Map the files again to see blocks written since (the session may still be recording)."""
+        self.close()
+        # The writer appends a block to .rec before its entry to .idx, so
+        # mapped in this order every entry's block is there too
+        self._idx = self._map(self.idx_path)
+        self._rec = self._map(self.rec_path)
+        blocks = len(self._idx) // INDEX.size if self._idx else 0
+        # Only whole blocks, should the files have been written some other way
+        while blocks and not self._complete(blocks - 1):
+            blocks -= 1
+        self.blocks = blocks
+
+    def _complete(self, block: int) -> bool:
+        _, position, _ = self.entry(block)
+        size = len(self._rec) if self._rec else 0
+        if position + BLOCK.size > size:
+            return False
+        return position + BLOCK.size + BLOCK.unpack_from(self._rec, position)[0] <= size
+
+    @staticmethod
+    def _map(path: str) -> Optional[mmap.mmap]:
+        with open(path, "rb") as f:
+            size = os.fstat(f.fileno()).st_size
+            return mmap.mmap(f.fileno(), size, access=mmap.ACCESS_READ) if size else None
+
+    def close(self):
+        for m in (self._rec, self._idx):
+            if m is not None:
+                m.close()
+        self._rec = self._idx = None
+
+    def entry(self, block: int) -> Tuple[float, int, int]:
+        return INDEX.unpack_from(self._idx, block * INDEX.size)
+
+    def find(self, t: float) -> int:
+        """Index of the last block starting at or before ``t`` (binary search)."""
+        lo, hi = 0, self.blocks
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self.entry(mid)[0] <= t:
+                lo = mid + 1
+            else:
+                hi = mid
+        return max(lo - 1, 0)
+
+    def read_block(self, block: int) -> Tuple[int, List[Event]]:
+        """``(stream offset, events)`` of one block."""
+        _, position, _ = self.entry(block)
+        packed_len, raw_len, _, offset = BLOCK.unpack_from(self._rec, position)
+        start = position + BLOCK.size
+        raw = zlib.decompress(self._rec[start:start + packed_len])
+        return offset, list(_decode_block(raw))
+
+    def events(self, start: float = 0.0) -> Iterator[Tuple[int, Event]]:
+        """``(stream offset, event)`` from the block holding ``start`` onwards."""
+        for block in range(self.find(start), self.blocks):
+            offset, events = self.read_block(block)
+            for event in events:
+                yield offset, event
+                if event[1] == KIND_OUTPUT:
+                    offset += len(event[2])
+
+    @property
+    def duration(self) -> float:
+        if not self.blocks:
+            return 0.0
+        _, events = self.read_block(self.blocks - 1)
+        return events[-1][0] if events else 0.0
+
+
+def asciicast(reader: RecordingReader, meta: dict) -> Iterator[str]:
+    """The recording as asciicast v2 lines (header, then one event per line)."""
+    rows, cols = meta.get("size") or (24, 80)
+    header = {
+        "version": 2,
+        "width": cols,
+        "height": rows,
+        "timestamp": int(meta.get("started_at") or 0),
+        "title": f"{meta.get('robot_id', '')}: {meta.get('command', '')}",
+        "env": {"TERM": "xterm-256color"},
+    }
+    yield json.dumps(header) + "\n"
+    # asciicast holds text: decode incrementally so characters split across
+    # chunks stay intact
+    decoders = {KIND_OUTPUT: codecs.getincrementaldecoder("utf-8")("replace"),
+                KIND_INPUT: codecs.getincrementaldecoder("utf-8")("replace")}
+    for _, (t, kind, data) in reader.events():
+        decoder = decoders.get(kind)
+        text = decoder.decode(data) if decoder else data.decode()
+        if text:
+            yield json.dumps([round(t, 6), kind.decode(), text]) + "\n"
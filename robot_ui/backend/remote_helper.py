@@ -0,0 +1,102 @@
+"""
+Small stdlib-only Python helpers run on the robots (sync_helper.py, bag_helper.py).
+
+A helper's source goes over the robot's pooled SSH connection as ``python3 -S
+-c``, so nothing has to be installed on a robot and the helper always matches
+the backend. ``-S`` skips site packages (the ROS environment's) so it starts
+quickly. ``LocalTarget`` runs the same helper against a local directory
+standing in for a robot instead (ROBOT_UI_LOCAL_ROBOTS, benchmarks).
+
+Helpers frame their first answer as a ``<mark> <length>`` line followed by
+that many bytes of JSON, so whatever a login shell prints first is skipped.
+"""
+import os
+import sys
+import json
+import shlex
+import asyncio
+from contextlib import asynccontextmanager
+from typing import List, Union
+
+from robots_config import robot_ip
+from ssh_pool import SSHPool
+
+# Robot N is the local directory <root>/<N>/ (robot paths taken under it)
+# instead of a robot over SSH
+LOCAL_ROBOTS_ROOT = os.environ.get("ROBOT_UI_LOCAL_ROBOTS")
+
+
+class HelperError(Exception):
+    """The robot's side of a helper run failed."""
+
+
+def last_line(output: bytes) -> str:
+    lines = output.decode(errors="replace").strip().splitlines()
+    return lines[-1] if lines else ""
+
+
+class LocalTarget:
+    """A local directory standing in for a robot; robot paths are taken under ``root``."""
+
+    def __init__(self, root: str):
+        self.root = root
+
+    def path(self, remote_path: str) -> str:
+        return os.path.join(self.root, remote_path.lstrip("/"))
+
+    @asynccontextmanager
+    async def process(self, source: str, args: List[str]):
+        """The helper as a local process (stdout and stderr merged into ``process.stdout``)."""
+        proc = await asyncio.create_subprocess_exec(
+            sys.executable, "-S", "-c", source, *args,
+            stdin=asyncio.subprocess.PIPE,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.STDOUT,
+        )
+        try:
+            yield proc
+        finally:
+            if proc.returncode is None:
+                proc.kill()
+                await proc.wait()
+
+
+class SSHTarget:
+    """A robot, reached over its pooled SSH connection."""
+
+    def __init__(self, pool: SSHPool, host: str):
+        self.pool = pool
+        self.host = host
+
+    def path(self, remote_path: str) -> str:
+        return remote_path
+
+    def process(self, source: str, args: List[str]):
+        """The helper as an SSH channel (see ``SSHPool.channel``)."""
+        command = f"python3 -S -c {shlex.quote(source)} {' '.join(shlex.quote(a) for a in args)}"
+        return self.pool.channel(self.host, command, stdin=True)
+
+
+HelperTarget = Union[LocalTarget, SSHTarget]
+
+
+def robot_target(pool: SSHPool, robot_number: int) -> HelperTarget:
+    if LOCAL_ROBOTS_ROOT:
+        return LocalTarget(os.path.join(LOCAL_ROBOTS_ROOT, str(robot_number)))
+    return SSHTarget(pool, robot_ip(robot_number))
+
+
+async def read_framed(proc, mark: bytes):
+    """The helper's framed JSON answer, skipping anything printed before it."""
+    noise = b""
+    try:
+        while True:
+            line = await proc.stdout.readline()
+            if line.startswith(mark):
+                return json.loads(await proc.stdout.readexactly(int(line.split()[1])))
+            if not line:
+                await proc.wait()
+                raise HelperError(last_line(noise) or f"helper exited with {proc.returncode}")
+            noise = line
+    except (asyncio.IncompleteReadError, ValueError) as e:
+        raise HelperError(f"Bad answer from the robot: {e}")
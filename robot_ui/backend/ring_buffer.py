@@ -0,0 +1,81 @@
+"""
+Fixed-size output ring addressed by absolute byte offsets.
+
+Offsets count every byte ever written to the stream, so a client that saw up
+to offset N can ask for ``read_from(N)`` and get exactly what it missed, as long
+as those bytes are still inside the window. The storage is one preallocated
+bytearray written through a memoryview, so memory stays flat however long the
+command runs and no per-chunk concatenation happens on the write path.
+"""
+from typing import Tuple
+
+
+class OutputRing:
+    """Keeps the last ``capacity`` bytes of a stream."""
+
+    def __init__(self, capacity: int, origin: int = 0):
+        if capacity <= 0:
+            raise ValueError("capacity must be positive")
+        self.capacity = capacity
+        self._buf = bytearray(capacity)
+        self._view = memoryview(self._buf)
+        # Offset of the first byte this ring saw: 0, or where a mirror of
+        # another process's ring picked the stream up
+        self.origin = origin
+        # Absolute offset one past the newest byte (total bytes ever written)
+        self.end = origin
+
+    @property
+    def start(self) -> int:
+        """Absolute offset of the oldest byte still retained."""
+        return max(self.origin, self.end - self.capacity)
+
+    def __len__(self) -> int:
+        return self.end - self.start
+
+    def append(self, data: bytes):
+        total = len(data)
+        if not total:
+            return
+        src = memoryview(data)
+        if total > self.capacity:
+            # Only the tail can survive anyway
+            src = src[total - self.capacity:]
+
+        n = len(src)
+        pos = (self.end + total - n) % self.capacity
+        first = min(n, self.capacity - pos)
+        self._view[pos:pos + first] = src[:first]
+        if first < n:
+            self._view[:n - first] = src[first:]
+        self.end += total
+
+    def shrink(self):
+        """
+        Release the unused part of the buffer once nothing more will be
+        written (the command finished). Offsets and retained bytes stay the same.
+        """
+        start, data = self.read_from(self.start)
+        if len(data) == self.capacity:
+            return
+        self.capacity = max(len(data), 1)
+        self._buf = bytearray(self.capacity)
+        self._view = memoryview(self._buf)
+        self.origin = self.end = start
+        self.append(data)
+
+    def read_from(self, offset: int) -> Tuple[int, bytes]:
+        """
+        Return ``(actual_offset, data)`` covering ``offset`` up to ``end``.
+        If ``offset`` has already been overwritten, reading starts at the oldest
+        retained byte and ``actual_offset`` says where that is.
+        """
+        offset = min(max(offset, self.start), self.end)
+        n = self.end - offset
+        if not n:
+            return offset, b""
+        pos = offset % self.capacity
+        first = min(n, self.capacity - pos)
+        if first == n:
+            return offset, bytes(self._view[pos:pos + n])
+        return offset, bytes(self._view[pos:]) + bytes(self._view[:n - first])
@@ -0,0 +1,185 @@
+"""
+Robot type registry loaded from a JSON (or YAML) file.
+
+The registry file (``ROBOT_UI_ROBOTS_FILE``, default ``robots.json`` next to this
+module) is validated once into ``RobotConfig`` models and compiled into a
+read-only ``CompiledRegistry``. The compiled registry holds the response bodies
+of ``/api/robots`` and ``/api/robots/{id}/commands`` as ready-made JSON bytes
+with their ETags, so those requests skip pydantic serialization entirely.
+``${SCRIPTS_DIR}`` and other ``${VAR}`` references in strings are expanded
+from the environment when the file is loaded.
+
+``RobotRegistry`` polls the file's mtime and swaps in a freshly compiled
+registry when it changes; a file that fails to load is logged and the previous
+registry stays in use. Handlers take ``registry.current`` once per request, so
+a reload never hands them a half-updated view.
+"""
+import os
+import json
+import time
+import asyncio
+import hashlib
+import logging
+from string import Template
+from types import MappingProxyType
+from typing import Any, Dict, Mapping, Optional
+
+from fastapi import Request, Response
+from pydantic import ValidationError
+
+from robots_config import RobotConfig, SCRIPTS_DIR
+
+logger = logging.getLogger("robot_ui_backend")
+
+ROBOTS_FILE = os.environ.get(
+    "ROBOT_UI_ROBOTS_FILE", os.path.join(os.path.dirname(os.path.abspath(__file__)), "robots.json")
+)
+
+# Seconds between checks of the registry file's mtime
+REGISTRY_POLL_INTERVAL = float(os.environ.get("ROBOT_UI_REGISTRY_POLL", "2"))
+
+
+class RegistryError(Exception):
+    """The registry file could not be read, parsed or validated."""
+
+
+def _expand(value: Any, variables: Mapping[str, str]) -> Any:
+    if isinstance(value, str):
+        return Template(value).safe_substitute(variables)
+    if isinstance(value, list):
+        return [_expand(v, variables) for v in value]
+    if isinstance(value, dict):
+        return {k: _expand(v, variables) for k, v in value.items()}
+    return value
+
+
+def _etag(body: bytes) -> str:
+    return '"' + hashlib.sha1(body).hexdigest()[:20] + '"'
+
+
+def _json(value: Any) -> bytes:
+    return json.dumps(value, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+
+
+def cached_json(request: Request, body: bytes, etag: str) -> Response:
+    """Pre-serialized registry JSON, or 304 if the client already has it."""
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    match = request.headers.get("if-none-match")
+    if match and (match.strip() == "*" or etag in (t.strip().removeprefix("W/") for t in match.split(","))):
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
+
+
+class CompiledRegistry:
+    """An immutable snapshot of the registry with pre-serialized responses."""
+
+    __slots__ = ("robots", "robots_body", "robots_etag", "commands_body", "commands_etag",
+                 "source", "mtime", "loaded_at")
+
+    def __init__(self, robots: Dict[str, RobotConfig], source: Optional[str] = None, mtime: float = 0.0):
+        self.robots: Mapping[str, RobotConfig] = MappingProxyType(dict(robots))
+        self.robots_body = _json([
+            {"id": r.id, "name": r.name, "image_key": r.image_key} for r in robots.values()
+        ])
+        self.robots_etag = _etag(self.robots_body)
+        commands_body = {
+            robot_id: _json([c.model_dump(mode="json") for c in robot.commands])
+            for robot_id, robot in robots.items()
+        }
+        self.commands_body: Mapping[str, bytes] = MappingProxyType(commands_body)
+        self.commands_etag: Mapping[str, str] = MappingProxyType(
+            {robot_id: _etag(body) for robot_id, body in commands_body.items()}
+        )
+        self.source = source
+        self.mtime = mtime
+        self.loaded_at = time.time()
+
+
+def load_registry(path: str = ROBOTS_FILE) -> CompiledRegistry:
+    """Read, expand, validate and compile a registry file."""
+    try:
+        mtime = os.stat(path).st_mtime
+        with open(path, "r", encoding="utf-8") as f:
+            if path.endswith((".yaml", ".yml")):
+                try:
+                    import yaml
+                except ImportError:
+                    raise RegistryError(f"{path}: YAML registries need PyYAML (pip install pyyaml)")
+                data = yaml.safe_load(f)
+            else:
+                data = json.load(f)
+    except (OSError, ValueError) as e:
+        raise RegistryError(f"{path}: {e}")
+
+    entries = data.get("robots") if isinstance(data, dict) else None
+    if not isinstance(entries, list):
+        raise RegistryError(f"{path}: expected an object with a \"robots\" list")
+
+    variables = dict(os.environ, SCRIPTS_DIR=SCRIPTS_DIR)
+    robots: Dict[str, RobotConfig] = {}
+    for index, entry in enumerate(entries):
+        try:
+            robot = RobotConfig.model_validate(_expand(entry, variables))
+        except ValidationError as e:
+            raise RegistryError(f"{path}: robot #{index}: {e}")
+        if robot.id in robots:
+            raise RegistryError(f"{path}: duplicate robot id {robot.id!r}")
+        robots[robot.id] = robot
+    return CompiledRegistry(robots, path, mtime)
+
+
+class RobotRegistry:
+    """The current compiled registry, reloaded when its file changes."""
+
+    def __init__(self, path: str = ROBOTS_FILE, poll_interval: float = REGISTRY_POLL_INTERVAL):
+        self.path = path
+        self.poll_interval = poll_interval
+        self.current = load_registry(path)
+        self._stamp = self._file_stamp()
+        self.reloads = 0
+        self.last_error: Optional[str] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def _file_stamp(self):
+        try:
+            st = os.stat(self.path)
+        except OSError:
+            return None
+        return st.st_mtime_ns, st.st_size, st.st_ino
+
+    def reload(self) -> bool:
+        """Reload if the file changed; returns True when a new registry was swapped in."""
+        stamp = self._file_stamp()
+        if stamp is None or stamp == self._stamp:
+            return False
+        self._stamp = stamp
+        try:
+            compiled = load_registry(self.path)
+        except RegistryError as e:
+            self.last_error = str(e)
+            logger.error(f"Keeping the previous robot registry: {e}")
+            return False
+        # A single reference swap; requests in flight keep the snapshot they took
+        self.current = compiled
+        self.reloads += 1
+        self.last_error = None
+        logger.info(f"Reloaded robot registry from {self.path} ({len(compiled.robots)} robot types)")
+        return True
+
+    async def _watch(self):
+        while True:
+            await asyncio.sleep(self.poll_interval)
+            self.reload()
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._watch())
+
+    async def close(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
@@ -1,9 +1,42 @@
-from typing import List, Dict
+import os
+from typing import List, Dict, Optional
 from pydantic import BaseModel
 
+class TelemetryConfig(BaseModel):
+    # Emit at most one (the latest) `---` frame per interval
+    interval_ms: int = 150
+    # Dotted paths to keep from each frame, e.g. ["pose"]; empty keeps everything
+    fields: List[str] = []
+    # Stream name for plotting (defaults to the command label)
+    topic: Optional[str] = None
+    # Numeric dotted paths recorded from every frame for /ws/telemetry plots;
+    # empty records nothing
+    series: List[str] = []
+
+class TeleopConfig(BaseModel):
+    # Keys that move the robot (turtlebot3_teleop_key and teleop_twist_keyboard
+    # style); repeats within repeat_ms collapse to the latest
+    move_keys: List[str] = ["w", "a", "d", "x", "i", "j", "l", ",", "F", "B", "L", "R"]
+    # Keys that stop it: sent ahead of anything waiting, and cancel waiting moves
+    stop_keys: List[str] = [" ", "s", "k", "S"]
+    repeat_ms: int = 50
+    # Output text after which key handling starts (e.g. once a sudo password
+    # has been typed); None starts it at once
+    ready: Optional[str] = None
+    # Output text that answers a key (e.g. "currently:"), timed as key
+    # latency; None takes any output
+    ack: Optional[str] = None
+
 class RobotCommand(BaseModel):
     label: str
-    command_args: List[str]
+    command_args: List[str] = []
+    # Set for high-rate `rostopic echo` style commands
+    telemetry: Optional[TelemetryConfig] = None
+    # Shell command run on the robot itself over its pooled SSH connection
+    # instead of command_args; needs a robot number in the request
+    remote_command: Optional[str] = None
+    # Set for interactive teleop: keystrokes take the low-latency path in teleop.py
+    teleop: Optional[TeleopConfig] = None
 
 class RobotConfig(BaseModel):
     id: str
@@ -12,51 +45,130 @@ class RobotConfig(BaseModel):
     validation_script: List[str]
     commands: List[RobotCommand]
 
-# Configuration for the 4 robot types
-# Using dummy scripts for now
-SCRIPTS_DIR = "/home/vlabuser2/.gemini/antigravity/scratch/robot_ui/scripts"
-
-ROBOTS: Dict[str, RobotConfig] = {
-    "zippy6": RobotConfig(
-        id="zippy6",
-        name="Zippy6",
-        image_key="zippy6",
-        validation_script=[f"{SCRIPTS_DIR}/validate_robot.sh", "Zippy6"],
-        commands=[
-            RobotCommand(label="Home System", command_args=[f"{SCRIPTS_DIR}/run_command.sh", "Home_Zippy6", "3"]),
-            RobotCommand(label="Calibrate Axis", command_args=[f"{SCRIPTS_DIR}/run_command.sh", "Calibrate_Zippy6", "5"]),
-            RobotCommand(label="Log Data", command_args=[f"{SCRIPTS_DIR}/run_command.sh", "Log_Zippy6", "2"]),
-        ]
+# Robot types and their commands live in robots.json (see robot_registry.py);
+# ${SCRIPTS_DIR} there expands to this directory
+SCRIPTS_DIR = os.environ.get(
+    "ROBOT_UI_SCRIPTS_DIR",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "scripts"),
+)
+
+# Robot N lives at ROBOT_IP_PREFIX + (N + ROBOT_IP_OFFSET), as in xvalidation.sh
+ROBOT_IP_PREFIX = os.environ.get("ROBOT_UI_IP_PREFIX", "10.30.72.")
+ROBOT_IP_OFFSET = int(os.environ.get("ROBOT_UI_IP_OFFSET", "60"))
+
+# Highest robot number an address exists for (.254 with the default offset)
+MAX_ROBOT_NUMBER = int(os.environ.get("ROBOT_UI_MAX_ROBOT", str(254 - ROBOT_IP_OFFSET)))
+
+def robot_ip(robot_number: int) -> str:
+    return f"{ROBOT_IP_PREFIX}{robot_number + ROBOT_IP_OFFSET}"
+
+def parse_robot_numbers(spec: str, max_number: Optional[int] = None, max_count: Optional[int] = None) -> List[int]:
+    """
+    '1-60,72' -> [1, 2, ..., 60, 72]. Raises ValueError on a malformed spec,
+    a number above ``max_number`` or more than ``max_count`` robots; the
+    limits are checked before a range is expanded.
+    """
+    numbers = set()
+    for part in spec.replace(" ", "").split(","):
+        if not part:
+            continue
+        first, _, last = part.partition("-")
+        try:
+            first, last = int(first), int(last or first)
+        except ValueError:
+            raise ValueError(f"Robot numbers look like '1-10,72', not {part!r}") from None
+        if max_number is not None and max(first, last) > max_number:
+            raise ValueError(f"Robot numbers go from 0 to {max_number}")
+        if max_count is not None and last - first + 1 > max_count:
+            raise ValueError(f"At most {max_count} robots")
+        numbers.update(range(first, last + 1))
+        if max_count is not None and len(numbers) > max_count:
+            raise ValueError(f"At most {max_count} robots")
+    return sorted(numbers)
+
+# Robot numbers the backend watches for reachability (see reachability.py)
+FLEET_ROBOTS = parse_robot_numbers(os.environ.get("ROBOT_UI_ROBOTS", "1-60"))
+
+class FleetCommand(BaseModel):
+    label: str
+    # Run on each robot over SSH; {robot_number} and {password} are filled in
+    # (write literal braces as {{ }})
+    remote_command: str
+    # Seconds before one robot's run is cut off
+    timeout: float = 60.0
+
+# Inside the robot's docker container, as xvalidation.sh does it
+def _in_container(command: str) -> str:
+    return (
+        "echo {password} | sudo -S docker exec zippy bash -c "
+        f"'source /home/zippy/zippy_ws/install/setup.bash && {command}'"
+    )
+
+def _topic_snapshot(label: str, topic: str) -> "FleetCommand":
+    # One message per robot: a fleet-wide snapshot rather than an endless echo
+    return FleetCommand(label=label, remote_command=_in_container(f"rostopic echo -n 1 {topic}"), timeout=15.0)
+
+# Non-interactive xvalidation.sh flags that can run across the fleet at once
+# (-s, -Z and file transfers stay per robot)
+FLEET_COMMANDS: Dict[str, FleetCommand] = {
+    "-i": FleetCommand(
+        label="Inspect docker image",
+        remote_command="echo {password} | sudo -S docker inspect zippy | grep 'Image' | awk 'NR==1'",
     ),
-    "zippy10": RobotConfig(
-        id="zippy10",
-        name="Zippy10",
-        image_key="zippy10",
-        validation_script=[f"{SCRIPTS_DIR}/validate_robot.sh", "Zippy10"],
-        commands=[
-            RobotCommand(label="Quick Scan", command_args=[f"{SCRIPTS_DIR}/run_command.sh", "Scan_Zippy10", "4"]),
-            RobotCommand(label="Deep Clean", command_args=[f"{SCRIPTS_DIR}/run_command.sh", "Clean_Zippy10", "6"]),
-        ]
+    "-x": FleetCommand(
+        label="Restart docker",
+        remote_command="echo {password} | sudo -S /opt/docker_setup/startup.sh",
+        timeout=300.0,
     ),
-    "zippy40": RobotConfig(
-        id="zippy40",
-        name="Zippy40",
-        image_key="zippy40",
-        validation_script=[f"{SCRIPTS_DIR}/validate_robot.sh", "Zippy40"],
-        commands=[
-            RobotCommand(label="Heavy Lift", command_args=[f"{SCRIPTS_DIR}/run_command.sh", "Lift_Zippy40", "8"]),
-            RobotCommand(label="Safety Check", command_args=[f"{SCRIPTS_DIR}/run_command.sh", "Safety_Zippy40", "2"]),
-            RobotCommand(label="Diagnose", command_args=[f"{SCRIPTS_DIR}/run_command.sh", "Diag_Zippy40", "5"]),
-        ]
+    "-X": FleetCommand(
+        label="Pull latest image",
+        remote_command="echo {password} | sudo -S docker pull 10.10.0.105:5000/zippyx:latest",
+        timeout=600.0,
     ),
-    "zippyx": RobotConfig(
-        id="zippyx",
-        name="ZippyX",
-        image_key="zippyx",
-        validation_script=[f"{SCRIPTS_DIR}/validate_robot.sh", "ZippyX"],
-        commands=[
-            RobotCommand(label="Expert Mode", command_args=[f"{SCRIPTS_DIR}/run_command.sh", "Expert_ZippyX", "10"]),
-            RobotCommand(label="Update Firmware", command_args=[f"{SCRIPTS_DIR}/run_command.sh", "Update_ZippyX", "15"]),
-        ]
+    "-h": FleetCommand(
+        label="Hostname change",
+        remote_command="echo {password} | sudo -S hostnamectl set-hostname zippy{robot_number}",
     ),
+    "-M": FleetCommand(label="Check bags list", remote_command="cd ~/logs/bags/ && ls -ltrh"),
+    "-T": FleetCommand(label="Check pgv offset value", remote_command="cd ~/cfg/robot_parameters && cat robot.yaml"),
+    "-o": _topic_snapshot("Linear odom", "/odom/twist/twist/linear/x"),
+    "-d": _topic_snapshot("Debug detail", "/debug_detail"),
+    "-c": _topic_snapshot("Client debug", "/client_debug"),
+    "-m": _topic_snapshot("Topic monitor", "/topic_monitor/monitoring"),
+    "-B": _topic_snapshot("Barcode data", "/barcode_pose_raw"),
+    "-E": _topic_snapshot("Error codes", "/error_code"),
+    "-A": _topic_snapshot("Lifter debug", "/lift_debug"),
+    "-G": _topic_snapshot("Goal result", "/goal_result"),
+    "-O": _topic_snapshot("Raw odom", "/raw_odom"),
 }
+
+# Files xvalidation.sh copies to robots live here (its ./robot_files)
+ROBOT_FILES_DIR = os.environ.get("ROBOT_UI_ROBOT_FILES_DIR", os.path.join(SCRIPTS_DIR, "robot_files"))
+
+class SyncBundle(BaseModel):
+    label: str
+    # File or directory under ROBOT_FILES_DIR
+    source: str
+    # Directory on the robot it goes into, as `scp -r source robot:dest` would put it
+    dest: str
+    # fnmatch patterns (relative to dest, e.g. "robot_parameters/robot.yaml")
+    # for files left alone on both sides
+    exclude: List[str] = []
+
+# xvalidation.sh file-transfer flags, pushed with sync.py; the docker restart
+# -U does afterwards stays a separate -x
+SYNC_BUNDLES: Dict[str, SyncBundle] = {
+    "-U": SyncBundle(
+        label="Robot parameters",
+        source="robot_parameters",
+        dest="/home/zippy",
+        # Each robot keeps its own calibration
+        exclude=["robot_parameters/robot.yaml"],
+    ),
+    "-p": SyncBundle(label="OS config", source="zippy_os.yaml", dest="/home/zippy/cfg"),
+    "-v": SyncBundle(label="Host CLI firmware", source="DHL_HOST_CLI", dest="/home/zippy"),
+}
+
+# Numeric fields recorded for plotting from the telemetry streams
+ODOM_SERIES = ["pose.pose.position.x", "pose.pose.position.y", "twist.twist.linear.x", "twist.twist.angular.z"]
+LIFT_SERIES = ["height", "target_height", "motor_current"]
@@ -0,0 +1,242 @@
+"""
+Production entry point for the backend.
+
+``uvicorn main:app --reload`` is for development: the reloader is a second
+process that imports the app again and keeps polling the tree. Here the app
+runs in one process without it, and the listening socket is bound before
+``main`` is imported, so while a restarting kiosk backend imports, requests
+wait in the socket's backlog instead of being refused. numpy (telemetry
+plots) and httpx (URL downloads) are imported when first used, not at
+start-up; ``--import-profile`` shows what start-up still imports.
+
+``--workers N`` (N > 1) serves a whole shift of operators on several cores.
+This process stays the primary: it runs main.py's app on a Unix socket, owns
+every session, job and transfer, and serves sessions to the workers
+(session_ipc.py). N worker processes (worker.py) share the TCP socket; each
+fans terminal output out to its own viewers and proxies everything else to
+the primary, so any worker sees every session. A worker that dies is
+restarted; the primary stops them all when it stops.
+
+Usage:
+    python3 serve.py [--host 0.0.0.0] [--port 8000] [--workers 1] [--no-access-log]
+    python3 serve.py --import-profile [--top 20]
+"""
+import os
+import sys
+import time
+import shutil
+import socket
+import asyncio
+import logging
+import argparse
+import tempfile
+import subprocess
+from typing import Dict, List, Optional, Tuple
+
+STARTED = time.perf_counter()
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+
+logger = logging.getLogger("robot_ui_backend")
+
+# uvicorn's default
+BACKLOG = 2048
+
+# Seconds between checks that every worker is still running
+WORKER_CHECK_INTERVAL = 1.0
+
+# Seconds workers get to finish at shutdown before they are killed
+WORKER_STOP_TIMEOUT = 5.0
+
+
+def process_started() -> float:
+    """``time.perf_counter()`` when this process started (from /proc; else when serve.py was imported)."""
+    try:
+        with open("/proc/self/stat") as f:
+            start_ticks = int(f.read().rsplit(")", 1)[1].split()[19])
+        with open("/proc/uptime") as f:
+            uptime = float(f.read().split()[0])
+        return time.perf_counter() - (uptime - start_ticks / os.sysconf("SC_CLK_TCK"))
+    except (OSError, ValueError, IndexError):
+        return STARTED
+
+
+def bind(host: str, port: int) -> socket.socket:
+    family = socket.AF_INET6 if ":" in host else socket.AF_INET
+    # With proto 0 asyncio doesn't recognize the accepted sockets as TCP and
+    # leaves Nagle on: every keep-alive response then waits for a delayed ACK
+    sock = socket.socket(family, socket.SOCK_STREAM, socket.IPPROTO_TCP)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(BACKLOG)
+    return sock
+
+
+def bind_unix(path: str) -> socket.socket:
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    sock.bind(path)
+    sock.listen(BACKLOG)
+    return sock
+
+
+class Workers:
+    """The worker processes of ``--workers``, each started again if it exits."""
+
+    def __init__(self, count: int, sock: socket.socket, env: Dict[str, str], access_log: bool = True):
+        self.sock = sock
+        self.env = env
+        self.access_log = access_log
+        self.restarts = 0
+        self._processes: List[Optional[subprocess.Popen]] = [None] * count
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def running(self) -> int:
+        return sum(1 for p in self._processes if p and p.poll() is None)
+
+    def _spawn(self, i: int):
+        fd = self.sock.fileno()
+        argv = [sys.executable, os.path.join(BACKEND_DIR, "serve.py"), "--worker-fd", str(fd)]
+        if not self.access_log:
+            argv.append("--no-access-log")
+        # Their own session: ^C in a terminal reaches the primary, which then
+        # stops the workers, instead of racing it to restart them
+        self._processes[i] = subprocess.Popen(argv, cwd=BACKEND_DIR, env=self.env, pass_fds=(fd,),
+                                              start_new_session=True)
+
+    def start(self):
+        """Spawn the workers; they import while the primary does."""
+        for i in range(len(self._processes)):
+            self._spawn(i)
+
+    def watch(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._watch())
+
+    async def _watch(self):
+        while True:
+            await asyncio.sleep(WORKER_CHECK_INTERVAL)
+            for i, process in enumerate(self._processes):
+                if process.poll() is not None:
+                    logger.warning(f"Worker {process.pid} exited with {process.returncode}; starting another")
+                    self.restarts += 1
+                    self._spawn(i)
+
+    async def close(self):
+        if self._task:
+            self._task.cancel()
+            self._task = None
+        for process in self._processes:
+            if process and process.poll() is None:
+                process.terminate()
+        deadline = time.monotonic() + WORKER_STOP_TIMEOUT
+        while any(p and p.poll() is None for p in self._processes) and time.monotonic() < deadline:
+            await asyncio.sleep(0.05)
+        for process in self._processes:
+            if process and process.poll() is None:
+                logger.warning(f"Worker {process.pid} didn't stop; killing it")
+                process.kill()
+                process.wait()
+
+
+def import_profile(top: int = 20) -> Tuple[float, List[Tuple[float, float, str]]]:
+    """
+    Import time of ``main`` in a fresh interpreter (ms) and its ``top``
+    modules by self time as (self ms, cumulative ms, module).
+    """
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", "import main"], cwd=BACKEND_DIR,
+                            capture_output=True, text=True, check=True)
+    modules = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "[us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        modules.append((int(self_us) / 1000, int(cumulative_us) / 1000, name.strip()))
+    total = next((cumulative for _, cumulative, name in modules if name == "main"), 0.0)
+    return total, sorted(modules, reverse=True)[:top]
+
+
+def main(app=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--workers", type=int, default=1,
+                        help="processes serving HTTP and websockets; above 1 this one owns the sessions")
+    parser.add_argument("--no-access-log", action="store_true", help="don't log every request")
+    # A worker's inherited TCP socket; set by the primary
+    parser.add_argument("--worker-fd", type=int, help=argparse.SUPPRESS)
+    parser.add_argument("--import-profile", action="store_true", help="print the slowest imports of main and exit")
+    parser.add_argument("--top", type=int, default=20, help="modules --import-profile prints")
+    args = parser.parse_args()
+
+    if args.import_profile:
+        total, modules = import_profile(args.top)
+        print(f"import main: {total:.1f} ms")
+        for self_ms, cumulative_ms, name in modules:
+            print(f"{self_ms:8.1f} ms self {cumulative_ms:8.1f} ms cumulative  {name}")
+        return
+
+    sys.path.insert(0, BACKEND_DIR)
+    if args.worker_fd is not None:
+        sock = socket.socket(fileno=args.worker_fd)
+        from worker import app
+        serving = f"worker {os.getpid()}"
+    else:
+        sock = bind(args.host, args.port)
+        serving = f"{args.host}:{args.port}"
+
+    workers = host = runtime_dir = None
+    if args.workers > 1 and args.worker_fd is None:
+        runtime_dir = tempfile.mkdtemp(prefix="robot-ui-")
+        primary_sock = bind_unix(os.path.join(runtime_dir, "primary.sock"))
+        session_sock = bind_unix(os.path.join(runtime_dir, "sessions.sock"))
+        env = dict(os.environ, ROBOT_UI_PRIMARY_SOCKET=primary_sock.getsockname(),
+                   ROBOT_UI_SESSION_SOCKET=session_sock.getsockname())
+        workers = Workers(args.workers, sock, env, not args.no_access_log)
+        workers.start()
+        serving += f" with {args.workers} workers"
+    if app is None:
+        from main import app
+
+    import uvicorn
+    from metrics import REGISTRY
+
+    ready: Optional[float] = None
+    REGISTRY.collector("robot_ui_startup_seconds", "Seconds from the process starting to serving requests", "gauge",
+                       lambda: [("", {}, ready)] if ready is not None else [])
+    if workers:
+        from session_ipc import SessionHost
+        host = SessionHost(app.state.sessions, session_sock)
+        REGISTRY.collector("robot_ui_workers", "Worker processes running", "gauge",
+                           lambda: [("", {}, workers.running)])
+        REGISTRY.collector("robot_ui_worker_restarts_total", "Worker processes started again after exiting",
+                           "counter", lambda: [("", {}, workers.restarts)])
+        REGISTRY.collector("robot_ui_session_host_connections", "Workers' connections to sessions", "gauge",
+                           lambda: [("", {}, host.connection_count)])
+
+    class Server(uvicorn.Server):
+        async def startup(self, sockets=None):
+            nonlocal ready
+            await super().startup(sockets)
+            if workers:
+                await host.start()
+                workers.watch()
+            ready = time.perf_counter() - process_started()
+            logger.info(f"Serving on {serving} {ready * 1000:.0f} ms after the process started")
+
+        async def shutdown(self, sockets=None):
+            if workers:
+                await workers.close()
+                await host.close()
+            await super().shutdown(sockets)
+
+    config = uvicorn.Config(app, access_log=not args.no_access_log, lifespan="on")
+    try:
+        Server(config).run(sockets=[primary_sock if workers else sock])
+    finally:
+        if runtime_dir:
+            shutil.rmtree(runtime_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,399 @@
+"""
+Terminal sessions shared between processes, for ``serve.py --workers N``.
+
+The primary process keeps owning every session: its PTY, process group and
+output ring. ``SessionHost`` serves them on a Unix socket. In a worker,
+``RemoteSessions`` opens one connection per session the worker has viewers
+for, mirrors the session's output into a local ring and broadcaster, and
+hands out ``RemoteSession`` objects that terminal_ws.py drives like a
+``Session``. However many viewers a worker has on a session, the primary
+writes its output to that worker once; framing, compression and websocket
+writes per viewer happen in the workers.
+
+Each frame on the connection is a type byte, a 4-byte length and the payload.
+The worker sends ATTACH ({"session_id", "since"}), then INPUT (keystrokes) and
+CONTROL ({"resize": [rows, cols]}, {"signal": n}, {"hold": viewer} or
+{"release": viewer}). The host answers HELLO ({"offset", "end", "teleop"}) or
+ERROR, then DATA with the output from ``offset`` on, and finally END
+({"reason": "finished" | "behind", "offset", "exit_code"}). A worker that
+fell behind attaches again from where its mirror got to.
+
+Teleop sessions are not mirrored: their keystroke path and echo probes
+(teleop.py) belong next to the PTY, so workers proxy those viewers' websockets
+to the primary instead (HELLO says which sessions they are).
+"""
+import json
+import socket
+import struct
+import asyncio
+import logging
+import contextlib
+from typing import AsyncIterator, Dict, Optional, Set, Tuple
+
+from ring_buffer import OutputRing
+from broadcaster import Broadcaster, Subscriber
+from sessions import Session, SessionManager, OUTPUT_BUFFER_SIZE
+
+logger = logging.getLogger("robot_ui_backend")
+
+HEADER = struct.Struct("!BI")
+
+# Worker to host
+MSG_ATTACH = 0x01
+MSG_INPUT = 0x02
+MSG_CONTROL = 0x03
+# Host to worker
+MSG_HELLO = 0x81
+MSG_DATA = 0x82
+MSG_END = 0x83
+MSG_ERROR = 0x84
+
+# Output a worker's connection may have queued in the host before it is
+# dropped as fallen behind; as much as a session keeps, so catching up from
+# the ring loses nothing
+IPC_MAX_PENDING = OUTPUT_BUFFER_SIZE
+
+# Seconds a worker keeps mirroring a session after its last viewer left, so a
+# reloading browser reattaches without a new connection and replay
+LINGER = 10.0
+
+
+def _frame(kind: int, payload: bytes = b"") -> bytes:
+    return HEADER.pack(kind, len(payload)) + payload
+
+
+def _json_frame(kind: int, value: dict) -> bytes:
+    return _frame(kind, json.dumps(value).encode())
+
+
+async def read_frame(reader: asyncio.StreamReader) -> Tuple[int, bytes]:
+    kind, length = HEADER.unpack(await reader.readexactly(HEADER.size))
+    if not length:
+        return kind, b""
+    return kind, await reader.readexactly(length)
+
+
+class SessionHost:
+    """Serves a SessionManager's sessions to worker processes over a Unix socket."""
+
+    def __init__(self, sessions: SessionManager, sock: socket.socket):
+        self.sessions = sessions
+        # Bound and listening already, so workers can connect while the primary starts
+        self.sock = sock
+        self._server: Optional[asyncio.AbstractServer] = None
+        self._connections: Set[asyncio.Task] = set()
+        self.bytes_sent = 0
+
+    @property
+    def connection_count(self) -> int:
+        return len(self._connections)
+
+    async def start(self):
+        if self._server is None:
+            self._server = await asyncio.start_unix_server(self._serve, sock=self.sock)
+
+    async def close(self):
+        if self._server:
+            self._server.close()
+            self._server = None
+        for task in self._connections:
+            task.cancel()
+        await asyncio.gather(*self._connections, return_exceptions=True)
+
+    async def _serve(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        task = asyncio.current_task()
+        self._connections.add(task)
+        try:
+            kind, payload = await read_frame(reader)
+            if kind != MSG_ATTACH:
+                raise ValueError(f"expected ATTACH, got message type {kind}")
+            request = json.loads(payload)
+            session = self.sessions.get(request.get("session_id"))
+            if session is None:
+                writer.write(_json_frame(MSG_ERROR, {"error": "Session not found"}))
+                await writer.drain()
+                return
+            await self._stream(session, request.get("since"), reader, writer)
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        except ValueError as e:
+            logger.warning(f"Bad session connection from a worker: {e}")
+        finally:
+            self._connections.discard(task)
+            writer.close()
+
+    async def _stream(self, session: Session, since: Optional[int], reader: asyncio.StreamReader,
+                      writer: asyncio.StreamWriter):
+        if session.teleop:
+            writer.write(_json_frame(MSG_HELLO, {"offset": session.output.end, "end": session.output.end,
+                                                 "teleop": True}))
+            await writer.drain()
+            return
+        offset, backlog, subscriber = session.subscribe(since, max_pending=IPC_MAX_PENDING)
+        holds: Set[object] = set()
+        controls = asyncio.create_task(self._controls(session, reader, holds))
+        # The worker hung up: stop waiting for output
+        controls.add_done_callback(lambda _: subscriber.close())
+        try:
+            writer.write(_json_frame(MSG_HELLO, {"offset": offset, "end": session.output.end, "teleop": False}))
+            if backlog:
+                writer.writelines((HEADER.pack(MSG_DATA, len(backlog)), backlog))
+                self.bytes_sent += len(backlog)
+            while True:
+                data = await subscriber.get()
+                if data is None:
+                    break
+                writer.writelines((HEADER.pack(MSG_DATA, len(data)), data))
+                self.bytes_sent += len(data)
+                await writer.drain()
+            if controls.done():
+                return
+            reason = "behind" if subscriber.overflowed else "finished"
+            writer.write(_json_frame(MSG_END, {"reason": reason, "offset": subscriber.offset,
+                                               "exit_code": session.exit_code}))
+            await writer.drain()
+        finally:
+            controls.cancel()
+            session.unsubscribe(subscriber)
+            # A worker that paused output and went away must not keep it paused
+            for viewer in holds:
+                session.release(viewer)
+
+    async def _controls(self, session: Session, reader: asyncio.StreamReader, holds: Set[object]):
+        while True:
+            try:
+                kind, payload = await read_frame(reader)
+            except (asyncio.IncompleteReadError, ConnectionError):
+                return
+            if kind == MSG_INPUT:
+                session.write(payload)
+                continue
+            if kind != MSG_CONTROL:
+                logger.warning(f"Session {session.id}: unexpected message type {kind} from a worker")
+                continue
+            try:
+                control = json.loads(payload)
+            except ValueError as e:
+                logger.warning(f"Session {session.id}: bad control message from a worker: {e}")
+                continue
+            if "resize" in control:
+                rows, cols = control["resize"]
+                session.resize(max(1, int(rows)), max(1, int(cols)))
+            elif "signal" in control:
+                session.send_signal(int(control["signal"]))
+            elif "hold" in control:
+                # Viewers of different workers are told apart by their connection
+                viewer = (id(holds), control["hold"])
+                holds.add(viewer)
+                session.hold(viewer)
+            elif "release" in control:
+                viewer = (id(holds), control["release"])
+                holds.discard(viewer)
+                session.release(viewer)
+
+
+class RemoteSession:
+    """A worker's mirror of one session in the primary process."""
+
+    def __init__(self, session_id: str, path: str):
+        self.id = session_id
+        self.path = path
+        # Mirrors aren't made of teleop sessions (see the module docstring)
+        self.teleop = None
+        self.is_teleop = False
+        self.exit_code: Optional[int] = None
+        self.output = OutputRing(OUTPUT_BUFFER_SIZE)
+        self.broadcaster = Broadcaster(None, self.output)
+        # Lost its connection to the primary; the next viewer gets a new mirror
+        self.closed = False
+        self.viewers = 0
+
+        self._reader: Optional[asyncio.StreamReader] = None
+        self._writer: Optional[asyncio.StreamWriter] = None
+        self._task: Optional[asyncio.Task] = None
+        # Tokens of this worker's viewers that paused output
+        self._holds: Set[int] = set()
+        self._linger: Optional[asyncio.TimerHandle] = None
+
+    @property
+    def running(self) -> bool:
+        return not self.broadcaster.finished
+
+    async def connect(self) -> bool:
+        """Attach to the session; False if the primary has no such session."""
+        hello = await self._attach(None)
+        if hello is None:
+            return False
+        self.is_teleop = hello["teleop"]
+        if self.is_teleop:
+            self._writer.close()
+            return True
+        self.output = OutputRing(OUTPUT_BUFFER_SIZE, hello["offset"])
+        self.broadcaster = Broadcaster(None, self.output)
+        self._task = asyncio.create_task(self._mirror())
+        return True
+
+    async def _attach(self, since: Optional[int]) -> Optional[dict]:
+        reader, writer = await asyncio.open_unix_connection(self.path)
+        writer.write(_json_frame(MSG_ATTACH, {"session_id": self.id, "since": since}))
+        try:
+            kind, payload = await read_frame(reader)
+        except asyncio.IncompleteReadError:
+            writer.close()
+            raise ConnectionError("the primary closed the session connection")
+        if kind != MSG_HELLO:
+            writer.close()
+            return None
+        self._reader, self._writer = reader, writer
+        return json.loads(payload)
+
+    async def _mirror(self):
+        try:
+            while True:
+                kind, payload = await read_frame(self._reader)
+                if kind == MSG_DATA:
+                    self.broadcaster.publish(payload)
+                elif kind == MSG_END:
+                    end = json.loads(payload)
+                    if end["reason"] != "behind":
+                        self.exit_code = end["exit_code"]
+                        break
+                    await self._catch_up()
+        except (asyncio.IncompleteReadError, OSError) as e:
+            logger.warning(f"Session {self.id}: lost the connection to the primary ({e!r})")
+            self.closed = True
+        finally:
+            self._writer.close()
+            self.broadcaster.finish()
+            self.output.shrink()
+
+    async def _catch_up(self):
+        # This worker didn't keep up with the session: attach again from where
+        # the mirror got to
+        self._writer.close()
+        logger.warning(f"Session {self.id}: worker fell behind, attaching again at {self.output.end}")
+        hello = await self._attach(self.output.end)
+        if hello is None:
+            raise ConnectionError("the session is gone")
+        if hello["offset"] > self.output.end:
+            # The primary no longer has what this worker missed: start over from
+            # there, and let this worker's viewers resume from the ring
+            self.output = OutputRing(OUTPUT_BUFFER_SIZE, hello["offset"])
+            self.broadcaster.ring = self.output
+            self.broadcaster.drop_all()
+        for viewer in self._holds:
+            self._control({"hold": viewer})
+
+    def _send(self, data: bytes):
+        if self._writer and not self._writer.is_closing():
+            self._writer.write(data)
+
+    def _control(self, control: dict):
+        self._send(_json_frame(MSG_CONTROL, control))
+
+    def subscribe(self, since: Optional[int] = None, **kwargs) -> Tuple[int, bytes, Subscriber]:
+        return self.broadcaster.subscribe(since, **kwargs)
+
+    def unsubscribe(self, subscriber: Subscriber):
+        self.broadcaster.unsubscribe(subscriber)
+
+    def write(self, data: bytes):
+        self._send(_frame(MSG_INPUT, data))
+
+    def resize(self, rows: int, cols: int):
+        self._control({"resize": [rows, cols]})
+
+    def send_signal(self, sig: int):
+        self._control({"signal": int(sig)})
+
+    def hold(self, viewer: object):
+        if id(viewer) not in self._holds:
+            self._holds.add(id(viewer))
+            self._control({"hold": id(viewer)})
+
+    def release(self, viewer: object):
+        if id(viewer) in self._holds:
+            self._holds.discard(id(viewer))
+            self._control({"release": id(viewer)})
+
+    def linger(self, expire):
+        """Call ``expire`` after LINGER seconds unless a viewer comes back first."""
+        self.keep()
+        self._linger = asyncio.get_running_loop().call_later(LINGER, expire)
+
+    def keep(self):
+        if self._linger:
+            self._linger.cancel()
+            self._linger = None
+
+    def close(self):
+        self.keep()
+        self.closed = True
+        if self._task:
+            # Its cleanup closes the connection and the local viewers
+            self._task.cancel()
+        elif self._writer:
+            self._writer.close()
+
+
+class RemoteSessions:
+    """A worker's mirrored sessions, one connection to the primary each."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._sessions: Dict[str, RemoteSession] = {}
+        self._connecting: Dict[str, asyncio.Task] = {}
+
+    @property
+    def count(self) -> int:
+        return len(self._sessions)
+
+    async def _get(self, session_id: str) -> Optional[RemoteSession]:
+        session = self._sessions.get(session_id)
+        if session and not session.closed:
+            return session
+        # Viewers arriving together share one connection
+        task = self._connecting.get(session_id)
+        if task is None:
+            task = self._connecting[session_id] = asyncio.create_task(self._connect(session_id))
+            task.add_done_callback(lambda _: self._connecting.pop(session_id, None))
+        return await asyncio.shield(task)
+
+    async def _connect(self, session_id: str) -> Optional[RemoteSession]:
+        session = RemoteSession(session_id, self.path)
+        if not await session.connect():
+            return None
+        if not session.is_teleop:
+            self._sessions[session_id] = session
+        return session
+
+    @contextlib.asynccontextmanager
+    async def viewer(self, session_id: str) -> AsyncIterator[Optional[RemoteSession]]:
+        """
+        The mirror of ``session_id`` for one viewer, or None if the primary has
+        no such session. Raises OSError if the primary can't be reached.
+        """
+        session = await self._get(session_id)
+        if session is None or session.is_teleop:
+            yield session
+            return
+        session.viewers += 1
+        session.keep()
+        try:
+            yield session
+        finally:
+            session.viewers -= 1
+            if not session.viewers:
+                session.linger(lambda: self._expire(session))
+
+    def _expire(self, session: RemoteSession):
+        if session.viewers:
+            return
+        if self._sessions.get(session.id) is session:
+            del self._sessions[session.id]
+        session.close()
+
+    def close(self):
+        sessions, self._sessions = list(self._sessions.values()), {}
+        for session in sessions:
+            session.close()
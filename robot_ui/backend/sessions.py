@@ -0,0 +1,480 @@
+"""
+Session registry for commands started through /api/execute.
+
+Every session owns its own PTY, process group, output ring buffer and set of
+subscribers, so several operators can drive different robots from one backend
+without sharing a file descriptor.
+"""
+import os
+import pty
+import time
+import fcntl
+import struct
+import termios
+import uuid
+import signal
+import asyncio
+import logging
+import subprocess
+from typing import TYPE_CHECKING, Dict, List, Optional, Set, Tuple
+
+from robots_config import RobotCommand
+from pty_reader import PtyReader
+from ring_buffer import OutputRing
+from broadcaster import Broadcaster, Subscriber
+from telemetry import TelemetryStream, extract_numeric
+from supervisor import ProcessSupervisor, STOP_LADDER
+from recording import Recorder, RecordingStore
+from teleop import TeleopInput
+from metrics import REGISTRY
+from ssh_pool import ChannelLease
+
+if TYPE_CHECKING:
+    # Imports numpy; loaded on first use (see SessionManager.series)
+    from telemetry_series import SeriesRegistry
+
+logger = logging.getLogger("robot_ui_backend")
+
+# Maximum number of commands allowed to run at the same time
+MAX_SESSIONS = int(os.environ.get("ROBOT_UI_MAX_SESSIONS", "64"))
+
+# Bytes of output kept per session so late viewers and reconnecting clients
+# can catch up. The buffer is preallocated, so this is also the memory cap.
+OUTPUT_BUFFER_SIZE = int(os.environ.get("ROBOT_UI_SESSION_BUFFER", "1048576"))
+
+# How long a finished session stays attachable before it is pruned
+FINISHED_SESSION_TTL = 300.0
+
+# Once the command has exited, output still in the PTY is read for this long;
+# then the PTY is closed even if a background process still holds it open
+PTY_DRAIN = 1.0
+
+# Stopping everything at shutdown: no time for the full ladder
+SHUTDOWN_LADDER = ((signal.SIGTERM, 1.0), (signal.SIGKILL, 2.0))
+
+SPAWN_SECONDS = REGISTRY.histogram(
+    "robot_ui_spawn_seconds", "Time to open a session's PTY and spawn its command",
+)
+
+# Signals a viewer may send to a session's process group by name
+SIGNALS = {
+    "interrupt": signal.SIGINT,
+    "terminate": signal.SIGTERM,
+    "quit": signal.SIGQUIT,
+    "hangup": signal.SIGHUP,
+    "kill": signal.SIGKILL,
+}
+
+
+class SessionLimitError(Exception):
+    """Raised when the concurrency cap is reached."""
+
+
+class RobotBusyError(Exception):
+    """Raised when the robot already has a running session."""
+
+    def __init__(self, session_id: str):
+        super().__init__(f"Robot already has a running session: {session_id}")
+        self.session_id = session_id
+
+
+class Session:
+    """A single command running inside its own PTY and process group."""
+
+    def __init__(
+        self,
+        robot_id: str,
+        command: RobotCommand,
+        series: Optional["SeriesRegistry"] = None,
+        robot_number: Optional[int] = None,
+        command_args: Optional[List[str]] = None,
+        supervisor: Optional[ProcessSupervisor] = None,
+        recordings: Optional[RecordingStore] = None,
+        channel: Optional[ChannelLease] = None,
+    ):
+        self.id = uuid.uuid4().hex
+        self.robot_id = robot_id
+        self.robot_number = robot_number
+        self.label = command.label
+        # SSH channel slot of a remote command, released when the session finishes
+        self.channel = channel
+        if channel is not None:
+            command_args = channel.args
+        # Overrides the configured argv, e.g. with an SSH channel for remote commands
+        self.command_args = list(command_args if command_args is not None else command.command_args)
+        self.telemetry = command.telemetry
+        self.teleop_config = command.teleop
+        # Keystroke path of a teleop command (see teleop.py)
+        self.teleop: Optional[TeleopInput] = None
+        # Runs on the robot through `ssh -tt`: signals for the remote program
+        # have to travel through the PTY rather than to the local ssh
+        self.remote = command.remote_command is not None
+        self.series = series
+        self.supervisor = supervisor or ProcessSupervisor()
+        self.recordings = recordings
+        self.recorder: Optional[Recorder] = None
+        self.started_at = time.time()
+        self.finished_at: Optional[float] = None
+        self.exit_code: Optional[int] = None
+
+        self.process: Optional[subprocess.Popen] = None
+        self.master_fd: Optional[int] = None
+        self.reader: Optional[PtyReader] = None
+        # Resolves with the exit code once the supervisor has reaped the command
+        self._exited: Optional[asyncio.Future] = None
+
+        self.output = OutputRing(OUTPUT_BUFFER_SIZE)
+        self.broadcaster: Optional[Broadcaster] = None
+        self._pump_task: Optional[asyncio.Task] = None
+        self.size: Optional[Tuple[int, int]] = None
+        # Viewers that asked to pause output; the PTY isn't read while any remain
+        self._holds: Set[object] = set()
+
+    @property
+    def running(self) -> bool:
+        return self.finished_at is None
+
+    def start(self):
+        """Spawn the command in a new session with the PTY as its terminal."""
+        started = time.perf_counter()
+        master_fd, slave_fd = pty.openpty()
+
+        env = os.environ.copy()
+        env["TERM"] = "xterm-256color"
+
+        try:
+            self.process = subprocess.Popen(
+                self.command_args,
+                stdin=slave_fd,
+                stdout=slave_fd,
+                stderr=slave_fd,
+                env=env,
+                start_new_session=True
+            )
+        except Exception:
+            os.close(master_fd)
+            raise
+        finally:
+            os.close(slave_fd)
+        SPAWN_SECONDS.observe(time.perf_counter() - started)
+
+        self.master_fd = master_fd
+        self._exited = self.supervisor.watch(self.process)
+        self._exited.add_done_callback(self._on_exit)
+        try:
+            self.reader = PtyReader(master_fd)
+            source = self.reader
+            if self.telemetry:
+                # Viewers (and the replay buffer) only get the latest frame per interval
+                source = TelemetryStream(self.reader, self.telemetry, self._frame_recorder())
+            self.broadcaster = Broadcaster(source, self.output)
+            if self.recordings:
+                self.recorder = self.recordings.open(
+                    self.id, robot_id=self.robot_id, robot_number=self.robot_number,
+                    command=self.label, started_at=self.started_at,
+                )
+            if self.teleop_config:
+                self.teleop = TeleopInput(master_fd, self.teleop_config)
+            if self.recorder or self.teleop:
+                self.broadcaster.tap = self._on_output
+        except Exception:
+            self._close_pty()
+            os.killpg(self.process.pid, signal.SIGKILL)
+            raise
+        self._pump_task = asyncio.create_task(self._pump())
+
+    def _on_exit(self, exited: asyncio.Future):
+        if exited.cancelled():
+            return
+        self.exit_code = exited.result()
+        if self.recorder and self.recorder.closed:
+            # The output ended first; the recording's metadata gets the code now
+            self.recorder.update(exit_code=self.exit_code)
+        if self.reader:
+            asyncio.get_running_loop().call_later(PTY_DRAIN, self._drain_timeout)
+
+    def _drain_timeout(self):
+        if self.reader:
+            # Something the command left behind keeps the PTY open
+            logger.info(f"Session {self.id}: command exited, closing its PTY")
+            self.reader.close()
+
+    def _on_output(self, data: bytes):
+        # Exactly what viewers get (telemetry frames after coalescing)
+        if self.recorder:
+            self.recorder.output(data)
+        if self.teleop:
+            self.teleop.observe(data)
+
+    def _frame_recorder(self):
+        """Callback storing the numeric fields of every frame, if configured."""
+        if not self.series or not self.telemetry.series:
+            return None
+        store = self.series.get(self.robot_id, self.telemetry.topic or self.label, create=True)
+        prefixes = self.telemetry.series
+
+        def record(frame: bytes):
+            values = extract_numeric(frame, prefixes)
+            if values:
+                store.append(time.time(), values)
+        return record
+
+    async def _pump(self):
+        """Run the single PTY reader for this session until the command exits."""
+        try:
+            await self.broadcaster.run()
+        except Exception as e:
+            logger.error(f"Session {self.id} reader error: {e}")
+        finally:
+            self._finish()
+
+    def _finish(self):
+        self._close_pty()
+        if self.process and self.exit_code is None:
+            self.exit_code = self.process.poll()
+        self.finished_at = time.time()
+        if self.channel:
+            self.channel.release()
+        # Nothing is written any more; keep only the bytes there are
+        self.output.shrink()
+        if self.recorder:
+            self.recorder.close(exit_code=self.exit_code, finished_at=self.finished_at)
+
+    async def wait(self) -> Optional[int]:
+        """Wait until the command has exited and its output is read; return its exit code."""
+        # Shielded: a cancelled waiter must not stop the reader or the reaper
+        if self._pump_task:
+            await asyncio.shield(self._pump_task)
+        if self._exited:
+            self.exit_code = await asyncio.shield(self._exited)
+        return self.exit_code
+
+    def _close_pty(self):
+        if self.teleop:
+            self.teleop.close()
+        if self.reader:
+            self.reader.close()
+            self.reader = None
+        if self.master_fd is not None:
+            try:
+                os.close(self.master_fd)
+            except OSError:
+                pass
+            self.master_fd = None
+
+    def subscribe(self, since: Optional[int] = None, **kwargs) -> Tuple[int, bytes, Subscriber]:
+        """
+        Return ``(offset, backlog, subscriber)``: the buffered output from
+        ``since`` (or the oldest retained byte) starting at ``offset``, and a
+        subscriber for everything after it. ``subscriber.get()`` returns None
+        once the command has finished. Extra arguments (``max_pending``,
+        ``policy``) are passed to the broadcaster.
+        """
+        return self.broadcaster.subscribe(since, **kwargs)
+
+    def unsubscribe(self, subscriber: Subscriber):
+        self.broadcaster.unsubscribe(subscriber)
+
+    def write(self, data: bytes):
+        if self.master_fd is None:
+            return
+        if self.recorder:
+            self.recorder.input(data)
+        if self.teleop:
+            self.teleop.key(data)
+            return
+        try:
+            os.write(self.master_fd, data)
+        except OSError:
+            pass
+
+    def resize(self, rows: int, cols: int):
+        """Set the PTY window size and tell the process group about it."""
+        if self.master_fd is None or (rows, cols) == self.size:
+            return
+        try:
+            fcntl.ioctl(self.master_fd, termios.TIOCSWINSZ, struct.pack("HHHH", rows, cols, 0, 0))
+        except OSError as e:
+            logger.warning(f"Session {self.id}: resize to {rows}x{cols} failed: {e}")
+            return
+        self.size = (rows, cols)
+        if self.recorder:
+            self.recorder.resize(rows, cols)
+        # The kernel only signals the terminal's foreground group; the command's
+        # own group may not be it (e.g. a wrapper script), so signal it too
+        self.send_signal(signal.SIGWINCH)
+
+    def send_signal(self, sig: int):
+        if not self.process or self.process.poll() is not None:
+            return
+        if sig == signal.SIGINT and self.remote:
+            # ^C through the PTY; ssh -tt forwards it to the remote terminal
+            self.write(b"\x03")
+            return
+        try:
+            os.killpg(self.process.pid, sig)
+        except ProcessLookupError:
+            pass
+
+    def hold(self, viewer: object):
+        """Flow control: stop reading output until every holding viewer releases."""
+        if self.teleop:
+            # A teleop command blocked on its output can't read keys either;
+            # its viewers skip old output instead
+            return
+        self._holds.add(viewer)
+        if self.reader:
+            self.reader.hold()
+
+    def release(self, viewer: object):
+        self._holds.discard(viewer)
+        if not self._holds and self.reader:
+            self.reader.release()
+
+    async def stop(self, ladder=STOP_LADDER) -> Optional[int]:
+        """Stop the whole process group (SIGINT, SIGTERM, SIGKILL) and return the exit code."""
+        if not self.process:
+            return None
+        await self.supervisor.stop(self.process, ladder, send=self._stop_signal)
+        return await self.wait()
+
+    def _stop_signal(self, sig: int):
+        if sig == signal.SIGINT and self.remote and self.process.returncode is None:
+            # ^C through the PTY; ssh -tt forwards it to the remote terminal
+            self.write(b"\x03")
+        else:
+            os.killpg(self.process.pid, sig)
+
+    def to_dict(self) -> dict:
+        return {
+            "session_id": self.id,
+            "robot_id": self.robot_id,
+            "robot_number": self.robot_number,
+            "command": self.label,
+            "running": self.running,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "exit_code": self.exit_code,
+            "output_start": self.output.start,
+            "output_end": self.output.end,
+            "subscribers": self.broadcaster.subscriber_count if self.broadcaster else 0,
+            "size": list(self.size) if self.size else None,
+            "paused": bool(self._holds),
+            "teleop": self.teleop.stats() if self.teleop else None,
+        }
+
+
+def _robot_key(robot_id: str, robot_number: Optional[int]) -> str:
+    return robot_id if robot_number is None else f"{robot_id}:{robot_number}"
+
+
+class SessionManager:
+    """Registry of sessions keyed by session id, with one running session per robot."""
+
+    def __init__(self, max_sessions: int = MAX_SESSIONS, series: Optional["SeriesRegistry"] = None,
+                 supervisor: Optional[ProcessSupervisor] = None, recordings: Optional[RecordingStore] = None):
+        self.max_sessions = max_sessions
+        # Reaps and stops the commands of every session
+        self.supervisor = supervisor or ProcessSupervisor()
+        # Numeric telemetry history, shared by every session of a robot
+        self._series = series
+        # Where sessions record their output, if anywhere
+        self.recordings = recordings
+        self._sessions: Dict[str, Session] = {}
+        self._by_robot: Dict[str, str] = {}
+        self._latest: Optional[str] = None
+        self._pruned_at = 0.0
+        # PTY bytes read and handed to viewers by sessions already pruned
+        self.pruned_bytes_read = 0
+        self.pruned_bytes_sent = 0
+
+    @property
+    def series(self) -> "SeriesRegistry":
+        # numpy is imported with the first telemetry history, not at start-up
+        if self._series is None:
+            from telemetry_series import SeriesRegistry
+            self._series = SeriesRegistry()
+        return self._series
+
+    def start(
+        self,
+        robot_id: str,
+        command: RobotCommand,
+        robot_number: Optional[int] = None,
+        command_args: Optional[List[str]] = None,
+        channel: Optional[ChannelLease] = None,
+    ) -> Session:
+        """Start a session; ``channel``, if given, is released when it finishes or fails to start."""
+        self._prune()
+
+        try:
+            current = self.running_for_robot(robot_id, robot_number)
+            if current:
+                raise RobotBusyError(current.id)
+            if self.running_count() >= self.max_sessions:
+                raise SessionLimitError(f"Session limit reached ({self.max_sessions})")
+
+            series = self.series if command.telemetry and command.telemetry.series else None
+            session = Session(robot_id, command, series, robot_number, command_args, self.supervisor,
+                              self.recordings, channel)
+            session.start()
+        except BaseException:
+            if channel:
+                channel.release()
+            raise
+        self._sessions[session.id] = session
+        self._by_robot[_robot_key(robot_id, robot_number)] = session.id
+        self._latest = session.id
+        logger.info(f"Started session {session.id} for {robot_id}: {command.label}")
+        return session
+
+    def get(self, session_id: str) -> Optional[Session]:
+        return self._sessions.get(session_id)
+
+    def latest(self) -> Optional[Session]:
+        return self._sessions.get(self._latest) if self._latest else None
+
+    def running_for_robot(self, robot_id: str, robot_number: Optional[int] = None) -> Optional[Session]:
+        session = self._sessions.get(self._by_robot.get(_robot_key(robot_id, robot_number), ""))
+        if session and session.running:
+            return session
+        return None
+
+    def running_count(self) -> int:
+        # A robot has at most one running session and it is always its latest
+        return sum(1 for session_id in self._by_robot.values() if self._sessions[session_id].running)
+
+    def list(self) -> List[Session]:
+        self._prune()
+        return list(self._sessions.values())
+
+    def stop(self, session_id: str) -> bool:
+        """Start stopping a session in the background."""
+        session = self._sessions.get(session_id)
+        if not session or not session.process:
+            return False
+        self.supervisor.stop_soon(session.process, send=session._stop_signal)
+        return True
+
+    async def stop_all(self):
+        await asyncio.gather(*(session.stop(SHUTDOWN_LADDER)
+                               for session in self._sessions.values() if session.running))
+
+    def _prune(self):
+        now = time.time()
+        # Scanning every session on every start adds up with thousands of jobs
+        if now - self._pruned_at < 1.0:
+            return
+        self._pruned_at = now
+        cutoff = now - FINISHED_SESSION_TTL
+        for session_id, session in list(self._sessions.items()):
+            if session.finished_at is not None and session.finished_at < cutoff:
+                del self._sessions[session_id]
+                if session.broadcaster:
+                    self.pruned_bytes_read += session.broadcaster.bytes_read
+                    self.pruned_bytes_sent += session.broadcaster.delivered()
+                key = _robot_key(session.robot_id, session.robot_number)
+                if self._by_robot.get(key) == session_id:
+                    del self._by_robot[key]
+                if self._latest == session_id:
+                    self._latest = None
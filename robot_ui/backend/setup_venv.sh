@@ -29,10 +29,13 @@ if [ -f "$VENV_NAME/bin/activate" ]; then
         pip install fastapi uvicorn websockets httpx ptyprocess
     fi
 
+    # Bytecode up front: a backend started without it spends seconds compiling
+    python3 -m compileall -q . > /dev/null
+
     echo ""
     echo "Setup Complete! To use it, run:"
     echo "  source $VENV_NAME/bin/activate"
-    echo "  python3 main.py"
+    echo "  python3 serve.py"
 else
     echo "Failed to create virtual environment."
     echo "Fallback: Installing dependencies to user space..."
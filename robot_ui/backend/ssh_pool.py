@@ -0,0 +1,361 @@
+"""
+Pool of multiplexed SSH connections to robots.
+
+``xvalidation.sh`` opens a new ``sshpass ... ssh`` connection for every command,
+paying TCP setup, key exchange and authentication each time. The pool keeps one
+OpenSSH ControlMaster connection per robot instead; commands are opened as
+extra channels on it (``ssh -S <socket>``), which costs a round trip rather
+than a handshake. Masters are health-checked with ``ssh -O check`` before
+reuse, stopped after ``idle_timeout`` seconds without use and limited to
+``max_channels`` concurrent commands per robot.
+"""
+import os
+import time
+import signal
+import shutil
+import asyncio
+import logging
+import tempfile
+from contextlib import asynccontextmanager
+from typing import Dict, List, Optional, Sequence, Tuple
+
+logger = logging.getLogger("robot_ui_backend")
+
+# ssh client and credentials, as used by xvalidation.sh. An empty password
+# skips sshpass (key authentication, optionally with ROBOT_UI_SSH_KEY).
+SSH_BINARY = os.environ.get("ROBOT_UI_SSH", "ssh")
+SSH_USER = os.environ.get("ROBOT_UI_SSH_USER", "zippy")
+SSH_PASSWORD = os.environ.get("ROBOT_UI_SSH_PASSWORD", "zippy")
+SSH_KEY_FILE = os.environ.get("ROBOT_UI_SSH_KEY")
+SSH_PORT = int(os.environ.get("ROBOT_UI_SSH_PORT", "22"))
+
+# Seconds a master connection may sit unused before it is stopped
+SSH_IDLE_TIMEOUT = float(os.environ.get("ROBOT_UI_SSH_IDLE_TIMEOUT", "300"))
+
+# Concurrent commands per robot; sshd's default MaxSessions is 10
+SSH_MAX_CHANNELS = int(os.environ.get("ROBOT_UI_SSH_MAX_CHANNELS", "8"))
+
+SSH_CONNECT_TIMEOUT = 5.0
+
+# A master used within this many seconds is trusted without a fresh -O check
+HEALTH_CHECK_INTERVAL = 15.0
+
+
+# Bytes of a master's stderr kept for the error message if it fails
+MASTER_ERROR_BYTES = 4096
+
+
+class SSHUnavailableError(Exception):
+    """Raised when no master connection to a robot can be established."""
+
+
+class ChannelLimitError(Exception):
+    """Raised when every channel slot of a robot's master is taken."""
+
+
+class _Master:
+    """One ControlMaster connection and its bookkeeping."""
+
+    def __init__(self, host: str, socket_path: str, max_channels: int):
+        self.host = host
+        self.socket_path = socket_path
+        self.process: Optional[asyncio.subprocess.Process] = None
+        # The tail of the master's stderr, read as it is written so the pipe never fills
+        self.errors = b""
+        self.stderr_task: Optional[asyncio.Task] = None
+        self.channels = asyncio.Semaphore(max_channels)
+        self.active = 0
+        self.connected_at = 0.0
+        self.last_used = 0.0
+        self.last_checked = 0.0
+
+    @property
+    def alive(self) -> bool:
+        return self.process is not None and self.process.returncode is None
+
+    async def read_errors(self, stream: asyncio.StreamReader):
+        while True:
+            data = await stream.read(MASTER_ERROR_BYTES)
+            if not data:
+                return
+            self.errors = (self.errors + data)[-MASTER_ERROR_BYTES:]
+
+
+class ChannelLease:
+    """
+    One of a master's channel slots, held by a command started elsewhere (a
+    PTY session) from ``args``. Until ``release()``, it counts against
+    ``max_channels`` and keeps the master from being stopped as idle.
+    """
+
+    def __init__(self, master: _Master, args: List[str]):
+        self.master = master
+        self.args = args
+        self._released = False
+
+    def release(self):
+        if self._released:
+            return
+        self._released = True
+        self.master.active -= 1
+        self.master.last_used = time.monotonic()
+        self.master.channels.release()
+
+
+class SSHPool:
+    """Multiplexed SSH connections keyed by robot IP."""
+
+    def __init__(
+        self,
+        user: str = SSH_USER,
+        password: Optional[str] = SSH_PASSWORD,
+        port: int = SSH_PORT,
+        binary: str = SSH_BINARY,
+        idle_timeout: float = SSH_IDLE_TIMEOUT,
+        max_channels: int = SSH_MAX_CHANNELS,
+        connect_timeout: float = SSH_CONNECT_TIMEOUT,
+        options: Optional[Sequence[str]] = None,
+        control_dir: Optional[str] = None,
+    ):
+        self.user = user
+        self.password = password or None
+        self.port = port
+        self.binary = binary
+        self.idle_timeout = idle_timeout
+        self.max_channels = max_channels
+        self.connect_timeout = connect_timeout
+        # Extra ssh arguments, e.g. ["-i", key_file]
+        if options is None:
+            options = ["-i", SSH_KEY_FILE, "-o", "IdentitiesOnly=yes"] if SSH_KEY_FILE else []
+        self.options = list(options)
+        # Unix socket paths are limited to ~100 bytes, so keep the directory short
+        self.control_dir = control_dir or tempfile.mkdtemp(prefix="rui-ssh-")
+        self.connects = 0
+
+        self._masters: Dict[str, _Master] = {}
+        self._locks: Dict[str, asyncio.Lock] = {}
+        self._evictor: Optional[asyncio.Task] = None
+
+    def _ssh_args(self) -> List[str]:
+        return [
+            self.binary,
+            "-p", str(self.port),
+            "-o", "StrictHostKeyChecking=no",
+            "-o", "UserKnownHostsFile=/dev/null",
+            "-o", "LogLevel=ERROR",
+            "-o", f"ConnectTimeout={int(self.connect_timeout)}",
+            *self.options,
+        ]
+
+    def _target(self, host: str) -> str:
+        return f"{self.user}@{host}"
+
+    def command_args(self, host: str, command: str, tty: bool = False) -> List[str]:
+        """
+        argv running ``command`` as a channel on the host's master. BatchMode
+        makes it fail instead of prompting if the master went away.
+        """
+        master = self._masters[host]
+        args = [
+            self.binary, "-S", master.socket_path,
+            "-o", "ControlMaster=no", "-o", "BatchMode=yes", "-o", "LogLevel=ERROR",
+        ]
+        if tty:
+            args.append("-tt")
+        return args + [self._target(host), command]
+
+    async def _control(self, master: _Master, op: str) -> bool:
+        """Run ``ssh -O <op>`` against a master socket."""
+        proc = await asyncio.create_subprocess_exec(
+            self.binary, "-S", master.socket_path, "-O", op, self._target(master.host),
+            stdin=asyncio.subprocess.DEVNULL,
+            stdout=asyncio.subprocess.DEVNULL,
+            stderr=asyncio.subprocess.DEVNULL,
+        )
+        return await proc.wait() == 0
+
+    async def _connect(self, master: _Master):
+        if os.path.exists(master.socket_path):
+            os.unlink(master.socket_path)
+        args = self._ssh_args() + [
+            "-M", "-N",
+            "-S", master.socket_path,
+            "-o", "ControlPersist=no",
+            "-o", "ServerAliveInterval=10",
+            self._target(master.host),
+        ]
+        env = None
+        if self.password:
+            # -e reads SSHPASS from the environment, keeping it out of `ps`
+            args = ["sshpass", "-e"] + args
+            env = dict(os.environ, SSHPASS=self.password)
+
+        started = time.monotonic()
+        master.process = await asyncio.create_subprocess_exec(
+            *args,
+            stdin=asyncio.subprocess.DEVNULL,
+            stdout=asyncio.subprocess.DEVNULL,
+            stderr=asyncio.subprocess.PIPE,
+            env=env,
+            start_new_session=True,
+        )
+        master.errors = b""
+        master.stderr_task = asyncio.create_task(master.read_errors(master.process.stderr))
+        # The master is usable once its control socket answers
+        deadline = started + self.connect_timeout + 1.0
+        while time.monotonic() < deadline:
+            if master.process.returncode is not None:
+                break
+            if os.path.exists(master.socket_path) and await self._control(master, "check"):
+                self.connects += 1
+                master.connected_at = master.last_checked = time.monotonic()
+                logger.info(f"SSH master to {master.host} up in {master.connected_at - started:.2f}s")
+                return
+            await asyncio.sleep(0.02)
+
+        if master.process.returncode is None:
+            await self._kill(master)
+        else:
+            # Whatever the master wrote before it exited
+            await asyncio.wait([master.stderr_task], timeout=1.0)
+        message = master.errors.decode(errors="replace").strip() or "connection timed out"
+        raise SSHUnavailableError(f"{master.host}: {message}")
+
+    async def acquire(self, host: str) -> _Master:
+        """Return a healthy master for ``host``, connecting if needed."""
+        lock = self._locks.setdefault(host, asyncio.Lock())
+        async with lock:
+            master = self._masters.get(host)
+            if master is None:
+                socket_path = os.path.join(self.control_dir, f"{host}-{self.port}")
+                master = self._masters[host] = _Master(host, socket_path, self.max_channels)
+
+            now = time.monotonic()
+            if master.alive and now - max(master.last_used, master.last_checked) > HEALTH_CHECK_INTERVAL:
+                if await self._control(master, "check"):
+                    master.last_checked = now
+                else:
+                    logger.warning(f"SSH master to {host} failed its health check, reconnecting")
+                    await self._stop(master, "exit")
+            if not master.alive:
+                await self._connect(master)
+            master.last_used = time.monotonic()
+            return master
+
+    async def prepare(self, host: str, command: str, tty: bool = False) -> ChannelLease:
+        """
+        Make sure the host has a master and take a channel slot on it for
+        ``command``, run by the caller from the lease's ``args``. Raises
+        ChannelLimitError rather than waiting if every slot is taken; the
+        caller releases the lease once the command has finished.
+        """
+        master = await self.acquire(host)
+        if master.channels.locked():
+            raise ChannelLimitError(f"All {self.max_channels} SSH channels to {host} are in use")
+        await master.channels.acquire()
+        master.active += 1
+        master.last_used = time.monotonic()
+        return ChannelLease(master, self.command_args(host, command, tty))
+
+    @asynccontextmanager
+    async def channel(self, host: str, command: str, stdin: bool = False):
+        """
+        Start ``command`` on ``host`` over its master and yield the local ssh
+        process (stdout and stderr merged into ``process.stdout``; with
+        ``stdin``, ``process.stdin`` feeds the command). The process is killed
+        if the block exits before it does.
+        """
+        master = await self.acquire(host)
+        async with master.channels:
+            master.active += 1
+            proc = None
+            try:
+                proc = await asyncio.create_subprocess_exec(
+                    *self.command_args(host, command),
+                    stdin=asyncio.subprocess.PIPE if stdin else asyncio.subprocess.DEVNULL,
+                    stdout=asyncio.subprocess.PIPE,
+                    stderr=asyncio.subprocess.STDOUT,
+                )
+                yield proc
+            finally:
+                if proc is not None and proc.returncode is None:
+                    proc.kill()
+                    await proc.wait()
+                master.active -= 1
+                master.last_used = time.monotonic()
+
+    async def run(self, host: str, command: str, timeout: Optional[float] = None) -> Tuple[int, bytes]:
+        """Run ``command`` on ``host`` over its master; returns (exit code, output)."""
+        async with self.channel(host, command) as proc:
+            output, _ = await asyncio.wait_for(proc.communicate(), timeout)
+            return proc.returncode, output
+
+    async def _stop(self, master: _Master, op: str = "stop"):
+        """
+        ``stop`` lets open channels (e.g. running terminal sessions) finish
+        before the master exits; ``exit`` closes them immediately.
+        """
+        if master.alive:
+            await self._control(master, op)
+            if op == "exit":
+                try:
+                    await asyncio.wait_for(master.process.wait(), 2.0)
+                except asyncio.TimeoutError:
+                    await self._kill(master)
+
+    async def _kill(self, master: _Master):
+        # sshpass and ssh share the process group started for the master
+        try:
+            os.killpg(master.process.pid, signal.SIGKILL)
+        except ProcessLookupError:
+            pass
+        await master.process.wait()
+
+    async def evict_idle(self) -> int:
+        """Stop masters unused for ``idle_timeout`` seconds; returns how many."""
+        cutoff = time.monotonic() - self.idle_timeout
+        evicted = 0
+        for host, master in list(self._masters.items()):
+            if not master.alive:
+                del self._masters[host]
+            elif master.active == 0 and master.last_used < cutoff:
+                logger.info(f"Closing idle SSH master to {host}")
+                await self._stop(master, "stop")
+                del self._masters[host]
+                evicted += 1
+        return evicted
+
+    async def _evict_loop(self):
+        while True:
+            await asyncio.sleep(max(1.0, min(self.idle_timeout / 4, 30.0)))
+            try:
+                await self.evict_idle()
+            except Exception as e:
+                logger.error(f"SSH idle eviction failed: {e}")
+
+    def start(self):
+        """Start the idle-eviction task (needs a running loop)."""
+        if self._evictor is None:
+            self._evictor = asyncio.create_task(self._evict_loop())
+
+    async def close(self):
+        if self._evictor:
+            self._evictor.cancel()
+            self._evictor = None
+        for master in list(self._masters.values()):
+            await self._stop(master, "exit")
+        self._masters.clear()
+        shutil.rmtree(self.control_dir, ignore_errors=True)
+
+    def stats(self) -> List[dict]:
+        now = time.monotonic()
+        return [
+            {
+                "host": master.host,
+                "alive": master.alive,
+                "active_channels": master.active,
+                "idle_seconds": round(now - master.last_used, 1),
+                "connected_seconds": round(now - master.connected_at, 1) if master.alive else None,
+            }
+            for master in self._masters.values()
+        ]
@@ -0,0 +1,244 @@
+"""
+Reaping and stopping of the commands sessions spawn.
+
+Every session's command runs as the leader of its own process group (it is
+started with ``start_new_session``, i.e. ``setsid``). The supervisor:
+
+* reaps each child as soon as it exits, from the event loop: a pidfd
+  (``os.pidfd_open``) becomes readable when the process exits and is watched
+  with ``add_reader``; without pidfd support the child is polled instead.
+  Nothing has to call ``wait()`` for a finished command to stop being a zombie.
+* stops a command by walking an escalation ladder over the whole group,
+  SIGINT, then SIGTERM, then SIGKILL, moving on when a rung's grace period
+  runs out while anything in the group is still alive.
+* counts what the backend holds open (fds, PTY masters, zombie children) for
+  GET /api/processes, so a leak shows up as a number that only goes up.
+
+Reading /proc walks every process on the host, so it never runs on the event
+loop: liveness is ``killpg(pgid, 0)`` first, and the scans go to a thread.
+"""
+import os
+import time
+import signal
+import asyncio
+import logging
+import subprocess
+from typing import Callable, Dict, Iterator, Optional, Sequence, Set, Tuple
+
+logger = logging.getLogger("robot_ui_backend")
+
+# (signal, seconds to wait for the group to go away before the next rung)
+STOP_LADDER: Tuple[Tuple[int, float], ...] = (
+    (signal.SIGINT, 2.0),
+    (signal.SIGTERM, 3.0),
+    (signal.SIGKILL, 5.0),
+)
+
+# How often a child is polled when pidfds are unavailable, and how often a
+# group whose leader has exited is checked for remaining members
+POLL_INTERVAL = 0.05
+
+
+def _processes() -> Iterator[Tuple[str, str, int, int]]:
+    """``(pid, state, ppid, pgrp)`` of every process, from /proc."""
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat") as f:
+                fields = f.read().rsplit(")", 1)[1].split()
+        except OSError:
+            continue
+        yield entry, fields[0], int(fields[1]), int(fields[2])
+
+
+def _group_exists(pgid: int) -> bool:
+    """Whether the group has any member, zombies included; no /proc scan."""
+    try:
+        os.killpg(pgid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def _group_running(pgid: int) -> bool:
+    # kill() succeeds on zombies too: an orphan that was killed stays in the
+    # group until init gets round to reaping it
+    return any(pgrp == pgid and state != "Z" for _, state, _, pgrp in _processes())
+
+
+def group_alive(pgid: int) -> bool:
+    """Whether anything in the group can still run (the leader may be gone)."""
+    return _group_exists(pgid) and _group_running(pgid)
+
+
+async def group_alive_async(pgid: int) -> bool:
+    """group_alive() with the /proc scan in a thread, only if the group still exists."""
+    return _group_exists(pgid) and await asyncio.to_thread(_group_running, pgid)
+
+
+class _Child:
+    __slots__ = ("process", "exited", "pidfd", "timer")
+
+    def __init__(self, process: subprocess.Popen, exited: asyncio.Future):
+        self.process = process
+        self.exited = exited
+        self.pidfd: Optional[int] = None
+        self.timer: Optional[asyncio.TimerHandle] = None
+
+
+class ProcessSupervisor:
+    """Reaps session commands asynchronously and stops their process groups."""
+
+    def __init__(self):
+        self._children: Dict[int, _Child] = {}
+        self._stops: Set[asyncio.Task] = set()
+        self.started = 0
+        self.reaped = 0
+        # Stops finished by each rung of the ladder, by signal name
+        self.stopped_by: Dict[str, int] = {}
+        self.pidfd = hasattr(os, "pidfd_open")
+        # Last process_counts(), refreshed off the loop by refresh_counts()
+        self.counts: Dict[str, Optional[int]] = {"open_fds": None, "pty_masters": None, "zombies": None}
+
+    def watch(self, process: subprocess.Popen) -> asyncio.Future:
+        """Start reaping ``process``; the future resolves with its exit code."""
+        loop = asyncio.get_running_loop()
+        child = _Child(process, loop.create_future())
+        self._children[process.pid] = child
+        self.started += 1
+        if self.pidfd:
+            try:
+                child.pidfd = os.pidfd_open(process.pid)
+            except OSError as e:
+                # Kernel without pidfd (< 5.3) or seccomp: poll from now on
+                logger.info(f"pidfd unavailable ({e}), polling children instead")
+                self.pidfd = False
+        if child.pidfd is not None:
+            loop.add_reader(child.pidfd, self._reap, process.pid)
+        else:
+            child.timer = loop.call_later(POLL_INTERVAL, self._reap, process.pid)
+        return child.exited
+
+    def _reap(self, pid: int):
+        child = self._children.get(pid)
+        if child is None:
+            return
+        # Popen.poll() does the waitpid, so the Popen keeps its returncode
+        code = child.process.poll()
+        if code is None:
+            if child.pidfd is None:
+                child.timer = asyncio.get_running_loop().call_later(POLL_INTERVAL, self._reap, pid)
+            return
+        del self._children[pid]
+        if child.pidfd is not None:
+            asyncio.get_running_loop().remove_reader(child.pidfd)
+            os.close(child.pidfd)
+        self.reaped += 1
+        if not child.exited.done():
+            child.exited.set_result(code)
+
+    async def stop(self, process: subprocess.Popen, ladder: Sequence[Tuple[int, float]] = STOP_LADDER,
+                   send: Optional[Callable[[int], None]] = None) -> Optional[int]:
+        """
+        Signal the process group rung by rung until nothing in it is left.
+        ``send`` delivers a signal instead of ``killpg`` (a session turns SIGINT
+        into ^C for remote commands). Returns the leader's exit code.
+        """
+        pgid = process.pid
+        child = self._children.get(pgid)
+        exited = child.exited if child else None
+        for sig, grace in ladder:
+            if not await self._alive(process, pgid):
+                break
+            try:
+                if send:
+                    send(sig)
+                else:
+                    os.killpg(pgid, sig)
+            except ProcessLookupError:
+                break
+            if await self._gone(process, pgid, exited, grace):
+                name = signal.Signals(sig).name
+                self.stopped_by[name] = self.stopped_by.get(name, 0) + 1
+                break
+        else:
+            logger.error(f"Process group {pgid} survived {signal.Signals(ladder[-1][0]).name}")
+        if exited is not None and not exited.done():
+            await asyncio.shield(exited)
+        return process.returncode
+
+    def stop_soon(self, process: subprocess.Popen, **kwargs) -> asyncio.Task:
+        """stop() in the background; the task is kept until it is done."""
+        task = asyncio.create_task(self.stop(process, **kwargs))
+        self._stops.add(task)
+        task.add_done_callback(self._stops.discard)
+        return task
+
+    @staticmethod
+    async def _alive(process: subprocess.Popen, pgid: int) -> bool:
+        return process.returncode is None or await group_alive_async(pgid)
+
+    async def _gone(self, process: subprocess.Popen, pgid: int,
+                    exited: Optional[asyncio.Future], grace: float) -> bool:
+        deadline = time.monotonic() + grace
+        if exited is not None and not exited.done():
+            try:
+                await asyncio.wait_for(asyncio.shield(exited), grace)
+            except asyncio.TimeoutError:
+                return False
+        # The leader is gone; wait for the rest of the group
+        while await self._alive(process, pgid):
+            if time.monotonic() >= deadline:
+                return False
+            await asyncio.sleep(POLL_INTERVAL)
+        return True
+
+    async def close(self):
+        for task in list(self._stops):
+            task.cancel()
+        loop = asyncio.get_running_loop()
+        for child in self._children.values():
+            if child.pidfd is not None:
+                loop.remove_reader(child.pidfd)
+                os.close(child.pidfd)
+            if child.timer:
+                child.timer.cancel()
+        self._children.clear()
+
+    async def refresh_counts(self) -> dict:
+        """Re-read process_counts() in a thread; stats() reports the result."""
+        self.counts = await asyncio.to_thread(process_counts)
+        return self.counts
+
+    def stats(self) -> dict:
+        return {
+            "children": len(self._children),
+            "started": self.started,
+            "reaped": self.reaped,
+            "stopping": len(self._stops),
+            "stopped_by": dict(self.stopped_by),
+            "reaper": "pidfd" if self.pidfd else "poll",
+            **self.counts,
+        }
+
+
+def process_counts() -> dict:
+    """Open fds, PTY masters and zombie children of this process, from /proc."""
+    fds = ptys = 0
+    try:
+        for fd in os.listdir("/proc/self/fd"):
+            fds += 1
+            try:
+                if os.readlink(f"/proc/self/fd/{fd}") in ("/dev/ptmx", "/dev/pts/ptmx"):
+                    ptys += 1
+            except OSError:
+                pass
+    except OSError:
+        return {"open_fds": None, "pty_masters": None, "zombies": None}
+
+    pid = os.getpid()
+    zombies = sum(1 for _, state, ppid, _ in _processes() if state == "Z" and ppid == pid)
+    return {"open_fds": fds, "pty_masters": ptys, "zombies": zombies}
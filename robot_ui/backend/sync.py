@@ -0,0 +1,258 @@
+"""
+Content-addressed delta push of robot files for /api/sync.
+
+``xvalidation.sh -U/-p/-v`` ``scp -r``s a whole bundle (robot parameters,
+zippy_os.yaml, the host CLI firmware) to one robot after the other, every
+byte every time. A push here compares content first:
+
+1. the bundle is hashed locally (SHA-256 of every file and of every
+   SYNC_BLOCK_SIZE block) into a manifest cached on size and mtime, so files
+   that haven't changed aren't read again;
+2. each robot reports the manifest of its copy, from sync_helper.py run over
+   its pooled SSH connection (with a cache of its own on the robot);
+3. only files that differ are sent, and of those only the blocks that differ,
+   to the same helper process. It rebuilds each file next to the old one,
+   checks its SHA-256 and renames it into place, so an interrupted push never
+   leaves a torn file.
+
+Robots are pushed to at the same time, at most ``parallelism`` at once, each
+stream capped to SYNC_ROBOT_RATE bytes/s and all of them together to
+SYNC_TOTAL_RATE so a push can't swamp the warehouse Wi-Fi. ``push_many``
+yields a diff summary per robot as each one finishes:
+
+    {"robot": 12, "status": "ok", "added": [...], "changed": [...], "deleted": [],
+     "extra": [], "unchanged": 31, "files": 33, "bytes_total": 8391012,
+     "bytes_sent": 65612, "blocks_sent": 2, "duration": 0.84}
+
+Targets are remote_helper.py's: ``SSHTarget`` is a robot reached over the
+pool, ``LocalTarget`` a local directory standing in for one.
+"""
+import os
+import json
+import time
+import asyncio
+import inspect
+import logging
+from typing import AsyncIterator, Callable, Dict, List, Optional, Tuple
+
+import sync_helper
+from robots_config import SyncBundle, ROBOT_FILES_DIR
+from ssh_pool import SSHUnavailableError
+from remote_helper import HelperError, HelperTarget, read_framed, last_line
+from fleet import STATUS_OK, STATUS_FAILED, STATUS_UNREACHABLE, STATUS_TIMEOUT
+
+logger = logging.getLogger("robot_ui_backend")
+
+# Bytes per hashed (and resent) block
+SYNC_BLOCK_SIZE = int(os.environ.get("ROBOT_UI_SYNC_BLOCK", "65536"))
+
+# Robots pushed to at the same time
+SYNC_PARALLELISM = int(os.environ.get("ROBOT_UI_SYNC_PARALLELISM", "16"))
+
+# Bytes per second to one robot and across a whole push; 0 is uncapped
+SYNC_ROBOT_RATE = int(os.environ.get("ROBOT_UI_SYNC_ROBOT_RATE", "2000000"))
+SYNC_TOTAL_RATE = int(os.environ.get("ROBOT_UI_SYNC_TOTAL_RATE", "20000000"))
+
+# Seconds one robot's push may take, manifest included
+SYNC_TIMEOUT = float(os.environ.get("ROBOT_UI_SYNC_TIMEOUT", "600"))
+
+# Bytes per write to the helper's stdin; also the rate limiter's granularity
+WRITE_SIZE = 65536
+
+# Run on the robots with remote_helper.py
+HELPER_SOURCE = inspect.getsource(sync_helper)
+
+
+class SyncError(HelperError):
+    """The robot's side of a push failed."""
+
+
+class RateLimiter:
+    """Token bucket shared by the streams it caps; ``rate`` 0 is uncapped."""
+
+    def __init__(self, rate: float):
+        self.rate = rate
+        # A tenth of a second's worth, so a cap holds over short windows too
+        self.burst = max(rate / 10, WRITE_SIZE)
+        self._tokens = self.burst
+        self._at = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def take(self, n: int):
+        if not self.rate:
+            return
+        # Waiting under the lock keeps streams in turn
+        async with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._at) * self.rate)
+            self._at = now
+            self._tokens -= n
+            if self._tokens < 0:
+                await asyncio.sleep(-self._tokens / self.rate)
+
+
+async def _feed(proc, plan: List[Tuple[dict, Optional[str]]], limiters: List[RateLimiter]):
+    try:
+        for header, local_path in plan:
+            proc.stdin.write(json.dumps(header).encode() + b"\n")
+            if not header.get("send"):
+                continue
+            with open(local_path, "rb") as f:
+                for index in header["send"]:
+                    f.seek(index * SYNC_BLOCK_SIZE)
+                    remaining = min(SYNC_BLOCK_SIZE, header["size"] - index * SYNC_BLOCK_SIZE)
+                    while remaining:
+                        data = f.read(min(WRITE_SIZE, remaining))
+                        if not data:
+                            raise SyncError(f"{header['path']} changed during the push")
+                        for limiter in limiters:
+                            await limiter.take(len(data))
+                        proc.stdin.write(data)
+                        await proc.stdin.drain()
+                        remaining -= len(data)
+    finally:
+        proc.stdin.close()
+
+
+async def _run_helper(target, root: str, names: List[str], exclude: List[str],
+                      make_plan: Callable[[Dict[str, dict]], List[Tuple[dict, Optional[str]]]],
+                      limiters: List[RateLimiter]) -> List[dict]:
+    """
+    Start the helper on ``root``, hand its manifest to ``make_plan`` and send
+    the plan that returns ((header, local path) per file), all in one
+    process; returns the helper's result per file.
+    """
+    args = ["sync", target.path(root), str(SYNC_BLOCK_SIZE), json.dumps(exclude), *names]
+    async with target.process(HELPER_SOURCE, args) as proc:
+        plan = make_plan(await read_framed(proc, sync_helper.MANIFEST_MARK))
+        feeder = asyncio.create_task(_feed(proc, plan, limiters))
+        try:
+            output = await proc.stdout.read()
+            await proc.wait()
+            await feeder
+        except (BrokenPipeError, ConnectionResetError):
+            # The helper died; its output says why
+            pass
+        finally:
+            feeder.cancel()
+    results = []
+    for line in output.decode(errors="replace").splitlines():
+        try:
+            results.append(json.loads(line))
+        except ValueError:
+            continue
+    if proc.returncode != 0 and len(results) < len(plan):
+        raise SyncError(last_line(output) or f"helper exited with {proc.returncode}")
+    return results
+
+
+def bundle_source(bundle: SyncBundle) -> str:
+    return os.path.join(ROBOT_FILES_DIR, bundle.source)
+
+
+def local_manifest(bundle: SyncBundle) -> Dict[str, dict]:
+    """The bundle's manifest; blocking (hashes whatever changed since the last call)."""
+    path = bundle_source(bundle)
+    if not os.path.exists(path):
+        raise SyncError(f"{path} does not exist")
+    return sync_helper.scan(os.path.dirname(path), [os.path.basename(path)], SYNC_BLOCK_SIZE, bundle.exclude)
+
+
+def plan_push(local: Dict[str, dict], remote: Dict[str, dict], source_root: str,
+              delete: bool = False) -> Tuple[List[Tuple[dict, Optional[str]]], dict]:
+    """The headers to send for ``remote`` to match ``local``, and a summary of the differences."""
+    plan: List[Tuple[dict, Optional[str]]] = []
+    summary = {"added": [], "changed": [], "deleted": [], "extra": [], "unchanged": 0, "files": len(local),
+               "bytes_total": 0, "bytes_sent": 0, "blocks_sent": 0}
+    for path, entry in sorted(local.items()):
+        summary["bytes_total"] += entry["size"]
+        theirs = remote.get(path)
+        if theirs and theirs["sha256"] == entry["sha256"] and theirs["mode"] == entry["mode"]:
+            summary["unchanged"] += 1
+            continue
+        if theirs:
+            summary["changed"].append(path)
+            their_blocks = theirs["blocks"]
+            send = [i for i, block in enumerate(entry["blocks"])
+                    if i >= len(their_blocks) or their_blocks[i] != block]
+        else:
+            summary["added"].append(path)
+            send = list(range(len(entry["blocks"])))
+        header = {"path": path, "size": entry["size"], "mode": entry["mode"], "mtime_ns": entry["mtime_ns"],
+                  "sha256": entry["sha256"], "send": send, "reuse": theirs is not None}
+        plan.append((header, os.path.join(source_root, path)))
+        summary["blocks_sent"] += len(send)
+        summary["bytes_sent"] += sum(min(SYNC_BLOCK_SIZE, entry["size"] - i * SYNC_BLOCK_SIZE) for i in send)
+    extra = sorted(path for path in remote if path not in local)
+    if delete:
+        summary["deleted"] = extra
+        plan.extend(({"path": path, "delete": True}, None) for path in extra)
+    else:
+        summary["extra"] = extra
+    return plan, summary
+
+
+async def push(bundle: SyncBundle, local: Dict[str, dict], target: HelperTarget,
+               limiters: List[RateLimiter], delete: bool = False, dry_run: bool = False) -> dict:
+    """Make ``target``'s copy of ``bundle`` match ``local``; returns its diff summary."""
+    source_root = os.path.dirname(bundle_source(bundle))
+    diff: dict = {}
+
+    def make_plan(remote: Dict[str, dict]) -> List[Tuple[dict, Optional[str]]]:
+        plan, summary = plan_push(local, remote, source_root, delete)
+        diff.update(summary)
+        return [] if dry_run else plan
+
+    results = await _run_helper(target, bundle.dest, [os.path.basename(bundle.source)], bundle.exclude,
+                                make_plan, limiters)
+    summary = {"status": STATUS_OK, **diff}
+    failed = [r for r in results if not r.get("ok")]
+    if failed:
+        summary["status"] = STATUS_FAILED
+        summary["error"] = "; ".join(f"{r['path']}: {r.get('error')}" for r in failed)
+    return summary
+
+
+async def push_many(
+    bundle: SyncBundle,
+    targets: Dict[object, HelperTarget],
+    parallelism: Optional[int] = None,
+    robot_rate: Optional[int] = None,
+    total_rate: Optional[int] = None,
+    delete: bool = False,
+    dry_run: bool = False,
+) -> AsyncIterator[dict]:
+    """
+    Push ``bundle`` to every target, at most ``parallelism`` at a time,
+    yielding each robot's summary (tagged with its key in ``targets``) as
+    soon as it finishes.
+    """
+    local = await asyncio.to_thread(local_manifest, bundle)
+    semaphore = asyncio.Semaphore(parallelism or SYNC_PARALLELISM)
+    total = RateLimiter(SYNC_TOTAL_RATE if total_rate is None else total_rate)
+    robot_rate = SYNC_ROBOT_RATE if robot_rate is None else robot_rate
+
+    async def push_one(key, target: HelperTarget) -> dict:
+        async with semaphore:
+            started = time.monotonic()
+            try:
+                result = await asyncio.wait_for(
+                    push(bundle, local, target, [RateLimiter(robot_rate), total], delete, dry_run), SYNC_TIMEOUT)
+            except SSHUnavailableError as e:
+                result = {"status": STATUS_UNREACHABLE, "error": str(e)}
+            except asyncio.TimeoutError:
+                result = {"status": STATUS_TIMEOUT, "error": f"Push timed out after {SYNC_TIMEOUT:g}s"}
+            except (HelperError, OSError) as e:
+                result = {"status": STATUS_FAILED, "error": str(e)}
+        if result["status"] != STATUS_OK:
+            logger.warning(f"Sync of {bundle.label} to {key}: {result['status']}: {result.get('error')}")
+        return {"robot": key, **result, "duration": round(time.monotonic() - started, 3)}
+
+    tasks = [asyncio.create_task(push_one(key, target)) for key, target in targets.items()]
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            yield await next_done
+    finally:
+        # Client went away mid-stream: stop pushing
+        for task in tasks:
+            task.cancel()
@@ -0,0 +1,234 @@
+"""
+Robot-side half of sync.py, run as ``python3 -S -c <this file> sync ...``.
+
+Only the standard library, and Python 3.6 syntax (the robots' ROS images), so
+the same source runs on a robot over SSH and locally for a stand-in directory.
+
+    sync <root> <block_size> <exclude_json> <name>...
+
+First prints a ``rui-sync-manifest <length>`` line and then that many bytes of
+JSON, {path: {"size", "mtime_ns", "mode", "sha256", "blocks"}} for every file
+under root/<name> (paths relative to root). Entries are cached per root in
+~/.cache/robot_ui_sync and reused while size and mtime match, so only new or
+changed files are hashed.
+
+Then reads files to write from stdin until it is closed, each a JSON header
+line ({"path", "size", "mode", "mtime_ns", "sha256", "send", "reuse"}, or
+{"path", "delete": true}) followed by the bytes of the blocks listed in
+"send", in order. Blocks not sent are taken from the file already there
+("reuse"). Each file is built in one pass into a temporary file next to it,
+checked against its sha256 and renamed into place; one JSON result line is
+printed per file.
+"""
+import os
+import sys
+import json
+import fnmatch
+import hashlib
+
+CACHE_DIR = os.path.expanduser("~/.cache/robot_ui_sync")
+
+# Precedes the manifest, so shell noise (a chatty .bashrc) can be skipped
+MANIFEST_MARK = b"rui-sync-manifest"
+
+# Files being rebuilt; never part of a manifest
+TEMP_PREFIX = ".rui-sync-"
+
+
+def _temp_path(path):
+    # Not tempfile: its imports would double the helper's start-up time
+    return os.path.join(os.path.dirname(path), "{}{}-{}".format(TEMP_PREFIX, os.getpid(), os.path.basename(path)))
+
+
+def _cache_path(root, block_size):
+    key = hashlib.sha1("{}:{}".format(os.path.abspath(root), block_size).encode()).hexdigest()[:16]
+    return os.path.join(CACHE_DIR, key + ".json")
+
+
+def _load_cache(path):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _save_cache(path, cache):
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = _temp_path(path)
+        with open(tmp, "w") as f:
+            json.dump(cache, f, separators=(",", ":"))
+        os.replace(tmp, path)
+    except OSError:
+        pass
+
+
+def _block_hash(data):
+    return hashlib.sha256(data).hexdigest()[:32]
+
+
+def hash_file(path, block_size):
+    """(sha256 of the file, truncated sha256 of each block)."""
+    whole = hashlib.sha256()
+    blocks = []
+    with open(path, "rb") as f:
+        while True:
+            data = f.read(block_size)
+            if not data:
+                break
+            whole.update(data)
+            blocks.append(_block_hash(data))
+    return whole.hexdigest(), blocks
+
+
+def _files(root, names, exclude):
+    for name in names:
+        top = os.path.join(root, name)
+        if os.path.isfile(top):
+            candidates = [name]
+        else:
+            candidates = []
+            for directory, dirs, files in os.walk(top):
+                dirs.sort()
+                rel_dir = os.path.relpath(directory, root)
+                candidates.extend(os.path.join(rel_dir, f) for f in sorted(files))
+        for rel in candidates:
+            rel = rel.replace(os.sep, "/")
+            if os.path.basename(rel).startswith(TEMP_PREFIX):
+                continue
+            if not any(fnmatch.fnmatch(rel, pattern) for pattern in exclude):
+                yield rel
+
+
+def scan(root, names, block_size, exclude=(), cache=None):
+    """Manifest of the files under root/<name> for every name."""
+    cache_path = _cache_path(root, block_size)
+    if cache is None:
+        cache = _load_cache(cache_path)
+    manifest = {}
+    for rel in _files(root, names, exclude):
+        path = os.path.join(root, rel)
+        try:
+            st = os.lstat(path)
+        except OSError:
+            continue
+        if not os.path.isfile(path) or os.path.islink(path):
+            continue
+        entry = cache.get(rel)
+        if not entry or entry["size"] != st.st_size or entry["mtime_ns"] != st.st_mtime_ns:
+            sha256, blocks = hash_file(path, block_size)
+            entry = {"size": st.st_size, "mtime_ns": st.st_mtime_ns, "sha256": sha256, "blocks": blocks}
+        entry["mode"] = st.st_mode & 0o7777
+        manifest[rel] = entry
+    if any(cache.get(rel) != entry for rel, entry in manifest.items()):
+        cache.update(manifest)
+        _save_cache(cache_path, cache)
+    return manifest
+
+
+def _read_exact(stream, n):
+    data = stream.read(n)
+    if len(data) != n:
+        raise EOFError("stream ended mid-block")
+    return data
+
+
+def _skip(stream, header, sent, block_size):
+    # The rest of a failed file's blocks are still on the stream
+    for index in header.get("send", [])[sent:]:
+        _read_exact(stream, min(block_size, header["size"] - index * block_size))
+
+
+def apply_one(root, block_size, header, stream):
+    path = os.path.join(root, header["path"])
+    if header.get("delete"):
+        if os.path.isfile(path):
+            os.remove(path)
+        return None
+    size = header["size"]
+    send = header["send"]
+    sent = 0
+    tmp = None
+    old = None
+    whole = hashlib.sha256()
+    blocks = []
+    try:
+        directory = os.path.dirname(path)
+        os.makedirs(directory, exist_ok=True)
+        if header.get("reuse") and os.path.isfile(path):
+            old = open(path, "rb")
+        tmp = _temp_path(path)
+        with open(tmp, "wb") as f:
+            for index in range((size + block_size - 1) // block_size):
+                length = min(block_size, size - index * block_size)
+                if sent < len(send) and send[sent] == index:
+                    data = _read_exact(stream, length)
+                    sent += 1
+                else:
+                    if old is None:
+                        raise ValueError("block {} not sent and no file to take it from".format(index))
+                    old.seek(index * block_size)
+                    data = old.read(length)
+                f.write(data)
+                whole.update(data)
+                blocks.append(_block_hash(data))
+            f.flush()
+            os.fsync(f.fileno())
+        if whole.hexdigest() != header["sha256"]:
+            raise ValueError("checksum mismatch (file changed on the robot during the push?)")
+        os.chmod(tmp, header["mode"])
+        os.utime(tmp, ns=(header["mtime_ns"], header["mtime_ns"]))
+        os.replace(tmp, path)
+    except BaseException as e:
+        if tmp and os.path.exists(tmp):
+            os.unlink(tmp)
+        if isinstance(e, (OSError, ValueError)):
+            _skip(stream, header, sent, block_size)
+        raise
+    finally:
+        if old is not None:
+            old.close()
+    return {"size": size, "mtime_ns": header["mtime_ns"], "sha256": whole.hexdigest(), "blocks": blocks,
+            "mode": header["mode"]}
+
+
+def apply(root, block_size, stream, out, cache):
+    while True:
+        line = stream.readline()
+        if not line:
+            break
+        header = json.loads(line.decode())
+        result = {"path": header["path"], "ok": True}
+        try:
+            entry = apply_one(root, block_size, header, stream)
+            if entry:
+                cache[header["path"]] = entry
+            else:
+                cache.pop(header["path"], None)
+        except EOFError as e:
+            result.update(ok=False, error=str(e))
+            out.write((json.dumps(result) + "\n").encode())
+            break
+        except (OSError, ValueError) as e:
+            result.update(ok=False, error=str(e))
+        out.write((json.dumps(result) + "\n").encode())
+        out.flush()
+    _save_cache(_cache_path(root, block_size), cache)
+
+
+def main(argv):
+    if len(argv) < 4 or argv[0] != "sync":
+        sys.exit("usage: sync <root> <block_size> <exclude_json> <name>...")
+    root, block_size = argv[1], int(argv[2])
+    cache = _load_cache(_cache_path(root, block_size))
+    manifest = json.dumps(scan(root, argv[4:], block_size, json.loads(argv[3]), cache),
+                          separators=(",", ":")).encode()
+    out = sys.stdout.buffer
+    out.write(MANIFEST_MARK + b" " + str(len(manifest)).encode() + b"\n" + manifest)
+    out.flush()
+    apply(root, block_size, sys.stdin.buffer, out, cache)
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,208 @@
+"""
+Streaming telemetry mode for high-rate ``rostopic echo`` commands.
+
+``rostopic echo`` prints YAML-ish messages separated by ``---`` lines, often
+hundreds per second. Forwarding every byte swamps the websocket and the
+browser, so telemetry commands are read through a ``TelemetryStream``: it
+splits frames incrementally (only new bytes are scanned), optionally projects
+each frame down to a few fields, and hands out at most one frame, the latest,
+per interval. Every complete frame can also be handed to an ``on_frame``
+callback, e.g. to record numeric fields for plotting.
+"""
+import time
+import asyncio
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+from robots_config import TelemetryConfig
+
+SEPARATOR = b"---"
+
+# Partial frame bytes kept before we give up on finding a separator
+MAX_FRAME_SIZE = 102400
+
+
+class FrameParser:
+    """Incremental splitter for ``---``-separated frames."""
+
+    def __init__(self, max_frame_size: int = MAX_FRAME_SIZE,
+                 on_frame: Optional[Callable[[bytes], None]] = None):
+        self.max_frame_size = max_frame_size
+        self.on_frame = on_frame
+        self._buf = bytearray()
+        # Where the next search for a separator starts; bytes before it were
+        # already checked, so each byte is scanned once
+        self._scan = 0
+        self.frames = 0
+
+    def feed(self, data: bytes) -> Optional[bytes]:
+        """
+        Consume ``data`` and return the newest complete frame in it, if any.
+        Older complete frames in the same chunk are skipped, as only the latest
+        state is ever shown.
+        """
+        buf = self._buf
+        buf += data
+        size = len(buf)
+        frame_start = 0
+        latest = None
+        pos = self._scan
+        while True:
+            i = buf.find(SEPARATOR, pos)
+            if i == -1:
+                # A separator may straddle the end of this chunk
+                pos = max(pos, size - len(SEPARATOR))
+                break
+            j = i + len(SEPARATOR)
+            if j < size and buf[j] == 0x0D:
+                j += 1
+            if j >= size:
+                # Can't tell yet whether the line ends here
+                pos = i
+                break
+            # Only a whole "---" line separates frames (the buffer always
+            # begins at a line start)
+            if buf[j] == 0x0A and (i == 0 or buf[i - 1] == 0x0A):
+                latest = frame_start, i
+                self.frames += 1
+                if self.on_frame:
+                    self.on_frame(bytes(buf[frame_start:i]))
+                frame_start = j + 1
+                pos = j + 1
+            else:
+                pos = i + 1
+
+        frame = bytes(buf[latest[0]:latest[1]]) if latest else None
+
+        # Drop everything before the current partial frame
+        if frame_start:
+            del buf[:frame_start]
+            pos -= frame_start
+        if len(buf) > self.max_frame_size:
+            buf.clear()
+            pos = 0
+        self._scan = max(pos, 0)
+        return frame
+
+
+def _parse_line(line: str) -> Tuple[int, Optional[str]]:
+    """Return (indent, key) for a ``key: value`` line, key None otherwise."""
+    stripped = line.lstrip(" ")
+    indent = len(line) - len(stripped)
+    if stripped.startswith("- "):
+        stripped = stripped[2:]
+        indent += 2
+    key, sep, _ = stripped.partition(":")
+    if not sep or not key or " " in key:
+        return indent, None
+    return indent, key
+
+
+def project(frame: bytes, fields: Sequence[str]) -> bytes:
+    """
+    Keep only the given dotted paths (``pose``, ``pose.position.x``, ...) of a
+    YAML-ish frame, plus the parent keys needed to place them.
+    """
+    if not fields:
+        return frame
+    wanted = [tuple(f.split(".")) for f in fields]
+    kept: List[str] = []
+    stack: List[Tuple[int, str]] = []
+    for line in frame.decode("utf-8", errors="replace").splitlines(True):
+        if not line.strip():
+            continue
+        indent, key = _parse_line(line.rstrip("\r\n"))
+        while stack and stack[-1][0] >= indent and key is not None:
+            stack.pop()
+        if key is None:
+            # Continuation line (list item, multi-line value): follows its parent
+            path = tuple(k for _, k in stack)
+        else:
+            stack.append((indent, key))
+            path = tuple(k for _, k in stack)
+        for want in wanted:
+            n = min(len(want), len(path))
+            if path[:n] == want[:n] and (key is not None or len(path) >= len(want)):
+                kept.append(line)
+                break
+    return "".join(kept).encode("utf-8")
+
+
+def extract_numeric(frame: bytes, prefixes: Sequence[str] = ()) -> Dict[str, float]:
+    """
+    Return ``{dotted.path: value}`` for every numeric scalar in a frame,
+    limited to paths equal to or under one of ``prefixes`` if given.
+    """
+    values: Dict[str, float] = {}
+    stack: List[Tuple[int, str]] = []
+    for line in frame.decode("utf-8", errors="replace").splitlines():
+        indent, key = _parse_line(line)
+        if key is None:
+            continue
+        while stack and stack[-1][0] >= indent:
+            stack.pop()
+        stack.append((indent, key))
+        raw = line.partition(":")[2].strip()
+        if not raw:
+            continue
+        try:
+            value = float(raw)
+        except ValueError:
+            continue
+        name = ".".join(k for _, k in stack)
+        if prefixes and not any(name == p or name.startswith(p + ".") for p in prefixes):
+            continue
+        values[name] = value
+    return values
+
+
+class TelemetryStream:
+    """
+    Wraps a reader with ``async read() -> bytes`` and returns at most one
+    projected frame per ``interval_ms``. Returns b"" at EOF like the reader.
+    """
+
+    def __init__(self, reader, config: TelemetryConfig,
+                 on_frame: Optional[Callable[[bytes], None]] = None):
+        self.reader = reader
+        self.config = config
+        self.interval = config.interval_ms / 1000.0
+        self.parser = FrameParser(on_frame=on_frame)
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self._latest: Optional[bytes] = None
+        self._next_emit = 0.0
+        self._eof = False
+
+    def _take(self) -> bytes:
+        frame = project(self._latest, self.config.fields)
+        self._latest = None
+        self._next_emit = time.monotonic() + self.interval
+        out = frame + b"---\r\n"
+        self.bytes_out += len(out)
+        return out
+
+    async def read(self) -> bytes:
+        while True:
+            if self._eof:
+                return self._take() if self._latest is not None else b""
+
+            now = time.monotonic()
+            if self._latest is not None and now >= self._next_emit:
+                return self._take()
+
+            if self._latest is None:
+                data = await self.reader.read()
+            else:
+                # A frame is waiting for its slot; don't sit on it past the slot
+                try:
+                    data = await asyncio.wait_for(self.reader.read(), self._next_emit - now)
+                except asyncio.TimeoutError:
+                    continue
+
+            if not data:
+                self._eof = True
+                continue
+            self.bytes_in += len(data)
+            frame = self.parser.feed(data)
+            if frame is not None:
+                self._latest = frame
@@ -0,0 +1,166 @@
+"""
+Columnar history of numeric telemetry fields, for plotting.
+
+Each (robot, stream) pair gets a ``SeriesStore``: one preallocated float64
+timestamp ring plus one float32 ring per field, filled from every telemetry
+frame. Plots are served as min/max/mean buckets sized to the client's pixel
+width, so a 30-minute 50 Hz history reaches the browser in a few KB no matter
+how many samples it holds.
+"""
+import os
+import struct
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+# Samples kept per stream: a little over 40 minutes at 50 Hz
+SERIES_CAPACITY = int(os.environ.get("ROBOT_UI_SERIES_CAPACITY", "131072"))
+
+# Binary window format, little endian:
+#   header  "RTS1", version u8, reserved u8, n_series u16, n_bins u32, t0 f64, t1 f64
+#   series  name_len u16, name utf-8, then n_bins f32 each of min, max, mean
+# Bin k covers [t0 + k * (t1 - t0) / n_bins, t0 + (k + 1) * (t1 - t0) / n_bins).
+# Empty bins are NaN.
+WINDOW_MAGIC = b"RTS1"
+WINDOW_VERSION = 1
+_HEADER = struct.Struct("<4sBBHIdd")
+_NAME_LEN = struct.Struct("<H")
+
+
+class SeriesStore:
+    """Fixed-capacity ring of timestamped samples with one column per field."""
+
+    def __init__(self, capacity: int = SERIES_CAPACITY):
+        self.capacity = capacity
+        self.times = np.zeros(capacity, dtype=np.float64)
+        self.columns: Dict[str, np.ndarray] = {}
+        # Total samples ever appended
+        self.count = 0
+
+    def __len__(self) -> int:
+        return min(self.count, self.capacity)
+
+    def append(self, t: float, values: Dict[str, float]):
+        i = self.count % self.capacity
+        self.times[i] = t
+        for name, column in self.columns.items():
+            column[i] = values.get(name, np.nan)
+        for name, value in values.items():
+            if name not in self.columns:
+                column = np.full(self.capacity, np.nan, dtype=np.float32)
+                column[i] = value
+                self.columns[name] = column
+        self.count += 1
+
+    def _ordered(self, array: np.ndarray) -> np.ndarray:
+        if self.count <= self.capacity:
+            return array[:self.count]
+        head = self.count % self.capacity
+        return np.concatenate((array[head:], array[:head]))
+
+    @property
+    def first_time(self) -> Optional[float]:
+        if not self.count:
+            return None
+        return float(self.times[self.count % self.capacity if self.count > self.capacity else 0])
+
+    @property
+    def last_time(self) -> Optional[float]:
+        return float(self.times[(self.count - 1) % self.capacity]) if self.count else None
+
+    def window(self, t0: float, t1: float, names: Sequence[str]) -> Tuple[np.ndarray, Dict[str, np.ndarray]]:
+        """Samples with ``t0 <= t <= t1`` for the requested fields, oldest first."""
+        times = self._ordered(self.times)
+        lo = int(np.searchsorted(times, t0, side="left"))
+        hi = int(np.searchsorted(times, t1, side="right"))
+        columns = {
+            name: self._ordered(self.columns[name])[lo:hi]
+            for name in names if name in self.columns
+        }
+        return times[lo:hi], columns
+
+
+def decimate(times: np.ndarray, values: np.ndarray, t0: float, t1: float, bins: int):
+    """
+    Bucket ``values`` into ``bins`` equal time slices of ``[t0, t1)`` and return
+    float32 ``(min, max, mean)`` arrays, NaN where a slice has no samples.
+    """
+    out_min = np.full(bins, np.nan, dtype=np.float32)
+    out_max = np.full(bins, np.nan, dtype=np.float32)
+    out_mean = np.full(bins, np.nan, dtype=np.float32)
+    if not len(times) or bins <= 0 or t1 <= t0:
+        return out_min, out_max, out_mean
+
+    edges = np.linspace(t0, t1, bins + 1)
+    starts = np.searchsorted(times, edges[:-1], side="left")
+    ends = np.searchsorted(times, edges[1:], side="left")
+    filled = ends > starts
+    if not filled.any():
+        return out_min, out_max, out_mean
+
+    # reduceat over interleaved [start, end] pairs reduces exactly each bin;
+    # the odd segments (gaps between bins) are discarded. One trailing pad
+    # element keeps an end index equal to len(values) in range.
+    idx = np.empty(2 * int(filled.sum()), dtype=np.intp)
+    idx[0::2] = starts[filled]
+    idx[1::2] = ends[filled]
+    padded = np.append(values, np.float32(np.nan))
+    valid = ~np.isnan(padded)
+    out_min[filled] = np.fmin.reduceat(padded, idx)[0::2]
+    out_max[filled] = np.fmax.reduceat(padded, idx)[0::2]
+    sums = np.add.reduceat(np.where(valid, padded, 0.0), idx)[0::2]
+    counts = np.add.reduceat(valid.astype(np.int32), idx)[0::2]
+    with np.errstate(invalid="ignore", divide="ignore"):
+        out_mean[filled] = sums / counts
+    return out_min, out_max, out_mean
+
+
+def encode_window(store: SeriesStore, names: Sequence[str], t0: float, t1: float, bins: int) -> bytes:
+    """Decimate the requested fields over ``[t0, t1)`` into the binary window format."""
+    times, columns = store.window(t0, t1, names)
+    parts = [_HEADER.pack(WINDOW_MAGIC, WINDOW_VERSION, 0, len(columns), bins, t0, t1)]
+    for name, values in columns.items():
+        encoded = name.encode("utf-8")
+        parts.append(_NAME_LEN.pack(len(encoded)))
+        parts.append(encoded)
+        for series in decimate(times, values, t0, t1, bins):
+            parts.append(series.astype("<f4", copy=False).tobytes())
+    return b"".join(parts)
+
+
+def decode_window(data: bytes) -> Tuple[float, float, int, Dict[str, Tuple[np.ndarray, np.ndarray, np.ndarray]]]:
+    """Inverse of ``encode_window``; used by tools and benchmarks."""
+    magic, version, _, n_series, bins, t0, t1 = _HEADER.unpack_from(data)
+    if magic != WINDOW_MAGIC or version != WINDOW_VERSION:
+        raise ValueError("Not a telemetry window")
+    pos = _HEADER.size
+    series = {}
+    for _ in range(n_series):
+        (name_len,) = _NAME_LEN.unpack_from(data, pos)
+        pos += _NAME_LEN.size
+        name = data[pos:pos + name_len].decode("utf-8")
+        pos += name_len
+        arrays = []
+        for _ in range(3):
+            arrays.append(np.frombuffer(data, dtype="<f4", count=bins, offset=pos))
+            pos += bins * 4
+        series[name] = tuple(arrays)
+    return t0, t1, bins, series
+
+
+class SeriesRegistry:
+    """One SeriesStore per (robot id, stream name)."""
+
+    def __init__(self, capacity: int = SERIES_CAPACITY):
+        self.capacity = capacity
+        self._stores: Dict[Tuple[str, str], SeriesStore] = {}
+
+    def get(self, robot_id: str, stream: str, create: bool = False) -> Optional[SeriesStore]:
+        key = (robot_id, stream)
+        store = self._stores.get(key)
+        if store is None and create:
+            store = self._stores[key] = SeriesStore(self.capacity)
+        return store
+
+    def streams(self, robot_id: str) -> List[str]:
+        return [stream for robot, stream in self._stores if robot == robot_id]
@@ -0,0 +1,337 @@
+"""
+Keystroke path for teleop sessions (``teleop`` set on the command).
+
+Keys from viewers are written to the PTY as soon as they arrive, in the
+websocket's receive task, without passing through any queue shared with the
+output. Only when the PTY's input buffer is full do they wait, in three
+priority levels drained with ``add_writer``:
+
+    stop keys     first, and they discard any movement still waiting
+    other input   in order (sudo prompts, ^C, ...)
+    movement      one slot: a newer movement key replaces a waiting one
+
+Movement keys are also throttled: the first press goes out at once and
+repeats arriving within ``repeat_ms`` collapse into the latest one, sent when
+the window ends, so a held key's autorepeat cannot queue up motion the robot
+keeps executing after the key is released.
+
+A slow viewer is held to ``TELEOP_WINDOW`` unconfirmed bytes of output, its
+queue keeping only the newest output meanwhile (see ViewerWindow).
+
+Latency is measured two ways: each key written to the time the command
+answers it (the next output containing ``ack``; teleop_key prints the new
+velocity after every key), and the websocket round trip of echo probes the server sends each viewer
+every ``PROBE_INTERVAL`` seconds.
+"""
+import os
+import time
+import socket
+import asyncio
+import logging
+from collections import deque
+from typing import Deque, Dict, Optional
+
+from robots_config import TeleopConfig
+from metrics import REGISTRY
+
+logger = logging.getLogger("robot_ui_backend")
+
+# Seconds between echo probes sent to each teleop viewer
+PROBE_INTERVAL = 1.0
+
+# Latency samples kept per session for the percentiles in its stats
+LATENCY_SAMPLES = 1000
+
+# Output waiting for a teleop viewer beyond this is dropped, oldest first, so
+# what the operator sees stays current under an output flood
+TELEOP_MAX_PENDING = 65536
+
+# Kernel send buffer of a teleop viewer's socket: kept small so a slow link
+# holds little stale output ahead of a key's answer
+TELEOP_SNDBUF = 65536
+
+# Output bytes a teleop viewer may have been sent without confirming them. The
+# socket buffers alone don't bound this: permessage-deflate shrinks a log
+# flood ~50x, so 128 KiB in the kernel can be seconds of output
+TELEOP_WINDOW = 262144
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.02, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+KEY_SECONDS = REGISTRY.histogram(
+    "robot_ui_teleop_key_seconds", "Teleop key written to the command's next output",
+    buckets=LATENCY_BUCKETS,
+)
+RTT_SECONDS = REGISTRY.histogram(
+    "robot_ui_teleop_rtt_seconds", "Echo probe round trip to teleop viewers",
+    buckets=LATENCY_BUCKETS,
+)
+
+
+def _percentiles(samples: Deque[float]) -> Optional[dict]:
+    if not samples:
+        return None
+    ordered = sorted(samples)
+    pick = lambda q: round(ordered[min(len(ordered) - 1, int(q * len(ordered)))] * 1000, 2)  # noqa: E731
+    return {"p50_ms": pick(0.50), "p99_ms": pick(0.99), "max_ms": round(ordered[-1] * 1000, 2),
+            "samples": len(ordered)}
+
+
+def tune_socket(websocket) -> bool:
+    """
+    Turn Nagle off on a teleop viewer's TCP socket so small frames (key
+    answers, probes) are not held back, and shrink its send buffer. asyncio
+    already sets TCP_NODELAY on its TCP transports; this makes sure. Best
+    effort: the ASGI server's transport is only reachable through its receive
+    callable. Returns whether TCP_NODELAY is on.
+    """
+    protocol = getattr(getattr(websocket, "_receive", None), "__self__", None)
+    transport = getattr(protocol, "transport", None)
+    sock = transport.get_extra_info("socket") if transport else None
+    if sock is None or sock.family not in (socket.AF_INET, socket.AF_INET6):
+        return False
+    try:
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, TELEOP_SNDBUF)
+        return bool(sock.getsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY))
+    except OSError:
+        return False
+
+
+class TeleopInput:
+    """Writes one session's keystrokes to its PTY, stop keys first."""
+
+    def __init__(self, fd: int, config: TeleopConfig, loop: Optional[asyncio.AbstractEventLoop] = None):
+        self.fd = fd
+        self.config = config
+        self._loop = loop or asyncio.get_running_loop()
+        self._stop_keys = {k.encode() for k in config.stop_keys}
+        self._move_keys = {k.encode() for k in config.move_keys}
+        self._repeat = config.repeat_ms / 1000.0
+        # Key handling starts with the command's ready text (until then it may
+        # be asking for a password, where every character matters)
+        self.ready = config.ready is None
+        self._ready_text = config.ready.encode() if config.ready else b""
+        self._ready_tail = b""
+        self._ack_text = config.ack.encode() if config.ack else b""
+        self._ack_tail = b""
+
+        # Waiting for the PTY, by priority
+        self._stops: Deque[bytes] = deque()
+        self._input: Deque[bytes] = deque()
+        self._move: Optional[bytes] = None
+        self._writing = False
+        # Throttle: when the last movement key went out, and the latest repeat
+        # held back since
+        self._move_sent = 0.0
+        self._held: Optional[bytes] = None
+        self._held_timer: Optional[asyncio.TimerHandle] = None
+
+        # When the oldest key not yet answered by output was written
+        self._key_at: Optional[float] = None
+        self._probes: Dict[int, float] = {}
+        self._probe_seq = 0
+        self.key_latency: Deque[float] = deque(maxlen=LATENCY_SAMPLES)
+        self.rtt: Deque[float] = deque(maxlen=LATENCY_SAMPLES)
+
+        self.keys = 0
+        self.written = 0
+        self.coalesced = 0
+        self.cancelled = 0
+        self.closed = False
+
+    def key(self, data: bytes):
+        """A viewer's keystroke(s)."""
+        if self.closed:
+            return
+        self.keys += 1
+        if not self.ready:
+            self._input.append(data)
+        elif data in self._stop_keys:
+            # Latest command wins: nothing older may move the robot after a stop
+            self.cancelled += (self._move is not None) + (self._held is not None)
+            self._move = self._held = None
+            if self._held_timer:
+                self._held_timer.cancel()
+                self._held_timer = None
+            self._stops.append(data)
+        elif data in self._move_keys:
+            now = time.monotonic()
+            if now - self._move_sent >= self._repeat and self._held is None:
+                self._queue_move(data, now)
+            else:
+                if self._held is not None:
+                    self.coalesced += 1
+                self._held = data
+                if self._held_timer is None:
+                    self._held_timer = self._loop.call_at(
+                        self._loop.time() + max(0.0, self._move_sent + self._repeat - now), self._release_held)
+        else:
+            self._input.append(data)
+        self._drain()
+
+    def _queue_move(self, data: bytes, now: float):
+        if self._move is not None:
+            self.coalesced += 1
+        self._move = data
+        self._move_sent = now
+
+    def _release_held(self):
+        self._held_timer = None
+        if self._held is not None and not self.closed:
+            data, self._held = self._held, None
+            self._queue_move(data, time.monotonic())
+            self._drain()
+
+    def _next(self) -> Optional[bytes]:
+        if self._stops:
+            return self._stops[0]
+        if self._input:
+            return self._input[0]
+        return self._move
+
+    def _pop(self, written: int):
+        queue = self._stops or self._input
+        if queue:
+            if written < len(queue[0]):
+                queue[0] = queue[0][written:]
+            else:
+                queue.popleft()
+        elif written < len(self._move):
+            self._move = self._move[written:]
+        else:
+            self._move = None
+
+    def _drain(self):
+        while True:
+            data = self._next()
+            if data is None:
+                break
+            try:
+                written = os.write(self.fd, data)
+            except BlockingIOError:
+                # The command isn't reading; continue once the PTY takes input again
+                if not self._writing:
+                    self._loop.add_writer(self.fd, self._drain)
+                    self._writing = True
+                return
+            except OSError:
+                self.close()
+                return
+            self.written += 1
+            if self._key_at is None:
+                self._key_at = time.perf_counter()
+            self._pop(written)
+        if self._writing:
+            self._loop.remove_writer(self.fd)
+            self._writing = False
+
+    def observe(self, data: bytes):
+        """The command's output (a broadcaster tap): readiness and key latency."""
+        if self._key_at is not None and self._seen(data, self._ack_text, "_ack_tail"):
+            latency = time.perf_counter() - self._key_at
+            self._key_at = None
+            self.key_latency.append(latency)
+            KEY_SECONDS.observe(latency)
+        if not self.ready and self._seen(data, self._ready_text, "_ready_tail"):
+            self.ready = True
+            logger.info("Teleop command ready, key handling on")
+
+    def _seen(self, data: bytes, text: bytes, tail: str) -> bool:
+        """Whether ``text`` (empty: anything) appears, also split across chunks."""
+        if not text:
+            return True
+        window = getattr(self, tail) + data
+        setattr(self, tail, window[-(len(text) - 1):] if len(text) > 1 else b"")
+        return text in window
+
+    def probe(self) -> dict:
+        """The next echo probe for a viewer to send straight back."""
+        self._probe_seq += 1
+        self._probes[self._probe_seq] = time.perf_counter()
+        # Viewers that never answer must not grow this
+        for stale in [seq for seq in self._probes if seq < self._probe_seq - 64]:
+            del self._probes[stale]
+        return {"type": "probe", "id": self._probe_seq}
+
+    def probe_reply(self, probe_id: int) -> Optional[float]:
+        sent = self._probes.pop(probe_id, None)
+        if sent is None:
+            return None
+        rtt = time.perf_counter() - sent
+        self.rtt.append(rtt)
+        RTT_SECONDS.observe(rtt)
+        return rtt
+
+    def close(self):
+        self.closed = True
+        if self._held_timer:
+            self._held_timer.cancel()
+            self._held_timer = None
+        if self._writing:
+            try:
+                self._loop.remove_writer(self.fd)
+            except (ValueError, OSError):
+                pass
+            self._writing = False
+
+    def stats(self) -> dict:
+        return {
+            "ready": self.ready,
+            "keys": self.keys,
+            "written": self.written,
+            "coalesced": self.coalesced,
+            "cancelled": self.cancelled,
+            "waiting": len(self._stops) + len(self._input) + (self._move is not None),
+            "key_to_output": _percentiles(self.key_latency),
+            "rtt": _percentiles(self.rtt),
+        }
+
+
+class ViewerWindow:
+    """
+    Flow control for one teleop viewer. Echo probes double as receipts: the
+    reply to a probe means the viewer got everything sent before it. Output
+    waits while ``window`` bytes are unconfirmed, so under a flood a slow
+    viewer's queue coalesces instead of the network filling with stale output.
+    Viewers that never echo a probe are not held back.
+    """
+
+    def __init__(self, teleop: TeleopInput, window: int = TELEOP_WINDOW):
+        self.teleop = teleop
+        self.window = window
+        self.sent = 0
+        self.confirmed = 0
+        self.echoes = False
+        self._probed = 0
+        self._marks: Dict[int, int] = {}
+        self._confirmed = asyncio.Event()
+
+    def probe(self) -> dict:
+        """An echo probe marking the output sent so far."""
+        message = self.teleop.probe()
+        self._marks[message["id"]] = self.sent
+        for stale in [seq for seq in self._marks if seq < message["id"] - 64]:
+            del self._marks[stale]
+        self._probed = self.sent
+        return message
+
+    def reply(self, probe_id: int):
+        self.teleop.probe_reply(probe_id)
+        mark = self._marks.pop(probe_id, None)
+        if mark is not None:
+            self.echoes = True
+            if mark > self.confirmed:
+                self.confirmed = mark
+                self._confirmed.set()
+
+    def sent_bytes(self, n: int) -> Optional[dict]:
+        """Count output sent; returns a probe to send along once half the window is unmarked."""
+        self.sent += n
+        if self.sent - self._probed >= self.window // 2:
+            return self.probe()
+        return None
+
+    async def wait(self):
+        """Until the viewer has confirmed enough output for more to be sent."""
+        while self.echoes and self.sent - self.confirmed >= self.window:
+            self._confirmed.clear()
+            await self._confirmed.wait()
@@ -0,0 +1,172 @@
+"""
+Binary framing for /ws/terminal (``?proto=bin``).
+
+The text protocol sends every PTY chunk as its own UTF-8 text message. The
+binary protocol sends raw bytes instead, so the client's terminal does the
+decoding and a multibyte character split between chunks never turns into a
+replacement character. Output is also coalesced: chunks arriving within
+``BATCH_MS`` are sent together, up to ``BATCH_BYTES``.
+
+Each websocket message holds one or more frames, each a little-endian header
+followed by ``length`` payload bytes:
+
+    type u8 | flags u8 | reserved u16 | seq u32 | offset u64 | time f64 | length u32
+
+``seq`` counts frames on this connection, ``offset`` is the stream offset of the
+first payload byte (DATA) or of the replay start (HELLO), and ``time`` is the
+server's wall clock in seconds. Frame types:
+
+    DATA  (1)  raw PTY output; FLAG_DEFLATE set if the payload is raw deflate
+    HELLO (2)  JSON {"offset": n, "end": m}, always the first frame
+    END   (3)  JSON {"reason": "finished" | "behind", "exit_code": ...}
+
+From the client, binary messages are keystrokes written to the PTY as-is and
+text messages are JSON control messages, so control data is never typed into
+the robot's shell:
+
+    {"type": "resize", "rows": 40, "cols": 120}   TIOCSWINSZ + SIGWINCH
+    {"type": "signal", "signal": "interrupt"}      also terminate, quit, hangup, kill
+    {"type": "pause"} / {"type": "resume"}         stop / restart reading the PTY
+    {"type": "probe", "id": 7}                      echo of a server probe (teleop)
+
+Teleop sessions also send text messages: echo probes, ``{"type": "probe",
+"id": n}``, which the client sends straight back to measure the round trip.
+
+Recordings play back over the same frames (/ws/recordings/{id}); there
+``time`` is when the output was originally produced, and the control messages
+are pause, resume and:
+
+    {"type": "seek", "time": 12.5}                 seconds into the recording
+    {"type": "speed", "speed": 4}                   0 plays without delays
+"""
+import json
+import time
+import zlib
+import struct
+from typing import Annotated, Iterator, Literal, Optional, Tuple, Union
+
+from pydantic import BaseModel, Field, TypeAdapter, ValidationError
+
+HEADER = struct.Struct("<BBHIQdI")
+HEADER_SIZE = HEADER.size
+
+FRAME_DATA = 1
+FRAME_HELLO = 2
+FRAME_END = 3
+
+FLAG_DEFLATE = 0x01
+
+# Coalescing budget: wait at most this long after the first chunk of a batch...
+BATCH_MS = 16
+# ...or until this many bytes are queued
+BATCH_BYTES = 65536
+
+# Payloads smaller than this are not worth compressing
+DEFLATE_MIN_SIZE = 512
+
+
+class FrameEncoder:
+    """Builds frames for one connection, numbering them and optionally deflating DATA."""
+
+    def __init__(self, deflate: bool = False, level: int = 1):
+        self.deflate = deflate
+        self.level = level
+        self.seq = 0
+        self.bytes_in = 0
+        self.bytes_out = 0
+
+    def frame(self, frame_type: int, offset: int, payload: bytes, flags: int = 0,
+              stamp: Optional[float] = None) -> bytes:
+        stamp = time.time() if stamp is None else stamp
+        header = HEADER.pack(frame_type, flags, 0, self.seq, offset, stamp, len(payload))
+        self.seq = (self.seq + 1) & 0xFFFFFFFF
+        self.bytes_out += HEADER_SIZE + len(payload)
+        return header + payload
+
+    def data(self, offset: int, payload: bytes, stamp: Optional[float] = None) -> bytes:
+        self.bytes_in += len(payload)
+        if self.deflate and len(payload) >= DEFLATE_MIN_SIZE:
+            # Each frame is compressed on its own so any frame decodes without the
+            # previous ones (a resumed viewer starts mid-stream)
+            compressor = zlib.compressobj(self.level, zlib.DEFLATED, -15)
+            packed = compressor.compress(payload) + compressor.flush()
+            if len(packed) < len(payload):
+                return self.frame(FRAME_DATA, offset, packed, FLAG_DEFLATE, stamp)
+        return self.frame(FRAME_DATA, offset, payload, stamp=stamp)
+
+    def hello(self, offset: int, end: int) -> bytes:
+        return self.frame(FRAME_HELLO, offset, json.dumps({"offset": offset, "end": end}).encode())
+
+    def end(self, offset: int, reason: str, exit_code: Optional[int] = None) -> bytes:
+        body = json.dumps({"reason": reason, "exit_code": exit_code}).encode()
+        return self.frame(FRAME_END, offset, body)
+
+
+def decode_frames(message: bytes) -> Iterator[Tuple[int, int, int, int, float, bytes]]:
+    """Yield ``(type, flags, seq, offset, time, payload)`` for every frame in a message."""
+    view = memoryview(message)
+    pos = 0
+    while pos < len(view):
+        frame_type, flags, _, seq, offset, stamp, length = HEADER.unpack_from(view, pos)
+        pos += HEADER_SIZE
+        payload = bytes(view[pos:pos + length])
+        pos += length
+        if flags & FLAG_DEFLATE:
+            payload = zlib.decompress(payload, -15)
+        yield frame_type, flags, seq, offset, stamp, payload
+
+
+class ResizeMessage(BaseModel):
+    type: Literal["resize"]
+    rows: int = Field(ge=1, le=1000)
+    cols: int = Field(ge=1, le=1000)
+
+
+class SignalMessage(BaseModel):
+    type: Literal["signal"]
+    signal: Literal["interrupt", "terminate", "quit", "hangup", "kill"]
+
+
+class FlowMessage(BaseModel):
+    type: Literal["pause", "resume"]
+
+
+class ProbeMessage(BaseModel):
+    type: Literal["probe"]
+    id: int
+
+
+class SeekMessage(BaseModel):
+    type: Literal["seek"]
+    time: float = Field(ge=0)
+
+
+class SpeedMessage(BaseModel):
+    type: Literal["speed"]
+    speed: float = Field(ge=0, le=1000)
+
+
+ControlMessage = Annotated[Union[ResizeMessage, SignalMessage, FlowMessage, ProbeMessage],
+                          Field(discriminator="type")]
+_control_adapter = TypeAdapter(ControlMessage)
+
+PlaybackMessage = Annotated[Union[FlowMessage, SeekMessage, SpeedMessage], Field(discriminator="type")]
+_playback_adapter = TypeAdapter(PlaybackMessage)
+
+
+def _parse(adapter: TypeAdapter, text: str):
+    try:
+        return adapter.validate_json(text)
+    except ValidationError as e:
+        errors = "; ".join(f"{'.'.join(map(str, err['loc'])) or 'message'}: {err['msg']}" for err in e.errors())
+        raise ValueError(errors)
+
+
+def parse_control(text: str) -> ControlMessage:
+    """Parse a client control message; raises ValueError if it is malformed."""
+    return _parse(_control_adapter, text)
+
+
+def parse_playback(text: str) -> PlaybackMessage:
+    """Parse a recording player's control message; raises ValueError if it is malformed."""
+    return _parse(_playback_adapter, text)
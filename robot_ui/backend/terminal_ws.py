@@ -0,0 +1,230 @@
+"""
+Terminal websockets: a viewer attached to a session's output and input.
+
+Shared by main.py, where ``session`` is a sessions.Session, and worker.py,
+where it is a session_ipc.RemoteSession mirroring one in the primary process.
+Both have the same attributes and methods as far as these functions go.
+"""
+import re
+import json
+import codecs
+import asyncio
+import logging
+from typing import Optional
+
+from fastapi import WebSocket, WebSocketDisconnect
+
+from sessions import Session, SIGNALS
+from terminal_protocol import (
+    FrameEncoder, parse_control, ControlMessage, ResizeMessage, SignalMessage, ProbeMessage, BATCH_MS, BATCH_BYTES,
+)
+from teleop import PROBE_INTERVAL, TELEOP_MAX_PENDING, ViewerWindow, tune_socket
+from broadcaster import POLICY_COALESCE
+
+logger = logging.getLogger("robot_ui_backend")
+
+# Resize message of the text protocol, recognized only as a whole message
+LEGACY_RESIZE = re.compile(r"RESIZE:(\d{1,4}),(\d{1,4})")
+
+
+async def _forward_input(websocket: WebSocket, session: Session):
+    """Single long-lived task that writes client keystrokes into the PTY."""
+    while True:
+        message = await websocket.receive()
+        if message["type"] == "websocket.disconnect":
+            raise WebSocketDisconnect(message.get("code", 1000))
+        if message.get("bytes") is not None:
+            # Keystrokes sent as a binary frame go to the PTY as they are
+            session.write(message["bytes"])
+            continue
+        msg = message.get("text")
+        if msg is None:
+            continue
+        resize = LEGACY_RESIZE.fullmatch(msg) if msg.startswith("RESIZE:") else None
+        if resize:
+            session.resize(max(1, int(resize.group(1))), max(1, int(resize.group(2))))
+            continue
+        session.write(msg.encode("utf-8"))
+
+
+async def _forward_output(websocket: WebSocket, session: Session, since: Optional[int]):
+    """
+    Replay buffered output, then stream live output. When the client passes
+    `since`, the first message is a JSON header telling it which byte offset
+    the replay starts at. Offsets count PTY bytes, and invalid UTF-8 is
+    replaced on the way, so a resume offset worked out from the text received
+    is only approximate; the binary protocol carries exact offsets.
+
+    Returns True if the command finished, False if this viewer fell too far
+    behind and was dropped.
+    """
+    offset, backlog, subscriber = session.subscribe(since)
+    # Incremental decoding keeps multibyte characters split across chunks intact
+    decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+    try:
+        if since is not None:
+            await websocket.send_text(json.dumps({"offset": offset, "end": session.output.end}))
+        if backlog:
+            await websocket.send_text(decoder.decode(backlog))
+        while True:
+            data = await subscriber.get()
+            if data is None:
+                if subscriber.overflowed:
+                    return False
+                tail = decoder.decode(b"", final=True)
+                await websocket.send_text(tail + "\n[Command Finished]\n")
+                return True
+            text = decoder.decode(data)
+            if text:
+                await websocket.send_text(text)
+    finally:
+        session.unsubscribe(subscriber)
+
+
+def _handle_control(websocket: WebSocket, session: Session, message: ControlMessage,
+                    window: Optional[ViewerWindow] = None):
+    """Apply a control message from a binary-protocol client."""
+    if isinstance(message, ResizeMessage):
+        session.resize(message.rows, message.cols)
+    elif isinstance(message, SignalMessage):
+        logger.info(f"Session {session.id}: {message.signal} requested by a viewer")
+        session.send_signal(SIGNALS[message.signal])
+    elif isinstance(message, ProbeMessage):
+        if window:
+            window.reply(message.id)
+    elif message.type == "pause":
+        # The client's terminal is backlogged; stop reading until it catches up
+        session.hold(websocket)
+    else:
+        session.release(websocket)
+
+
+async def _forward_input_binary(websocket: WebSocket, session: Session,
+                                window: Optional[ViewerWindow] = None):
+    """Binary messages are keystrokes; text messages are JSON control messages."""
+    while True:
+        message = await websocket.receive()
+        if message["type"] == "websocket.disconnect":
+            raise WebSocketDisconnect(message.get("code", 1000))
+        if message.get("bytes") is not None:
+            session.write(message["bytes"])
+        elif message.get("text") is not None:
+            try:
+                control = parse_control(message["text"])
+            except ValueError as e:
+                logger.warning(f"Bad control message for session {session.id}: {e}")
+                continue
+            _handle_control(websocket, session, control, window)
+
+
+async def _forward_output_binary(websocket: WebSocket, session: Session, since: Optional[int],
+                                 deflate: bool, batch_ms: int, window: Optional[ViewerWindow] = None):
+    """
+    Binary-protocol counterpart of _forward_output: a HELLO frame, the replay,
+    then live output coalesced for up to `batch_ms` or BATCH_BYTES per message.
+    A teleop viewer's queue keeps only the newest output instead of dropping
+    the viewer, and its `window` holds output back while the viewer hasn't
+    confirmed what it was sent, so key answers show up at once even under a
+    flood on a slow link.
+    """
+    if session.teleop:
+        offset, backlog, subscriber = session.subscribe(since, max_pending=TELEOP_MAX_PENDING,
+                                                        policy=POLICY_COALESCE)
+    else:
+        offset, backlog, subscriber = session.subscribe(since)
+    encoder = FrameEncoder(deflate)
+    loop = asyncio.get_running_loop()
+    try:
+        await websocket.send_bytes(encoder.hello(offset, session.output.end))
+        for start in range(0, len(backlog), BATCH_BYTES):
+            await websocket.send_bytes(encoder.data(offset + start, backlog[start:start + BATCH_BYTES]))
+        finished = False
+        while not finished:
+            if window:
+                await window.wait()
+            data = await subscriber.get()
+            if data is None:
+                break
+            start = subscriber.offset - len(data)
+            chunks = [data]
+            size = len(data)
+            deadline = loop.time() + batch_ms / 1000.0
+            while size < BATCH_BYTES:
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    break
+                try:
+                    more = await asyncio.wait_for(subscriber.get(), remaining)
+                except asyncio.TimeoutError:
+                    break
+                if more is None:
+                    finished = True
+                    break
+                chunks.append(more)
+                size += len(more)
+            await websocket.send_bytes(encoder.data(start, chunks[0] if len(chunks) == 1 else b"".join(chunks)))
+            probe = window.sent_bytes(size) if window else None
+            if probe:
+                await websocket.send_text(json.dumps(probe))
+        if subscriber.overflowed:
+            await websocket.send_bytes(encoder.end(subscriber.offset, "behind"))
+            return False
+        await websocket.send_bytes(encoder.end(subscriber.offset, "finished", session.exit_code))
+        return True
+    finally:
+        session.unsubscribe(subscriber)
+
+
+async def _send_probes(websocket: WebSocket, session: Session, window: ViewerWindow):
+    """Echo probes for a teleop viewer; replies come back as control messages."""
+    while session.running:
+        await websocket.send_text(json.dumps(window.probe()))
+        await asyncio.sleep(PROBE_INTERVAL)
+
+
+async def attach(websocket: WebSocket, session: Session, since: Optional[int] = None,
+                  proto: str = "text", deflate: bool = False, batch_ms: int = BATCH_MS):
+    tasks = []
+    window = None
+    if session.teleop:
+        if not tune_socket(websocket):
+            logger.debug(f"Session {session.id}: TCP_NODELAY not available for this viewer")
+        # A key's answer goes out as soon as it is read
+        batch_ms = 0
+        if proto == "bin":
+            window = ViewerWindow(session.teleop)
+            tasks.append(asyncio.create_task(_send_probes(websocket, session, window)))
+    if proto == "bin":
+        input_task = asyncio.create_task(_forward_input_binary(websocket, session, window))
+        output_task = asyncio.create_task(
+            _forward_output_binary(websocket, session, since, deflate, max(0, min(batch_ms, 1000)), window))
+    else:
+        input_task = asyncio.create_task(_forward_input(websocket, session))
+        output_task = asyncio.create_task(_forward_output(websocket, session, since))
+    try:
+        done, pending = await asyncio.wait(
+            [input_task, output_task],
+            return_when=asyncio.FIRST_COMPLETED
+        )
+        for task in done:
+            task.result()
+        if output_task in done:
+            if output_task.result():
+                # Command finished: let the client know by closing the socket
+                await websocket.close()
+            else:
+                # Too slow to keep up: the client reconnects with ?since= and
+                # catches up from the ring buffer in one go
+                await websocket.close(code=1013, reason="viewer fell behind")
+    except WebSocketDisconnect:
+        logger.info("Websocket disconnected")
+    except Exception as e:
+        logger.error(f"Terminal error: {e}")
+    finally:
+        tasks += [input_task, output_task]
+        for task in tasks:
+            task.cancel()
+        # Collects what a task raised after the socket closed under it
+        await asyncio.gather(*tasks, return_exceptions=True)
+        # A viewer that paused output and went away must not keep it paused
+        session.release(websocket)
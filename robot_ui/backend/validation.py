@@ -0,0 +1,81 @@
+"""
+Robot validation helpers.
+
+Validation scripts run through ``asyncio.create_subprocess_exec`` so a slow or
+unreachable robot never blocks the event loop (and with it every open terminal
+websocket). ``validate_many`` fans out over a bounded semaphore and yields
+results in completion order.
+"""
+import os
+import time
+import signal
+import asyncio
+from typing import AsyncIterator, Dict, List, Optional
+
+# Per-robot validation timeout in seconds
+VALIDATION_TIMEOUT = 10.0
+
+# Upper bound on validation scripts running at the same time
+MAX_PARALLEL_VALIDATIONS = int(os.environ.get("ROBOT_UI_MAX_PARALLEL_VALIDATIONS", "32"))
+
+
+async def run_validation(args: List[str], timeout: float = VALIDATION_TIMEOUT) -> dict:
+    """Run one validation script and return ``{"success": ..., "message": ...}``."""
+    try:
+        proc = await asyncio.create_subprocess_exec(
+            *args,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE,
+            start_new_session=True
+        )
+    except Exception as e:
+        return {"success": False, "message": str(e)}
+
+    try:
+        stdout, stderr = await asyncio.wait_for(proc.communicate(), timeout)
+    except (asyncio.TimeoutError, asyncio.CancelledError) as e:
+        try:
+            os.killpg(proc.pid, signal.SIGKILL)
+        except ProcessLookupError:
+            pass
+        await proc.wait()
+        if isinstance(e, asyncio.CancelledError):
+            raise
+        return {"success": False, "message": f"Validation timed out after {timeout:g}s"}
+
+    out = stdout.decode("utf-8", errors="replace")
+    err = stderr.decode("utf-8", errors="replace")
+    if proc.returncode == 0:
+        return {"success": True, "message": out}
+    return {"success": False, "message": f"Validation failed:\n{err}\n{out}"}
+
+
+async def validate_many(
+    targets: Dict[str, List[str]],
+    limit: Optional[int] = None,
+    timeout: float = VALIDATION_TIMEOUT,
+) -> AsyncIterator[dict]:
+    """
+    Validate every target concurrently, at most ``limit`` at a time, yielding
+    each result as soon as that robot finishes. ``targets`` maps a target name
+    to the script arguments used to validate it. ``limit`` is clamped to
+    1..MAX_PARALLEL_VALIDATIONS.
+    """
+    semaphore = asyncio.Semaphore(max(1, min(limit or MAX_PARALLEL_VALIDATIONS, MAX_PARALLEL_VALIDATIONS)))
+
+    async def validate_one(target: str, args: List[str]) -> dict:
+        async with semaphore:
+            started = time.perf_counter()
+            result = await run_validation(args, timeout)
+        result["target"] = target
+        result["duration"] = round(time.perf_counter() - started, 3)
+        return result
+
+    tasks = [asyncio.create_task(validate_one(t, a)) for t, a in targets.items()]
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            yield await next_done
+    finally:
+        # Client went away mid-stream: don't leave scripts running
+        for task in tasks:
+            task.cancel()
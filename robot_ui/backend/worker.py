@@ -0,0 +1,218 @@
+"""
+HTTP/websocket worker process of ``serve.py --workers N``.
+
+The primary process runs main.py's app on a Unix socket and owns everything
+with state: sessions and their PTYs, jobs, fleet runs, downloads, the bag
+catalog, metrics. The workers share the TCP port, and each one serves
+
+    /health, /api/robots, /api/robots/{id}/commands
+        itself, from its own copy of the robot registry
+    /ws/terminal/{session_id}
+        from its mirror of the session (session_ipc.py): the primary sends a
+        session's output to each worker once, and the worker fans it out to
+        its viewers. Teleop sessions are proxied like everything else.
+    everything else
+        proxied to the primary: HTTP through httpx and websockets through the
+        websockets client, streamed both ways
+
+so whichever worker a request lands on, it sees the same sessions and jobs.
+"""
+import os
+import signal
+import asyncio
+import logging
+from typing import Optional
+
+import httpx
+from fastapi import FastAPI, HTTPException, Request, WebSocket
+from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, StreamingResponse
+from starlette.background import BackgroundTask
+from websockets.client import unix_connect
+from websockets.exceptions import ConnectionClosed, InvalidHandshake
+
+from robot_registry import RobotRegistry, cached_json
+from session_ipc import RemoteSessions
+from terminal_protocol import BATCH_MS
+from terminal_ws import attach
+from teleop import tune_socket
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger("robot_ui_backend")
+# One line per proxied request otherwise
+logging.getLogger("httpx").setLevel(logging.WARNING)
+
+# The primary's app and its session host; serve.py sets both
+PRIMARY_SOCKET = os.environ.get("ROBOT_UI_PRIMARY_SOCKET", "")
+SESSION_SOCKET = os.environ.get("ROBOT_UI_SESSION_SOCKET", "")
+
+# Seconds between checks that the primary (this process's parent) is still
+# there; a worker outliving a killed primary would only answer 502s
+PARENT_CHECK_INTERVAL = 1.0
+
+# Headers that describe one connection rather than the request
+HOP_HEADERS = frozenset((
+    "connection", "keep-alive", "proxy-authenticate", "proxy-authorization", "te", "trailer",
+    "transfer-encoding", "upgrade", "host",
+))
+
+app = FastAPI(title="Robot UI Backend worker")
+
+# CORS here, for the primary's responses too: requests go on without their
+# Origin, so its middleware doesn't add the headers a second time
+app.add_middleware(
+    CORSMiddleware,
+    allow_origins=["*"],
+    allow_credentials=True,
+    allow_methods=["*"],
+    allow_headers=["*"],
+)
+
+registry = RobotRegistry()
+
+remote = RemoteSessions(SESSION_SOCKET)
+
+# No timeout: NDJSON streams and downloads run as long as their work does
+primary = httpx.AsyncClient(transport=httpx.AsyncHTTPTransport(uds=PRIMARY_SOCKET), base_url="http://primary",
+                            timeout=None, limits=httpx.Limits(max_connections=None))
+
+_parent_task: Optional[asyncio.Task] = None
+
+
+def _target(scope: dict) -> str:
+    """The request's path and query string, exactly as the client sent them."""
+    target = scope["raw_path"].decode("latin-1")
+    if scope["query_string"]:
+        target += "?" + scope["query_string"].decode("latin-1")
+    return target
+
+
+@app.get("/health")
+async def health_check():
+    return {"status": "ok"}
+
+
+@app.get("/api/robots")
+async def get_robots(request: Request):
+    current = registry.current
+    return cached_json(request, current.robots_body, current.robots_etag)
+
+
+@app.get("/api/robots/{robot_id}/commands")
+async def get_robot_commands(robot_id: str, request: Request):
+    current = registry.current
+    if robot_id not in current.robots:
+        raise HTTPException(404, "Robot not found")
+    return cached_json(request, current.commands_body[robot_id], current.commands_etag[robot_id])
+
+
+@app.websocket("/ws/terminal/{session_id}")
+async def session_terminal_websocket(websocket: WebSocket, session_id: str, since: Optional[int] = None,
+                                     proto: str = "text", deflate: bool = False, batch_ms: int = BATCH_MS):
+    try:
+        async with remote.viewer(session_id) as session:
+            if session is None:
+                await websocket.close(code=4404)
+                return
+            if session.is_teleop:
+                tune_socket(websocket)
+                await proxy_websocket(websocket)
+                return
+            await websocket.accept()
+            await attach(websocket, session, since, proto, deflate, batch_ms)
+    except OSError as e:
+        logger.error(f"Session {session_id}: primary unavailable: {e}")
+        await websocket.close(code=1011)
+
+
+async def _client_to_primary(websocket: WebSocket, upstream):
+    while True:
+        message = await websocket.receive()
+        if message["type"] == "websocket.disconnect":
+            await upstream.close(message.get("code", 1000))
+            return
+        if message.get("bytes") is not None:
+            await upstream.send(message["bytes"])
+        elif message.get("text") is not None:
+            await upstream.send(message["text"])
+
+
+async def _primary_to_client(websocket: WebSocket, upstream):
+    try:
+        async for message in upstream:
+            if isinstance(message, bytes):
+                await websocket.send_bytes(message)
+            else:
+                await websocket.send_text(message)
+    except ConnectionClosed:
+        pass
+    # 1005/1006 only describe the primary's side; they can't be sent on
+    code = upstream.close_code if upstream.close_code not in (None, 1005, 1006) else 1011
+    await websocket.close(code, upstream.close_reason or None)
+
+
+@app.websocket("/{path:path}")
+async def proxy_websocket(websocket: WebSocket):
+    try:
+        upstream = await unix_connect(PRIMARY_SOCKET, "ws://primary" + _target(websocket.scope), max_size=None,
+                                      compression=None, ping_interval=None)
+    except (OSError, InvalidHandshake) as e:
+        # The primary refused it (an unknown run or transfer) or is down
+        logger.info(f"Websocket {websocket.url.path} not proxied: {e}")
+        await websocket.close()
+        return
+    await websocket.accept()
+    tasks = [asyncio.create_task(_client_to_primary(websocket, upstream)),
+             asyncio.create_task(_primary_to_client(websocket, upstream))]
+    try:
+        done, _ = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+        for task in done:
+            task.result()
+    except Exception as e:
+        logger.debug(f"Websocket {websocket.url.path}: {e!r}")
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        await upstream.close()
+
+
+@app.api_route("/{path:path}", methods=["GET", "HEAD", "POST", "PUT", "PATCH", "DELETE", "OPTIONS"])
+async def proxy(request: Request):
+    headers = [(k, v) for k, v in request.headers.items() if k not in HOP_HEADERS and k != "origin"]
+    has_body = "content-length" in request.headers or "transfer-encoding" in request.headers
+    upstream_request = primary.build_request(request.method, _target(request.scope), headers=headers,
+                                             content=request.stream() if has_body else None)
+    try:
+        upstream = await primary.send(upstream_request, stream=True)
+    except httpx.TransportError as e:
+        logger.error(f"{request.method} {request.url.path}: primary unavailable: {e}")
+        return JSONResponse({"detail": "Backend unavailable"}, status_code=502)
+    return StreamingResponse(
+        upstream.aiter_raw(), status_code=upstream.status_code,
+        headers={k: v for k, v in upstream.headers.items() if k not in HOP_HEADERS},
+        background=BackgroundTask(upstream.aclose),
+    )
+
+
+async def _watch_parent(parent: int):
+    while os.getppid() == parent:
+        await asyncio.sleep(PARENT_CHECK_INTERVAL)
+    logger.error("The primary process went away; stopping this worker")
+    os.kill(os.getpid(), signal.SIGTERM)
+
+
+@app.on_event("startup")
+async def startup():
+    global _parent_task
+    registry.start()
+    _parent_task = asyncio.create_task(_watch_parent(os.getppid()))
+
+
+@app.on_event("shutdown")
+async def shutdown():
+    if _parent_task:
+        _parent_task.cancel()
+    remote.close()
+    await registry.close()
+    await primary.aclose()
@@ -3,10 +3,38 @@ import { Terminal } from 'xterm';
 import { FitAddon } from 'xterm-addon-fit';
 import 'xterm/css/xterm.css';
 
-const TerminalComponent = () => {
+// Binary /ws/terminal protocol (backend/terminal_protocol.py): every message
+// holds frames of a 28-byte little-endian header plus payload
+const HEADER_SIZE = 28;
+const FRAME_DATA = 1;
+const FRAME_HELLO = 2;
+const FRAME_END = 3;
+const FLAG_DEFLATE = 0x01;
+// Flow control: ask the backend to pause the PTY while xterm has this many
+// bytes queued for rendering, and resume once it is down to the low mark
+const WRITE_HIGH_WATER = 1024 * 1024;
+const WRITE_LOW_WATER = 128 * 1024;
+const textEncoder = new TextEncoder();
+const textDecoder = new TextDecoder();
+
+const inflate = async (bytes) => {
+    const stream = new Blob([bytes]).stream().pipeThrough(new DecompressionStream('deflate-raw'));
+    return new Uint8Array(await new Response(stream).arrayBuffer());
+};
+
+const sendControl = (ws, message) => {
+    if (ws && ws.readyState === WebSocket.OPEN) {
+        ws.send(JSON.stringify(message));
+    }
+};
+
+const TerminalComponent = ({ sessionId, onExit }) => {
     const terminalRef = useRef(null);
     const wsRef = useRef(null);
     const xtermRef = useRef(null);
+    const fitAddonRef = useRef(null);
+    const onExitRef = useRef(onExit);
+    onExitRef.current = onExit;
 
     useEffect(() => {
         // Initialize xterm
@@ -23,6 +51,7 @@ const TerminalComponent = () => {
 
         const fitAddon = new FitAddon();
         term.loadAddon(fitAddon);
+        fitAddonRef.current = fitAddon;
 
         if (terminalRef.current) {
             term.open(terminalRef.current);
@@ -30,55 +59,147 @@ const TerminalComponent = () => {
             xtermRef.current = term;
         }
 
-        // Connect WebSocket
-        const protocol = window.location.protocol === 'https:' ? 'wss:' : 'ws:';
-        // Check if we are in dev mode (vite proxy) or prod
-        // We'll hardcode localhost for dev if needed, or relative
-        // Assuming we proxy /ws in Vite config or direct connect to 8000
-        const wsUrl = `ws://localhost:8000/ws/terminal`;
-
-        const ws = new WebSocket(wsUrl);
-        wsRef.current = ws;
-
-        ws.onopen = () => {
-            term.writeln('\x1b[32m[SYSTEM] Connected to Robot Terminal...\x1b[0m\r\n');
-            const dims = fitAddon.proposeDimensions();
-            if (dims) {
-                ws.send(`RESIZE:${dims.rows},${dims.cols}`);
-            }
-        };
-
-        ws.onmessage = (event) => {
-            term.write(event.data);
-        };
-
-        ws.onclose = () => {
-            term.writeln('\r\n\x1b[31m[SYSTEM] Connection lost.\x1b[0m');
-        };
-
         term.onData(data => {
-            if (ws.readyState === WebSocket.OPEN) {
-                ws.send(data);
+            const ws = wsRef.current;
+            if (ws && ws.readyState === WebSocket.OPEN) {
+                // Keystrokes go as binary; text messages are control messages
+                ws.send(textEncoder.encode(data));
             }
         });
 
         // Handle resize
         const handleResize = () => {
             fitAddon.fit();
+            const ws = wsRef.current;
             const dims = fitAddon.proposeDimensions();
-            if (dims && ws.readyState === WebSocket.OPEN) {
-                ws.send(`RESIZE:${dims.rows},${dims.cols}`);
+            if (dims) {
+                sendControl(ws, { type: 'resize', rows: dims.rows, cols: dims.cols });
             }
         };
         window.addEventListener('resize', handleResize);
 
         return () => {
             window.removeEventListener('resize', handleResize);
-            if (ws.readyState === WebSocket.OPEN) ws.close();
             term.dispose();
         };
     }, []);
 
+    useEffect(() => {
+        const term = xtermRef.current;
+        if (!sessionId || !term) return;
+
+        // Byte offset of the output we have shown so far. On a dropped
+        // connection we reattach with ?since= and only get what we missed.
+        let offset = 0;
+        let retries = 0;
+        let retryTimer = null;
+        let disposed = false;
+
+        const connect = () => {
+            // Each command runs in its own backend session; attach to it.
+            // We'll hardcode localhost for dev if needed, or relative
+            const wsUrl = `ws://localhost:8000/ws/terminal/${sessionId}?since=${offset}&proto=bin`;
+
+            const ws = new WebSocket(wsUrl);
+            ws.binaryType = 'arraybuffer';
+            wsRef.current = ws;
+            // Deflated frames decompress asynchronously; keep output in order
+            let pending = Promise.resolve();
+            let unrendered = 0;
+            let paused = false;
+
+            const render = (bytes) => {
+                unrendered += bytes.length;
+                if (!paused && unrendered > WRITE_HIGH_WATER) {
+                    paused = true;
+                    sendControl(ws, { type: 'pause' });
+                }
+                term.write(bytes, () => {
+                    unrendered -= bytes.length;
+                    if (paused && unrendered < WRITE_LOW_WATER) {
+                        paused = false;
+                        sendControl(ws, { type: 'resume' });
+                    }
+                });
+            };
+
+            ws.onopen = () => {
+                if (retries === 0) {
+                    term.writeln('\x1b[32m[SYSTEM] Connected to Robot Terminal...\x1b[0m\r\n');
+                }
+                retries = 0;
+                const dims = fitAddonRef.current && fitAddonRef.current.proposeDimensions();
+                if (dims) {
+                    sendControl(ws, { type: 'resize', rows: dims.rows, cols: dims.cols });
+                }
+            };
+
+            ws.onmessage = (event) => {
+                if (typeof event.data === 'string') {
+                    // Teleop sessions measure the round trip with echo probes
+                    const message = JSON.parse(event.data);
+                    if (message.type === 'probe') sendControl(ws, message);
+                    return;
+                }
+                const view = new DataView(event.data);
+                let pos = 0;
+                while (pos + HEADER_SIZE <= view.byteLength) {
+                    const type = view.getUint8(pos);
+                    const flags = view.getUint8(pos + 1);
+                    const frameOffset = Number(view.getBigUint64(pos + 8, true));
+                    const length = view.getUint32(pos + 24, true);
+                    const payload = new Uint8Array(event.data, pos + HEADER_SIZE, length);
+                    pos += HEADER_SIZE + length;
+
+                    if (type === FRAME_HELLO) {
+                        // {"offset": n, "end": m}: where the replay starts
+                        offset = JSON.parse(textDecoder.decode(payload)).offset;
+                    } else if (type === FRAME_DATA) {
+                        const data = flags & FLAG_DEFLATE ? inflate(payload) : payload;
+                        pending = pending.then(async () => {
+                            const bytes = await data;
+                            // Raw bytes: xterm decodes UTF-8 across frame boundaries
+                            render(bytes);
+                            offset = frameOffset + bytes.length;
+                        });
+                    } else if (type === FRAME_END && JSON.parse(textDecoder.decode(payload)).reason === 'finished') {
+                        pending = pending.then(() => term.write('\r\n[Command Finished]\r\n'));
+                    }
+                }
+            };
+
+            ws.onclose = (event) => {
+                if (wsRef.current !== ws) return;
+                wsRef.current = null;
+                if (disposed) return;
+                // 1013: this viewer fell behind and was dropped by the backend;
+                // resume from our offset right away and catch up from its buffer
+                if (event.code === 1013) {
+                    connect();
+                    return;
+                }
+                // 1000 means the command finished; anything else is a dropped link
+                if (event.code !== 1000 && event.code !== 4404 && retries < 5) {
+                    retries += 1;
+                    term.writeln(`\r\n\x1b[33m[SYSTEM] Connection lost, reconnecting (${retries})...\x1b[0m`);
+                    retryTimer = setTimeout(connect, 1000 * retries);
+                    return;
+                }
+                if (onExitRef.current) onExitRef.current(sessionId);
+            };
+        };
+
+        connect();
+
+        return () => {
+            disposed = true;
+            clearTimeout(retryTimer);
+            const ws = wsRef.current;
+            wsRef.current = null;
+            if (ws && (ws.readyState === WebSocket.OPEN || ws.readyState === WebSocket.CONNECTING)) ws.close();
+        };
+    }, [sessionId]);
+
     return (
         <div style={{ width: '100%', height: '100%', position: 'relative' }}>
             <div ref={terminalRef} style={{ width: '100%', height: '100%' }} />
@@ -9,6 +9,7 @@ const RobotControl = () => {
     const [commands, setCommands] = useState([]);
     const [robotName, setRobotName] = useState(id);
     const [runningCmd, setRunningCmd] = useState(null); // Index of running command
+    const [sessionId, setSessionId] = useState(null); // Backend session streaming to the terminal
 
     useEffect(() => {
         // Fetch robot details (name) - simplified, usually would have a dedicated endpoint or passed state
@@ -29,21 +30,27 @@ const RobotControl = () => {
     const handleExecute = async (idx) => {
         if (runningCmd !== null) return; // Prevent multiple commands
 
+        // Remote commands run on one robot, over the backend's SSH pool
+        const body = { robot_id: id, command_index: idx };
+        if (commands[idx].remote_command) {
+            const robotNumber = window.prompt("Enter Robot Number:");
+            if (!robotNumber || !/^\d+$/.test(robotNumber.trim())) return;
+            body.robot_number = parseInt(robotNumber.trim(), 10);
+        }
+
         setRunningCmd(idx);
         try {
             const res = await fetch('http://localhost:8000/api/execute', {
                 method: 'POST',
                 headers: { 'Content-Type': 'application/json' },
-                body: JSON.stringify({ robot_id: id, command_index: idx })
+                body: JSON.stringify(body)
             });
             if (!res.ok) throw new Error("Failed to start");
 
-            // Wait for completion logic would go here, 
-            // but for now we rely on the user watching the terminal or a websocket signal
-            // For UI feedback, we'll reset the button state after a bit or listen for "Command Finished" via WS context
-            // Since we simplified the WS to be just "Terminal", we'll just timeout the button state for visual effect
-            // In a real app the WS should broadcast state changes.
-            setTimeout(() => setRunningCmd(null), 2000);
+            // The terminal attaches to this session and calls handleSessionExit
+            // once the backend closes the stream.
+            const data = await res.json();
+            setSessionId(data.session_id);
 
         } catch (err) {
             console.error(err);
@@ -51,6 +58,10 @@ const RobotControl = () => {
         }
     };
 
+    const handleSessionExit = () => {
+        setRunningCmd(null);
+    };
+
     return (
         <div className="flex flex-col h-screen w-full overflow-hidden bg-[#121212]">
             {/* Header */}
@@ -136,7 +147,7 @@ const RobotControl = () => {
                         </div>
                     </div>
                     <div className="flex-1 p-4 overflow-hidden">
-                        <TerminalComponent />
+                        <TerminalComponent sessionId={sessionId} onExit={handleSessionExit} />
                     </div>
                 </div>
             </div>
@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+"""
+Stand-in for one robot of the simulated fleet (backend/benchmarks/fleet_sim.py).
+
+Modes:
+    stream <bytes_per_s> [seconds]   ROS log lines at that rate; 0 s runs until stopped
+    validate <name> [robot_number]   validate_robot.sh's checks
+    hang                             prints a line, then ignores SIGINT/SIGTERM and never
+                                     finishes, like a wedged ssh or docker exec
+
+--latency delays the first output (and validation) like a slow link. --loss
+is the chance per 100 ms of output that the link stalls for a retransmit
+timeout, and the chance that validation times out.
+
+Usage:
+    fake_robot.py [--latency 0.05] [--loss 0.01] stream 100000 30
+"""
+import sys
+import time
+import random
+import signal
+import argparse
+
+LINE = "[ INFO] [{:.6f}]: /move_base: planner tick {}, costmap updated, 42 waypoints\r\n"
+
+# Seconds a lost packet holds the link up, as a TCP retransmit timeout
+STALL_SECONDS = (0.2, 1.0)
+
+# How long validation waits on a lost link before giving up, as ssh's ConnectTimeout
+CONNECT_TIMEOUT = 5.0
+
+
+def out(text: str):
+    sys.stdout.write(text)
+    sys.stdout.flush()
+
+
+def stream(rate: int, seconds: float, loss: float):
+    # Ten writes a second, each a batch of lines
+    tick = 0
+    next_at = time.monotonic()
+    end = next_at + seconds if seconds else float("inf")
+    size = len(LINE.format(0.0, 0))
+    while next_at < end:
+        lines = max(1, rate // 10 // size)
+        out("".join(LINE.format(time.time(), tick * lines + i) for i in range(lines)))
+        tick += 1
+        next_at += 0.1
+        if random.random() < loss:
+            next_at += random.uniform(*STALL_SECONDS)
+        time.sleep(max(0.0, next_at - time.monotonic()))
+    out(f"Stream finished after {tick} ticks.\r\n")
+
+
+def validate(name: str, number: str, loss: float) -> int:
+    out(f"Targeting robot: {name}{' #' + number if number else ''}\n")
+    if random.random() < loss:
+        time.sleep(CONNECT_TIMEOUT)
+        print(f"ssh: connect to host {name}: Connection timed out", file=sys.stderr)
+        return 255
+    out("Checking connection... [OK]\nVerifying firmware version... [OK]\n")
+    out(f"Validation passed for {name}.\n")
+    return 0
+
+
+def hang():
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGTERM, signal.SIG_IGN)
+    out("Waiting for robot to respond...\r\n")
+    while True:
+        time.sleep(3600)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds before the first output")
+    parser.add_argument("--loss", type=float, default=0.0, help="chance of a stall per 100 ms / of a timeout")
+    parser.add_argument("--seed", type=int)
+    parser.add_argument("mode", choices=("stream", "validate", "hang"))
+    parser.add_argument("args", nargs="*")
+    args = parser.parse_args()
+    random.seed(args.seed)
+    time.sleep(args.latency)
+    try:
+        if args.mode == "stream":
+            stream(int(args.args[0]) if args.args else 100_000,
+                   float(args.args[1]) if len(args.args) > 1 else 0.0, args.loss)
+        elif args.mode == "validate":
+            sys.exit(validate(args.args[0] if args.args else "robot",
+                              args.args[1] if len(args.args) > 1 else "", args.loss))
+        else:
+            hang()
+    except (KeyboardInterrupt, BrokenPipeError):
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+"""
+Stand-in for `rostopic echo <topic>` on a robot.
+
+Prints messages separated by `---` lines at the given rate (messages per
+second, 50 Hz by default) until interrupted or `count` messages are out.
+Known topics: /raw_odom (nav_msgs/Odometry shape), /lift_debug and
+/pgv_offset; anything else gets the odometry shape.
+
+Usage:
+    fake_rostopic.py <topic> [rate_hz] [count]
+"""
+import sys
+import math
+import time
+
+
+def header(seq, t):
+    return f"""header:
+  seq: {seq}
+  stamp:
+    secs: {int(t)}
+    nsecs: {int((t % 1) * 1e9)}
+  frame_id: "odom\""""
+
+
+def raw_odom(seq, t):
+    x = math.cos(seq * 0.01)
+    y = math.sin(seq * 0.01)
+    theta = (seq * 0.01) % (2 * math.pi)
+    return f"""{header(seq, t)}
+child_frame_id: "base_link"
+pose:
+  pose:
+    position:
+      x: {x:.6f}
+      y: {y:.6f}
+      z: 0.0
+    orientation:
+      x: 0.0
+      y: 0.0
+      z: {math.sin(theta / 2):.6f}
+      w: {math.cos(theta / 2):.6f}
+twist:
+  twist:
+    linear:
+      x: {0.5 * math.sin(seq * 0.05):.6f}
+      y: 0.0
+      z: 0.0
+    angular:
+      x: 0.0
+      y: 0.0
+      z: {0.1 * math.cos(seq * 0.05):.6f}"""
+
+
+def lift_debug(seq, t):
+    # Lifter cycling between 0 and 60 mm every 10 s at 50 Hz
+    target = 60.0 if (seq // 500) % 2 else 0.0
+    height = target - (60.0 if target else -60.0) * math.exp(-(seq % 500) / 60.0)
+    return f"""{header(seq, t)}
+state: "{'LIFTING' if target else 'LOWERING'}"
+height: {height:.3f}
+target_height: {target:.1f}
+motor_current: {1.2 + 0.8 * abs(target - height) / 60.0 + 0.05 * math.sin(seq):.3f}"""
+
+
+def pgv_offset(seq, t):
+    return f"""{header(seq, t)}
+tag_id: {1000 + (seq // 250)}
+x_offset: {2.0 * math.sin(seq * 0.02):.3f}
+y_offset: {1.5 * math.cos(seq * 0.03):.3f}
+angle_offset: {0.4 * math.sin(seq * 0.007):.4f}"""
+
+
+MESSAGES = {
+    "/raw_odom": raw_odom,
+    "/lift_debug": lift_debug,
+    "/pgv_offset": pgv_offset,
+}
+
+topic = sys.argv[1] if len(sys.argv) > 1 else "/raw_odom"
+rate = float(sys.argv[2]) if len(sys.argv) > 2 else 50.0
+count = int(sys.argv[3]) if len(sys.argv) > 3 else 0
+message = MESSAGES.get(topic, raw_odom)
+
+period = 1.0 / rate
+seq = 0
+next_tick = time.monotonic()
+try:
+    while not count or seq < count:
+        print(message(seq, time.time()) + "\n---", flush=True)
+        seq += 1
+        next_tick += period
+        delay = next_tick - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+except (KeyboardInterrupt, BrokenPipeError):
+    pass
@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+"""
+Stand-in for `rosrun turtlebot3_teleop turtlebot3_teleop_key` on a robot.
+
+Reads single keys from its terminal in raw mode and answers each with the
+new velocities, as teleop_key does: w/x change linear speed, a/d angular,
+space or s stops, ^C quits. Every answer carries the key count ("key N") so
+the latency of a particular key can be told apart.
+
+With a rate, another thread meanwhile floods the terminal with that many
+bytes per second of log lines, like the ROS nodes sharing a roslaunch
+terminal with teleop.
+
+Usage:
+    fake_teleop.py [flood_bytes_per_s]
+"""
+import os
+import sys
+import time
+import termios
+import threading
+
+LINEAR_STEP = 0.01
+ANGULAR_STEP = 0.1
+
+lock = threading.Lock()
+
+
+def out(data: bytes):
+    with lock:
+        while data:
+            data = data[os.write(1, data):]
+
+
+def flood(rate: int):
+    line = b"[ INFO] [1700000000.000000]: /move_base: planner tick, costmap updated, 42 waypoints\r\n"
+    lines = line * max(1, rate // 100 // len(line))
+    next_at = time.monotonic()
+    while True:
+        out(lines)
+        next_at += 0.01
+        time.sleep(max(0.0, next_at - time.monotonic()))
+
+
+def main():
+    rate = int(sys.argv[1]) if len(sys.argv) > 1 else 0
+    fd = sys.stdin.fileno()
+    saved = termios.tcgetattr(fd)
+    mode = termios.tcgetattr(fd)
+    # Raw enough for single keys: no line buffering, no echo, ^C as a byte
+    mode[3] &= ~(termios.ICANON | termios.ECHO | termios.ISIG)
+    mode[6][termios.VMIN] = 1
+    mode[6][termios.VTIME] = 0
+    termios.tcsetattr(fd, termios.TCSADRAIN, mode)
+
+    out(b"Manual Teleop Started\r\nControl Your TurtleBot3!\r\n"
+        b"w/x : increase/decrease linear velocity\r\n"
+        b"a/d : increase/decrease angular velocity\r\n"
+        b"space key, s : force stop\r\n\r\n")
+    if rate:
+        threading.Thread(target=flood, args=(rate,), daemon=True).start()
+
+    linear = angular = 0.0
+    keys = 0
+    try:
+        while True:
+            key = os.read(fd, 1)
+            if not key or key == b"\x03":
+                break
+            keys += 1
+            if key == b"w":
+                linear += LINEAR_STEP
+            elif key == b"x":
+                linear -= LINEAR_STEP
+            elif key == b"a":
+                angular += ANGULAR_STEP
+            elif key == b"d":
+                angular -= ANGULAR_STEP
+            elif key in (b" ", b"s"):
+                linear = angular = 0.0
+            else:
+                continue
+            out(b"currently:\tlinear vel %.2f\t angular vel %.1f\tkey %d\r\n" % (linear, angular, keys))
+    finally:
+        termios.tcsetattr(fd, termios.TCSADRAIN, saved)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,7 +1,8 @@
 #!/bin/bash
 ROBOT_NAME=$1
+ROBOT_NUMBER=$2
 
-echo "Targeting robot: $ROBOT_NAME"
+echo "Targeting robot: $ROBOT_NAME${ROBOT_NUMBER:+ #$ROBOT_NUMBER}"
 echo "Checking connection... [OK]"
 echo "Verifying firmware version... [OK]"
 echo "Checking calibration data... [OK]"